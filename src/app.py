@@ -1,20 +1,45 @@
+import argparse
 import json
 import sys
 import os
 import os.path
 import logging
-
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload
+import threading
+import time
+from typing import Callable, Dict, List, Optional
 
 # Import the new modular downloader
 from downloader import VideoDownloader, __version__
+from downloader.utils import canonical_id
+from downloader.drive import (
+    REQUEST_TIMEOUT,
+    UPLOAD_CONCURRENCY,
+    DriveUploader,
+    ServiceAccountPool,
+)
+from downloader.bandwidth import parse_rate, shared_limiter
+from downloader.breaker import CircuitBreaker, RetryBudget
+from downloader.concurrency import AIMDController
+from downloader.deadline import Deadline, parse_duration
+from downloader.jobstore import JobStore, DONE, FAILED
+from downloader.pipeline import BatchRunner
+from downloader.scheduler import (
+    DEFAULT_THROUGHPUT,
+    FIFO,
+    ORDERS,
+    format_plan,
+    parse_platform_values,
+)
+from downloader.sinks import open_sink
+from downloader.sharding import in_shard, merge_manifests, parse_shard, write_manifest
+from downloader.storage import StorageManager, parse_size
+from downloader.sync import ArchiveIndex, ChannelSync
 from downloader.exceptions import (
+    CircuitOpenError,
+    DeadlineExceededError,
     DownloadError,
-    UnsupportedPlatformError,
-    DuplicateFileError,
+    ExtractionError,
+    NetworkError,
     AuthenticationRequiredError,
 )
 
@@ -32,59 +57,486 @@ EXIT_OK = 0
 EXIT_ERROR = 1              # bad input, config, or upload failure — yt-dlp can't help
 EXIT_STALE_EXTRACTOR = 2    # download broke; a newer yt-dlp may already fix it
 EXIT_AUTH_REQUIRED = 3      # platform refused anonymous access; cookies likely needed
+EXIT_DEADLINE = 4           # ran out of time; a rerun with the same --state resumes
 
-SCOPES = ['https://www.googleapis.com/auth/drive']
 SERVICE_ACCOUNT_FILE = "./auth.json"
 # Google Drive folder ID - can be overridden with GDRIVE_FOLDER_ID environment variable
 DEFAULT_GDRIVE_FOLDER_ID = '1j_mqg56mxnLPU6bI7UP5KebxN6NEkFZ6'
 
+# Failure type (as recorded on the job) → exit code. Anything unlisted is a
+# bad-input or upload problem that a newer yt-dlp cannot fix.
+_RETRYABLE_EXIT_CODES = {
+    DownloadError.__name__: EXIT_STALE_EXTRACTOR,
+    ExtractionError.__name__: EXIT_STALE_EXTRACTOR,
+    NetworkError.__name__: EXIT_STALE_EXTRACTOR,
+    AuthenticationRequiredError.__name__: EXIT_AUTH_REQUIRED,
+    # Skipped because its platform kept failing the same retryable ways
+    CircuitOpenError.__name__: EXIT_STALE_EXTRACTOR,
+    # A job that reached --job-timeout; its partial file is kept for the rerun
+    DeadlineExceededError.__name__: EXIT_DEADLINE,
+}
+
+# Built on the first upload, then shared by every thread
+_sink = None
+_uploader = None
+_uploader_lock = threading.Lock()
+# Set from --upload-workers / --upload-timeout (and, with a disk budget, the
+# staging directory) before the first upload
+_upload_settings = {'concurrency': UPLOAD_CONCURRENCY, 'timeout': REQUEST_TIMEOUT,
+                    'staging_dir': None}
+
+
+def _drive_uploader() -> DriveUploader:
+    """Return the process-wide Drive uploader, loading its accounts on first use."""
+    global _uploader
+    with _uploader_lock:
+        if _uploader is None:
+            # GDRIVE_SERVICE_ACCOUNTS lists several key files (os.pathsep-separated)
+            # to spread uploads over their quotas
+            paths = os.environ.get('GDRIVE_SERVICE_ACCOUNTS', SERVICE_ACCOUNT_FILE)
+            pool = ServiceAccountPool.from_files([p for p in paths.split(os.pathsep) if p],
+                                                 timeout=_upload_settings['timeout'])
+            folder_id = os.environ.get('GDRIVE_FOLDER_ID', DEFAULT_GDRIVE_FOLDER_ID)
+            _uploader = DriveUploader(pool, folder_id,
+                                      concurrency=_upload_settings['concurrency'])
+        return _uploader
 
-def sendVideo(filename: str):
+
+def _upload_sink():
+    """Return the process-wide upload sink described by ``UPLOAD_SINKS``."""
+    global _sink
+    with _uploader_lock:
+        if _sink is None:
+            # e.g. UPLOAD_SINKS=drive,s3://archive/videos sends every file to both
+            _sink = open_sink(os.environ.get('UPLOAD_SINKS', 'drive'), drive=_drive_uploader,
+                              staging_dir=_upload_settings['staging_dir'])
+        return _sink
+
+
+def sendVideo(filename: str, session_uri: Optional[str] = None,
+              on_session: Optional[Callable[[str], None]] = None,
+              deadline: Optional[Deadline] = None):
     """
-    Upload a video file to Google Drive.
+    Upload a video file to the configured sink(s), Google Drive by default.
+
+    See ``DriveUploader.upload()``: a Drive upload is resumable, and moves to
+    another service account when one runs out of quota. With several sinks
+    the file is read once and sent to all of them at the same time.
     
     Args:
         filename: Path to the video file to upload
+        session_uri: Resumable session from an interrupted earlier attempt
+        on_session: Called with the session URI once it is known
+        deadline: Stop between chunks rather than run past this
+
+    Returns:
+        The remote file id, or None if the upload failed
+
+    Raises:
+        DeadlineExceededError: If the upload stopped for ``deadline``, to be
+            resumed from ``on_session``'s session
     """
-    logger.info(f"Uploading video to Google Drive: {filename}")
-    
-    # Get folder ID from environment or use default
-    folder_id = os.environ.get('GDRIVE_FOLDER_ID', DEFAULT_GDRIVE_FOLDER_ID)
-    
+    logger.info(f"Uploading video: {filename}")
     try:
-        credentials = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=SCOPES
-        )
-        drive_service = build('drive', 'v3', credentials=credentials)
-
-        file_metadata = {
-            'name': os.path.basename(filename),
-            'mimeType': 'video/mp4',
-            'parents': [folder_id]
-        }
-        media = MediaFileUpload(filename, mimetype='video/mp4')
-        file = drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
-        
-        logger.info(f'Successfully uploaded to Google Drive. File ID: {file.get("id")}')
-        print(f'OK: File ID: {file.get("id")}')
-        
-        return file.get('id')
-
-    except HttpError as error:
-        logger.error(f"Google Drive upload error: {error}")
-        print(f"An error occurred: {error}")
+        file_id = _upload_sink().upload(filename, session_uri=session_uri,
+                                        on_session=on_session, deadline=deadline)
+    except (ImportError, ValueError) as e:
+        logger.error(f"Upload not possible: {e}")
+        print(f"An error occurred: {e}")
+        return None
+
+    if file_id is None:
+        print(f"An error occurred uploading {filename}")
+        return None
+    print(f'OK: File ID: {file_id}')
+    return file_id
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Download the video(s) described in data.json and upload them to Google Drive."
+    )
+    parser.add_argument('--state', default=os.environ.get('JOB_STATE'),
+                        help="SQLite file recording job progress. A rerun with the same file "
+                             "skips finished jobs and resumes interrupted ones "
+                             "(default: $JOB_STATE, else kept in memory)")
+    parser.add_argument('--staging-dir', default=os.environ.get('STAGING_DIR'),
+                        help="where downloads are written; setting it (or --disk-budget) also "
+                             "deletes each file once its upload is confirmed. May be a tmpfs "
+                             "mount (default: $STAGING_DIR, else '.' or 'downloads' for serve)")
+    parser.add_argument('--disk-budget', type=parse_size, default=os.environ.get('DISK_BUDGET'),
+                        help="cap on bytes held in the staging directory, e.g. 2G; downloads "
+                             "wait for room (default: $DISK_BUDGET, else unlimited)")
+    parser.add_argument('--sync', action='append', metavar='URL',
+                        help="download the new videos of a channel, playlist or profile "
+                             "instead of reading data.json; may be repeated")
+    parser.add_argument('--archive', default=os.environ.get('SYNC_ARCHIVE', 'archive.txt'),
+                        help="ids already synced, one per line in yt-dlp --download-archive "
+                             "format (default: $SYNC_ARCHIVE, else %(default)s)")
+    parser.add_argument('--shard', type=parse_shard, metavar='I/N',
+                        help="process only the data.json entries hashed to shard I of N "
+                             "(1-based), for splitting one list over N runners")
+    parser.add_argument('--manifest', metavar='PATH',
+                        help="write this run's job results to a JSON manifest; merge the "
+                             "manifests of several shards with the merge command")
+    parser.add_argument('--queue', default=os.environ.get('WORK_QUEUE', 'queue.db'),
+                        help="work queue for the enqueue and work commands: a SQLite file, "
+                             "sqlite:///path or redis://host:port/db "
+                             "(default: $WORK_QUEUE, else %(default)s)")
+    parser.add_argument('--upload-workers', type=int,
+                        default=int(os.environ.get('UPLOAD_WORKERS', UPLOAD_CONCURRENCY)),
+                        help="files uploaded to Drive at once, each over its own connection "
+                             "(default: $UPLOAD_WORKERS, else %(default)s)")
+    parser.add_argument('--upload-timeout', type=float,
+                        default=float(os.environ.get('UPLOAD_TIMEOUT', REQUEST_TIMEOUT)),
+                        help="seconds a single request to Drive may take before the upload "
+                             "fails and is left to resume later "
+                             "(default: $UPLOAD_TIMEOUT, else %(default)s)")
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('BATCH_WORKERS', 0)),
+                        help="jobs a batch run or the service processes at once; 0 means "
+                             "one per --process-workers process, but at least one for a "
+                             "batch run and two for the service "
+                             "(default: $BATCH_WORKERS, else %(default)s)")
+    parser.add_argument('--process-workers', type=int,
+                        default=int(os.environ.get('PROCESS_WORKERS', 0)),
+                        help="run yt-dlp in this many worker processes instead of in-process, "
+                             "so extraction uses several cores; 0 disables "
+                             "(default: $PROCESS_WORKERS, else %(default)s)")
+    parser.add_argument('--worker-max-jobs', type=int,
+                        default=int(os.environ.get('WORKER_MAX_JOBS', 100)),
+                        help="jobs after which a worker process is replaced "
+                             "(default: $WORKER_MAX_JOBS, else %(default)s)")
+    parser.add_argument('--worker-max-rss', type=parse_size,
+                        default=os.environ.get('WORKER_MAX_RSS', '1G'),
+                        help="resident memory past which a worker process is replaced, e.g. 512M "
+                             "(default: $WORKER_MAX_RSS, else %(default)s)")
+    parser.add_argument('--prefetch', type=int, default=int(os.environ.get('PREFETCH', 2)),
+                        help="upcoming jobs whose metadata is extracted while earlier ones "
+                             "download; 0 disables (default: $PREFETCH, else %(default)s)")
+    parser.add_argument('--order', choices=ORDERS, default=os.environ.get('JOB_ORDER', FIFO),
+                        help="order jobs start in: fifo keeps data.json order; longest first "
+                             "finishes the whole batch soonest; shortest first finishes most "
+                             "jobs soonest. Sizes come from a metadata pass "
+                             "(default: $JOB_ORDER, else %(default)s)")
+    parser.add_argument('--plan', action='store_true',
+                        help="print each job's expected size and the batch's expected finish "
+                             "time in --order, then exit without downloading. With --state "
+                             "the sizes are kept for the real run")
+    parser.add_argument('--throughput', type=parse_size,
+                        default=os.environ.get('PLAN_THROUGHPUT', DEFAULT_THROUGHPUT),
+                        help="download speed of one worker per second assumed by --plan, e.g. "
+                             "10M (default: $PLAN_THROUGHPUT, else 5M)")
+    parser.add_argument('--platform-weights', type=parse_platform_values,
+                        default=os.environ.get('PLATFORM_WEIGHTS'),
+                        help="share of workers each platform gets while several have jobs "
+                             "waiting, e.g. youtube=2,instagram=1; a bare number is the "
+                             "default for the rest (default: $PLATFORM_WEIGHTS, else 1 each)")
+    parser.add_argument('--platform-workers', type=parse_platform_values,
+                        default=os.environ.get('PLATFORM_WORKERS'),
+                        help="most jobs of one platform running at once, e.g. 2,instagram=1, "
+                             "so a throttled platform cannot hold every worker "
+                             "(default: $PLATFORM_WORKERS, else no cap)")
+    parser.add_argument('--adaptive-concurrency', type=int, metavar='MAX',
+                        default=int(os.environ.get('ADAPTIVE_CONCURRENCY', 0)),
+                        help="let the number of downloads running at once find its own level, "
+                             "up to MAX: it grows while throughput improves and halves on "
+                             "throttling or login walls; 0 keeps it fixed "
+                             "(default: $ADAPTIVE_CONCURRENCY, else %(default)s)")
+    parser.add_argument('--download-limit', type=parse_rate,
+                        default=os.environ.get('DOWNLOAD_LIMIT'),
+                        help="bytes per second all downloads together may use, e.g. 20M; "
+                             "shared by every worker thread and process "
+                             "(default: $DOWNLOAD_LIMIT, else unlimited)")
+    parser.add_argument('--upload-limit', type=parse_rate,
+                        default=os.environ.get('UPLOAD_LIMIT'),
+                        help="bytes per second all uploads together may use, e.g. 10M "
+                             "(default: $UPLOAD_LIMIT, else unlimited). The service can "
+                             "change both limits at runtime through POST /bandwidth")
+    parser.add_argument('--stall-speed', type=parse_rate, metavar='RATE',
+                        default=os.environ.get('STALL_SPEED'),
+                        help="restart a download that stays below RATE bytes per second, "
+                             "e.g. 16K, for a whole minute; it resumes from its partial file "
+                             "(default: $STALL_SPEED, else off)")
+    parser.add_argument('--circuit-breaker', type=int, metavar='N',
+                        default=int(os.environ.get('CIRCUIT_BREAKER', 0)),
+                        help="after N failed download attempts in a row on one platform, "
+                             "fail its remaining jobs fast instead of retrying them, and "
+                             "send one probe job after --circuit-cooldown; 0 disables "
+                             "(default: $CIRCUIT_BREAKER, else %(default)s)")
+    parser.add_argument('--circuit-cooldown', type=float,
+                        default=float(os.environ.get('CIRCUIT_COOLDOWN', 300)),
+                        help="seconds an open circuit waits before its probe "
+                             "(default: $CIRCUIT_COOLDOWN, else %(default)s)")
+    parser.add_argument('--retry-budget', type=float, metavar='RATIO',
+                        default=float(os.environ.get('RETRY_BUDGET', 0)),
+                        help="most retries as a share of all download attempts over the "
+                             "last 5 minutes, e.g. 0.2, so a failure storm does not multiply "
+                             "the load; 0 disables (default: $RETRY_BUDGET, else %(default)s)")
+    parser.add_argument('--deadline', type=parse_duration,
+                        default=os.environ.get('RUN_DEADLINE'),
+                        help="how long the run may take, e.g. 5h30m: jobs that would not finish "
+                             "in the time left are not started, and downloads still running "
+                             "then are stopped, leaving their progress in --state for the "
+                             "next run (default: $RUN_DEADLINE, else no limit)")
+    parser.add_argument('--job-timeout', type=parse_duration,
+                        default=os.environ.get('JOB_TIMEOUT'),
+                        help="how long one job's download may take, retries included, before "
+                             "it fails (default: $JOB_TIMEOUT, else no limit)")
+    commands = parser.add_subparsers(dest='command')
+
+    serve = commands.add_parser(
+        'serve', help="run as a long-lived service accepting jobs over a local HTTP API"
+    )
+    serve.add_argument('--host', default='127.0.0.1',
+                       help="interface to bind; the API is unauthenticated (default: %(default)s)")
+    serve.add_argument('--port', type=int, default=8765, help="default: %(default)s")
+    # The top-level --workers, also accepted after the command; suppressed so
+    # that, when absent here, it leaves the top-level value alone
+    serve.add_argument('--workers', type=int, default=argparse.SUPPRESS,
+                       help="same as --workers before the command")
+
+    commands.add_parser('enqueue', help="add the entries of data.json to the work queue")
+    work = commands.add_parser(
+        'work', help="process jobs from the work queue until it is drained"
+    )
+    work.add_argument('--lease', type=float, default=120,
+                      help="seconds a claimed job stays ours without a heartbeat; it is "
+                           "renewed every third of that while the job runs "
+                           "(default: %(default)s)")
+    work.add_argument('--worker-id', help="name recorded on claims (default: host:pid)")
+
+    merge = commands.add_parser(
+        'merge', help="combine shard manifests into one report and exit with the overall code"
+    )
+    merge.add_argument('manifests', nargs='+', metavar='MANIFEST')
+    return parser.parse_args(argv)
+
+
+def _downloader(args: argparse.Namespace, output_dir: str) -> VideoDownloader:
+    """Build the downloader described by the parsed arguments."""
+    return VideoDownloader(
+        output_dir=output_dir,
+        prevent_duplicates=False,  # Allow overwrites for now
+        process_workers=args.process_workers,
+        worker_max_jobs=args.worker_max_jobs,
+        worker_max_rss=args.worker_max_rss,
+        breaker=(CircuitBreaker(args.circuit_breaker, args.circuit_cooldown)
+                 if args.circuit_breaker > 0 else None),
+        retry_budget=RetryBudget(args.retry_budget) if args.retry_budget > 0 else None,
+        stall_speed=args.stall_speed or 0,
+    )
+
+
+def _storage(args: argparse.Namespace, default_dir: str) -> tuple:
+    """Return ``(output_dir, storage manager or None)`` for the parsed arguments."""
+    output_dir = args.staging_dir or default_dir
+    if args.staging_dir is None and args.disk_budget is None:
+        # Neither asked for: keep files where they land, as before
+        return output_dir, None
+    # Uploaded files are deleted from here, so no local sink may store into it
+    _upload_settings['staging_dir'] = output_dir
+    return output_dir, StorageManager(output_dir, budget_bytes=args.disk_budget)
+
+
+def _concurrency(args: argparse.Namespace, downloader: VideoDownloader,
+                 initial: int) -> Optional[AIMDController]:
+    """Return the adaptive concurrency limit asked for, fed by ``downloader``, if any."""
+    if args.adaptive_concurrency <= 0:
         return None
+    controller = AIMDController(initial=min(initial, args.adaptive_concurrency),
+                                max_limit=args.adaptive_concurrency)
+    downloader.add_listener(controller.observe)
+    return controller
+
+
+def serve(args: argparse.Namespace):
+    """Run the resident service until interrupted."""
+    from downloader.service import DownloadService, make_server
+
+    output_dir, storage = _storage(args, 'downloads')
+    downloader = _downloader(args, output_dir)
+    workers = args.workers or max(2, args.process_workers)
+    concurrency = _concurrency(args, downloader, workers)
+    service = DownloadService(downloader, uploader=sendVideo,
+                              workers=max(workers, args.adaptive_concurrency),
+                              storage=storage, concurrency=concurrency)
+    server = make_server(service, args.host, args.port)
+
+    host, port = server.server_address[:2]
+    logger.info(f"Serving job API on http://{host}:{port}")
+    print(f"Serving job API on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        server.server_close()
+        service.shutdown(wait=True)
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Main application entry point."""
     logger.info(f"paola-video-downloader v{__version__}")
 
-    # Load video data
+    args = _parse_args(argv or [])
+    # Counted from start-up, so it covers the whole run
+    deadline = Deadline.after(args.deadline)
+    _upload_settings.update(concurrency=args.upload_workers, timeout=args.upload_timeout)
+    shared_limiter().set_limits(download=args.download_limit, upload=args.upload_limit)
+    if args.command == 'serve':
+        serve(args)
+        return
+    if args.command == 'merge':
+        merge(args)
+        return
+    if args.command == 'enqueue':
+        enqueue(args)
+        return
+    if args.command == 'work':
+        work(args, deadline)
+        return
+
+    # --sync lists its sources instead of reading data.json
+    entries = [] if args.sync else _load_entries()
+
+    store = JobStore(args.state or ':memory:')
+    try:
+        requeued = store.requeue_failed()
+        if requeued:
+            logger.info(f"Retrying {requeued} job(s) that failed in an earlier run")
+
+        output_dir, storage = _storage(args, '.')
+        downloader = _downloader(args, output_dir)
+
+        sync = None
+        if args.sync:
+            sync = ChannelSync(downloader, store, ArchiveIndex(args.archive))
+            for source in args.sync:
+                try:
+                    sync.queue_new(source)
+                except DownloadError as e:
+                    logger.error(f"Could not list {source}: {e}")
+                    print(f"Error: Could not list {source}: {e}")
+                    sys.exit(_RETRYABLE_EXIT_CODES.get(type(e).__name__, EXIT_ERROR))
+
+        if args.shard:
+            total = len(entries)
+            entries = [(url, title) for url, title in entries
+                       if in_shard(canonical_id(url), args.shard)]
+            logger.info(f"Shard {args.shard[0]}/{args.shard[1]}: "
+                        f"{len(entries)} of {total} entries")
+
+        for url, title in entries:
+            job = store.add(url, title)
+            logger.info(f"Job {job['id']} ({job['state']}): {url} → {title}")
+
+        # Unless set, each worker process takes a job of its own
+        workers = args.workers or max(1, args.process_workers)
+        concurrency = _concurrency(args, downloader, workers)
+        # Looked up at call time so tests can patch app.sendVideo
+        runner = BatchRunner(downloader, store,
+                             uploader=lambda *a, **kw: sendVideo(*a, **kw),
+                             storage=storage,
+                             workers=workers,
+                             upload_workers=args.upload_workers,
+                             prefetch=args.prefetch,
+                             order=args.order,
+                             throughput=args.throughput,
+                             platform_weights=args.platform_weights,
+                             platform_workers=args.platform_workers,
+                             concurrency=concurrency,
+                             deadline=deadline,
+                             job_timeout=args.job_timeout,
+                             # Archived as each job finishes, so an interrupted sync keeps them
+                             on_finished=sync.finished if sync else None)
+        if args.plan:
+            print(format_plan(runner.plan(), started=time.time()))
+            return
+        jobs = runner.run()
+        if concurrency:
+            logger.info(f"Download concurrency ended at {concurrency.stats()}")
+        if downloader.breaker:
+            opened = {platform: circuit['opened']
+                      for platform, circuit in downloader.breaker.stats().items() if circuit['opened']}
+            if opened:
+                logger.warning(f"Circuits opened during the run (times per platform): {opened}")
+        if downloader.retry_budget:
+            logger.info(f"Retry budget: {downloader.retry_budget.stats()}")
+        if sync:
+            logger.info(f"Archive {args.archive} now holds {len(sync.archive)} video(s)")
+    finally:
+        store.close()
+
+    if args.manifest:
+        write_manifest(args.manifest, jobs, args.shard or (1, 1))
+    _report(jobs)
+    exit_code = _exit_code(jobs)
+    if exit_code != EXIT_OK:
+        sys.exit(exit_code)
+
+
+def enqueue(args: argparse.Namespace):
+    """Add the entries of data.json to the work queue."""
+    from downloader.workqueue import enqueue as enqueue_job, open_queue
+
+    entries = _load_entries()
+    queue = open_queue(args.queue)
+    try:
+        added = sum(enqueue_job(queue, url, title) for url, title in entries)
+        counts = queue.counts()
+    finally:
+        queue.close()
+    print(f"Queued {added} new job(s) of {len(entries)}; queue now holds {counts}")
+
+
+def work(args: argparse.Namespace, deadline: Optional[Deadline] = None):
+    """Drain the work queue alongside any other workers, then report."""
+    from downloader.workqueue import Worker, open_queue
+
+    output_dir, storage = _storage(args, '.')
+    downloader = _downloader(args, output_dir)
+    queue = open_queue(args.queue)
+    try:
+        # Looked up at call time so tests can patch app.sendVideo
+        worker = Worker(queue, downloader,
+                        uploader=lambda *a, **kw: sendVideo(*a, **kw),
+                        lease_seconds=args.lease, worker_id=args.worker_id,
+                        storage=storage, deadline=deadline)
+        jobs = worker.run()
+    finally:
+        queue.close()
+
+    _report(jobs)
+    exit_code = _exit_code(jobs)
+    if exit_code != EXIT_OK:
+        sys.exit(exit_code)
+
+
+def merge(args: argparse.Namespace):
+    """Report on the manifests of a sharded run as if it had been one run."""
+    try:
+        merged = merge_manifests(args.manifests)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not merge manifests: {e}")
+        print(f"Error: Could not merge manifests: {e}")
+        sys.exit(EXIT_ERROR)
+
+    jobs = merged['jobs']
+    _report(jobs)
+    print(f"{len(jobs)} job(s) from {merged['shards'] - len(merged['missing'])} "
+          f"of {merged['shards']} shard(s)")
+
+    exit_code = _exit_code(jobs)
+    if merged['missing']:
+        print(f"Error: no manifest for shard(s) {', '.join(map(str, merged['missing']))}")
+        exit_code = exit_code or EXIT_ERROR
+    if exit_code != EXIT_OK:
+        sys.exit(exit_code)
+
+
+def _load_entries() -> List[tuple]:
+    """Read data.json and return its ``(url, title)`` entries, or exit on bad input."""
     try:
         with open('data.json', 'r', encoding='utf-8') as f:
             content = f.read().strip()
@@ -99,8 +551,14 @@ def main():
         print(f"Error parsing JSON: {e}")
         sys.exit(EXIT_ERROR)
 
-    url = data.get('link')
-    title = data.get('title')
+    # data.json holds one {"title", "link"} object, or a list of them for a batch
+    return [_validate_entry(entry) for entry in (data if isinstance(data, list) else [data])]
+
+
+def _validate_entry(entry) -> tuple:
+    """Return ``(url, title)`` from one data.json entry, or exit on bad input."""
+    url = entry.get('link') if isinstance(entry, dict) else None
+    title = entry.get('title') if isinstance(entry, dict) else None
     
     if not url:
         logger.error("No 'link' field found in data.json")
@@ -122,63 +580,44 @@ def main():
     if not title:
         logger.warning("No 'title' field found in data.json, using default")
         title = 'video'
-    
-    logger.info(f"Starting download for: {url}")
-    logger.info(f"Title: {title}")
-    
-    # Initialize the video downloader
-    downloader = VideoDownloader(
-        output_dir='.',
-        prevent_duplicates=False  # Allow overwrites for now
-    )
-    
-    # Download the video
-    try:
-        result = downloader.download(url, title)
-        
-        if result['success']:
-            filepath = result['filepath']
-            logger.info(f"Download successful: {filepath}")
-            print(f"Successfully downloaded: {filepath}")
-            
-            # Upload to Google Drive
-            file_id = sendVideo(filepath)
-            
-            if file_id:
-                logger.info("Video successfully uploaded to Google Drive")
-            else:
-                # Failing loudly here matters: without it the job reports success
-                # while nothing ever reached Drive.
-                logger.error("Video downloaded but the Google Drive upload failed")
-                print("Error: download succeeded but the Google Drive upload failed")
-                sys.exit(EXIT_ERROR)
+
+    return url, title
+
+
+def _report(jobs: List[Dict]):
+    """Print one line per job."""
+    for job in jobs:
+        if job['state'] == FAILED:
+            logger.error(f"{job['url']} failed ({job['error_type']}): {job['error']}")
+            print(f"Error: {job['url']}: {job['error']}")
+        elif job['state'] != DONE:
+            logger.warning(f"{job['url']} left {job['state']} at the deadline")
+            print(f"Deferred: {job['url']} ({job['state']}): out of time, resumes on the next run")
         else:
-            error = result.get('error', 'Unknown error')
-            logger.error(f"Download failed: {error}")
-            print(f"Error: Download failed: {error}")
-            sys.exit(EXIT_STALE_EXTRACTOR)
-
-    except AuthenticationRequiredError as e:
-        logger.error(f"Authentication required: {e}")
-        print(f"Error: {e}")
-        sys.exit(EXIT_AUTH_REQUIRED)
-    except UnsupportedPlatformError as e:
-        logger.error(f"Unsupported platform: {e}")
-        print(f"Error: {e}")
-        sys.exit(EXIT_ERROR)
-    except DuplicateFileError as e:
-        logger.error(f"Duplicate file: {e}")
-        print(f"Error: {e}")
-        sys.exit(EXIT_ERROR)
-    except DownloadError as e:
-        logger.error(f"Download error: {e}")
-        print(f"Error: {e}")
-        sys.exit(EXIT_STALE_EXTRACTOR)
-    except Exception as e:
-        logger.error(f"Unexpected error: {e}", exc_info=True)
-        print(f"Unexpected error: {e}")
-        sys.exit(EXIT_ERROR)
+            print(f"Done: {job['url']} → {job['remote_id'] or job['filepath']}")
+
+
+def _exit_code(jobs: List[Dict]) -> int:
+    """
+    Summarize a run as one exit code.
+
+    A batch exits 2 or 3 whenever any failure is one the nightly retry could
+    fix — finished jobs are skipped on the rerun, so retrying costs little —
+    and 1 only when every failure is permanent. Jobs the deadline left
+    unfinished, and nothing worse, exit 4.
+    """
+    codes = {
+        _RETRYABLE_EXIT_CODES.get(job['error_type'], EXIT_ERROR)
+        for job in jobs if job['state'] == FAILED
+    }
+    if any(job['state'] not in (DONE, FAILED) for job in jobs):
+        codes.add(EXIT_DEADLINE)
+
+    for code in (EXIT_STALE_EXTRACTOR, EXIT_AUTH_REQUIRED, EXIT_ERROR, EXIT_DEADLINE):
+        if code in codes:
+            return code
+    return EXIT_OK
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(sys.argv[1:])
\ No newline at end of file
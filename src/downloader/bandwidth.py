@@ -0,0 +1,245 @@
+"""Process-wide bandwidth limits for downloads and uploads (token buckets)."""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Union
+
+from .storage import parse_size
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD = 'download'
+UPLOAD = 'upload'
+
+
+def parse_rate(rate: Union[None, int, float, str]) -> Optional[float]:
+    """
+    Parse a bandwidth limit.
+
+    Args:
+        rate: Bytes per second, or a size such as ``"2M"`` meaning per second.
+            None, 0 and ``""`` mean unlimited.
+
+    Returns:
+        Bytes per second, or None for unlimited
+
+    Raises:
+        ValueError: If the rate is negative or not a size
+    """
+    if rate is None or rate == '':
+        return None
+    value = float(parse_size(rate)) if isinstance(rate, str) else float(rate)
+    if value < 0:
+        raise ValueError(f"Bandwidth limit must not be negative: {rate!r}")
+    return value or None
+
+
+class TokenBucket:
+    """
+    Cap the rate at which bytes are spent, across every thread sharing the bucket.
+
+    ``consume(n)`` accounts for ``n`` bytes just transferred or about to be.
+    While the bucket holds tokens the caller goes straight through, even into
+    debt; later callers wait until the debt is paid back at ``rate`` bytes
+    per second. A chunk bigger than the bucket therefore still passes, and
+    the long-run rate holds whatever the chunk sizes are. Up to ``burst``
+    unused bytes are saved for later.
+
+    ``set_rate()`` changes the rate while transfers run; waiting callers pick
+    the new rate up at once.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the bucket.
+
+        Args:
+            rate: Bytes per second, or None for unlimited
+            burst: Most bytes saved up while idle (default: one second's worth)
+            clock: Monotonic time source
+        """
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._stamp = clock()
+        self._tokens = 0.0
+        self.rate: Optional[float] = None
+        self.burst: Optional[float] = None
+        self.consumed = 0
+        self.waited = 0.0
+        self._local = threading.local()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate: Optional[float], burst: Optional[float] = None):
+        """
+        Change the rate.
+
+        Args:
+            rate: Bytes per second, or None (or 0) for unlimited
+            burst: See ``__init__``
+
+        Raises:
+            ValueError: If the rate is negative
+        """
+        rate = parse_rate(rate)
+        with self._cond:
+            self._refill()
+            if rate is None:
+                self._tokens = 0.0
+            elif self.rate is None:
+                self._tokens = burst if burst is not None else rate
+            self.rate = rate
+            self.burst = (burst if burst is not None else rate) if rate else None
+            if self.burst is not None:
+                self._tokens = min(self._tokens, self.burst)
+            self._cond.notify_all()
+
+    def consume(self, nbytes: int):
+        """Account for ``nbytes``, first waiting while the bucket is in debt."""
+        if nbytes <= 0:
+            return
+        with self._cond:
+            started = self._clock()
+            while self.rate:
+                self._refill()
+                if self._tokens >= 0:
+                    break
+                self._cond.wait(-self._tokens / self.rate)
+            if self.rate:
+                self._tokens -= nbytes
+            self.consumed += nbytes
+            waited = self._clock() - started
+            self.waited += waited
+        self._local.waited = self.thread_waited() + waited
+
+    def thread_waited(self) -> float:
+        """Seconds the calling thread has spent waiting on this bucket."""
+        return getattr(self._local, 'waited', 0.0)
+
+    def stats(self) -> Dict:
+        """Return the rate, bytes accounted for and seconds spent waiting."""
+        with self._cond:
+            return {'rate': self.rate, 'consumed': self.consumed, 'waited': self.waited}
+
+    def _refill(self):
+        """Credit the tokens earned since the last call. Caller holds the lock."""
+        now = self._clock()
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+
+class BandwidthLimiter:
+    """
+    Separate download and upload budgets, shared by every transfer in the process.
+
+    yt-dlp's own ``ratelimit`` holds per ``YoutubeDL`` instance, so N
+    concurrent downloads may use N times the link. Here every provider
+    transfer spends from ``download`` (through ``progress_hook()``), and
+    every upload chunk or part from ``upload``, so the totals stay within
+    the limits however many workers run. Worker processes forward their
+    download budget to the parent (see ``providers.worker``).
+    """
+
+    def __init__(self, download: Optional[float] = None, upload: Optional[float] = None):
+        """
+        Initialize the limiter.
+
+        Args:
+            download: Download bytes per second, or None for unlimited
+            upload: Upload bytes per second, or None for unlimited
+        """
+        self.download = TokenBucket(download)
+        self.upload = TokenBucket(upload)
+
+    @classmethod
+    def from_env(cls) -> 'BandwidthLimiter':
+        """
+        Build a limiter from ``DOWNLOAD_LIMIT`` and ``UPLOAD_LIMIT`` (e.g. ``"5M"``).
+
+        Raises:
+            ValueError: If either is not a size
+        """
+        return cls(parse_rate(os.environ.get('DOWNLOAD_LIMIT')),
+                   parse_rate(os.environ.get('UPLOAD_LIMIT')))
+
+    def set_limits(self, **limits: Union[None, int, float, str]):
+        """
+        Change one or both limits while transfers run.
+
+        Args:
+            **limits: ``download`` and/or ``upload``, each as accepted by
+                ``parse_rate()``
+
+        Raises:
+            ValueError: On an unknown direction or a rate that is not a size
+        """
+        rates = {}
+        for direction, rate in limits.items():
+            if direction not in (DOWNLOAD, UPLOAD):
+                raise ValueError(f"Unknown bandwidth direction {direction!r}")
+            rates[direction] = parse_rate(rate)
+        for direction, rate in rates.items():
+            bucket = getattr(self, direction)
+            if rate != bucket.rate:
+                logger.info(f"{direction.capitalize()} limit "
+                            f"{_format_rate(bucket.rate)} -> {_format_rate(rate)}")
+            bucket.set_rate(rate)
+
+    def stats(self) -> Dict:
+        """Return each direction's rate, bytes and waiting time, for metrics."""
+        return {DOWNLOAD: self.download.stats(), UPLOAD: self.upload.stats()}
+
+
+def progress_hook(bucket: TokenBucket) -> Callable[[Dict], None]:
+    """
+    Make a yt-dlp progress hook that spends what a download receives from ``bucket``.
+
+    yt-dlp calls its hooks from the download loop after every block, so a
+    hook that waits slows the transfer itself. The hook may be shared by the
+    YoutubeDL instances of one attempt; files are told apart by name.
+    """
+    seen: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def hook(progress: Dict):
+        name = progress.get('tmpfilename') or progress.get('filename')
+        done = progress.get('downloaded_bytes') or 0
+        with lock:
+            received = done - seen.get(name, 0)
+            if received < 0:
+                # The file was started over
+                received = done
+            if progress.get('status') == 'downloading':
+                seen[name] = done
+            else:
+                seen.pop(name, None)
+        bucket.consume(received)
+
+    return hook
+
+
+_shared: Optional[BandwidthLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter() -> BandwidthLimiter:
+    """Return the process-wide limiter, built from the environment on first use."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = BandwidthLimiter.from_env()
+        return _shared
+
+
+def set_shared_limiter(limiter: BandwidthLimiter):
+    """Replace the process-wide limiter; transfers set up afterwards use it."""
+    global _shared
+    with _shared_lock:
+        _shared = limiter
+
+
+def _format_rate(rate: Optional[float]) -> str:
+    return f"{rate / 2**20:.2f} MiB/s" if rate else 'unlimited'
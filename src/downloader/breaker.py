@@ -0,0 +1,203 @@
+"""Per-platform circuit breakers and a global retry budget."""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class _Circuit:
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+        self.opened = 0
+
+
+class CircuitBreaker:
+    """
+    Stop sending work to a platform that keeps failing, and probe it until it recovers.
+
+    Each platform (or any other key) has its own circuit. Download attempts
+    are reported to ``record()``. After ``threshold`` failures in a row
+    (throttles, login walls, extraction errors; a dropped connection or a
+    full disk is not the platform's fault and does not count) the circuit
+    opens, and
+    ``allow()`` refuses new jobs for it. After ``cooldown`` seconds the
+    circuit goes half-open: one job is let through as a probe. If the probe
+    succeeds the circuit closes; if it fails, it opens for another cooldown.
+
+    Jobs already running check ``closed()`` before retrying, so they stop
+    piling retries onto a platform once its circuit opens.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the breaker.
+
+        Args:
+            threshold: Consecutive failed attempts that open a circuit
+            cooldown: Seconds a circuit stays open before a probe is let
+                through (and how long a probe may take to report back)
+            clock: Monotonic time source
+
+        Raises:
+            ValueError: If ``threshold`` is below 1
+        """
+        if threshold < 1:
+            raise ValueError("threshold must be at least 1")
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._circuits: Dict[str, _Circuit] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> bool:
+        """Return whether a new job for ``key`` may start; may take the half-open probe."""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit.state == CLOSED:
+                return True
+            now = self._clock()
+            if circuit.state == OPEN:
+                if now - circuit.opened_at < self.cooldown:
+                    return False
+                circuit.state = HALF_OPEN
+                logger.info(f"Circuit for {key} half-open: sending a probe")
+            elif now - circuit.probe_started < self.cooldown:
+                return False
+            # First probe, or one that never reported back
+            circuit.probe_started = now
+            return True
+
+    def closed(self, key: str) -> bool:
+        """Return whether ``key``'s circuit is closed (retries are welcome)."""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            return circuit is None or circuit.state == CLOSED
+
+    def retry_after(self, key: str) -> float:
+        """Seconds until ``key``'s open circuit lets a probe through (0 if it would now)."""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit.state == CLOSED:
+                return 0.0
+            since = circuit.opened_at if circuit.state == OPEN else circuit.probe_started
+            return max(0.0, since + self.cooldown - self._clock())
+
+    def record(self, key: str, ok: Optional[bool]):
+        """
+        Account for one attempt on ``key``.
+
+        Args:
+            key: The platform
+            ok: Whether the attempt succeeded; None for a failure that was
+                not the platform's doing, which neither counts towards
+                opening the circuit nor resets it. A half-open circuit's
+                probe that ends so is replaced by the next job.
+        """
+        with self._lock:
+            circuit = self._circuits.setdefault(key, _Circuit())
+            if ok is None:
+                if circuit.state == HALF_OPEN:
+                    circuit.probe_started = self._clock() - self.cooldown
+                return
+            if ok:
+                if circuit.state != CLOSED:
+                    logger.info(f"Circuit for {key} closed: platform recovered")
+                circuit.state = CLOSED
+                circuit.failures = 0
+                return
+            circuit.failures += 1
+            if circuit.state == HALF_OPEN or (circuit.state == CLOSED
+                                              and circuit.failures >= self.threshold):
+                logger.warning(f"Circuit for {key} open after {circuit.failures} failed "
+                               f"attempt(s) in a row; new jobs fail fast for "
+                               f"{self.cooldown:.0f}s")
+                circuit.state = OPEN
+                circuit.opened_at = self._clock()
+                circuit.opened += 1
+
+    def state(self, key: str) -> str:
+        """Return ``key``'s circuit state: ``closed``, ``open`` or ``half-open``."""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            return circuit.state if circuit else CLOSED
+
+    def stats(self) -> Dict[str, Dict]:
+        """Return each known circuit's state, current failure run and times opened."""
+        with self._lock:
+            return {key: {'state': circuit.state, 'failures': circuit.failures,
+                          'opened': circuit.opened}
+                    for key, circuit in self._circuits.items()}
+
+
+class RetryBudget:
+    """
+    Cap retries at a share of all download attempts.
+
+    Attempts are reported to ``record_attempt()``; a provider about to retry
+    asks ``try_retry()``. Over the last ``window`` seconds, retries may make
+    up ``ratio`` of the attempts, plus ``min_retries`` that are always
+    allowed so a quiet run can still retry. When most jobs fail, retries
+    stop at that share instead of multiplying the load by ``max_retries``.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 3, window: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the budget.
+
+        Args:
+            ratio: Share of attempts that may be retries
+            min_retries: Retries allowed in any window regardless of ``ratio``
+            window: Seconds over which attempts and retries are counted
+            clock: Monotonic time source
+
+        Raises:
+            ValueError: If ``ratio`` is negative
+        """
+        if ratio < 0:
+            raise ValueError("ratio must not be negative")
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._clock = clock
+        self._attempts: deque = deque()
+        self._retries: deque = deque()
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def record_attempt(self):
+        """Account for one download attempt, first or retry."""
+        with self._lock:
+            self._attempts.append(self._clock())
+
+    def try_retry(self) -> bool:
+        """Spend one retry if the budget has room; return whether it did."""
+        with self._lock:
+            now = self._clock()
+            for times in (self._attempts, self._retries):
+                while times and now - times[0] > self.window:
+                    times.popleft()
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._attempts):
+                self.denied += 1
+                return False
+            self._retries.append(now)
+            return True
+
+    def stats(self) -> Dict:
+        """Return attempts and retries in the current window, and retries denied."""
+        with self._lock:
+            return {'ratio': self.ratio, 'attempts': len(self._attempts),
+                    'retries': len(self._retries), 'denied': self.denied}
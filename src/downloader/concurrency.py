@@ -0,0 +1,186 @@
+"""Adaptive limit on concurrent downloads (additive increase, multiplicative decrease)."""
+
+import logging
+import math
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AIMDController:
+    """
+    Find how many downloads to run at once from how they turn out.
+
+    Providers report every download attempt to ``observe()`` (see
+    ``VideoDownloader.add_listener()``): the bytes it moved, how long it took,
+    and whether the platform throttled it or demanded a login. The
+    controller tallies those per ``interval`` and then adjusts ``limit``:
+
+    - A throttle or auth wall cuts the limit by ``decrease`` straight away
+      (at most once per interval, so a burst of failures from the same
+      overload counts once).
+    - Otherwise, if the limit was actually reached during the interval and
+      aggregate throughput rose by more than ``tolerance``, the limit grows
+      by ``increase``. If throughput fell instead, the last increase is
+      undone; if it held, the limit stays.
+
+    Downloads take a slot with ``acquire()`` (or ``with controller:``) and
+    give it back with ``release()``; callers wait while ``limit`` slots are
+    taken.
+    """
+
+    def __init__(self,
+                 initial: int = 2,
+                 min_limit: int = 1,
+                 max_limit: int = 16,
+                 increase: int = 1,
+                 decrease: float = 0.5,
+                 interval: float = 30.0,
+                 tolerance: float = 0.05,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the controller.
+
+        Args:
+            initial: Limit to start from
+            min_limit: Lowest the limit goes
+            max_limit: Highest the limit goes
+            increase: Slots added after an interval of improving throughput
+            decrease: Factor the limit is multiplied by on a throttle
+            interval: Seconds over which throughput is measured
+            tolerance: Relative throughput change treated as noise
+            clock: Monotonic time source
+
+        Raises:
+            ValueError: If the bounds are inconsistent
+        """
+        if not 1 <= min_limit <= max_limit or not 0 < decrease < 1:
+            raise ValueError("Need 1 <= min_limit <= max_limit and 0 < decrease < 1")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.interval = interval
+        self.tolerance = tolerance
+        self._clock = clock
+        self._limit = max(min_limit, min(initial, max_limit))
+        self._active = 0
+        self._cond = threading.Condition()
+
+        self._window_start = clock()
+        self._window_bytes = 0
+        self._window_throttles = 0
+        self._saturated = False
+        self._last_throughput: Optional[float] = None
+        self._last_change = 0
+        self._last_cut = -math.inf
+        self.throughput: Optional[float] = None
+        self.throttles = 0
+
+    @property
+    def limit(self) -> int:
+        """Downloads currently allowed at once."""
+        return self._limit
+
+    @property
+    def active(self) -> int:
+        """Downloads currently running."""
+        return self._active
+
+    def acquire(self):
+        """Wait for a free slot and take it."""
+        with self._cond:
+            while self._active >= self._limit:
+                self._saturated = True
+                self._cond.wait(timeout=self.interval)
+                self._tick()
+            self._active += 1
+            if self._active >= self._limit:
+                self._saturated = True
+
+    def release(self):
+        """Give a slot back."""
+        with self._cond:
+            self._active -= 1
+            self._tick()
+            self._cond.notify_all()
+
+    def __enter__(self) -> 'AIMDController':
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def observe(self, attempt: Dict):
+        """
+        Account for one download attempt.
+
+        Args:
+            attempt: ``bytes`` moved, and ``throttled`` / ``auth`` flags, as
+                reported by the providers
+        """
+        with self._cond:
+            self._window_bytes += attempt.get('bytes') or 0
+            if attempt.get('throttled') or attempt.get('auth'):
+                self.throttles += 1
+                self._window_throttles += 1
+                now = self._clock()
+                if now - self._last_cut >= self.interval:
+                    self._last_cut = now
+                    self._set_limit(math.floor(self._limit * self.decrease),
+                                    'throttled' if attempt.get('throttled') else 'auth wall')
+                    self._last_change = 0
+            self._tick()
+
+    def stats(self) -> Dict:
+        """Return the current limit and what it is based on, for metrics."""
+        with self._cond:
+            return {
+                'limit': self._limit,
+                'active': self._active,
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'throughput': self.throughput,
+                'throttles': self.throttles,
+            }
+
+    def _tick(self):
+        """Close the measuring window once it is due and adjust. Caller holds the lock."""
+        now = self._clock()
+        elapsed = now - self._window_start
+        if elapsed < self.interval:
+            return
+        throughput = self._window_bytes / elapsed
+        self.throughput = throughput
+        last = self._last_throughput
+
+        if self._window_throttles:
+            pass  # already cut in observe()
+        elif last is not None and throughput < last * (1 - self.tolerance) and self._last_change > 0:
+            self._set_limit(self._limit - self._last_change,
+                            f"throughput fell to {throughput / 2**20:.1f} MiB/s")
+            self._last_change = 0
+        elif self._saturated and (last is None or throughput > last * (1 + self.tolerance)):
+            before = self._limit
+            self._set_limit(self._limit + self.increase,
+                            f"throughput {throughput / 2**20:.1f} MiB/s")
+            self._last_change = self._limit - before
+        else:
+            self._last_change = 0
+
+        self._last_throughput = throughput
+        self._window_start = now
+        self._window_bytes = 0
+        self._window_throttles = 0
+        self._saturated = self._active >= self._limit
+
+    def _set_limit(self, limit: int, reason: str):
+        """Move the limit within bounds. Caller holds the lock."""
+        limit = max(self.min_limit, min(self.max_limit, limit))
+        if limit != self._limit:
+            logger.info(f"Download concurrency {self._limit} -> {limit} ({reason})")
+            self._limit = limit
+            self._cond.notify_all()
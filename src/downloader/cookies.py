@@ -0,0 +1,141 @@
+"""Pool of logged-in cookie sessions, rotated to spread per-account rate limits."""
+
+import logging
+import os
+import threading
+import time
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from yt_dlp.cookies import YoutubeDLCookieJar
+except ImportError:
+    YoutubeDLCookieJar = None
+
+
+class CookieSession:
+    """One account's cookies, loaded once and shared by every download using it."""
+
+    def __init__(self, path: str, jar):
+        self.path = path
+        self.jar = jar
+        self.cooldown_until = 0.0
+        self.last_throttled = 0.0
+        self.last_used = 0.0
+        self.throttles = 0
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+
+class CookiePool:
+    """
+    Hand out cookie sessions so no single account carries all the traffic.
+
+    Each Netscape cookie file is parsed once into a cookie jar that every
+    YoutubeDL instance using that session shares (cookie jars are
+    thread-safe), instead of being re-read for each download.
+
+    ``acquire()`` prefers the session throttled least recently, and among
+    equally healthy sessions the one used least recently, so load rotates
+    round-robin until a platform pushes back. A throttled session sits out
+    ``cooldown`` seconds; when every session is cooling down, the one whose
+    cooldown ends first is used rather than none.
+    """
+
+    def __init__(self, sessions: List[CookieSession], cooldown: float = 900):
+        """
+        Initialize the pool.
+
+        Args:
+            sessions: The sessions to rotate between
+            cooldown: Seconds a throttled session is kept out of rotation
+        """
+        self.sessions = sessions
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_files(cls, paths: List[str], cooldown: float = 900) -> 'CookiePool':
+        """
+        Load a pool from Netscape-format cookie files.
+
+        Files that are missing or cannot be parsed are skipped with a warning.
+
+        Args:
+            paths: Cookie files, one per account
+            cooldown: See ``__init__``
+        """
+        if YoutubeDLCookieJar is None:
+            raise ImportError("yt-dlp is required for CookiePool. Install with: pip install yt-dlp")
+
+        sessions = []
+        for path in paths:
+            if not os.path.exists(path):
+                logger.warning(f"Cookies file not found, skipping: {path}")
+                continue
+            jar = YoutubeDLCookieJar(path)
+            try:
+                jar.load()
+            except Exception as e:
+                logger.warning(f"Could not load cookies from {path}: {e}")
+                continue
+            sessions.append(CookieSession(path, jar))
+
+        logger.info(f"Cookie pool holds {len(sessions)} session(s)")
+        return cls(sessions, cooldown=cooldown)
+
+    @classmethod
+    def from_env(cls, cooldown: float = 900) -> Optional['CookiePool']:
+        """
+        Load the pool named by ``COOKIES_FILE``.
+
+        The variable holds one cookie file or several separated by
+        ``os.pathsep`` (``:`` on Linux).
+
+        Returns:
+            The pool, or None if no usable cookie file is configured
+        """
+        value = os.environ.get('COOKIES_FILE')
+        if not value:
+            return None
+        pool = cls.from_files([p for p in value.split(os.pathsep) if p], cooldown=cooldown)
+        return pool if pool.sessions else None
+
+    def acquire(self) -> Optional[CookieSession]:
+        """
+        Pick the session for the next download.
+
+        Returns:
+            A session, or None if the pool is empty
+        """
+        with self._lock:
+            if not self.sessions:
+                return None
+            now = time.monotonic()
+            ready = [s for s in self.sessions if s.cooldown_until <= now]
+            if ready:
+                session = min(ready, key=lambda s: (s.last_throttled, s.last_used))
+            else:
+                session = min(self.sessions, key=lambda s: s.cooldown_until)
+                logger.warning(f"Every cookie session is cooling down; using {session.name}")
+            session.last_used = now
+            return session
+
+    def throttled(self, session: CookieSession):
+        """Take a session out of rotation after the platform throttled it."""
+        with self._lock:
+            now = time.monotonic()
+            session.cooldown_until = now + self.cooldown
+            session.last_throttled = now
+            session.throttles += 1
+        logger.warning(f"Cookie session {session.name} throttled "
+                       f"({session.throttles} time(s)); cooling down for {self.cooldown}s")
+
+    def available(self) -> int:
+        """Return the number of sessions not cooling down."""
+        with self._lock:
+            now = time.monotonic()
+            return sum(1 for s in self.sessions if s.cooldown_until <= now)
@@ -2,16 +2,26 @@
 
 import logging
 import os
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict
 
-from .providers import BaseProvider, YtDlpProvider
+from .breaker import CircuitBreaker, RetryBudget
+from .providers import BaseProvider, FallbackProvider, SubprocessProvider, YtDlpProvider
 from .exceptions import (
+    CircuitOpenError,
+    DeadlineExceededError,
     UnsupportedPlatformError,
     DownloadError,
     DuplicateFileError,
     AuthenticationRequiredError,
 )
-from .utils import check_duplicate, sanitize_filename
+from .utils import (
+    SingleFlight,
+    canonical_id,
+    canonicalize_url,
+    check_duplicate,
+    platform_of,
+    sanitize_filename,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -22,36 +32,97 @@ class VideoDownloader:
     
     This class provides a unified interface for downloading videos from
     various platforms by automatically selecting the appropriate provider.
+
+    It is safe to share between threads: concurrent requests for the same
+    media (by canonical id, so ``youtu.be/ID`` and ``watch?v=ID&si=...`` count
+    as one) run a single extraction and download and all receive its result.
     """
     
     def __init__(self, 
                  output_dir: str = '.',
                  prevent_duplicates: bool = True,
-                 providers: Optional[List[BaseProvider]] = None):
+                 providers: Optional[List[BaseProvider]] = None,
+                 process_workers: int = 0,
+                 worker_max_jobs: Optional[int] = None,
+                 worker_max_rss: Optional[int] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 retry_budget: Optional[RetryBudget] = None,
+                 stall_speed: Optional[float] = None):
         """
         Initialize the video downloader.
         
         Args:
             output_dir: Directory where videos will be saved
             prevent_duplicates: If True, check for existing files before downloading
-            providers: List of provider instances to use. If None, use defaults.
+            providers: List of provider instances to use. If None, use defaults:
+                yt-dlp, backed by a second yt-dlp installed under
+                ``YTDLP_FALLBACK_PATH`` when that is set
+            process_workers: If above 0, the default providers run yt-dlp in
+                this many worker processes instead of in this one (see
+                ``SubprocessProvider``), so extraction scales across cores
+            worker_max_jobs: Jobs after which a worker process is replaced
+            worker_max_rss: Resident bytes past which a worker process is replaced
+            breaker: Optional per-platform circuit breaker. Downloads for a
+                platform whose circuit is open raise ``CircuitOpenError``
+                without trying, and stop retrying once it opens.
+            retry_budget: Optional cap on the share of download attempts
+                that may be retries, across every job
+            stall_speed: Bytes per second below which the default providers
+                restart a transfer as stalled (default: ``STALL_SPEED``, else
+                no stall detection)
         """
         self.output_dir = output_dir
         self.prevent_duplicates = prevent_duplicates
         
         # Initialize providers
         if providers is None:
-            self.providers = [
-                YtDlpProvider(max_retries=3, retry_delay=2)
-            ]
+            self.providers = [self._default_provider(process_workers, worker_max_jobs,
+                                                     worker_max_rss, stall_speed)]
         else:
             self.providers = providers
         
+        # In-flight downloads/extractions keyed by canonical id
+        self._inflight = SingleFlight()
+
+        self.breaker = breaker
+        self.retry_budget = retry_budget
+        if breaker or retry_budget:
+            self.add_listener(self._on_attempt)
+            for provider in self.providers:
+                set_retry_gate = getattr(provider, 'set_retry_gate', None)
+                if set_retry_gate:
+                    set_retry_gate(self._may_retry)
+
         # Ensure output directory exists
         os.makedirs(output_dir, exist_ok=True)
         
         logger.info(f"VideoDownloader initialized with {len(self.providers)} provider(s)")
     
+    @staticmethod
+    def _default_provider(process_workers: int = 0, max_jobs: Optional[int] = None,
+                          max_rss: Optional[int] = None,
+                          stall_speed: Optional[float] = None) -> BaseProvider:
+        options = {'max_retries': 3, 'retry_delay': 2}
+        if stall_speed is not None:
+            options['stall_speed'] = stall_speed
+        pool = {'workers': max(process_workers, 1), 'max_jobs': max_jobs, 'max_rss': max_rss}
+        if process_workers > 0:
+            provider = SubprocessProvider(options=options, name='yt-dlp', **pool)
+        else:
+            provider = YtDlpProvider(**options)
+        fallback_path = os.environ.get('YTDLP_FALLBACK_PATH')
+        if not fallback_path:
+            return provider
+        # Another yt-dlp (e.g. nightly) installed side by side with
+        # `pip install --target`, run in worker processes when this one fails
+        fallback = SubprocessProvider(
+            path=[p for p in fallback_path.split(os.pathsep) if p],
+            options=options,
+            name='yt-dlp (fallback)',
+            **pool,
+        )
+        return FallbackProvider([provider, fallback])
+
     def _select_provider(self, url: str) -> BaseProvider:
         """
         Select the appropriate provider for the given URL.
@@ -75,24 +146,34 @@ class VideoDownloader:
             f"Available providers: {[p.name for p in self.providers]}"
         )
     
-    def download(self, url: str, title: Optional[str] = None) -> Dict:
+    def download(self, url: str, title: Optional[str] = None, **options) -> Dict:
         """
         Download a video from the given URL.
         
         Args:
             url: The video URL
             title: Optional custom title for the file
+            **options: Passed through to the provider's ``download()``
             
         Returns:
             Dictionary with download results:
                 - success: Boolean indicating success
                 - filepath: Path to downloaded file (if successful)
+                - filepaths: Every downloaded file, for posts with several
+                  parts (if successful; ``filepath`` is the first)
                 - error: Error message (if failed)
                 - provider: Name of provider used
+                - canonical_id: Identity the request was coalesced on
+
+            A call made while another call for the same media is running
+            shares that call's result, including its filename: the first
+            caller's title wins.
                 
         Raises:
             UnsupportedPlatformError: If URL is not supported
             DuplicateFileError: If file exists and prevent_duplicates is True
+            CircuitOpenError: If the platform's circuit breaker is open
+            DeadlineExceededError: If the ``deadline`` option passed first
             DownloadError: If download fails
         """
         logger.info(f"Starting download for URL: {url}")
@@ -102,6 +183,13 @@ class VideoDownloader:
         # {'success': False} result would be reported as.
         provider = self._select_provider(url)
 
+        platform = platform_of(url)
+        if self.breaker and not self.breaker.allow(platform):
+            raise CircuitOpenError(
+                f"Not downloading {url}: {platform} failed repeatedly; next probe in "
+                f"{self.breaker.retry_after(platform):.0f}s"
+            )
+
         # Check for duplicates if enabled
         if self.prevent_duplicates and title:
             safe_title = sanitize_filename(title)
@@ -113,24 +201,38 @@ class VideoDownloader:
                     error_msg = f"File already exists: {existing}"
                     logger.warning(error_msg)
                     raise DuplicateFileError(error_msg)
-        
-        # Download the video
+
+        key = canonical_id(url)
+        result = self._inflight.do(
+            ('download', key),
+            lambda: self._download(provider, canonicalize_url(url), title, options),
+        )
+        # Each caller gets its own copy; joined callers share the leader's outcome
+        return dict(result, canonical_id=key)
+
+    def _download(self, provider: BaseProvider, url: str, title: Optional[str],
+                  options: Dict) -> Dict:
+        """Run one provider download and turn its outcome into a result dict."""
         try:
-            filepath = provider.download(url, self.output_dir, title)
+            filepaths = provider.download_all(url, self.output_dir, title, **options)
             
             result = {
                 'success': True,
-                'filepath': filepath,
+                'filepath': filepaths[0],
+                'filepaths': filepaths,
                 'provider': provider.name
             }
             
-            logger.info(f"Download successful: {filepath}")
+            logger.info(f"Download successful: {', '.join(filepaths)}")
             return result
 
         except AuthenticationRequiredError:
             # Propagate: this needs fresh cookies, and callers must be able to tell
             # it apart from a recoverable download failure.
             raise
+        except DeadlineExceededError:
+            # Propagate: the job did not fail, it ran out of time and can resume
+            raise
         except Exception as e:
             error_msg = f"Download failed: {e}"
             logger.error(error_msg)
@@ -155,8 +257,91 @@ class VideoDownloader:
             UnsupportedPlatformError: If URL is not supported
         """
         provider = self._select_provider(url)
-        return provider.extract_info(url)
+        return self._inflight.do(
+            ('info', canonical_id(url)),
+            lambda: provider.extract_info(canonicalize_url(url)),
+        )
     
+    def prefetch(self, url: str):
+        """
+        Extract a URL's metadata ahead of its download, where the provider can.
+
+        Pass the result to ``download(url, prefetched=...)``; a download that
+        does not use it should ``discard()`` it.
+
+        Args:
+            url: The video URL
+
+        Returns:
+            The provider's prefetch, or None if it cannot prefetch
+
+        Raises:
+            UnsupportedPlatformError: If URL is not supported
+            ExtractionError: If extraction fails
+        """
+        provider = self._select_provider(url)
+        prefetch = getattr(provider, 'prefetch', None)
+        if prefetch is None:
+            return None
+        return prefetch(canonicalize_url(url))
+
+    def list_entries(self, url: str) -> List[Dict]:
+        """
+        List the videos behind a channel, playlist or profile URL.
+
+        Args:
+            url: The channel, playlist or profile URL
+
+        Returns:
+            One dict per entry (``id``, ``url``, ``title``, ``extractor``)
+
+        Raises:
+            UnsupportedPlatformError: If no provider supports the URL, or the
+                one that does cannot list entries
+            ExtractionError: If the listing fails
+        """
+        provider = self._select_provider(url)
+        list_entries = getattr(provider, 'list_entries', None)
+        if list_entries is None:
+            raise UnsupportedPlatformError(
+                f"Provider {provider.name} cannot list the entries of {url}"
+            )
+        return list_entries(url)
+
+    def add_listener(self, listener: Callable[[Dict], None]):
+        """
+        Have ``listener`` called after every download attempt of every provider
+        that reports them (see ``YtDlpProvider.add_listener()``).
+
+        Args:
+            listener: Called with the attempt's ``ok``, ``throttled``,
+                ``auth``, ``extraction``, ``bytes`` and ``seconds``
+        """
+        for provider in self.providers:
+            add_listener = getattr(provider, 'add_listener', None)
+            if add_listener:
+                add_listener(listener)
+
+    def _on_attempt(self, attempt: Dict):
+        """Feed a provider's attempt to the circuit breaker and retry budget."""
+        if self.breaker and attempt.get('url'):
+            if attempt.get('ok', False):
+                outcome = True
+            elif attempt.get('throttled') or attempt.get('auth') or attempt.get('extraction'):
+                outcome = False
+            else:
+                # A dropped connection, ffmpeg or a full disk says nothing about the platform
+                outcome = None
+            self.breaker.record(platform_of(attempt['url']), outcome)
+        if self.retry_budget:
+            self.retry_budget.record_attempt()
+
+    def _may_retry(self, url: str) -> bool:
+        """Retry gate handed to the providers."""
+        if self.breaker and not self.breaker.closed(platform_of(url)):
+            return False
+        return self.retry_budget is None or self.retry_budget.try_retry()
+
     def add_provider(self, provider: BaseProvider):
         """
         Add a new provider to the downloader.
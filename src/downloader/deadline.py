@@ -0,0 +1,108 @@
+"""Run and job deadlines, so work stops cleanly before a hard time limit."""
+
+import math
+import re
+import time
+from typing import Callable, Dict, Optional, Union
+
+from .exceptions import DeadlineExceededError
+
+
+def parse_duration(text: Union[None, int, float, str]) -> Optional[float]:
+    """
+    Parse a length of time.
+
+    Args:
+        text: Seconds, or e.g. ``"90m"``, ``"5h30m"``, ``"1.5h"``. None, 0
+            and ``""`` mean no limit.
+
+    Returns:
+        Seconds, or None for no limit
+
+    Raises:
+        ValueError: If the text is not a duration
+    """
+    if text is None or text == '':
+        return None
+    if not isinstance(text, str):
+        seconds = float(text)
+    else:
+        match = re.fullmatch(r'\s*(?:(\d+(?:\.\d+)?)h)?\s*(?:(\d+(?:\.\d+)?)m)?\s*'
+                             r'(?:(\d+(?:\.\d+)?)s?)?\s*', text.lower())
+        if not match or not any(match.groups()):
+            raise ValueError(f"Not a duration: {text!r}")
+        hours, minutes, secs = (float(part or 0) for part in match.groups())
+        seconds = hours * 3600 + minutes * 60 + secs
+    if seconds < 0:
+        raise ValueError(f"Duration must not be negative: {text!r}")
+    return seconds or None
+
+
+class Deadline:
+    """
+    A moment by which work must be finished, or left resumable.
+
+    Held as a wall-clock timestamp (``at``, as from ``time.time()``), so it
+    can be handed to a worker process as a plain number. A deadline with
+    ``at`` None never passes.
+    """
+
+    def __init__(self, at: Optional[float] = None, clock: Callable[[], float] = time.time):
+        """
+        Initialize the deadline.
+
+        Args:
+            at: When it passes, as a ``clock`` timestamp; None for never
+            clock: Wall-clock time source
+        """
+        self.at = at
+        self._clock = clock
+
+    @classmethod
+    def after(cls, seconds: Optional[float],
+              clock: Callable[[], float] = time.time) -> 'Deadline':
+        """Return a deadline ``seconds`` from now (never, if None)."""
+        return cls(None if seconds is None else clock() + seconds, clock)
+
+    def remaining(self) -> float:
+        """Seconds left (``inf`` without a deadline, never below 0)."""
+        if self.at is None:
+            return math.inf
+        return max(0.0, self.at - self._clock())
+
+    def expired(self) -> bool:
+        """Return whether the deadline has passed."""
+        return self.at is not None and self._clock() >= self.at
+
+    def allows(self, seconds: float) -> bool:
+        """Return whether ``seconds`` of work fit in the time left (none do once it passed)."""
+        return self.remaining() > seconds
+
+    def check(self, what: str):
+        """
+        Raise if the deadline has passed.
+
+        Raises:
+            DeadlineExceededError: Naming ``what`` was stopped
+        """
+        if self.expired():
+            raise DeadlineExceededError(f"{what}: deadline passed")
+
+    def within(self, seconds: Optional[float]) -> 'Deadline':
+        """Return the earlier of this deadline and one ``seconds`` from now."""
+        if seconds is None:
+            return self
+        other = self._clock() + seconds
+        return Deadline(other if self.at is None else min(self.at, other), self._clock)
+
+    def progress_hook(self) -> Callable[[Dict], None]:
+        """
+        Make a yt-dlp progress hook that aborts the transfer once the deadline passes.
+
+        The ``.part`` file is kept, so a later run continues it.
+        """
+        def hook(progress: Dict):
+            if progress.get('status') == 'downloading':
+                self.check('Download stopped')
+
+        return hook
@@ -0,0 +1,347 @@
+"""Google Drive uploads spread over a pool of service accounts."""
+
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from typing import BinaryIO, Callable, Dict, List, Optional, Set
+
+from .bandwidth import BandwidthLimiter, shared_limiter
+from .deadline import Deadline
+from .exceptions import DeadlineExceededError
+
+try:
+    import httplib2
+    from google.oauth2 import service_account
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.discovery import build
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
+except ImportError:
+    service_account = None
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ['https://www.googleapis.com/auth/drive']
+# Resumable uploads go up in chunks of this size (a multiple of 256 KiB)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# 403 reasons meaning "this account has used up its quota", not "forbidden"
+_RATE_LIMIT_REASONS = frozenset({'userRateLimitExceeded', 'rateLimitExceeded'})
+_DAILY_LIMIT_REASONS = frozenset({'uploadLimitExceeded', 'dailyLimitExceeded',
+                                  'quotaExceeded', 'storageQuotaExceeded'})
+
+# Per-user request rate is measured over 100 s windows
+RATE_LIMIT_COOLDOWN = 100
+
+# Seconds any single request to Drive (one chunk) may take
+REQUEST_TIMEOUT = 120
+# Uploads in flight at once, across every thread sharing an uploader
+UPLOAD_CONCURRENCY = 4
+
+
+def _error_reasons(error: 'HttpError') -> Set[str]:
+    """Return the ``reason`` codes Google attached to an API error."""
+    reasons = {detail.get('reason') for detail in getattr(error, 'error_details', None) or []
+               if isinstance(detail, dict)}
+    try:
+        body = json.loads(error.content.decode('utf-8'))
+        reasons.update(e.get('reason') for e in body['error'].get('errors', []))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        pass
+    reasons.discard(None)
+    return reasons
+
+
+def next_quota_reset(now: Optional[float] = None) -> float:
+    """
+    Return when Google's daily quotas next reset: midnight Pacific time.
+
+    Args:
+        now: Current Unix time (default: now)
+
+    Returns:
+        Unix time of the reset
+    """
+    try:
+        from zoneinfo import ZoneInfo
+        pacific = ZoneInfo('America/Los_Angeles')
+    except Exception:
+        # No tz database: standard time is close enough for a cooldown
+        pacific = datetime.timezone(datetime.timedelta(hours=-8))
+    current = datetime.datetime.fromtimestamp(time.time() if now is None else now, pacific)
+    midnight = (current + datetime.timedelta(days=1)).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    return midnight.timestamp()
+
+
+class ServiceAccount:
+    """One service account's credentials and quota state."""
+
+    def __init__(self, path: str, credentials):
+        self.path = path
+        self.credentials = credentials
+        self.exhausted_until = 0.0
+        self.last_used = 0.0
+        self.uploads = 0
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+
+class ServiceAccountPool:
+    """
+    Rotate Drive uploads over several service accounts.
+
+    Each account's credentials are loaded once and its Drive clients cached,
+    one per thread: a client sits on its own authorized ``httplib2``
+    transport, which is not thread-safe, so no two threads ever share one.
+    Every transport carries a per-request timeout.
+    Uploads go to the least recently used account with quota left. An account
+    that reports ``userRateLimitExceeded`` rests for the 100-second rate
+    window; one that reports ``uploadLimitExceeded`` (the daily upload cap)
+    rests until quotas reset at midnight Pacific time.
+    """
+
+    def __init__(self, accounts: List[ServiceAccount], timeout: float = REQUEST_TIMEOUT):
+        """
+        Initialize the pool.
+
+        Args:
+            accounts: Accounts to rotate between
+            timeout: Seconds a single request may take before it fails
+        """
+        self.accounts = accounts
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def from_files(cls, paths: List[str], scopes: List[str] = SCOPES,
+                   timeout: float = REQUEST_TIMEOUT) -> 'ServiceAccountPool':
+        """
+        Load a pool from service-account key files.
+
+        Args:
+            paths: Key files, one per account
+            scopes: OAuth scopes to request
+            timeout: See ``__init__``
+
+        Raises:
+            ImportError: If the Google client libraries are missing
+            ValueError: If no file could be loaded
+        """
+        if service_account is None:
+            raise ImportError("google-api-python-client and google-auth are required for "
+                              "Drive uploads. Install with: pip install -r requirements.txt")
+        accounts = []
+        for path in paths:
+            try:
+                credentials = service_account.Credentials.from_service_account_file(
+                    path, scopes=scopes)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not load service account {path}: {e}")
+                continue
+            accounts.append(ServiceAccount(path, credentials))
+        if not accounts:
+            raise ValueError(f"No usable service account among {paths}")
+        logger.info(f"Drive upload pool holds {len(accounts)} service account(s)")
+        return cls(accounts, timeout=timeout)
+
+    def acquire(self) -> Optional[ServiceAccount]:
+        """
+        Pick the account for the next upload.
+
+        Returns:
+            An account with quota left, or None if every account is exhausted
+        """
+        with self._lock:
+            now = time.time()
+            ready = [a for a in self.accounts if a.exhausted_until <= now]
+            if not ready:
+                return None
+            account = min(ready, key=lambda a: a.last_used)
+            account.last_used = time.monotonic()
+            account.uploads += 1
+            return account
+
+    def exhausted(self, account: ServiceAccount, reasons: Set[str]):
+        """Rest an account that ran out of quota, until that quota resets."""
+        if reasons & _DAILY_LIMIT_REASONS:
+            until = next_quota_reset()
+        else:
+            until = time.time() + RATE_LIMIT_COOLDOWN
+        with self._lock:
+            account.exhausted_until = max(account.exhausted_until, until)
+        logger.warning(f"Service account {account.name} out of quota "
+                       f"({', '.join(sorted(reasons))}) until "
+                       f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(until))}")
+
+    def available(self) -> int:
+        """Return the number of accounts with quota left."""
+        now = time.time()
+        with self._lock:
+            return sum(1 for a in self.accounts if a.exhausted_until <= now)
+
+    def client(self, account: ServiceAccount):
+        """Return this thread's Drive client for ``account``, building it on first use."""
+        clients: Dict[str, object] = getattr(self._local, 'clients', None)
+        if clients is None:
+            clients = self._local.clients = {}
+        if account.path not in clients:
+            http = AuthorizedHttp(account.credentials, http=httplib2.Http(timeout=self.timeout))
+            clients[account.path] = build('drive', 'v3', http=http, cache_discovery=False)
+        return clients[account.path]
+
+
+class DriveUploader:
+    """
+    Resumable, chunked uploads to a Drive folder through a service-account pool.
+
+    Safe to call from several threads at once: each thread talks to Drive over
+    its own transport (see ``ServiceAccountPool``), and at most
+    ``concurrency`` uploads run at a time; further callers wait for a slot.
+    """
+
+    def __init__(self, pool: ServiceAccountPool, folder_id: str,
+                 chunk_size: int = UPLOAD_CHUNK_SIZE,
+                 concurrency: int = UPLOAD_CONCURRENCY,
+                 bandwidth: Optional[BandwidthLimiter] = None):
+        """
+        Initialize the uploader.
+
+        Args:
+            pool: Accounts to upload with
+            folder_id: Drive folder receiving the files
+            chunk_size: Bytes per resumable chunk (a multiple of 256 KiB)
+            concurrency: Most uploads in flight at once
+            bandwidth: Limiter whose upload budget each chunk spends from
+                (default: the process-wide one)
+        """
+        self.pool = pool
+        self.folder_id = folder_id
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.bandwidth = bandwidth if bandwidth is not None else shared_limiter()
+        self._slots = threading.BoundedSemaphore(concurrency)
+
+    def upload(self, filename: str, session_uri: Optional[str] = None,
+               on_session: Optional[Callable[[str], None]] = None,
+               stream: Optional[BinaryIO] = None,
+               deadline: Optional[Deadline] = None) -> Optional[str]:
+        """
+        Upload a file, moving to another account if one runs out of quota.
+
+        The upload is resumable and sent in chunks. Its session URI is reported
+        through ``on_session`` as soon as Drive issues it; handing it back as
+        ``session_uri`` after an interruption continues from the last byte Drive
+        acknowledged instead of from zero.
+
+        Args:
+            filename: Path to the file
+            session_uri: Resumable session from an interrupted earlier attempt
+            on_session: Called with the session URI once it is known
+            stream: Seekable file object holding the file's contents, read
+                instead of opening ``filename`` (which then only names the file)
+            deadline: Stop before a chunk that, going by the last one, would
+                not finish in time
+
+        Returns:
+            The Drive file id, or None if the upload failed, timed out, or every
+            account is out of quota
+
+        Raises:
+            DeadlineExceededError: If the upload stopped for ``deadline``; its
+                session has been reported, so it can be resumed
+        """
+        with self._slots:
+            return self._rotate(filename, session_uri, on_session, stream, deadline)
+
+    def _rotate(self, filename: str, session_uri: Optional[str],
+                on_session: Optional[Callable[[str], None]],
+                stream: Optional[BinaryIO],
+                deadline: Optional[Deadline] = None) -> Optional[str]:
+        while True:
+            account = self.pool.acquire()
+            if account is None:
+                logger.error(f"Every service account is out of quota; not uploading {filename}")
+                return None
+            try:
+                return self._upload(account, filename, session_uri, on_session, stream,
+                                    deadline)
+            except HttpError as error:
+                reasons = _error_reasons(error) & (_RATE_LIMIT_REASONS | _DAILY_LIMIT_REASONS)
+                if error.resp.status in (403, 429) and reasons:
+                    self.pool.exhausted(account, reasons)
+                    # A session belongs to the account that opened it
+                    session_uri = None
+                    continue
+                logger.error(f"Google Drive upload error: {error}")
+                return None
+            except (OSError, httplib2.HttpLib2Error) as error:
+                # Timeouts land here; the session survives for a later resume
+                logger.error(f"Google Drive upload of {filename} failed: "
+                             f"{type(error).__name__}: {error}")
+                return None
+
+    def _upload(self, account: ServiceAccount, filename: str, session_uri: Optional[str],
+                on_session: Optional[Callable[[str], None]],
+                stream: Optional[BinaryIO] = None,
+                deadline: Optional[Deadline] = None) -> str:
+        logger.info(f"Uploading {filename} to Google Drive as {account.name}")
+        file_metadata = {
+            'name': os.path.basename(filename),
+            'mimeType': 'video/mp4',
+            'parents': [self.folder_id]
+        }
+        if stream is not None:
+            media = MediaIoBaseUpload(stream, mimetype='video/mp4',
+                                      resumable=True, chunksize=self.chunk_size)
+        else:
+            media = MediaFileUpload(filename, mimetype='video/mp4',
+                                    resumable=True, chunksize=self.chunk_size)
+        request = self.pool.client(account).files().create(
+            body=file_metadata,
+            media_body=media,
+            fields='id'
+        )
+
+        if session_uri:
+            # googleapiclient has no public resume call. Flagging the request as
+            # interrupted makes its next chunk ask Drive how many bytes it holds
+            # and continue from there.
+            logger.info("Resuming interrupted Google Drive upload")
+            request.resumable_uri = session_uri
+            request._in_error_state = True
+
+        file = None
+        reported = session_uri
+        chunk_seconds = 0.0
+        while file is None:
+            if deadline is not None:
+                if not deadline.allows(chunk_seconds):
+                    # Drive keeps what it has; the reported session resumes from there
+                    raise DeadlineExceededError(f"Upload of {filename} stopped before the "
+                                                f"deadline; left to resume")
+                left = deadline.remaining()
+            # Counted as a full chunk; the last one may be shorter
+            self.bandwidth.upload.consume(self.chunk_size)
+            try:
+                _, file = request.next_chunk()
+            except HttpError as error:
+                if session_uri and error.resp.status in (404, 410):
+                    # Sessions expire after about a week; start over
+                    logger.warning("Upload session expired, restarting the upload")
+                    return self._upload(account, filename, None, on_session, stream, deadline)
+                raise
+            if deadline is not None:
+                chunk_seconds = left - deadline.remaining()
+            if on_session and request.resumable_uri and request.resumable_uri != reported:
+                reported = request.resumable_uri
+                on_session(reported)
+
+        logger.info(f'Successfully uploaded to Google Drive. File ID: {file.get("id")}')
+        return file.get('id')
@@ -29,3 +29,18 @@ class NetworkError(DownloadError):
 class AuthenticationRequiredError(DownloadError):
     """Raised when the platform refuses anonymous access (login or rate limit)."""
     pass
+
+
+class CircuitOpenError(DownloadError):
+    """Raised without trying when a platform's circuit breaker is open."""
+    pass
+
+
+class DownloadStalledError(NetworkError):
+    """Raised when a transfer stays below the minimum speed for too long."""
+    pass
+
+
+class DeadlineExceededError(DownloadError):
+    """Raised when work is stopped, or not started, because its deadline has passed."""
+    pass
@@ -0,0 +1,156 @@
+"""Hedged requests: a second copy of a slow operation, first result wins."""
+
+import logging
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional, TypeVar
+
+from .breaker import RetryBudget
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Latency quantile past which a second copy starts
+HEDGE_QUANTILE = 0.95
+# Latencies needed for a key before it is hedged at all
+MIN_SAMPLES = 20
+# Latencies kept per key
+HISTORY = 200
+
+
+class Hedger:
+    """
+    Start a second copy of an operation that runs longer than usual.
+
+    Latencies are kept per key (e.g. ``extract:instagram``). Once a key has
+    ``min_samples`` of them, an operation still running past their
+    ``quantile`` gets a hedge: the same operation started again, in
+    parallel. Whichever copy succeeds first is returned. The other cannot be
+    interrupted mid-request, so it runs to completion in the background and
+    its result is handed to ``discard`` (if given) and dropped.
+
+    Hedges spend from a ``RetryBudget``, so they add at most ``ratio`` extra
+    requests over its window however slow a platform gets.
+    """
+
+    def __init__(self,
+                 ratio: float = 0.05,
+                 quantile: float = HEDGE_QUANTILE,
+                 min_samples: int = MIN_SAMPLES,
+                 history: int = HISTORY,
+                 max_workers: int = 32):
+        """
+        Initialize the hedger.
+
+        Args:
+            ratio: Most hedges as a share of all operations
+            quantile: Latency quantile after which an operation is hedged
+            min_samples: Latencies a key needs before it is hedged
+            history: Latencies kept per key
+            max_workers: Threads running operations and hedges
+        """
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.history = history
+        self.budget = RetryBudget(ratio=ratio, min_retries=0)
+        self.hedged = 0
+        self.won = 0
+        self._latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+
+    @classmethod
+    def from_env(cls) -> Optional['Hedger']:
+        """
+        Build a hedger from ``HEDGE_BUDGET`` (e.g. ``0.05`` for 5 % extra requests).
+
+        Returns:
+            The hedger, or None if ``HEDGE_BUDGET`` is unset or 0
+        """
+        ratio = float(os.environ.get('HEDGE_BUDGET') or 0)
+        return cls(ratio) if ratio > 0 else None
+
+    def threshold(self, key: str) -> Optional[float]:
+        """Seconds after which an operation on ``key`` is hedged, or None if not yet known."""
+        with self._lock:
+            latencies = list(self._latencies.get(key, ()))
+        if len(latencies) < self.min_samples:
+            return None
+        return statistics.quantiles(latencies, n=100, method='inclusive')[
+            round(self.quantile * 100) - 1]
+
+    def run(self, key: str, operation: Callable[[], T],
+            discard: Optional[Callable[[T], None]] = None) -> T:
+        """
+        Run ``operation``, hedging it if it gets slow.
+
+        Args:
+            key: What the operation's latency is compared with
+            operation: The work; it must be safe to run twice at once
+            discard: Called with the losing copy's result, if it succeeds
+
+        Returns:
+            The first successful result
+
+        Raises:
+            Exception: The first copy's error, if every copy failed
+        """
+        delay = self.threshold(key)
+        self.budget.record_attempt()
+        primary = self._executor.submit(self._timed, key, operation)
+        if delay is None:
+            return primary.result()
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeout:
+            pass
+        if not self.budget.try_retry():
+            return primary.result()
+
+        logger.info(f"Hedging {key}: still running after {delay:.1f}s")
+        with self._lock:
+            self.hedged += 1
+        self.budget.record_attempt()
+        hedge = self._executor.submit(self._timed, key, operation)
+
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    continue
+                if future is hedge:
+                    with self._lock:
+                        self.won += 1
+                for loser in pending:
+                    loser.add_done_callback(lambda f: self._discard(f, discard))
+                return future.result()
+        return primary.result()
+
+    def stats(self) -> Dict:
+        """Return hedges started and won, and the budget they spend from."""
+        with self._lock:
+            return {'hedged': self.hedged, 'won': self.won, 'budget': self.budget.stats()}
+
+    def _timed(self, key: str, operation: Callable[[], T]) -> T:
+        started = time.monotonic()
+        result = operation()
+        with self._lock:
+            latencies = self._latencies.setdefault(key, deque(maxlen=self.history))
+            latencies.append(time.monotonic() - started)
+        return result
+
+    @staticmethod
+    def _discard(future, discard: Optional[Callable]):
+        if discard is None or future.exception() is not None:
+            return
+        try:
+            discard(future.result())
+        except Exception as e:
+            logger.warning(f"Discarding a hedged result failed: {e}")
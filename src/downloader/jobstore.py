@@ -0,0 +1,307 @@
+"""Crash-safe, SQLite-backed record of batch jobs and how far each one got."""
+
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from .utils import canonical_id
+
+# Job states, in the order a job moves through them
+QUEUED = 'queued'
+EXTRACTING = 'extracting'
+DOWNLOADING = 'downloading'
+DOWNLOADED = 'downloaded'
+UPLOADING = 'uploading'
+DONE = 'done'
+FAILED = 'failed'
+
+STATES = (QUEUED, EXTRACTING, DOWNLOADING, DOWNLOADED, UPLOADING, DONE, FAILED)
+TERMINAL_STATES = (DONE, FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id             TEXT PRIMARY KEY,
+    url            TEXT NOT NULL,
+    title          TEXT,
+    state          TEXT NOT NULL,
+    format_id      TEXT,
+    part_path      TEXT,
+    filepath       TEXT,
+    remote_id      TEXT,
+    error          TEXT,
+    error_type     TEXT,
+    attempts       INTEGER NOT NULL DEFAULT 0,
+    est_bytes      INTEGER,
+    duration       REAL,
+    created_at     REAL NOT NULL,
+    updated_at     REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    job_id         TEXT NOT NULL REFERENCES jobs (id),
+    path           TEXT NOT NULL,
+    position       INTEGER NOT NULL,
+    format_id      TEXT,
+    part_path      TEXT,
+    upload_session TEXT,
+    remote_id      TEXT,
+    PRIMARY KEY (job_id, path)
+);
+"""
+
+# Columns added since the first schema, created on older stores when opened
+_ADDED_COLUMNS = {
+    'jobs': {'est_bytes': 'INTEGER', 'duration': 'REAL'},
+    'files': {'format_id': 'TEXT', 'part_path': 'TEXT'},
+}
+
+# Columns callers may set through update()
+_MUTABLE_COLUMNS = frozenset({
+    'format_id', 'part_path', 'filepath', 'remote_id',
+    'error', 'error_type', 'attempts', 'est_bytes', 'duration',
+})
+_MUTABLE_FILE_COLUMNS = frozenset({'upload_session', 'remote_id'})
+
+
+class JobStore:
+    """
+    Durable job table for batch runs.
+
+    Every state change is committed before the work it describes starts, so a
+    process killed at any point can be restarted and each job resumed from
+    its last recorded stage: a half-written ``.part`` file is continued with
+    the same format, and an interrupted upload continues its resumable session.
+
+    A job may produce several files (the parts of a carousel). Each is
+    recorded in a ``files`` table with its own upload session and remote id,
+    so the parts are uploaded, and resumed, independently.
+
+    Jobs are keyed by canonical id, so adding the same post twice (under any
+    URL spelling) yields one job. The store is safe to share between threads.
+    """
+
+    def __init__(self, path: str = ':memory:'):
+        """
+        Open (creating if needed) a job store.
+
+        Args:
+            path: SQLite database file, or ``:memory:`` for a store that lives
+                only as long as the process
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if path != ':memory:':
+            # WAL keeps committed rows safe if the process dies mid-write
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+        for table, columns in _ADDED_COLUMNS.items():
+            existing = {row['name'] for row in self._conn.execute(f'PRAGMA table_info({table})')}
+            for column, kind in columns.items():
+                if column not in existing:
+                    self._conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {kind}')
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def add(self, url: str, title: Optional[str] = None) -> Dict:
+        """
+        Queue a job unless one for the same media already exists.
+
+        Args:
+            url: The video URL
+            title: Optional custom title for the file
+
+        Returns:
+            The job, either newly queued or the existing one (whatever its state)
+        """
+        job_id = canonical_id(url)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR IGNORE INTO jobs (id, url, title, state, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, url, title, QUEUED, now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return one job as a dict, or None if it is unknown."""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, job_id: str, state: Optional[str] = None, **fields) -> Dict:
+        """
+        Record progress on a job.
+
+        Args:
+            job_id: The job to update
+            state: New state, if it changes
+            **fields: Column values to set (see the schema)
+
+        Returns:
+            The job after the update
+
+        Raises:
+            ValueError: On an unknown state or column
+            KeyError: If the job does not exist
+        """
+        if state is not None and state not in STATES:
+            raise ValueError(f"Unknown job state: {state}")
+        unknown = set(fields) - _MUTABLE_COLUMNS
+        if unknown:
+            raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+
+        if state is not None:
+            fields['state'] = state
+        fields['updated_at'] = time.time()
+
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+        if cursor.rowcount == 0:
+            raise KeyError(job_id)
+        return self.get(job_id)
+
+    def set_files(self, job_id: str, paths: List[str]):
+        """
+        Record the files a job's download produced.
+
+        Files already recorded keep their upload progress; files no longer in
+        ``paths`` are forgotten.
+
+        Args:
+            job_id: The job
+            paths: Downloaded files, in order
+        """
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                placeholders = ', '.join('?' * len(paths))
+                self._conn.execute(
+                    f"DELETE FROM files WHERE job_id = ? AND path NOT IN ({placeholders})",
+                    (job_id, *paths),
+                )
+                for position, path in enumerate(paths):
+                    self._conn.execute(
+                        'INSERT INTO files (job_id, path, position) VALUES (?, ?, ?) '
+                        'ON CONFLICT (job_id, path) DO UPDATE SET position = excluded.position',
+                        (job_id, path, position),
+                    )
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def start_file(self, job_id: str, position: int, path: str,
+                   format_id: Optional[str] = None, part_path: Optional[str] = None):
+        """
+        Record the format and partial file of one part as its download starts.
+
+        The parts of a carousel each pick their own format, so a resumed job
+        pins every part to its own rather than sharing the job's ``format_id``.
+        ``set_files()`` replaces these rows with the finished files.
+
+        Args:
+            job_id: The job
+            position: The part's place in the job, from 0
+            path: The file the part is being downloaded to
+            format_id: The format chosen for it
+            part_path: Its ``.part`` file
+        """
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                # An earlier attempt may have named the part differently
+                self._conn.execute(
+                    'DELETE FROM files WHERE job_id = ? AND position = ? AND path != ?',
+                    (job_id, position, path),
+                )
+                self._conn.execute(
+                    'INSERT INTO files (job_id, path, position, format_id, part_path) '
+                    'VALUES (?, ?, ?, ?, ?) ON CONFLICT (job_id, path) DO UPDATE SET '
+                    'position = excluded.position, format_id = excluded.format_id, '
+                    'part_path = excluded.part_path',
+                    (job_id, path, position, format_id, part_path),
+                )
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def files(self, job_id: str) -> List[Dict]:
+        """Return a job's files in download order."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT * FROM files WHERE job_id = ? ORDER BY position', (job_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def update_file(self, job_id: str, path: str, **fields):
+        """
+        Record upload progress for one of a job's files.
+
+        Args:
+            job_id: The job
+            path: The file
+            **fields: ``upload_session`` and/or ``remote_id``
+
+        Raises:
+            ValueError: On an unknown column
+        """
+        unknown = set(fields) - _MUTABLE_FILE_COLUMNS
+        if unknown:
+            raise ValueError(f"Unknown file fields: {sorted(unknown)}")
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE files SET {assignments} WHERE job_id = ? AND path = ?",
+                (*fields.values(), job_id, path),
+            )
+
+    def jobs(self, states: Optional[Iterable[str]] = None) -> List[Dict]:
+        """
+        List jobs in insertion order.
+
+        Args:
+            states: Only return jobs in these states; all jobs if None
+        """
+        query = 'SELECT * FROM jobs'
+        params: tuple = ()
+        if states is not None:
+            states = tuple(states)
+            query += f" WHERE state IN ({', '.join('?' * len(states))})"
+            params = states
+        with self._lock:
+            rows = self._conn.execute(query + ' ORDER BY created_at, rowid', params).fetchall()
+        return [dict(row) for row in rows]
+
+    def unfinished(self) -> List[Dict]:
+        """Return every job that still has work left, in insertion order."""
+        return self.jobs(s for s in STATES if s not in TERMINAL_STATES)
+
+    def requeue_failed(self) -> int:
+        """
+        Give failed jobs another attempt.
+
+        Their recorded format, partial file and upload session are kept, so a
+        retry picks up where the failure left off: a job that failed after its
+        download finished goes straight back to the upload stage.
+
+        Returns:
+            Number of jobs requeued
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET state = CASE WHEN filepath IS NULL THEN ? ELSE ? END, '
+                'error = NULL, error_type = NULL, updated_at = ? WHERE state = ?',
+                (QUEUED, DOWNLOADED, time.time(), FAILED),
+            )
+        return cursor.rowcount
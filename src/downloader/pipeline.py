@@ -0,0 +1,445 @@
+"""Batch pipeline: drive stored jobs through download and upload, resumably."""
+
+import contextlib
+import logging
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from .concurrency import AIMDController
+from .core import VideoDownloader
+from .deadline import Deadline
+from .exceptions import DeadlineExceededError, DownloadError
+from .jobstore import (
+    DONE,
+    DOWNLOADED,
+    DOWNLOADING,
+    EXTRACTING,
+    FAILED,
+    QUEUED,
+    UPLOADING,
+    JobStore,
+)
+from .prefetch import Prefetcher
+from .scheduler import DEFAULT_THROUGHPUT, FIFO, FairScheduler, plan
+from .storage import StorageManager, estimate_size
+
+logger = logging.getLogger(__name__)
+
+# uploader(filepath, session_uri=None, on_session=None) -> remote id, or None on
+# failure. `on_session` is called with a resumable session URI as soon as one
+# exists, and `session_uri` hands a stored one back after a restart. When the
+# run has a deadline it is passed as `deadline=`; the uploader may then raise
+# DeadlineExceededError to stop part-way, leaving the session to resume.
+Uploader = Callable[..., Optional[str]]
+
+# Metadata extractions run at once when estimating job sizes
+ESTIMATE_WORKERS = 8
+
+
+class BatchRunner:
+    """
+    Run every unfinished job in a JobStore.
+
+    Each job resumes from its recorded stage: queued/extracting jobs start
+    from scratch, a job interrupted while downloading is restarted with the
+    format it had chosen (so yt-dlp continues its ``.part`` file), a
+    downloaded job goes straight to upload, and an interrupted upload
+    continues its resumable session.
+
+    A job that produced several files (a carousel) uploads each one on its
+    own; a file that already reached the remote is not sent again.
+
+    Uploads run on their own pool of ``upload_workers`` threads, so a
+    finished download is handed off and the download worker moves on to the
+    next job while earlier files are still going up. For many small files
+    the per-request latency of the upload dominates, and only running
+    several at once hides it.
+
+    With ``prefetch`` set, the metadata of the next few jobs is extracted
+    while the current ones download (see ``Prefetcher``), and each download
+    starts from it instead of extracting again.
+
+    Jobs start in queue order unless ``order`` says otherwise: ``longest``
+    or ``shortest`` first, by the size estimate each job gets from a
+    metadata pass (see ``plan()`` and ``scheduler``).
+
+    Workers take jobs from a ``FairScheduler``, which interleaves platforms
+    (by ``platform_weights``) and caps each one's running jobs (by
+    ``platform_workers``). A throttled platform whose jobs sit in backoff
+    then holds only its share of the workers; the order above still holds
+    within each platform.
+
+    With a ``concurrency`` controller, the number of jobs downloading at once
+    follows its limit (up to its ``max_limit``) instead of ``workers``.
+
+    With a ``deadline``, a job only starts if its expected download time (its
+    size estimate over ``throughput``) fits in the time left. A download
+    still running at the deadline is stopped, and uploads not yet started are
+    not started. Those jobs keep their recorded stage, partial file and upload
+    session for the next run instead of being marked failed. ``job_timeout``
+    gives each job its own, earlier deadline; a job that reaches it fails
+    with ``DeadlineExceededError``.
+
+    ``on_finished`` is called with each job's record as soon as that job is
+    through, so its result can be persisted without waiting for the batch.
+    """
+
+    def __init__(self,
+                 downloader: VideoDownloader,
+                 store: JobStore,
+                 uploader: Optional[Uploader] = None,
+                 workers: int = 1,
+                 storage: Optional[StorageManager] = None,
+                 upload_workers: int = 1,
+                 prefetch: int = 0,
+                 prefetch_max_age: float = 300,
+                 order: str = FIFO,
+                 throughput: float = DEFAULT_THROUGHPUT,
+                 platform_weights: Optional[Dict[str, float]] = None,
+                 platform_workers: Optional[Dict[str, float]] = None,
+                 concurrency: Optional[AIMDController] = None,
+                 deadline: Optional[Deadline] = None,
+                 job_timeout: Optional[float] = None,
+                 on_finished: Optional[Callable[[Dict], None]] = None):
+        """
+        Initialize the runner.
+
+        Args:
+            downloader: Downloader used for every job
+            store: Where job state is read from and recorded to
+            uploader: Optional upload step run after each download (see ``Uploader``)
+            workers: Number of jobs processed concurrently
+            storage: Optional disk budget for the downloader's output directory.
+                Downloads wait for room before fetching, and local copies are
+                freed once their upload is confirmed.
+            upload_workers: Number of jobs uploading concurrently
+            prefetch: Jobs whose metadata is extracted ahead of their
+                download; 0 disables prefetching
+            prefetch_max_age: Seconds a prefetch stays usable; media URLs
+                are often signed and expire
+            order: Order jobs start in (see ``scheduler.ORDERS``)
+            throughput: Bytes per second one worker is assumed to download,
+                for the forecast in ``plan()``
+            platform_weights: Share of job starts per platform, ``*`` for the
+                default (see ``FairScheduler``)
+            platform_workers: Most jobs of one platform running at once,
+                ``*`` for the default (default: no cap)
+            concurrency: Adaptive limit on jobs downloading at once, fed by
+                the downloader's attempt reports (see ``AIMDController``);
+                overrides ``workers``
+            deadline: When the run must stop (default: never)
+            job_timeout: Seconds one job's download may take, retries included
+            on_finished: Called with each job's record once this run is done
+                with it (done, failed, or left for the next run)
+        """
+        self.downloader = downloader
+        self.store = store
+        self.uploader = uploader
+        self.workers = workers
+        self.storage = storage
+        self.upload_workers = upload_workers
+        self.prefetch = prefetch
+        self.prefetch_max_age = prefetch_max_age
+        self.order = order
+        self.throughput = throughput
+        self.platform_weights = platform_weights
+        self.platform_workers = platform_workers
+        self.concurrency = concurrency
+        self.deadline = deadline if deadline is not None else Deadline()
+        self.job_timeout = job_timeout
+        self.on_finished = on_finished
+
+    def run(self) -> List[Dict]:
+        """
+        Process every unfinished job.
+
+        Returns:
+            The final record of each job processed, in queue order
+        """
+        pending = self.store.unfinished()
+        logger.info(f"Processing {len(pending)} job(s) with {self.workers} worker(s) "
+                    f"and {self.upload_workers} upload worker(s)")
+        if self.deadline.at is not None:
+            logger.info(f"Stopping at the deadline, {self.deadline.remaining() / 60:.0f} min "
+                        f"from now")
+        queued = pending
+        if self.order != FIFO:
+            batch_plan = self.plan()
+            pending = [entry['job'] for entry in batch_plan['jobs']]
+            logger.info(f"Running {self.order} jobs first; expected to take "
+                        f"{batch_plan['makespan'] / 60:.0f} min")
+
+        scheduler = FairScheduler(pending, self.platform_weights, self.platform_workers)
+        prefetcher = Prefetcher(
+            lambda job: self.downloader.prefetch(job['url']),
+            [job for job in scheduler.preview()
+             if job['state'] in (QUEUED, EXTRACTING, DOWNLOADING)],
+            lookahead=self.prefetch,
+            max_age=self.prefetch_max_age,
+        )
+        staged: Dict[str, Future] = {}
+        with prefetcher, ThreadPoolExecutor(max_workers=self.upload_workers,
+                                            thread_name_prefix='upload') as uploads:
+            def stage(job: Dict) -> Future:
+                if self._fits(job):
+                    job = self._fetch(job, prefetcher)
+                    ready = job['state'] in (DOWNLOADED, UPLOADING)
+                else:
+                    ready = False
+                if not ready:
+                    done = Future()
+                    done.set_result(self._finished(job))
+                    return done
+                return uploads.submit(lambda: self._finished(self._finish(job)))
+
+            def work():
+                # Each download worker takes the next job the scheduler allows,
+                # once the concurrency limit (if any) has room
+                while True:
+                    with self.concurrency or contextlib.nullcontext():
+                        job = scheduler.acquire()
+                        if job is None:
+                            return
+                        try:
+                            staged[job['id']] = stage(job)
+                        finally:
+                            scheduler.release(job)
+
+            threads = self.concurrency.max_limit if self.concurrency else self.workers
+            with ThreadPoolExecutor(max_workers=threads) as downloads:
+                for worker in [downloads.submit(work) for _ in range(threads)]:
+                    worker.result()
+            return [staged[job['id']].result() for job in queued]
+
+    def plan(self) -> Dict:
+        """
+        Estimate every unfinished job's size and forecast the run.
+
+        Sizes already recorded on the job store (from an earlier plan) are
+        reused; the others are estimated from a metadata extraction and
+        recorded. A job whose file is already downloaded counts as nothing
+        left to fetch.
+
+        Returns:
+            The forecast, as from ``scheduler.plan()``
+        """
+        pending = self.store.unfinished()
+        missing = [job for job in pending
+                   if job['est_bytes'] is None and job['state'] in (QUEUED, EXTRACTING, DOWNLOADING)]
+        if missing:
+            logger.info(f"Estimating the size of {len(missing)} job(s)")
+            with ThreadPoolExecutor(max_workers=ESTIMATE_WORKERS,
+                                    thread_name_prefix='estimate') as executor:
+                estimated = {job['id']: job for job in executor.map(self._estimate, missing)}
+            pending = [estimated.get(job['id'], job) for job in pending]
+        pending = [job if job['state'] in (QUEUED, EXTRACTING, DOWNLOADING)
+                   else dict(job, est_bytes=0) for job in pending]
+        return plan(pending, self.order, self.workers, self.throughput)
+
+    def _fits(self, job: Dict) -> bool:
+        """Return whether what is left of ``job``'s download should fit before the deadline."""
+        if self.deadline.at is None:
+            return True
+        downloading = job['state'] in (QUEUED, EXTRACTING, DOWNLOADING)
+        left = (job['est_bytes'] or 0) if downloading else 0
+        if self.deadline.allows(left / self.throughput):
+            return True
+        stage = 'download' if downloading else 'upload'
+        logger.warning(f"{job['id']}: not starting its {stage}, it would not finish before "
+                       f"the deadline; left for the next run")
+        return False
+
+    def _estimate(self, job: Dict) -> Dict:
+        """Record the size and duration a metadata extraction reports for ``job``."""
+        try:
+            info = self.downloader.extract_info(job['url'])
+        except Exception as e:
+            logger.warning(f"{job['id']}: could not estimate its size: {e}")
+            return job
+        return self.store.update(job['id'], est_bytes=estimate_size(info),
+                                 duration=info.get('duration'))
+
+    def process(self, job: Dict) -> Dict:
+        """
+        Take one job as far as it can go, on the calling thread.
+
+        Args:
+            job: The job record, as returned by the store
+
+        Returns:
+            The job's final record (state ``done`` or ``failed``, or where
+            the deadline left it)
+        """
+        if self._fits(job):
+            job = self._fetch(job)
+            if job['state'] in (DOWNLOADED, UPLOADING):
+                job = self._finish(job)
+        return self._finished(job)
+
+    def _fetch(self, job: Dict, prefetcher: Optional[Prefetcher] = None) -> Dict:
+        """Bring a job to ``downloaded``, or record why it failed."""
+        job_id = job['id']
+        try:
+            if job['state'] in (DOWNLOADED, UPLOADING):
+                if not self.store.files(job_id) and job['filepath']:
+                    self.store.set_files(job_id, [job['filepath']])
+                pending = [f['path'] for f in self.store.files(job_id) if not f['remote_id']]
+                if not pending or not all(os.path.exists(path) for path in pending):
+                    logger.warning(f"{job_id}: downloaded file is gone, downloading again")
+                    self.store.set_files(job_id, [])
+                    job = self.store.update(job_id, QUEUED, filepath=None)
+                elif self.storage:
+                    for path in pending:
+                        self.storage.track(path)
+
+            if job['state'] in (QUEUED, EXTRACTING, DOWNLOADING):
+                job = self._download(job, prefetcher)
+            return job
+        except DeadlineExceededError as e:
+            return self._out_of_time(job_id, e)
+        except Exception as e:
+            return self._unexpected(job_id, e)
+
+    def _finish(self, job: Dict) -> Dict:
+        """Upload a downloaded job's files and mark it done."""
+        job_id = job['id']
+        try:
+            if self.uploader is not None:
+                return self._upload(job)
+            return self.store.update(job_id, DONE)
+        except Exception as e:
+            return self._unexpected(job_id, e)
+
+    def _download(self, job: Dict, prefetcher: Optional[Prefetcher] = None) -> Dict:
+        job_id = job['id']
+        # A job interrupted mid-download keeps its format so the .part file is
+        # continued rather than restarted under a different stream. The parts
+        # of a carousel each keep their own.
+        resume_format = resume_formats = None
+        if job['state'] == DOWNLOADING:
+            parts = self.store.files(job_id)
+            if parts:
+                resume_formats = [None] * (parts[-1]['position'] + 1)
+                for part in parts:
+                    resume_formats[part['position']] = part['format_id']
+                logger.info(f"{job_id}: resuming download of {len(parts)} parts")
+            elif job['format_id']:
+                resume_format = job['format_id']
+                logger.info(f"{job_id}: resuming download of format {resume_format}")
+
+        self.store.update(job_id, EXTRACTING, attempts=job['attempts'] + 1)
+        reservations = []
+
+        def before_download(info: Dict):
+            # Runs on the download thread, so waiting for disk space here holds
+            # the transfer back until the budget has room for it.
+            if self.storage:
+                reservations.append(self.storage.reserve(estimate_size(info)))
+            filename = info.get('_filename') or info.get('filepath')
+            part_path = f"{filename}.part" if filename else None
+            index = info.get('playlist_index')
+            if index is not None and filename:
+                # One part of a carousel; the job's own format would only
+                # hold whichever part started last
+                self.store.start_file(job_id, index - 1, filename,
+                                      format_id=info.get('format_id'), part_path=part_path)
+                self.store.update(job_id, DOWNLOADING)
+            else:
+                self.store.update(job_id, DOWNLOADING,
+                                  format_id=info.get('format_id'), part_path=part_path)
+
+        options = {'before_download': before_download}
+        deadline = self.deadline.within(self.job_timeout)
+        if deadline.at is not None:
+            options['deadline'] = deadline.at
+        if resume_format:
+            options['format_id'] = resume_format
+        if resume_formats:
+            options['entry_formats'] = resume_formats
+        prefetched = prefetcher.take(job) if prefetcher else None
+        if prefetched is not None:
+            options['prefetched'] = prefetched
+        try:
+            result = self.downloader.download(job['url'], job['title'], **options)
+        finally:
+            if prefetched is not None:
+                # No-op once the download used it; frees its route otherwise
+                prefetched.discard()
+            # Entries of a carousel reserve in parallel, so reservations can't be
+            # matched to files; swap them all for the files' real sizes instead.
+            for reservation in reservations:
+                self.storage.cancel(reservation)
+
+        if not result['success']:
+            return self.store.update(job_id, FAILED, error=result.get('error'),
+                                     error_type='DownloadError')
+
+        filepaths = result.get('filepaths') or [result['filepath']]
+        if self.storage:
+            for path in filepaths:
+                self.storage.track(path)
+        self.store.set_files(job_id, filepaths)
+        return self.store.update(job_id, DOWNLOADED, filepath=filepaths[0])
+
+    def _upload(self, job: Dict) -> Dict:
+        job_id = job['id']
+        self.store.update(job_id, UPLOADING)
+
+        files = self.store.files(job_id)
+        for file in files:
+            if file['remote_id']:
+                continue
+            path = file['path']
+            if self.deadline.expired():
+                logger.warning(f"{job_id}: not uploading {path}, the deadline passed; "
+                               f"left for the next run")
+                return self.store.get(job_id)
+            options = {'deadline': self.deadline} if self.deadline.at is not None else {}
+            try:
+                remote_id = self.uploader(
+                    path,
+                    session_uri=file['upload_session'],
+                    on_session=lambda uri, path=path: self.store.update_file(
+                        job_id, path, upload_session=uri),
+                    **options,
+                )
+            except DeadlineExceededError as e:
+                logger.warning(f"{job_id}: {e}; left for the next run")
+                return self.store.get(job_id)
+            if not remote_id:
+                return self.store.update(job_id, FAILED, error=f'upload failed: {path}',
+                                         error_type='UploadError')
+            self.store.update_file(job_id, path, remote_id=remote_id, upload_session=None)
+            file['remote_id'] = remote_id
+            if self.storage:
+                self.storage.release(path)
+
+        return self.store.update(job_id, DONE,
+                                 remote_id=', '.join(f['remote_id'] for f in files))
+
+    def _unexpected(self, job_id: str, error: Exception) -> Dict:
+        if not isinstance(error, DownloadError):
+            logger.error(f"{job_id}: unexpected error: {error}", exc_info=True)
+        return self._fail(job_id, error)
+
+    def _finished(self, job: Dict) -> Dict:
+        """Hand ``job``'s record to ``on_finished``, if set; return it."""
+        if self.on_finished is not None:
+            try:
+                self.on_finished(job)
+            except Exception as e:
+                logger.warning(f"{job['id']}: on_finished failed: {e}")
+        return job
+
+    def _out_of_time(self, job_id: str, error: DeadlineExceededError) -> Dict:
+        if not self.deadline.expired():
+            # Only the job's own timeout passed
+            return self._fail(job_id, error)
+        logger.warning(f"{job_id}: {error}; left for the next run")
+        return self.store.get(job_id)
+
+    def _fail(self, job_id: str, error: Exception) -> Dict:
+        logger.error(f"{job_id}: {type(error).__name__}: {error}")
+        return self.store.update(job_id, FAILED, error=str(error),
+                                 error_type=type(error).__name__)
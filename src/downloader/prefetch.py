@@ -0,0 +1,145 @@
+"""Bounded lookahead that extracts upcoming jobs' metadata ahead of their download."""
+
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Per-job prefetch state
+_PENDING, _RUNNING, _READY, _TAKEN, _SKIPPED = range(5)
+
+
+class Prefetcher:
+    """
+    Run ``fetch`` for the next few jobs while earlier ones are downloading.
+
+    Extraction is latency-bound (page and API round trips) and downloading
+    is bandwidth-bound, so doing the next jobs' extraction during the current
+    downloads hides most of it. A download worker calls ``take()`` for its
+    job: a finished prefetch is handed over, one still running is waited for,
+    and a job the lookahead has not reached yet is skipped — the worker
+    extracts it itself rather than wait.
+
+    At most ``lookahead`` jobs are being prefetched or waiting to be taken,
+    and a prefetch older than ``max_age`` seconds is discarded, so the signed
+    media URLs inside do not expire before the download starts.
+
+    Use it as a context manager: the threads start on entry, and on exit they
+    are stopped and anything not taken is discarded.
+    """
+
+    def __init__(self,
+                 fetch: Callable[[Dict], Any],
+                 jobs: List[Dict],
+                 lookahead: int = 2,
+                 max_age: float = 300):
+        """
+        Initialize the prefetcher.
+
+        Args:
+            fetch: Called with a job record; returns the prefetch (e.g.
+                ``VideoDownloader.prefetch(job['url'])``) or None
+            jobs: Jobs to prefetch, in the order they will be downloaded
+            lookahead: Most jobs prefetched ahead of the downloads; 0 disables
+            max_age: Seconds after which a prefetch is too old to use
+        """
+        self.fetch = fetch
+        self.lookahead = lookahead
+        self.max_age = max_age
+        self._queue = deque(jobs)
+        self._state = {job['id']: _PENDING for job in jobs}
+        self._ready: Dict[str, Any] = {}
+        self._outstanding = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def __enter__(self) -> 'Prefetcher':
+        for i in range(self.lookahead if self._queue else 0):
+            thread = threading.Thread(target=self._run, name=f'prefetch-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def take(self, job: Dict) -> Optional[Any]:
+        """
+        Claim ``job``'s prefetch.
+
+        Returns:
+            The prefetch, or None if there is none (not reached yet, failed,
+            or too old) and the caller should extract as usual
+        """
+        job_id = job['id']
+        with self._cond:
+            if self._state.get(job_id) == _PENDING:
+                self._state[job_id] = _SKIPPED
+                return None
+            while self._state.get(job_id) == _RUNNING:
+                self._cond.wait()
+            if self._state.get(job_id) != _READY:
+                return None
+            self._state[job_id] = _TAKEN
+            self._outstanding -= 1
+            self._cond.notify_all()
+            prefetched = self._ready.pop(job_id)
+
+        if prefetched is not None and getattr(prefetched, 'age', 0) > self.max_age:
+            logger.info(f"{job_id}: prefetched metadata is {prefetched.age:.0f}s old, "
+                        "extracting again")
+            self._discard(prefetched)
+            return None
+        return prefetched
+
+    def close(self):
+        """Stop prefetching and discard whatever was not taken."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        with self._cond:
+            leftover, self._ready = list(self._ready.values()), {}
+        for prefetched in leftover:
+            self._discard(prefetched)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                job = self._next()
+                if job is None:
+                    return
+            try:
+                prefetched = self.fetch(job)
+            except Exception as e:
+                logger.info(f"{job['id']}: prefetch failed, extracting at download time: {e}")
+                prefetched = None
+            with self._cond:
+                self._state[job['id']] = _READY
+                self._ready[job['id']] = prefetched
+                self._cond.notify_all()
+
+    def _next(self) -> Optional[Dict]:
+        """Wait for room in the lookahead and return the next job. Caller holds the lock."""
+        while not self._closed:
+            while self._queue and self._state[self._queue[0]['id']] == _SKIPPED:
+                self._queue.popleft()
+            if not self._queue:
+                return None
+            if self._outstanding < self.lookahead:
+                job = self._queue.popleft()
+                self._state[job['id']] = _RUNNING
+                self._outstanding += 1
+                return job
+            self._cond.wait()
+        return None
+
+    @staticmethod
+    def _discard(prefetched: Any):
+        discard = getattr(prefetched, 'discard', None)
+        if discard:
+            discard()
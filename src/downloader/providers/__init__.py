@@ -1,9 +1,13 @@
 """Video download providers."""
 
 from .base import BaseProvider
+from .fallback import FallbackProvider
+from .subprocess_provider import SubprocessProvider
 from .ytdlp_provider import YtDlpProvider
 
 __all__ = [
     'BaseProvider',
+    'FallbackProvider',
+    'SubprocessProvider',
     'YtDlpProvider',
 ]
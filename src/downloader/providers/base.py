@@ -1,7 +1,7 @@
 """Base provider interface for video downloaders."""
 
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 
 class BaseProvider(ABC):
@@ -42,7 +42,7 @@ class BaseProvider(ABC):
         pass
     
     @abstractmethod
-    def download(self, url: str, output_path: str, title: Optional[str] = None) -> str:
+    def download(self, url: str, output_path: str, title: Optional[str] = None, **options) -> str:
         """
         Download video from the given URL.
         
@@ -50,6 +50,9 @@ class BaseProvider(ABC):
             url: The video URL
             output_path: Directory to save the video
             title: Optional custom title for the file
+            **options: Provider-specific download options (see each provider).
+                Callers only pass them when set, and providers ignore those
+                they do not support.
             
         Returns:
             Path to the downloaded file
@@ -59,6 +62,28 @@ class BaseProvider(ABC):
         """
         pass
     
+    def download_all(self, url: str, output_path: str, title: Optional[str] = None,
+                     **options) -> List[str]:
+        """
+        Download every file behind the URL.
+
+        Providers that can return several files for one URL (e.g. the parts of
+        a multi-video post) override this; by default it is ``download()``.
+
+        Args:
+            url: The video URL
+            output_path: Directory to save the files
+            title: Optional custom title for the files
+            **options: As for ``download()``
+
+        Returns:
+            Paths to the downloaded files, at least one
+
+        Raises:
+            DownloadError: If download fails
+        """
+        return [self.download(url, output_path, title, **options)]
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -0,0 +1,112 @@
+"""Provider that retries a failed job on alternative providers."""
+
+import logging
+from typing import Dict, List, Optional
+
+from .base import BaseProvider
+from ..exceptions import (
+    DeadlineExceededError,
+    DownloadError,
+    DuplicateFileError,
+    UnsupportedPlatformError,
+)
+
+logger = logging.getLogger(__name__)
+
+# Failures no other provider fixes: the input itself is the problem, or time ran out
+_FINAL_ERRORS = (UnsupportedPlatformError, DuplicateFileError, DeadlineExceededError)
+
+
+class FallbackProvider(BaseProvider):
+    """
+    Try providers in order until one succeeds.
+
+    Meant for side-by-side yt-dlp versions: the stable one in this process
+    first, then a nightly in a ``SubprocessProvider``. A job failing with the
+    errors that point to a stale extractor — the ones the app exits 2 or 3 on
+    (download, extraction, network and authentication errors) — is retried
+    on the next provider straight away, in the same run.
+    """
+
+    def __init__(self, providers: List[BaseProvider]):
+        """
+        Initialize the provider.
+
+        Args:
+            providers: Providers to try, in order
+
+        Raises:
+            ValueError: If ``providers`` is empty
+        """
+        if not providers:
+            raise ValueError("FallbackProvider needs at least one provider")
+        self.providers = providers
+
+    @property
+    def name(self) -> str:
+        return self.providers[0].name
+
+    def supports(self, url: str) -> bool:
+        return any(provider.supports(url) for provider in self.providers)
+
+    def warm_up(self):
+        """Warm up the first provider; the others start only when needed."""
+        warm_up = getattr(self.providers[0], 'warm_up', None)
+        if warm_up:
+            warm_up()
+
+    def add_listener(self, listener):
+        """Pass ``listener`` to every provider that reports its attempts."""
+        for provider in self.providers:
+            add_listener = getattr(provider, 'add_listener', None)
+            if add_listener:
+                add_listener(listener)
+
+    def set_retry_gate(self, gate):
+        """Pass the retry ``gate`` to every provider that retries."""
+        for provider in self.providers:
+            set_retry_gate = getattr(provider, 'set_retry_gate', None)
+            if set_retry_gate:
+                set_retry_gate(gate)
+
+    def prefetch(self, url: str):
+        """Prefetch with the first provider, the one a download starts with."""
+        prefetch = getattr(self.providers[0], 'prefetch', None)
+        return prefetch(url) if prefetch else None
+
+    def extract_info(self, url: str) -> Dict:
+        return self._first('extract_info', url)
+
+    def list_entries(self, url: str) -> List[Dict]:
+        return self._first('list_entries', url)
+
+    def download(self, url: str, output_path: str, title: Optional[str] = None,
+                 **options) -> str:
+        return self.download_all(url, output_path, title, **options)[0]
+
+    def download_all(self, url: str, output_path: str, title: Optional[str] = None,
+                     **options) -> List[str]:
+        return self._first('download_all', url, output_path, title, **options)
+
+    def _first(self, method: str, url: str, *args, **kwargs):
+        """Return the first successful ``method`` call, or raise the last failure."""
+        candidates = [provider for provider in self.providers
+                      if provider.supports(url) and hasattr(provider, method)]
+        if not candidates:
+            raise UnsupportedPlatformError(f"No provider can {method} {url}")
+        # A prefetch belongs to the first provider (see ``prefetch()``)
+        prefetched = kwargs.pop('prefetched', None)
+        for index, provider in enumerate(candidates):
+            if prefetched is not None and provider is self.providers[0]:
+                kwargs['prefetched'] = prefetched
+            else:
+                kwargs.pop('prefetched', None)
+            try:
+                return getattr(provider, method)(url, *args, **kwargs)
+            except _FINAL_ERRORS:
+                raise
+            except DownloadError as e:
+                if index == len(candidates) - 1:
+                    raise
+                logger.warning(f"{provider.name} failed ({type(e).__name__}: {e}); "
+                               f"retrying with {candidates[index + 1].name}")
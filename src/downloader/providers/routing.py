@@ -0,0 +1,129 @@
+"""Cache of which yt-dlp extractor handles which kind of URL."""
+
+import logging
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+GENERIC = 'Generic'
+
+# A first path segment that names a route (``reel``, ``watch``, ``shorts``)
+# rather than an id; anything else is folded into a wildcard
+_ROUTE_SEGMENT = re.compile(r'^[a-z][a-z_-]{0,15}$')
+
+
+def url_shape(url: str) -> Tuple[str, str]:
+    """
+    Reduce a URL to the part that decides its extractor.
+
+    ``https://www.instagram.com/reel/Cx1/`` and ``https://instagram.com/reel/Dy2``
+    share the shape ``('instagram.com', 'reel')``; ``https://youtu.be/abc123``
+    and ``https://www.tiktok.com/@user/video/1`` become ``('youtu.be', '*')``
+    and ``('tiktok.com', '@')``.
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    for prefix in ('www.', 'm.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    segment = next((s for s in parts.path.split('/') if s), '')
+    if segment.startswith('@'):
+        segment = '@'
+    elif not _ROUTE_SEGMENT.match(segment.lower()):
+        segment = '*' if segment else ''
+    return host, segment.lower()
+
+
+class ExtractorRouter:
+    """
+    Remember which extractor each URL shape (see ``url_shape()``) goes to.
+
+    yt-dlp matches a URL by testing it against every extractor's
+    ``suitable()`` regex in turn, falling back to the generic extractor,
+    which fetches the page to look for embedded media. The router does that
+    scan once per URL shape and hands the ``ie_key`` it found to
+    ``extract_info()`` afterwards, so only that extractor is tried. A cached
+    key is still checked with its extractor's ``suitable()`` — a single regex
+    — and a mismatch rescans.
+
+    A shape that only the generic extractor took, and that it then reported
+    as unsupported, is remembered for ``unsupported_ttl`` seconds: further
+    URLs of that shape are refused before any request is made.
+    """
+
+    def __init__(self, extractors: Optional[List] = None, unsupported_ttl: float = 3600):
+        """
+        Initialize the router.
+
+        Args:
+            extractors: Extractor classes in yt-dlp's matching order (default:
+                yt-dlp's own list, loaded on first use)
+            unsupported_ttl: Seconds a shape stays known-unsupported
+        """
+        self._extractors = extractors
+        self.unsupported_ttl = unsupported_ttl
+        self._routes: Dict[Tuple[str, str], str] = {}
+        self._unsupported: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.scans = 0
+
+    @property
+    def extractors(self) -> List:
+        if self._extractors is None:
+            from yt_dlp.extractor import gen_extractor_classes
+            self._extractors = list(gen_extractor_classes())
+        return self._extractors
+
+    def route(self, url: str) -> str:
+        """
+        Return the key of the extractor for ``url``.
+
+        Returns:
+            An ``ie_key``; ``Generic`` if no specific extractor matches
+        """
+        shape = url_shape(url)
+        with self._lock:
+            cached = self._routes.get(shape)
+        if cached is not None and self._suitable(cached, url):
+            self.hits += 1
+            return cached
+
+        self.scans += 1
+        ie_key = next((ie.ie_key() for ie in self.extractors
+                       if ie.ie_key() != GENERIC and ie.suitable(url)), GENERIC)
+        with self._lock:
+            self._routes[shape] = ie_key
+        return ie_key
+
+    def is_unsupported(self, url: str) -> bool:
+        """Return True if URLs shaped like ``url`` are known to be unsupported."""
+        shape = url_shape(url)
+        with self._lock:
+            until = self._unsupported.get(shape)
+            if until is None:
+                return False
+            if until <= time.monotonic():
+                del self._unsupported[shape]
+                return False
+            return True
+
+    def unsupported(self, url: str):
+        """Record that no extractor could handle ``url``."""
+        shape = url_shape(url)
+        with self._lock:
+            self._unsupported[shape] = time.monotonic() + self.unsupported_ttl
+        logger.info(f"No extractor supports {shape[0]}/{shape[1]} URLs; "
+                    f"refusing them for {self.unsupported_ttl:.0f}s")
+
+    def _suitable(self, ie_key: str, url: str) -> bool:
+        if ie_key == GENERIC:
+            # Generic accepts everything; re-check that no specific one does
+            return False
+        ie = next((ie for ie in self.extractors if ie.ie_key() == ie_key), None)
+        return ie is not None and ie.suitable(url)
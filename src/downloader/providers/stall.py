@@ -0,0 +1,74 @@
+"""Detect downloads that stop making progress, from yt-dlp's progress hooks."""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from ..exceptions import DownloadStalledError
+
+# A transfer slower than this (bytes per second) over a whole window is stalled
+DEFAULT_MIN_SPEED = 16 * 1024
+# Seconds the speed is measured over
+DEFAULT_WINDOW = 60.0
+# Immediate restarts of a stalled download before it counts as a failed attempt
+DEFAULT_RESTARTS = 2
+
+
+class StallMonitor:
+    """
+    yt-dlp progress hook that aborts a transfer running below ``min_speed``.
+
+    A trickling connection never errors out: yt-dlp's socket timeout only
+    catches one that sends nothing at all. The monitor keeps each file's
+    progress over the last ``window`` seconds, and once a full window has
+    moved fewer than ``min_speed`` bytes per second, it raises
+    ``DownloadStalledError`` from inside the download loop. The ``.part``
+    file stays, so a restart carries on from where this one stopped.
+
+    ``clock`` should leave out time the download spent waiting on a
+    bandwidth limit, which is slowness on purpose.
+    """
+
+    def __init__(self, min_speed: float = DEFAULT_MIN_SPEED, window: float = DEFAULT_WINDOW,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the monitor.
+
+        Args:
+            min_speed: Bytes per second below which a file is stalled
+            window: Seconds the speed is measured over
+            clock: Time source
+        """
+        self.min_speed = min_speed
+        self.window = window
+        self._clock = clock
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self.stalled: Optional[str] = None
+
+    def __call__(self, progress: Dict):
+        name = progress.get('tmpfilename') or progress.get('filename')
+        if progress.get('status') != 'downloading':
+            with self._lock:
+                self._samples.pop(name, None)
+            return
+        now = self._clock()
+        done = progress.get('downloaded_bytes') or 0
+        with self._lock:
+            samples = self._samples.setdefault(name, deque())
+            samples.append((now, done))
+            # Keep the newest sample at least a window old as the baseline
+            while len(samples) > 1 and now - samples[1][0] >= self.window:
+                samples.popleft()
+            since, baseline = samples[0]
+            elapsed = now - since
+            if elapsed < self.window:
+                return
+            speed = (done - baseline) / elapsed
+            if speed >= self.min_speed:
+                return
+            self.stalled = (f"{os.path.basename(name or 'download')} stalled at "
+                            f"{speed / 1024:.1f} KiB/s over {elapsed:.0f}s")
+        raise DownloadStalledError(self.stalled)
@@ -0,0 +1,334 @@
+"""Provider that runs another provider in a pool of separate Python processes."""
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .base import BaseProvider
+from ..bandwidth import BandwidthLimiter, shared_limiter
+from ..exceptions import (
+    AuthenticationRequiredError,
+    DeadlineExceededError,
+    DownloadError,
+    DuplicateFileError,
+    ExtractionError,
+    NetworkError,
+    UnsupportedPlatformError,
+)
+
+logger = logging.getLogger(__name__)
+
+YTDLP_TARGET = 'downloader.providers.ytdlp_provider:YtDlpProvider'
+
+# Errors a worker reports by name, raised again on this side
+_ERRORS = {error.__name__: error for error in (
+    AuthenticationRequiredError, DeadlineExceededError, DownloadError, DuplicateFileError,
+    ExtractionError, NetworkError, UnsupportedPlatformError,
+)}
+
+# Directory holding the ``downloader`` package, put on the worker's path
+_SRC_DIR = str(Path(__file__).resolve().parents[2])
+
+
+class _Worker:
+    """One worker process, speaking the protocol described in ``worker.py``."""
+
+    def __init__(self, name: str, process: subprocess.Popen):
+        self.name = name
+        self.process = process
+        self.pid = process.pid
+        self.version: Optional[str] = None
+        self.jobs = 0
+        self.rss: Optional[int] = None
+
+    @classmethod
+    def start(cls, name: str, python: str, path: List[str], target: str,
+              options: Dict) -> '_Worker':
+        """
+        Start a worker and wait until its provider is loaded.
+
+        Raises:
+            DownloadError: If the worker could not start
+        """
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            path + [_SRC_DIR] + [p for p in env.get('PYTHONPATH', '').split(os.pathsep) if p])
+        try:
+            process = subprocess.Popen(
+                [python, '-m', 'downloader.providers.worker'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+                text=True, encoding='utf-8', bufsize=1,
+            )
+        except OSError as e:
+            raise DownloadError(f"{name} worker did not start: {e}") from e
+        worker = cls(name, process)
+        # Downloads in the worker spend this process's bandwidth budget
+        worker._exchange({'target': target, 'options': options, 'bandwidth': True})
+        ready = worker._exchange()
+        if ready.get('event') != 'ready':
+            worker.stop()
+            raise DownloadError(f"{name} worker did not start: {ready.get('error')}")
+        worker.version = ready.get('version')
+        logger.info(f"Started {name} worker (pid {worker.pid}"
+                    + (f", yt-dlp {worker.version}" if worker.version else "") + ")")
+        return worker
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def call(self, op: str, args: Sequence, kwargs: Dict,
+             callback: Optional[Callable[[Dict], None]] = None,
+             on_attempt: Optional[Callable[[Dict], None]] = None,
+             on_bandwidth: Optional[Callable[[int], None]] = None,
+             on_retry: Optional[Callable[[str], bool]] = None) -> Dict:
+        """Run one call and return its final reply (``result`` or ``error``)."""
+        self._exchange({'op': op, 'args': list(args), 'kwargs': kwargs})
+        while True:
+            message = self._exchange()
+            if message.get('event') == 'bandwidth':
+                if on_bandwidth:
+                    on_bandwidth(message['bytes'])
+                self._exchange({'grant': message['bytes']})
+                continue
+            if message.get('event') == 'retry':
+                self._exchange({'grant': bool(on_retry(message['url'])) if on_retry else True})
+                continue
+            if message.get('event') == 'attempt':
+                if on_attempt:
+                    on_attempt(message['attempt'])
+                continue
+            if message.get('event') != 'before_download':
+                break
+            if callback:
+                try:
+                    callback(message['info'])
+                except BaseException:
+                    # The worker's remaining replies would answer the next call
+                    self.stop(kill=True)
+                    raise
+        self.jobs += 1
+        self.rss = message.get('rss', self.rss)
+        return message
+
+    def stop(self, kill: bool = False):
+        """Stop the worker: closing its input lets it exit once idle."""
+        if kill:
+            self.process.kill()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+
+    def _exchange(self, request: Optional[Dict] = None) -> Dict:
+        """Send ``request``, or read the next reply."""
+        try:
+            if request is not None:
+                self.process.stdin.write(json.dumps(request) + '\n')
+                self.process.stdin.flush()
+                return {}
+            line = self.process.stdout.readline()
+            if not line:
+                raise EOFError(f"worker exited with code {self.process.wait()}")
+            return json.loads(line)
+        except (OSError, EOFError, ValueError) as e:
+            # The worker died or spoke garbage
+            self.stop(kill=True)
+            raise DownloadError(f"{self.name} worker failed: {e}") from e
+
+
+class SubprocessProvider(BaseProvider):
+    """
+    Run a provider in a pool of long-lived worker processes.
+
+    Each worker is a separate interpreter, so extraction — JSON, manifest and
+    JavaScript parsing in pure Python, all under the GIL — runs on as many
+    cores as there are workers. Calls and results cross the pipe as compact
+    JSON messages. Workers start on demand and are then reused, so later
+    calls skip interpreter start-up and imports.
+
+    yt-dlp's caches and leftover info dicts make a long-lived process grow.
+    A worker is therefore recycled — stopped, and replaced on the next call —
+    after ``max_jobs`` calls or once its resident memory passes ``max_rss``,
+    which keeps a resident service's memory bounded.
+
+    Workers import from ``path`` before anything installed in this
+    environment, so they can run a different yt-dlp than this process — e.g.
+    a nightly installed side by side with
+    ``pip install --target .ytdlp-nightly --pre "yt-dlp[default]"``.
+    """
+
+    def __init__(self,
+                 path: Sequence[str] = (),
+                 target: str = YTDLP_TARGET,
+                 options: Optional[Dict] = None,
+                 python: str = sys.executable,
+                 name: str = 'yt-dlp (subprocess)',
+                 workers: int = 1,
+                 max_jobs: Optional[int] = None,
+                 max_rss: Optional[int] = None,
+                 bandwidth: Optional[BandwidthLimiter] = None):
+        """
+        Initialize the provider.
+
+        Args:
+            path: Directories searched for imports ahead of this environment's
+            target: Provider class run by the workers, as ``module:Class``
+            options: Keyword arguments for that class (JSON-serializable)
+            python: Interpreter running the workers
+            name: Provider name
+            workers: Most worker processes running at once; further calls wait
+            max_jobs: Calls after which a worker is replaced (default: never)
+            max_rss: Resident bytes past which a worker is replaced (default: never)
+            bandwidth: Limiter whose download budget the workers' transfers
+                spend from (default: this process's shared one)
+        """
+        self.path = list(path)
+        self.target = target
+        self.options = options or {}
+        self.python = python
+        self._name = name
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.max_rss = max_rss
+        self.bandwidth = bandwidth if bandwidth is not None else shared_limiter()
+        self.version: Optional[str] = None
+        self.recycled = 0
+        self._listeners: List[Callable[[Dict], None]] = []
+        self._retry_gate: Optional[Callable[[str], bool]] = None
+        self._idle: List[_Worker] = []
+        self._slots = threading.BoundedSemaphore(workers)
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def supports(self, url: str) -> bool:
+        return isinstance(url, str) and url.lower().startswith(('http://', 'https://'))
+
+    def warm_up(self):
+        """Start every worker now, and warm up the provider inside each."""
+        started = []
+        try:
+            for _ in range(self.workers):
+                self._slots.acquire()
+                try:
+                    worker = self._checkout()
+                except BaseException:
+                    self._slots.release()
+                    raise
+                started.append(worker)
+                worker.call('warm_up', [], {})
+        finally:
+            for worker in started:
+                self._checkin(worker)
+                self._slots.release()
+
+    def extract_info(self, url: str) -> Dict:
+        return self._call('extract_info', url)
+
+    def list_entries(self, url: str) -> List[Dict]:
+        return self._call('list_entries', url)
+
+    def download(self, url: str, output_path: str, title: Optional[str] = None,
+                 **options) -> str:
+        return self.download_all(url, output_path, title, **options)[0]
+
+    def download_all(self, url: str, output_path: str, title: Optional[str] = None,
+                     before_download: Optional[Callable[[Dict], None]] = None,
+                     **options) -> List[str]:
+        """
+        Download in a worker.
+
+        ``before_download`` runs here, in this process, with a compact copy of
+        the info dict (see ``worker.compact_info``).
+        """
+        if before_download:
+            options['before_download'] = True
+        return self._call('download_all', url, output_path, title,
+                          callback=before_download, **options)
+
+    def add_listener(self, listener: Callable[[Dict], None]):
+        """Have ``listener`` called with each download attempt the workers report."""
+        self._listeners.append(listener)
+
+    def set_retry_gate(self, gate: Optional[Callable[[str], bool]]):
+        """Have the workers ask ``gate(url)``, in this process, before every retry."""
+        self._retry_gate = gate
+
+    @property
+    def pids(self) -> List[int]:
+        """Process ids of the idle workers."""
+        with self._lock:
+            return [worker.pid for worker in self._idle]
+
+    def close(self):
+        """Stop the idle workers; busy ones stop when their call returns."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+
+    def _call(self, op: str, *args, callback: Optional[Callable[[Dict], None]] = None,
+              **kwargs):
+        with self._slots:
+            worker = self._checkout()
+            try:
+                message = worker.call(op, args, kwargs, callback, self._notify,
+                                      self.bandwidth.download.consume, self._retry_gate)
+            finally:
+                self._checkin(worker)
+
+        if 'error' in message:
+            error = _ERRORS.get(message['error_type'])
+            if error is None:
+                raise DownloadError(f"{message['error_type']}: {message['error']}")
+            raise error(message['error'])
+        return message['result']
+
+    def _notify(self, attempt: Dict):
+        for listener in self._listeners:
+            try:
+                listener(attempt)
+            except Exception as e:
+                logger.warning(f"Attempt listener failed: {e}")
+
+    def _checkout(self) -> _Worker:
+        """Take an idle worker, or start one. Caller holds a slot."""
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.alive:
+                    return worker
+        worker = _Worker.start(self.name, self.python, self.path, self.target, self.options)
+        self.version = worker.version
+        return worker
+
+    def _checkin(self, worker: _Worker):
+        """Return a worker to the pool, or retire it if it died or is due for recycling."""
+        if not worker.alive:
+            return
+        reason = None
+        if self.max_jobs is not None and worker.jobs >= self.max_jobs:
+            reason = f"{worker.jobs} jobs"
+        elif self.max_rss is not None and worker.rss and worker.rss > self.max_rss:
+            reason = f"{worker.rss / 2**20:.0f} MiB resident"
+        if reason is None:
+            with self._lock:
+                self._idle.append(worker)
+            return
+        logger.info(f"Recycling {self.name} worker {worker.pid} after {reason}")
+        self.recycled += 1
+        worker.stop()
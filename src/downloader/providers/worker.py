@@ -0,0 +1,187 @@
+"""
+Child side of ``SubprocessProvider``: serve provider calls over a pipe.
+
+Run as ``python -m downloader.providers.worker``. The parent sends one JSON
+object per line on stdin: first ``{"target": "module:Class", "options":
+{...}}`` naming the provider to build, then one request per call
+(``{"op": ..., "args": [...], "kwargs": {...}}``). Each request is answered
+by zero or more ``{"event": "before_download", "info": {...}}`` and
+``{"event": "attempt", "attempt": {...}}`` lines (the latter for providers
+with ``add_listener()``) and then ``{"result": ...}`` or ``{"error": ..., "error_type": ...}``, both
+carrying the worker's resident memory as ``rss`` so the parent can recycle
+a worker that has grown too large.
+
+If the first line also carries ``"bandwidth": true``, downloads spend the
+parent's download budget rather than one of their own: every
+``GRANT_BYTES`` received, the worker sends ``{"event": "bandwidth",
+"bytes": n}`` and waits for the parent's ``{"grant": n}`` before going on.
+Likewise a provider with ``set_retry_gate()`` sends ``{"event": "retry",
+"url": ...}`` before each retry and retries only if the parent answers
+``{"grant": true}``.
+
+yt-dlp prints progress to stdout, so the protocol runs on a duplicate of the
+original stdout and everything else is sent to stderr.
+"""
+
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional, TextIO
+
+from ..bandwidth import BandwidthLimiter, set_shared_limiter
+
+# Calls a worker answers; anything else is refused
+OPS = frozenset({'extract_info', 'list_entries', 'download_all', 'warm_up'})
+
+# Bytes a worker downloads between asking the parent for bandwidth
+GRANT_BYTES = 2**20
+
+# Info dict fields a before_download callback may need (see storage.estimate_size
+# and BatchRunner._download)
+_INFO_FIELDS = ('id', 'title', 'ext', 'format_id', '_filename', 'filepath', 'filesize',
+                'filesize_approx', 'duration', 'tbr', 'playlist_index')
+_FORMAT_FIELDS = ('format_id', 'filesize', 'filesize_approx', 'tbr')
+
+
+def compact_info(info: Optional[Dict]) -> Dict:
+    """Reduce a yt-dlp info dict to the few fields worth sending between processes."""
+    if not info:
+        return {}
+    compact = {field: info[field] for field in _INFO_FIELDS if info.get(field) is not None}
+    if info.get('requested_formats'):
+        compact['requested_formats'] = [
+            {field: part[field] for field in _FORMAT_FIELDS if part.get(field) is not None}
+            for part in info['requested_formats']
+        ]
+    return compact
+
+
+def current_rss() -> Optional[int]:
+    """Return this process's resident memory in bytes, if the platform tells."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # Not /proc: fall back to the peak, in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class ParentBucket:
+    """
+    Download budget kept by the parent process, spent in ``GRANT_BYTES`` steps.
+
+    Stands in for a ``bandwidth.TokenBucket``: ``consume()`` adds up what the
+    downloads received and, once a step's worth has come in, blocks in
+    ``ask`` until the parent's own bucket lets it through.
+    """
+
+    def __init__(self, ask: Callable[[int], None], step: int = GRANT_BYTES):
+        self._ask = ask
+        self.step = step
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def consume(self, nbytes: int):
+        started = time.monotonic()
+        with self._lock:
+            self._pending += nbytes
+            if self._pending >= self.step:
+                nbytes, self._pending = self._pending, 0
+                self._ask(nbytes)
+        self._local.waited = self.thread_waited() + time.monotonic() - started
+
+    def thread_waited(self) -> float:
+        """Seconds the calling thread has spent waiting for the parent."""
+        return getattr(self._local, 'waited', 0.0)
+
+
+def load_provider(target: str, options: Optional[Dict] = None):
+    """Instantiate ``module:Class`` with ``options``."""
+    module_name, _, class_name = target.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)(**(options or {}))
+
+
+def serve(requests: TextIO, responses: TextIO):
+    """Answer requests until the parent closes the pipe."""
+    lock = threading.Lock()
+
+    def send(message: Dict):
+        # Entry downloads run in threads of their own and report from them
+        with lock:
+            responses.write(json.dumps(message, default=str) + '\n')
+            responses.flush()
+
+    ask_lock = threading.Lock()
+
+    def ask(message: Dict) -> Dict:
+        # Only called during a request, while the loop below is not reading;
+        # the lock keeps one question on the pipe at a time
+        with ask_lock:
+            send(message)
+            return json.loads(requests.readline() or '{}')
+
+    hello = json.loads(requests.readline() or '{}')
+    if hello.get('bandwidth'):
+        limiter = BandwidthLimiter()
+        limiter.download = ParentBucket(
+            lambda nbytes: ask({'event': 'bandwidth', 'bytes': nbytes}))
+        set_shared_limiter(limiter)
+    try:
+        provider = load_provider(hello['target'], hello.get('options'))
+    except Exception as e:
+        send({'error': f"could not load {hello.get('target')}: {e}",
+              'error_type': type(e).__name__})
+        return
+    add_listener = getattr(provider, 'add_listener', None)
+    if add_listener:
+        add_listener(lambda attempt: send({'event': 'attempt', 'attempt': attempt}))
+    set_retry_gate = getattr(provider, 'set_retry_gate', None)
+    if set_retry_gate:
+        set_retry_gate(lambda url: ask({'event': 'retry', 'url': url}).get('grant', True))
+    ytdlp = sys.modules.get('yt_dlp')
+    send({'event': 'ready', 'pid': os.getpid(),
+          'version': getattr(getattr(ytdlp, 'version', None), '__version__', None)})
+
+    for line in requests:
+        request = json.loads(line)
+        op = request.get('op')
+        kwargs = request.get('kwargs') or {}
+        if kwargs.pop('before_download', False):
+            kwargs['before_download'] = lambda info: send(
+                {'event': 'before_download', 'info': compact_info(info)})
+        try:
+            if op not in OPS:
+                raise ValueError(f"unknown operation {op!r}")
+            method = getattr(provider, op, None)
+            result = method(*request.get('args', []), **kwargs) if method else None
+        except Exception as e:
+            send({'error': str(e), 'error_type': type(e).__name__, 'rss': current_rss()})
+        else:
+            send({'result': result, 'rss': current_rss()})
+
+
+def main():
+    responses = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8')
+    # Whatever else writes to stdout (yt-dlp's progress) goes to stderr instead
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - worker {os.getpid()} - %(name)s - %(levelname)s - %(message)s'
+    )
+    serve(sys.stdin, responses)
+
+
+if __name__ == '__main__':
+    main()
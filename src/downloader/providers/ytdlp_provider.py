@@ -3,18 +3,30 @@
 import logging
 import os
 import shutil
+import threading
 from pathlib import Path
-from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
 import time
 
 from .base import BaseProvider
+from .routing import GENERIC, ExtractorRouter
+from .stall import DEFAULT_RESTARTS, DEFAULT_WINDOW, StallMonitor
+from ..bandwidth import BandwidthLimiter, parse_rate, progress_hook, shared_limiter
+from ..cookies import CookiePool, CookieSession
+from ..deadline import Deadline
+from ..hedging import Hedger
+from ..proxies import Route, RoutePool
 from ..exceptions import (
     ExtractionError,
+    DeadlineExceededError,
     DownloadError,
+    DownloadStalledError,
     NetworkError,
     AuthenticationRequiredError,
 )
-from ..utils import sanitize_filename
+from ..storage import estimate_size
+from ..utils import platform_of, sanitize_filename
 
 try:
     import yt_dlp
@@ -64,16 +76,127 @@ def _is_auth_error(message: str) -> bool:
     return any(marker in lowered for marker in _AUTH_ERROR_MARKERS)
 
 
+def _is_extraction_error(error: BaseException) -> bool:
+    """
+    Return True if the error is the platform failing to serve the post's
+    metadata, as opposed to the connection, ffmpeg or the local disk.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, yt_dlp.utils.ExtractorError):
+            # An unsupported URL says nothing about the platform, and "Unable to
+            # download webpage" is the connection failing rather than the site
+            return not (isinstance(error, yt_dlp.utils.UnsupportedError)
+                        or isinstance(error.cause, (OSError,
+                                                    yt_dlp.networking.exceptions.TransportError)))
+        # yt-dlp's DownloadError carries the extractor's error in exc_info
+        exc_info = getattr(error, 'exc_info', None)
+        error = (exc_info[1] if exc_info else None) or error.__cause__ or error.__context__
+    return False
+
+
 def _auth_required_message(url: str, error: Exception) -> str:
     """Build the operator-facing message for a refusal that needs cookies."""
     return (
         f"{url} could not be downloaded anonymously: {error}. "
         "Export browser cookies in Netscape format and expose them "
         "via the COOKIES_FILE environment variable (the workflow reads "
-        "the base64-encoded COOKIES repository secret)."
+        "the base64-encoded COOKIES repository secret). Several accounts' "
+        "files may be listed, separated by os.pathsep, to spread the load."
     )
 
 
+def _entry_info(playlist: Dict, entry: Dict, index: int, count: int) -> Dict:
+    """
+    Give one entry of ``playlist`` the fields yt-dlp's own playlist handling
+    adds (see ``YoutubeDL._playlist_infodict``), without overriding its own.
+
+    Entries fetched one by one miss them otherwise, and output templates,
+    archives and post-processors rely on ``extractor``, ``webpage_url`` and
+    the ``playlist_*`` fields.
+    """
+    extra = {
+        'playlist_count': playlist.get('playlist_count'),
+        'playlist': playlist.get('title') or playlist.get('id'),
+        'playlist_id': playlist.get('id'),
+        'playlist_title': playlist.get('title'),
+        'playlist_uploader': playlist.get('uploader'),
+        'playlist_uploader_id': playlist.get('uploader_id'),
+        'playlist_channel': playlist.get('channel'),
+        'playlist_channel_id': playlist.get('channel_id'),
+        'playlist_webpage_url': playlist.get('webpage_url'),
+        'extractor': playlist.get('extractor'),
+        'extractor_key': playlist.get('extractor_key'),
+        'original_url': playlist.get('original_url'),
+        'n_entries': count,
+    }
+    webpage_url = playlist.get('webpage_url')
+    if webpage_url:
+        extra.update({
+            'webpage_url': webpage_url,
+            'webpage_url_basename': yt_dlp.utils.url_basename(webpage_url),
+            'webpage_url_domain': yt_dlp.utils.get_domain(webpage_url),
+        })
+    info = {key: value for key, value in extra.items() if value is not None}
+    info.update(entry)
+    # Our numbering names the files and keys recorded formats, so it wins
+    info.update(playlist_index=index, playlist_autonumber=index)
+    return info
+
+
+def _before_download_pp(callback: Callable[[Dict], None]):
+    """
+    Wrap ``callback`` as a yt-dlp pre-processor that runs once formats are
+    chosen and the output name is known, but before any media bytes move.
+    """
+    class _BeforeDownloadPP(yt_dlp.postprocessor.PostProcessor):
+        def run(self, info):
+            callback(info)
+            return [], info
+
+    return _BeforeDownloadPP()
+
+
+class Prefetched:
+    """
+    A URL's metadata, extracted ahead of its download by ``YtDlpProvider.prefetch()``.
+
+    Keeps the cookie session and route it was extracted with: media URLs may
+    be signed for the address that asked for them, so the download has to go
+    out the same way. Hand it to ``download_all(prefetched=...)``, or
+    ``discard()`` it to give the route back.
+    """
+
+    def __init__(self, provider: 'YtDlpProvider', url: str, info: Dict,
+                 session: Optional[CookieSession], route: Optional[Route], started: float):
+        self.url = url
+        self.info = info
+        self.session = session
+        self.route = route
+        self.started = started
+        self.created = time.monotonic()
+        self._provider = provider
+        self._lock = threading.Lock()
+        self._claimed = False
+
+    @property
+    def age(self) -> float:
+        """Seconds since the metadata was extracted."""
+        return time.monotonic() - self.created
+
+    def claim(self) -> bool:
+        """Take ownership of the route and info; True only for the first caller."""
+        with self._lock:
+            claimed, self._claimed = self._claimed, True
+        return not claimed
+
+    def discard(self):
+        """Release the route of a prefetch that will not be downloaded."""
+        if self.claim():
+            self._provider._release_route(self.route, self.started)
+
+
 class YtDlpProvider(BaseProvider):
     """
     Generic provider using yt-dlp for downloading videos.
@@ -82,19 +205,107 @@ class YtDlpProvider(BaseProvider):
     Handles short-form content like reels, shorts, and stories.
     """
     
-    def __init__(self, max_retries: int = 3, retry_delay: int = 2):
+    def __init__(self, max_retries: int = 3, retry_delay: int = 2, entry_workers: int = 4,
+                 cookie_pool: Optional[CookiePool] = None,
+                 route_pool: Optional[RoutePool] = None,
+                 router: Optional[ExtractorRouter] = None,
+                 bandwidth: Optional[BandwidthLimiter] = None,
+                 stall_speed: Optional[float] = None,
+                 stall_window: Optional[float] = None,
+                 stall_restarts: int = DEFAULT_RESTARTS,
+                 hedger: Optional[Hedger] = None):
         """
         Initialize the yt-dlp provider.
         
         Args:
             max_retries: Maximum number of retry attempts
             retry_delay: Initial delay between retries in seconds
+            entry_workers: Entries of a multi-part post (e.g. an Instagram
+                carousel) downloaded concurrently
+            cookie_pool: Logged-in sessions to rotate between. If None, the
+                cookie file(s) named by ``COOKIES_FILE`` are loaded, if any.
+            route_pool: Proxies or source addresses to spread downloads over.
+                If None, the routes listed in ``PROXIES`` are used, if any.
+            router: Cache of which extractor handles which URLs (default: a
+                new one per provider)
+            bandwidth: Limiter whose download budget every transfer spends
+                from (default: the process-wide one)
+            stall_speed: Bytes per second below which a transfer counts as
+                stalled, e.g. ``DEFAULT_MIN_SPEED`` (default: ``STALL_SPEED``,
+                else off); 0 disables
+            stall_window: Seconds the speed is measured over (default:
+                ``STALL_WINDOW``, else 60)
+            stall_restarts: Immediate restarts of a stalled transfer before
+                it fails the attempt
+            hedger: Starts a second extraction when one runs past its
+                platform's usual latency. If None, one is built from
+                ``HEDGE_BUDGET``, if set.
         """
         if yt_dlp is None:
             raise ImportError("yt-dlp is required for YtDlpProvider. Install with: pip install yt-dlp")
         
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        self.entry_workers = entry_workers
+        self.cookie_pool = cookie_pool if cookie_pool is not None else CookiePool.from_env()
+        self.route_pool = route_pool if route_pool is not None else RoutePool.from_env()
+        self.router = router if router is not None else ExtractorRouter()
+        self.bandwidth = bandwidth if bandwidth is not None else shared_limiter()
+        if stall_speed is None:
+            stall_speed = parse_rate(os.environ.get('STALL_SPEED'))
+        self.stall_speed = stall_speed or None
+        self.stall_window = (stall_window if stall_window is not None
+                             else float(os.environ.get('STALL_WINDOW', DEFAULT_WINDOW)))
+        self.stall_restarts = stall_restarts
+        self.hedger = hedger if hedger is not None else Hedger.from_env()
+        self._listeners: List[Callable[[Dict], None]] = []
+        self._retry_gate: Optional[Callable[[str], bool]] = None
+
+        # One metadata-only YoutubeDL per thread, reused across extract_info()
+        # calls so a long-lived process keeps its HTTP connections warm.
+        self._local = threading.local()
+
+    def warm_up(self):
+        """
+        Pay one-off start-up costs now rather than on the first job.
+
+        Loads yt-dlp's extractor table and probes for ffmpeg. Worth calling from
+        long-running processes; a one-shot run gains nothing from it.
+        """
+        extractors = self.router.extractors
+        self._format_selector()
+        logger.info(f"yt-dlp warmed up with {len(extractors)} extractors")
+
+    def _info_ydl(self):
+        """Return this thread's metadata-only YoutubeDL, creating it on first use."""
+        ydl = getattr(self._local, 'info_ydl', None)
+        if ydl is None:
+            ydl = self._local.info_ydl = yt_dlp.YoutubeDL({
+                'quiet': True,
+                'no_warnings': True,
+                'extract_flat': False,
+                # Pick what download() would, so reported sizes match it
+                'format': self._format_selector(),
+            })
+        return ydl
+
+    def _extract(self, ydl, url: str, **kwargs) -> Optional[Dict]:
+        """
+        ``ydl.extract_info(url, **kwargs)``, tried on the URL's extractor only.
+
+        Raises:
+            ExtractionError: Without any request, if URLs like ``url`` are
+                known to be unsupported
+        """
+        if self.router.is_unsupported(url):
+            raise ExtractionError(f"Unsupported URL: {url} (no extractor handles such URLs)")
+        ie_key = self.router.route(url)
+        try:
+            return ydl.extract_info(url, ie_key=ie_key, **kwargs)
+        except Exception as e:
+            if ie_key == GENERIC and 'unsupported url' in str(e).lower():
+                self.router.unsupported(url)
+            raise
     
     @property
     def name(self) -> str:
@@ -128,29 +339,86 @@ class YtDlpProvider(BaseProvider):
         Raises:
             ExtractionError: If extraction fails
         """
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-        }
-        
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                return {
-                    'title': info.get('title', 'video'),
-                    'url': info.get('url'),
-                    'ext': info.get('ext', 'mp4'),
-                    'duration': info.get('duration'),
-                    'description': info.get('description'),
-                    'uploader': info.get('uploader'),
-                    'thumbnail': info.get('thumbnail'),
-                }
+            def extract():
+                return self._extract(self._info_ydl(), url, download=False)
+
+            if self.hedger:
+                info = self.hedger.run(f"extract:{platform_of(url)}", extract)
+            else:
+                info = extract()
+
+            return {
+                'title': info.get('title', 'video'),
+                'url': info.get('url'),
+                'ext': info.get('ext', 'mp4'),
+                'duration': info.get('duration'),
+                'description': info.get('description'),
+                'uploader': info.get('uploader'),
+                'thumbnail': info.get('thumbnail'),
+                # Size of the formats yt-dlp picked by default; see estimate_size()
+                'filesize_approx': estimate_size(info),
+            }
         except Exception as e:
             logger.error(f"Failed to extract info from {url}: {e}")
             raise ExtractionError(f"Failed to extract video information: {e}")
     
+    def list_entries(self, url: str) -> List[Dict]:
+        """
+        List the videos behind a channel, playlist or profile URL, cheaply.
+
+        Uses yt-dlp's flat extraction: one listing request (plus pagination)
+        yields each entry's id and URL without extracting the entries
+        themselves. A URL for a single video lists just that video.
+
+        Args:
+            url: Channel, playlist, profile or video URL
+
+        Returns:
+            One dict per entry with ``id``, ``url``, ``title`` and ``extractor``
+            (yt-dlp's extractor key, lower-cased), in listing order
+
+        Raises:
+            ExtractionError: If the listing fails
+        """
+        try:
+            with yt_dlp.YoutubeDL({
+                'quiet': True,
+                'no_warnings': True,
+                'extract_flat': 'in_playlist',
+            }) as ydl:
+                info = self._extract(ydl, url, download=False)
+        except Exception as e:
+            logger.error(f"Failed to list entries of {url}: {e}")
+            raise ExtractionError(f"Failed to list entries: {e}")
+
+        if not info:
+            return []
+        if info.get('_type') not in ('playlist', 'multi_video'):
+            return [self._flat_entry(info, url)]
+
+        entries = []
+        for entry in info.get('entries') or []:
+            if not entry:
+                continue
+            if entry.get('_type') in ('playlist', 'multi_video'):
+                # Channels come back as a playlist of their tabs
+                entries.extend(self._flat_entry(e, None) for e in entry.get('entries') or [] if e)
+            else:
+                entries.append(self._flat_entry(entry, None))
+        return [entry for entry in entries if entry['url']]
+
+    @staticmethod
+    def _flat_entry(info: Dict, url: Optional[str]) -> Dict:
+        """Reduce a (flat) info dict to what a sync needs to know about it."""
+        extractor = info.get('ie_key') or info.get('extractor_key') or info.get('extractor')
+        return {
+            'id': info.get('id'),
+            'url': info.get('webpage_url') or url or info.get('url'),
+            'title': info.get('title'),
+            'extractor': extractor.lower() if extractor else None,
+        }
+
     @staticmethod
     def _resolve_filepath(info: Optional[Dict]) -> Optional[str]:
         """
@@ -160,28 +428,43 @@ class YtDlpProvider(BaseProvider):
             info: The info dict returned by ``extract_info(download=True)``
 
         Returns:
-            The path of the final file, or None if it cannot be determined
+            The path of the final file (the first one, for a container result),
+            or None if it cannot be determined
+        """
+        paths = YtDlpProvider._resolve_filepaths(info)
+        return paths[0] if paths else None
+
+    @staticmethod
+    def _resolve_filepaths(info: Optional[Dict]) -> List[str]:
+        """
+        Work out every path yt-dlp wrote to from the info dict it returns.
+
+        Args:
+            info: The info dict returned by ``extract_info(download=True)``
+
+        Returns:
+            The final file of each entry that has one, in entry order
         """
         if not info:
-            return None
+            return []
 
         # Container results wrap the real entries. yt-dlp emits `multi_video` for
         # multi-part posts (e.g. an Instagram carousel) and handles it exactly like
         # a playlist — `requested_downloads` only ever lands on the inner entries.
         if info.get('_type') in ('playlist', 'multi_video'):
+            paths = []
             for entry in info.get('entries') or []:
-                path = YtDlpProvider._resolve_filepath(entry)
-                if path:
-                    return path
-            return None
+                paths.extend(YtDlpProvider._resolve_filepaths(entry))
+            return paths
 
         # `requested_downloads` carries the post-processed path (after merging)
         for download in info.get('requested_downloads') or []:
             path = download.get('filepath') or download.get('_filename')
             if path:
-                return path
+                return [path]
 
-        return info.get('filepath') or info.get('_filename')
+        path = info.get('filepath') or info.get('_filename')
+        return [path] if path else []
 
     @staticmethod
     def _format_selector() -> str:
@@ -203,14 +486,57 @@ class YtDlpProvider(BaseProvider):
         )
         return 'best[ext=mp4]/best'
 
-    def download(self, url: str, output_path: str = '.', title: Optional[str] = None) -> str:
+    def prefetch(self, url: str) -> Prefetched:
+        """
+        Extract ``url``'s metadata now, for a download that starts later.
+
+        Runs the page and API round trips of extraction — but not format
+        selection, which needs the download's options — so a caller can do it
+        for upcoming jobs while earlier ones are still downloading. The media
+        URLs inside are often signed and expire, so the result should be
+        downloaded within minutes.
+
+        Returns:
+            The metadata, for ``download_all(prefetched=...)``
+
+        Raises:
+            ExtractionError: If extraction fails (the download will then
+                extract again, with its usual retries)
+        """
+        session = self.cookie_pool.acquire() if self.cookie_pool else None
+        route = self.route_pool.acquire() if self.route_pool else None
+        started = time.monotonic()
+        opts = {'quiet': True, 'no_warnings': True}
+        if route:
+            opts.update(route.ydl_options())
+        try:
+            info = self._resolve_hedged(url, opts, session)
+        except Exception as e:
+            self._attempt_finished(url, route, started, ok=False,
+                                   throttled=_is_rate_limited(str(e)), auth=_is_auth_error(str(e)),
+                                   extraction=_is_extraction_error(e))
+            raise ExtractionError(f"Failed to prefetch {url}: {e}") from e
+        return Prefetched(self, url, info, session, route, started)
+
+    def download(self, url: str, output_path: str = '.', title: Optional[str] = None,
+                 format_id: Optional[str] = None,
+                 before_download: Optional[Callable[[Dict], None]] = None,
+                 **options) -> str:
         """
         Download video using yt-dlp with retry logic.
 
+        For a multi-part post this downloads every part (see ``download_all()``)
+        and returns the first.
+
         Args:
             url: The video URL
             output_path: Directory to save the video
             title: Optional custom title for the file
+            format_id: Download exactly this format (e.g. ``137+140``) instead of
+                running format selection. Pass the id recorded from an earlier,
+                interrupted attempt so yt-dlp continues the same ``.part`` file.
+            before_download: Called with the info dict once the format and
+                output filename are fixed, before any media is transferred
 
         Returns:
             Path to the downloaded file
@@ -219,6 +545,50 @@ class YtDlpProvider(BaseProvider):
             AuthenticationRequiredError: If the platform refuses anonymous access
             DownloadError: If download fails after all retries
         """
+        return self.download_all(url, output_path, title, format_id=format_id,
+                                 before_download=before_download, **options)[0]
+
+    def download_all(self, url: str, output_path: str = '.', title: Optional[str] = None,
+                     format_id: Optional[str] = None,
+                     entry_formats: Optional[List[Optional[str]]] = None,
+                     before_download: Optional[Callable[[Dict], None]] = None,
+                     prefetched: Optional[Prefetched] = None,
+                     deadline: Optional[float] = None,
+                     **options) -> List[str]:
+        """
+        Download every file behind a URL, with retry logic.
+
+        A single video yields one file. The entries of a playlist or
+        ``multi_video`` result (an Instagram carousel, a multi-part tweet) are
+        downloaded concurrently, up to ``entry_workers`` at a time, as
+        ``<title> - 01.<ext>``, ``<title> - 02.<ext>``, ... A retry after a
+        partial failure skips the entries already on disk.
+
+        Args:
+            url: The video URL
+            output_path: Directory to save the files
+            title: Optional custom title for the files
+            format_id: See ``download()``
+            entry_formats: The formats recorded for the entries of an
+                interrupted multi-part download, in entry order; each entry
+                with one is pinned to it, like ``format_id`` for a single video
+            before_download: See ``download()``; called once per entry, whose
+                info dict then carries its ``playlist_index`` (from 1)
+            prefetched: Metadata from ``prefetch()``. The first attempt starts
+                from it, over the same session and route, instead of
+                extracting; retries extract afresh.
+            deadline: Time (as from ``time.time()``) by which to give up. A
+                transfer still running then is aborted, keeping its ``.part``
+                file, and no retry starts whose backoff would end past it.
+
+        Returns:
+            Paths of the downloaded files, in entry order
+
+        Raises:
+            AuthenticationRequiredError: If the platform refuses anonymous access
+            DeadlineExceededError: If ``deadline`` passed first
+            DownloadError: If download fails after all retries
+        """
         # Ensure output directory exists
         os.makedirs(output_path, exist_ok=True)
 
@@ -231,51 +601,82 @@ class YtDlpProvider(BaseProvider):
         # separate video+audio streams merged locally. Platforms such as Instagram
         # serve DASH-only streams for some posts, where a bare `best` finds nothing.
         ydl_opts = {
-            'format': self._format_selector(),
-            'outtmpl': output_base + '.%(ext)s',
+            'format': format_id or self._format_selector(),
+            # '%' is template syntax to yt-dlp; a literal one in a title must be doubled
+            'outtmpl': output_base.replace('%', '%%') + '.%(ext)s',
             'merge_output_format': 'mp4',
             'quiet': False,
             'no_warnings': False,
             'retries': self.max_retries,
             'fragment_retries': self.max_retries,
             'http_chunk_size': 10485760,  # 10MB chunks
+            # Holds every transfer in the process to the shared download limit
+            'progress_hooks': [progress_hook(self.bandwidth.download)],
         }
-
-        # Optional cookies file for platforms that require authentication (e.g. Instagram, Facebook)
-        cookies_file = os.environ.get('COOKIES_FILE')
-        if cookies_file and os.path.exists(cookies_file):
-            ydl_opts['cookiefile'] = cookies_file
-            logger.info(f"Using cookies file: {cookies_file}")
+        deadline = Deadline(deadline)
+        if deadline.at is not None:
+            ydl_opts['progress_hooks'].append(deadline.progress_hook())
 
         # Retry logic with exponential backoff
         last_error = None
+        attempts = 0
+        deadline.check(f"Not downloading {url}")
+        if prefetched is not None and not prefetched.claim():
+            prefetched = None
         for attempt in range(self.max_retries):
+            info = None
+            if attempt == 0 and prefetched is not None:
+                session, route = prefetched.session, prefetched.route
+                started, info = prefetched.started, prefetched.info
+            else:
+                # Optional logged-in session for platforms that require
+                # authentication (e.g. Instagram, Facebook). Taken per attempt,
+                # so a retry after a throttle moves on to another account.
+                session = self.cookie_pool.acquire() if self.cookie_pool else None
+                # Optional egress route (proxy or source address), likewise per attempt
+                route = self.route_pool.acquire() if self.route_pool else None
+                started = time.monotonic()
+            attempts += 1
             try:
-                logger.info(f"Download attempt {attempt + 1}/{self.max_retries} for {url}")
+                logger.info(f"Download attempt {attempt + 1}/{self.max_retries} for {url}"
+                            + (f" with cookies {session.name}" if session else "")
+                            + (f" via {route.name}" if route else ""))
 
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=True)
-
-                # Ask yt-dlp where it actually put the file rather than guessing:
+                # Ask yt-dlp where it actually put the files rather than guessing:
                 # the extension is decided at download time and post-processors
                 # (e.g. the mp4 merger) may rename the result.
-                filepath = self._resolve_filepath(info)
-                if filepath and os.path.exists(filepath):
-                    logger.info(f"Successfully downloaded to {filepath}")
-                    return filepath
+                attempt_opts = dict(ydl_opts, **route.ydl_options()) if route else ydl_opts
+                filepaths = self._download_watched(url, attempt_opts, before_download, session,
+                                                   info, entry_formats)
+                missing = [path for path in filepaths if not os.path.exists(path)]
+
+                if filepaths and not missing:
+                    logger.info(f"Successfully downloaded to {', '.join(filepaths)}")
+                    self._attempt_finished(url, route, started, filepaths)
+                    return filepaths
 
-                if filepath:
+                if missing:
                     raise DownloadError(
-                        f"Download reported success but the file is missing: {filepath}"
+                        f"Download reported success but the file is missing: {missing[0]}"
                     )
                 raise DownloadError(
                     "Download reported success but yt-dlp named no output file "
                     f"(expected something under {output_base}.*)"
                 )
 
-            except DownloadError:
-                raise
             except Exception as e:
+                if deadline.expired():
+                    # Not the platform's fault: leave breakers and routes out of it
+                    self._release_route(route, started)
+                    raise DeadlineExceededError(f"Download of {url} stopped: deadline passed "
+                                                f"({e})") from e
+                if isinstance(e, DownloadError) and not isinstance(e, DownloadStalledError):
+                    self._attempt_finished(url, route, started, ok=False)
+                    raise
+                self._attempt_finished(url, route, started, ok=False,
+                                       throttled=_is_rate_limited(str(e)),
+                                       auth=_is_auth_error(str(e)),
+                                       extraction=_is_extraction_error(e))
                 if _is_auth_error(str(e)):
                     raise AuthenticationRequiredError(
                         _auth_required_message(url, e)
@@ -283,9 +684,20 @@ class YtDlpProvider(BaseProvider):
 
                 last_error = e
                 logger.warning(f"Attempt {attempt + 1} failed: {e}")
+                if session and _is_rate_limited(str(e)):
+                    self.cookie_pool.throttled(session)
 
                 if attempt < self.max_retries - 1:
+                    if self._retry_gate and not self._retry_gate(url):
+                        logger.warning(f"Not retrying {url}: its circuit is open or the "
+                                       f"retry budget is spent")
+                        break
                     delay = self.retry_delay * (2 ** attempt)
+                    if not deadline.allows(delay):
+                        raise DeadlineExceededError(
+                            f"Not retrying {url}: {deadline.remaining():.0f}s left before "
+                            f"the deadline, backoff is {delay}s (last error: {e})"
+                        ) from e
                     logger.info(f"Retrying in {delay} seconds...")
                     time.sleep(delay)
 
@@ -293,11 +705,177 @@ class YtDlpProvider(BaseProvider):
         # longer plausibly transient — surface it as "needs cookies" so the caller
         # exits 3 and the operator gets the actionable message.
         if last_error is not None and _is_rate_limited(str(last_error)):
-            logger.error(f"Still refused after {self.max_retries} attempts: {last_error}")
+            logger.error(f"Still refused after {attempts} attempt(s): {last_error}")
             raise AuthenticationRequiredError(
                 _auth_required_message(url, last_error)
             ) from last_error
 
-        error_msg = f"Failed to download after {self.max_retries} attempts: {last_error}"
+        error_msg = f"Failed to download after {attempts} attempt(s): {last_error}"
         logger.error(error_msg)
         raise DownloadError(error_msg)
+
+    def add_listener(self, listener: Callable[[Dict], None]):
+        """
+        Have ``listener`` called after every download attempt.
+
+        It receives ``url``, ``ok``, ``throttled`` (the platform rate-limited
+        the attempt), ``auth`` (it demanded a login), ``extraction`` (it
+        failed to serve the metadata), ``bytes`` written and ``seconds``
+        taken — e.g. for ``concurrency.AIMDController.observe``.
+        """
+        self._listeners.append(listener)
+
+    def set_retry_gate(self, gate: Optional[Callable[[str], bool]]):
+        """
+        Ask ``gate(url)`` before every retry; a False answer ends the download
+        with the last attempt's error (e.g. ``VideoDownloader``'s circuit
+        breaker and retry budget).
+        """
+        self._retry_gate = gate
+
+    def _attempt_finished(self, url: str, route: Optional[Route], started: float,
+                          filepaths: List[str] = (), ok: bool = True,
+                          throttled: bool = False, auth: bool = False,
+                          extraction: bool = False):
+        """Report an attempt's outcome to the route pool and the listeners."""
+        nbytes = sum(os.path.getsize(path) for path in filepaths if os.path.exists(path))
+        seconds = time.monotonic() - started
+        if route is not None:
+            self.route_pool.release(route, seconds, nbytes, ok=ok, throttled=throttled)
+        attempt = {'url': url, 'ok': ok, 'throttled': throttled, 'auth': auth,
+                   'extraction': extraction, 'bytes': nbytes, 'seconds': seconds}
+        for listener in self._listeners:
+            try:
+                listener(attempt)
+            except Exception as e:
+                logger.warning(f"Attempt listener failed: {e}")
+
+    def _release_route(self, route: Optional[Route], started: float,
+                       filepaths: List[str] = (), ok: bool = True, throttled: bool = False):
+        """Report an attempt's outcome and throughput to the route pool."""
+        if route is None:
+            return
+        nbytes = sum(os.path.getsize(path) for path in filepaths if os.path.exists(path))
+        self.route_pool.release(route, time.monotonic() - started, nbytes,
+                                ok=ok, throttled=throttled)
+
+    def _resolve(self, ydl, url: str) -> Optional[Dict]:
+        """Extract ``url`` without processing, following redirects to the result."""
+        info = self._extract(ydl, url, download=False, process=False)
+        # Follow redirects (short links, embeds) to the result they stand for,
+        # so a container behind one is still split up
+        while info and info.get('_type') == 'url':
+            info = ydl.extract_info(info['url'], download=False, process=False,
+                                    ie_key=info.get('ie_key'))
+        return info
+
+    def _resolve_hedged(self, url: str, ydl_opts: Dict,
+                        session: Optional[CookieSession] = None) -> Optional[Dict]:
+        """
+        ``_resolve()`` on a YoutubeDL of its own, hedged by ``hedger`` if slow.
+
+        Each copy gets its own instance (they are not thread-safe) but the
+        same session and route: media URLs are often signed for the address
+        that extracted them, so the winner's must stay downloadable there.
+        """
+        def resolve():
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                if session:
+                    ydl.cookiejar = session.jar
+                return self._resolve(ydl, url)
+
+        if not self.hedger:
+            return resolve()
+        return self.hedger.run(f"resolve:{platform_of(url)}", resolve)
+
+    def _download_watched(self, url: str, ydl_opts: Dict,
+                          before_download: Optional[Callable[[Dict], None]],
+                          session: Optional[CookieSession] = None,
+                          info: Optional[Dict] = None,
+                          entry_formats: Optional[List[Optional[str]]] = None) -> List[str]:
+        """
+        ``_download_once()`` under a ``StallMonitor``, restarting stalled transfers.
+
+        A restart goes straight back in, without the retry backoff. It
+        extracts afresh, so the media URLs may now point at another CDN host,
+        and yt-dlp resumes from the ``.part`` file. A stall that outlasts
+        ``stall_restarts`` restarts fails the attempt like a network error.
+        """
+        if not self.stall_speed:
+            return self._download_once(url, ydl_opts, before_download, session, info,
+                                       entry_formats)
+        bucket = self.bandwidth.download
+        # Waiting on the bandwidth limit is slowness on purpose, not a stall
+        def clock():
+            return time.monotonic() - bucket.thread_waited()
+
+        for restart in range(self.stall_restarts + 1):
+            monitor = StallMonitor(self.stall_speed, self.stall_window, clock)
+            hooks = list(ydl_opts.get('progress_hooks', [])) + [monitor]
+            opts = dict(ydl_opts, progress_hooks=hooks)
+            try:
+                return self._download_once(url, opts, before_download, session,
+                                           info if restart == 0 else None, entry_formats)
+            except Exception:
+                if monitor.stalled is None or restart == self.stall_restarts:
+                    raise
+                logger.warning(f"{monitor.stalled}; restarting the download "
+                               f"({restart + 1}/{self.stall_restarts})")
+
+    def _download_once(self, url: str, ydl_opts: Dict,
+                       before_download: Optional[Callable[[Dict], None]],
+                       session: Optional[CookieSession] = None,
+                       info: Optional[Dict] = None,
+                       entry_formats: Optional[List[Optional[str]]] = None) -> List[str]:
+        """
+        One attempt at fetching everything behind ``url``.
+
+        The URL is resolved without processing first (unless ``info`` already
+        holds that resolution), so a container's entries can each be handed to
+        their own YoutubeDL (instances are not thread-safe) and fetched in
+        parallel.
+
+        Returns:
+            The paths yt-dlp reports having written, in entry order
+        """
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            if session:
+                # Share the session's already-parsed jar instead of re-reading the file
+                ydl.cookiejar = session.jar
+            if before_download:
+                ydl.add_post_processor(_before_download_pp(before_download), when='before_dl')
+            if info is None:
+                info = (self._resolve_hedged(url, ydl_opts, session) if self.hedger
+                        else self._resolve(ydl, url))
+
+            entries = None
+            if info and info.get('_type') in ('playlist', 'multi_video'):
+                entries = [entry for entry in info.get('entries') or [] if entry]
+            if not entries or len(entries) == 1:
+                return self._resolve_filepaths(
+                    ydl.process_ie_result(entries[0] if entries else info, download=True)
+                )
+
+        logger.info(f"{url} has {len(entries)} entries, downloading up to "
+                    f"{self.entry_workers} at a time")
+        base = ydl_opts['outtmpl'][:-len('.%(ext)s')]
+        width = max(2, len(str(len(entries))))
+
+        def download_entry(index: int, entry: Dict) -> List[str]:
+            opts = dict(ydl_opts, outtmpl=f"{base} - {index:0{width}d}.%(ext)s")
+            if entry_formats and index <= len(entry_formats) and entry_formats[index - 1]:
+                opts['format'] = entry_formats[index - 1]
+            entry = _entry_info(info, entry, index, len(entries))
+            with yt_dlp.YoutubeDL(opts) as entry_ydl:
+                if session:
+                    entry_ydl.cookiejar = session.jar
+                if before_download:
+                    entry_ydl.add_post_processor(
+                        _before_download_pp(before_download), when='before_dl')
+                return self._resolve_filepaths(
+                    entry_ydl.process_ie_result(entry, download=True)
+                )
+
+        with ThreadPoolExecutor(max_workers=self.entry_workers) as executor:
+            results = list(executor.map(download_entry, range(1, len(entries) + 1), entries))
+        return [path for paths in results for path in paths]
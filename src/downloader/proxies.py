@@ -0,0 +1,224 @@
+"""Pool of egress routes (proxies or local source addresses) scored by health."""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest observation in the moving averages
+_EWMA_ALPHA = 0.3
+
+
+class Route:
+    """One way out to the network, and how well it has been doing."""
+
+    def __init__(self, proxy: Optional[str] = None, source_address: Optional[str] = None):
+        """
+        Args:
+            proxy: Proxy URL (``http://``, ``socks5://``...) for yt-dlp's ``proxy``
+            source_address: Local IP to bind, for hosts with several addresses
+        """
+        self.proxy = proxy
+        self.source_address = source_address
+
+        self.health = 1.0           # EWMA of success (1) / failure (0)
+        self.latency: Optional[float] = None      # EWMA seconds per request
+        self.throughput: Optional[float] = None   # EWMA bytes per second
+        self.samples = 0
+        self.active = 0
+        self.evicted_until = 0.0
+        self.evictions = 0
+
+    @classmethod
+    def parse(cls, spec: str) -> 'Route':
+        """
+        Build a route from its configuration string.
+
+        ``direct`` is the default route, a URL (``scheme://...``) is a proxy and
+        anything else is a local source address.
+        """
+        spec = spec.strip()
+        if spec == 'direct':
+            return cls()
+        if '://' in spec:
+            return cls(proxy=spec)
+        return cls(source_address=spec)
+
+    @property
+    def name(self) -> str:
+        return self.proxy or self.source_address or 'direct'
+
+    def ydl_options(self) -> Dict:
+        """Return the yt-dlp options sending traffic through this route."""
+        options = {}
+        if self.proxy:
+            options['proxy'] = self.proxy
+        if self.source_address:
+            options['source_address'] = self.source_address
+        return options
+
+    def __repr__(self):
+        return f"Route({self.name!r}, health={self.health:.2f})"
+
+
+class RoutePool:
+    """
+    Spread downloads over several egress routes and drop the bad ones.
+
+    Every finished request reports back how long it took, how many bytes it
+    moved and whether it was throttled. From that each route keeps a health
+    score and moving averages of latency and throughput. ``acquire()`` hands
+    out the healthy route with the best expected throughput per active
+    download, trying unmeasured routes first.
+
+    A route is evicted — left out of rotation for ``cooldown`` seconds,
+    doubling on each repeat — when it is throttled, when its health falls
+    below ``min_health``, or when its throughput drops below ``slow_ratio``
+    of the best route's. If every route is evicted, the one due back first is
+    used rather than none.
+    """
+
+    def __init__(self,
+                 routes: List[Route],
+                 cooldown: float = 300,
+                 max_cooldown: float = 3600,
+                 min_health: float = 0.3,
+                 slow_ratio: float = 0.2,
+                 min_samples: int = 3):
+        """
+        Initialize the pool.
+
+        Args:
+            routes: Routes to spread traffic over
+            cooldown: Seconds an evicted route first sits out
+            max_cooldown: Upper bound on the doubled cooldown
+            min_health: Health below which a route is evicted
+            slow_ratio: Fraction of the best throughput below which a route is
+                evicted as slow
+            min_samples: Observations a route needs before health or speed can
+                evict it (a throttle evicts straight away)
+        """
+        self.routes = routes
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.min_health = min_health
+        self.slow_ratio = slow_ratio
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional['RoutePool']:
+        """
+        Build the pool described by ``PROXIES``: comma-separated proxy URLs,
+        source addresses, or ``direct``.
+
+        Returns:
+            The pool, or None if ``PROXIES`` is unset or empty
+        """
+        specs = [spec for spec in os.environ.get('PROXIES', '').split(',') if spec.strip()]
+        if not specs:
+            return None
+        routes = [Route.parse(spec) for spec in specs]
+        logger.info(f"Route pool: {', '.join(route.name for route in routes)}")
+        return cls(routes)
+
+    def acquire(self) -> Optional[Route]:
+        """
+        Pick the route for the next request; pass it back to ``release()``.
+
+        Returns:
+            A route, or None if the pool is empty
+        """
+        with self._lock:
+            if not self.routes:
+                return None
+            now = time.monotonic()
+            ready = [route for route in self.routes if route.evicted_until <= now]
+            if ready:
+                route = max(ready, key=self._score)
+            else:
+                route = min(self.routes, key=lambda r: r.evicted_until)
+                logger.warning(f"Every route is evicted; using {route.name}")
+            route.active += 1
+            return route
+
+    @staticmethod
+    def _score(route: Route) -> tuple:
+        # An idle, unmeasured route is worth trying before settling on known ones
+        untried = route.throughput is None and route.active == 0
+        expected = route.health * (route.throughput or 0) / (1 + route.active)
+        return untried, expected, -route.active
+
+    def release(self, route: Route, seconds: float, nbytes: int = 0,
+                ok: bool = True, throttled: bool = False):
+        """
+        Report how a request over ``route`` went.
+
+        Args:
+            route: The route from ``acquire()``
+            seconds: How long the request took
+            nbytes: Bytes it transferred
+            ok: Whether it succeeded
+            throttled: Whether the platform rate-limited it
+        """
+        with self._lock:
+            route.active -= 1
+            route.samples += 1
+            route.health = _ewma(route.health, 1.0 if ok else 0.0)
+            route.latency = _ewma(route.latency, seconds)
+            if ok and nbytes and seconds > 0:
+                route.throughput = _ewma(route.throughput, nbytes / seconds)
+
+            reason = self._eviction_reason(route, throttled)
+            if reason:
+                self._evict(route, reason)
+            elif ok:
+                route.evictions = 0
+
+    def _eviction_reason(self, route: Route, throttled: bool) -> Optional[str]:
+        """Decide whether a route should leave rotation. Caller holds the lock."""
+        if throttled:
+            return 'throttled'
+        if route.samples < self.min_samples:
+            return None
+        if route.health < self.min_health:
+            return f"health {route.health:.2f}"
+        measured = [r.throughput for r in self.routes if r.throughput is not None]
+        if route.throughput is not None and len(measured) > 1:
+            best = max(measured)
+            if route.throughput < self.slow_ratio * best:
+                return f"slow ({route.throughput:.0f} B/s vs {best:.0f} B/s)"
+        return None
+
+    def _evict(self, route: Route, reason: str):
+        """Take a route out of rotation. Caller holds the lock."""
+        duration = min(self.cooldown * 2 ** route.evictions, self.max_cooldown)
+        route.evicted_until = time.monotonic() + duration
+        route.evictions += 1
+        # Back in rotation with a clean slate; a repeat offence evicts it again
+        route.health = 1.0
+        route.throughput = None
+        route.samples = 0
+        logger.warning(f"Route {route.name} evicted for {duration:.0f}s: {reason}")
+
+    def stats(self) -> List[Dict]:
+        """Return a snapshot of every route's scores."""
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                'route': route.name,
+                'health': route.health,
+                'latency': route.latency,
+                'throughput': route.throughput,
+                'active': route.active,
+                'evicted': route.evicted_until > now,
+            } for route in self.routes]
+
+
+def _ewma(current: Optional[float], value: float) -> float:
+    if current is None:
+        return value
+    return (1 - _EWMA_ALPHA) * current + _EWMA_ALPHA * value
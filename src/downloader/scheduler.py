@@ -0,0 +1,282 @@
+"""Order batch jobs by expected size and forecast when the batch will finish."""
+
+import heapq
+import statistics
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+
+from .utils import platform_of
+
+FIFO = 'fifo'
+LONGEST = 'longest'
+SHORTEST = 'shortest'
+ORDERS = (FIFO, LONGEST, SHORTEST)
+
+# Assumed download speed of one worker, in bytes per second
+DEFAULT_THROUGHPUT = 5 * 2**20
+# Seconds each job spends on things other than moving bytes (extraction,
+# upload round trips)
+JOB_OVERHEAD = 5.0
+# Size assumed for a job nothing is known about, when no other job is known either
+DEFAULT_JOB_BYTES = 50 * 2**20
+
+
+def order_jobs(jobs: List[Dict], sizes: Dict[str, int], order: str = FIFO) -> List[Dict]:
+    """
+    Put jobs in the order they should start.
+
+    ``longest`` starts the biggest jobs first, so no large download is left
+    running alone at the end of the batch (shortest makespan). ``shortest``
+    starts the smallest first, so jobs finish sooner on average (shortest
+    mean completion time). ``fifo`` keeps the queue order. Ties keep queue
+    order.
+
+    Args:
+        jobs: Job records, in queue order
+        sizes: Expected bytes per job id
+        order: One of ``ORDERS``
+
+    Returns:
+        The jobs, reordered
+
+    Raises:
+        ValueError: On an unknown order
+    """
+    if order not in ORDERS:
+        raise ValueError(f"Unknown job order {order!r}; expected one of {', '.join(ORDERS)}")
+    if order == LONGEST:
+        return sorted(jobs, key=lambda job: -sizes[job['id']])
+    if order == SHORTEST:
+        return sorted(jobs, key=lambda job: sizes[job['id']])
+    return list(jobs)
+
+
+def plan(jobs: List[Dict],
+         order: str = FIFO,
+         workers: int = 1,
+         throughput: float = DEFAULT_THROUGHPUT,
+         overhead: float = JOB_OVERHEAD) -> Dict:
+    """
+    Simulate a batch run and forecast its timing.
+
+    Each job's size is its ``est_bytes``. A job with no estimate is assumed
+    to be the median of the known ones. Workers take the next job as soon as
+    they are free, as ``BatchRunner`` does.
+
+    Args:
+        jobs: Job records, in queue order
+        order: One of ``ORDERS``
+        workers: Jobs downloaded at once
+        throughput: Bytes per second one worker downloads
+        overhead: Seconds added to every job
+
+    Returns:
+        ``jobs`` (one entry per job in start order, with ``job``, ``bytes``,
+        ``estimated``, ``worker``, ``start`` and ``finish`` in seconds from the
+        start of the run), ``total_bytes``, ``unknown`` (jobs without an
+        estimate), ``makespan`` and ``mean_completion`` (seconds)
+    """
+    known = [job['est_bytes'] for job in jobs if job.get('est_bytes') is not None]
+    fallback = int(statistics.median(known)) if known else DEFAULT_JOB_BYTES
+    sizes = {job['id']: job['est_bytes'] if job.get('est_bytes') is not None else fallback
+             for job in jobs}
+
+    free = [(0.0, worker) for worker in range(max(1, workers))]
+    entries = []
+    for job in order_jobs(jobs, sizes, order):
+        start, worker = heapq.heappop(free)
+        finish = start + overhead + sizes[job['id']] / throughput
+        heapq.heappush(free, (finish, worker))
+        entries.append({
+            'job': job,
+            'bytes': sizes[job['id']],
+            'estimated': job.get('est_bytes') is not None,
+            'worker': worker,
+            'start': start,
+            'finish': finish,
+        })
+
+    return {
+        'order': order,
+        'workers': max(1, workers),
+        'jobs': entries,
+        'total_bytes': sum(sizes.values()),
+        'unknown': len(jobs) - len(known),
+        'makespan': max((entry['finish'] for entry in entries), default=0.0),
+        'mean_completion': (statistics.mean(entry['finish'] for entry in entries)
+                            if entries else 0.0),
+    }
+
+
+def format_plan(batch_plan: Dict, started: Optional[float] = None) -> str:
+    """
+    Render a plan from ``plan()`` as a table.
+
+    Args:
+        batch_plan: The plan
+        started: Epoch time the run starts, to print the expected end as a
+            clock time (default: durations only)
+    """
+    lines = [f"{'#':>3}  {'size':>9}  {'start':>8}  {'finish':>8}  title"]
+    for index, entry in enumerate(batch_plan['jobs'], 1):
+        size = _format_bytes(entry['bytes']) + ('' if entry['estimated'] else '?')
+        title = entry['job'].get('title') or entry['job']['url']
+        lines.append(f"{index:>3}  {size:>9}  {_format_seconds(entry['start']):>8}  "
+                     f"{_format_seconds(entry['finish']):>8}  {title}")
+
+    summary = (f"{len(batch_plan['jobs'])} job(s), {_format_bytes(batch_plan['total_bytes'])} "
+               f"over {batch_plan['workers']} worker(s) in {batch_plan['order']} order: "
+               f"done in {_format_seconds(batch_plan['makespan'])}")
+    if started is not None:
+        summary += time.strftime(' (around %H:%M)', time.localtime(started + batch_plan['makespan']))
+    summary += f", mean completion {_format_seconds(batch_plan['mean_completion'])}"
+    if batch_plan['unknown']:
+        summary += f"; {batch_plan['unknown']} size(s) unknown (?), assumed typical"
+    return '\n'.join(lines + [summary])
+
+
+def parse_platform_values(text: Optional[str]) -> Dict[str, float]:
+    """
+    Parse per-platform settings such as ``"2,instagram=1,youtube=3"``.
+
+    A bare number applies to every platform not named, and is returned under
+    the key ``*``.
+
+    Raises:
+        ValueError: If an entry is not a number or ``platform=number``
+    """
+    values = {}
+    for item in (text or '').split(','):
+        if not item.strip():
+            continue
+        platform, _, value = item.rpartition('=')
+        try:
+            values[platform.strip().lower() or '*'] = float(value)
+        except ValueError:
+            raise ValueError(f"Not a platform setting: {item.strip()!r}") from None
+    return values
+
+
+class FairScheduler:
+    """
+    Hand jobs to workers fairly across platforms.
+
+    Jobs are queued per platform (``platform_of()`` their URL), keeping their
+    given order within each queue, and taken from the queues by deficit round
+    robin: each visit earns a platform its weight in credit, and starting a
+    job costs one. A platform of weight 2 thus starts twice as many jobs as
+    one of weight 1 while both have work.
+
+    ``max_active`` caps how many of a platform's jobs run at once. When one
+    platform is throttled and its jobs sit in retry and backoff, they hold at
+    most that many workers, and the other platforms keep the rest.
+
+    Workers call ``acquire()`` for their next job and ``release()`` it when
+    it no longer needs its slot.
+    """
+
+    def __init__(self,
+                 jobs: List[Dict],
+                 weights: Optional[Dict[str, float]] = None,
+                 max_active: Optional[Dict[str, float]] = None,
+                 key: Callable[[Dict], str] = lambda job: platform_of(job['url'])):
+        """
+        Initialize the scheduler.
+
+        Args:
+            jobs: Jobs to hand out, in the order wanted within each platform
+            weights: Share per platform; ``*`` sets the default (1)
+            max_active: Cap on running jobs per platform; ``*`` sets the
+                default (none)
+            key: Names a job's platform
+
+        Raises:
+            ValueError: On a weight or cap that is not positive
+        """
+        weights = weights or {}
+        max_active = max_active or {}
+        if any(value <= 0 for value in list(weights.values()) + list(max_active.values())):
+            raise ValueError("Platform weights and caps must be positive")
+        self.key = key
+        self._weight_spec = weights
+        self._queues: Dict[str, deque] = OrderedDict()
+        for job in jobs:
+            self._queues.setdefault(key(job), deque()).append(job)
+        self._platforms = list(self._queues)
+        self._weights = {p: weights.get(p, weights.get('*', 1.0)) for p in self._platforms}
+        self._caps = {p: max_active.get(p, max_active.get('*')) for p in self._platforms}
+        self._active = {p: 0 for p in self._platforms}
+        self._deficit = {p: 0.0 for p in self._platforms}
+        self._cursor = 0
+        if self._platforms:
+            self._deficit[self._platforms[0]] = self._weights[self._platforms[0]]
+        self._cond = threading.Condition()
+
+    def preview(self) -> List[Dict]:
+        """Return the jobs not yet handed out, in the order they start if no cap is reached."""
+        with self._cond:
+            pending = [job for queue in self._queues.values() for job in queue]
+        preview = FairScheduler(pending, self._weight_spec, key=self.key)
+        jobs = []
+        job = preview._pick()
+        while job is not None:
+            jobs.append(job)
+            job = preview._pick()
+        return jobs
+
+    def acquire(self) -> Optional[Dict]:
+        """
+        Wait until a job may start, and return it.
+
+        Returns:
+            The next job, or None once every job has been handed out
+        """
+        with self._cond:
+            while any(self._queues.values()):
+                job = self._pick()
+                if job is not None:
+                    self._active[self.key(job)] += 1
+                    return job
+                self._cond.wait()
+            return None
+
+    def release(self, job: Dict):
+        """Free the slot ``job`` held on its platform."""
+        with self._cond:
+            self._active[self.key(job)] -= 1
+            self._cond.notify_all()
+
+    def _ready(self, platform: str) -> bool:
+        cap = self._caps[platform]
+        return bool(self._queues[platform]) and (cap is None or self._active[platform] < cap)
+
+    def _pick(self) -> Optional[Dict]:
+        """Take the next job by deficit round robin, or None if every platform is capped."""
+        if not any(self._ready(platform) for platform in self._platforms):
+            return None
+        while True:
+            platform = self._platforms[self._cursor]
+            if self._ready(platform) and self._deficit[platform] >= 1:
+                self._deficit[platform] -= 1
+                return self._queues[platform].popleft()
+            if not self._queues[platform]:
+                # An idle platform does not bank credit
+                self._deficit[platform] = 0.0
+            self._cursor = (self._cursor + 1) % len(self._platforms)
+            platform = self._platforms[self._cursor]
+            if self._ready(platform):
+                self._deficit[platform] += self._weights[platform]
+
+
+def _format_bytes(nbytes: float) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if nbytes < 1024 or unit == 'GiB':
+            return f"{nbytes:.0f} {unit}" if unit == 'B' else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
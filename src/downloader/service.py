@@ -0,0 +1,310 @@
+"""Long-running download service with a local HTTP/JSON job API."""
+
+import contextlib
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+from .bandwidth import BandwidthLimiter, shared_limiter
+from .concurrency import AIMDController
+from .core import VideoDownloader
+from .exceptions import DownloadError
+from .storage import StorageManager, estimate_size
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle as reported by the API
+QUEUED = 'queued'
+RUNNING = 'running'
+UPLOADING = 'uploading'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class DownloadService:
+    """
+    Run download jobs on a pool of warm worker threads.
+
+    The downloader, its providers and the uploader live for as long as the
+    service does, so interpreter start-up, imports and client construction
+    are paid once rather than for every video.
+    """
+
+    def __init__(self,
+                 downloader: VideoDownloader,
+                 uploader: Optional[Callable[[str], Optional[str]]] = None,
+                 workers: int = 2,
+                 max_history: int = 1000,
+                 storage: Optional[StorageManager] = None,
+                 concurrency: Optional[AIMDController] = None,
+                 bandwidth: Optional[BandwidthLimiter] = None):
+        """
+        Initialize the service.
+
+        Args:
+            downloader: Shared downloader used by every worker
+            uploader: Optional callable taking a file path and returning a remote
+                file id, or None when the upload failed
+            workers: Number of jobs processed concurrently
+            max_history: Finished jobs kept for status queries before the oldest
+                are forgotten
+            storage: Optional disk budget for the downloader's output directory;
+                uploaded files are freed through it
+            concurrency: Optional adaptive limit on downloads running at once,
+                below ``workers``; reported by ``/health``
+            bandwidth: Download and upload limits, reported by ``/health`` and
+                changed through ``/bandwidth`` (default: the process-wide ones)
+        """
+        self.downloader = downloader
+        self.uploader = uploader
+        self.workers = workers
+        self.max_history = max_history
+        self.storage = storage
+        self.concurrency = concurrency
+        self.bandwidth = bandwidth if bandwidth is not None else shared_limiter()
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='download')
+        self._lock = threading.Lock()
+        self._jobs: 'OrderedDict[str, Dict]' = OrderedDict()
+
+        for provider in downloader.providers:
+            warm_up = getattr(provider, 'warm_up', None)
+            if warm_up:
+                warm_up()
+
+        logger.info(f"DownloadService started with {workers} worker(s)")
+
+    def submit(self, url: str, title: Optional[str] = None) -> Dict:
+        """
+        Queue a download job.
+
+        Args:
+            url: The video URL
+            title: Optional custom title for the file
+
+        Returns:
+            A snapshot of the queued job
+        """
+        job = {
+            'id': uuid.uuid4().hex[:12],
+            'url': url,
+            'title': title,
+            'status': QUEUED,
+            'created_at': time.time(),
+        }
+        with self._lock:
+            self._jobs[job['id']] = job
+            self._forget_finished()
+            snapshot = dict(job)
+
+        self._executor.submit(self._run, job['id'])
+        logger.info(f"Queued job {job['id']} for {url}")
+        return snapshot
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return a snapshot of one job, or None if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self) -> List[Dict]:
+        """Return snapshots of every known job, oldest first."""
+        with self._lock:
+            return [dict(job) for job in self._jobs.values()]
+
+    def stats(self) -> Dict:
+        """Return job counts per status, bandwidth use, and concurrency and retry guards if set."""
+        counts = {status: 0 for status in (QUEUED, RUNNING, UPLOADING, DONE, FAILED)}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+        stats = {'workers': self.workers, 'jobs': counts, 'bandwidth': self.bandwidth.stats()}
+        if self.concurrency:
+            stats['concurrency'] = self.concurrency.stats()
+        if self.downloader.breaker:
+            stats['circuits'] = self.downloader.breaker.stats()
+        if self.downloader.retry_budget:
+            stats['retry_budget'] = self.downloader.retry_budget.stats()
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and optionally wait for running jobs."""
+        self._executor.shutdown(wait=wait)
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _forget_finished(self):
+        """Drop the oldest finished jobs beyond ``max_history``. Caller holds the lock."""
+        excess = len(self._jobs) - self.max_history
+        if excess <= 0:
+            return
+        for job_id in [j for j, job in self._jobs.items() if job['status'] in (DONE, FAILED)][:excess]:
+            del self._jobs[job_id]
+
+    def _run(self, job_id: str):
+        """Worker body: download, upload, and record the outcome."""
+        job = self.get(job_id)
+        self._update(job_id, status=RUNNING, started_at=time.time())
+
+        reservations = []
+        options = {}
+        if self.storage:
+            options['before_download'] = lambda info: reservations.append(
+                self.storage.reserve(estimate_size(info)))
+
+        try:
+            with self.concurrency or contextlib.nullcontext():
+                result = self.downloader.download(job['url'], job['title'], **options)
+        except Exception as e:
+            # DownloadError and its subclasses (auth, unsupported, duplicate) are
+            # expected outcomes; anything else is a bug worth a traceback.
+            if not isinstance(e, DownloadError):
+                logger.error(f"Job {job_id} crashed: {e}", exc_info=True)
+            self._fail(job_id, e)
+            return
+        finally:
+            for reservation in reservations:
+                self.storage.cancel(reservation)
+
+        if not result['success']:
+            self._update(job_id, status=FAILED, error=result.get('error'),
+                         error_type='DownloadError', finished_at=time.time())
+            return
+
+        filepaths = result.get('filepaths') or [result['filepath']]
+        if self.storage:
+            for path in filepaths:
+                self.storage.track(path)
+        self._update(job_id, filepath=filepaths[0], filepaths=filepaths,
+                     canonical_id=result.get('canonical_id'))
+
+        if self.uploader is not None:
+            self._update(job_id, status=UPLOADING)
+            remote_ids = []
+            # Each part of a multi-part post is its own upload
+            for path in filepaths:
+                try:
+                    remote_id = self.uploader(path)
+                except Exception as e:
+                    logger.error(f"Job {job_id} upload crashed: {e}", exc_info=True)
+                    remote_id = None
+                if not remote_id:
+                    self._update(job_id, status=FAILED, error=f'upload failed: {path}',
+                                 error_type='UploadError', remote_ids=remote_ids,
+                                 finished_at=time.time())
+                    return
+                remote_ids.append(remote_id)
+                if self.storage:
+                    self.storage.release(path)
+            self._update(job_id, remote_id=remote_ids[0], remote_ids=remote_ids)
+
+        self._update(job_id, status=DONE, finished_at=time.time())
+
+    def _fail(self, job_id: str, error: Exception):
+        self._update(job_id, status=FAILED, error=str(error),
+                     error_type=type(error).__name__, finished_at=time.time())
+
+
+class _JobAPIHandler(BaseHTTPRequestHandler):
+    """HTTP front end for a DownloadService (set as ``server.service``)."""
+
+    server_version = 'paola-video-downloader'
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        service = self.server.service
+        path = self.path.rstrip('/')
+
+        if path == '/health':
+            self._send_json(200, dict(service.stats(), status='ok'))
+        elif path == '/jobs':
+            self._send_json(200, service.list_jobs())
+        elif path == '/bandwidth':
+            self._send_json(200, service.bandwidth.stats())
+        elif path.startswith('/jobs/'):
+            job = service.get(path[len('/jobs/'):])
+            if job is None:
+                self._send_json(404, {'error': 'unknown job'})
+            else:
+                self._send_json(200, job)
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        path = self.path.rstrip('/')
+        if path not in ('/jobs', '/bandwidth'):
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            data = json.loads(self.rfile.read(length) or b'{}')
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {'error': f'invalid JSON: {e}'})
+            return
+
+        if path == '/bandwidth':
+            bandwidth = self.server.service.bandwidth
+            try:
+                if not isinstance(data, dict):
+                    raise ValueError("expected an object")
+                bandwidth.set_limits(**data)
+            except (TypeError, ValueError) as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            self._send_json(200, bandwidth.stats())
+            return
+
+        url = data.get('link') if isinstance(data, dict) else None
+        if not isinstance(url, str) or not url.strip().startswith(('http://', 'https://')):
+            self._send_json(400, {'error': "'link' must be an http(s) URL"})
+            return
+
+        job = self.server.service.submit(url.strip(), data.get('title') or 'video')
+        self._send_json(202, job)
+
+
+def make_server(service: DownloadService, host: str = '127.0.0.1', port: int = 8765) -> ThreadingHTTPServer:
+    """
+    Build (but do not start) the HTTP server for a service.
+
+    Endpoints:
+        POST /jobs        ``{"link": ..., "title": ...}`` → 202 with the queued job
+        GET  /jobs        every known job
+        GET  /jobs/<id>   one job's status
+        GET  /health      worker count, job counts per status and bandwidth use
+        GET  /bandwidth   download and upload limits (bytes/s, null if none)
+                          with bytes moved and seconds spent waiting
+        POST /bandwidth   ``{"download": "20M", "upload": null}`` → 200; changes
+                          the limits named, for transfers already running too
+
+    Args:
+        service: The service that runs submitted jobs
+        host: Interface to bind; keep the default unless the API must be reachable
+            from other machines — it has no authentication
+        port: TCP port, or 0 for an ephemeral one
+
+    Returns:
+        The server; call ``serve_forever()`` on it
+    """
+    server = ThreadingHTTPServer((host, port), _JobAPIHandler)
+    server.service = service
+    return server
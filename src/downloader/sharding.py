@@ -0,0 +1,116 @@
+"""Deterministic split of a job list across runners, and their mergeable manifests."""
+
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+# Job fields carried into a manifest
+_MANIFEST_FIELDS = ('id', 'url', 'title', 'state', 'filepath', 'remote_id',
+                    'error', 'error_type', 'attempts')
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """
+    Parse a shard spec.
+
+    Args:
+        text: ``"i/n"``, 1-based — ``"3/20"`` is the third of twenty shards
+
+    Returns:
+        ``(i, n)``
+
+    Raises:
+        ValueError: If the spec is malformed or out of range
+    """
+    try:
+        index, count = (int(part) for part in str(text).split('/'))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/n, got {text!r}")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Shard {text!r} out of range: need 1 <= i <= n")
+    return index, count
+
+
+def shard_of(job_id: str, count: int) -> int:
+    """
+    Return the (1-based) shard a job belongs to.
+
+    Hashes the canonical job id, so the assignment is stable across runs,
+    machines and Python versions, and does not depend on list order.
+    """
+    digest = hashlib.sha1(job_id.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+
+def in_shard(job_id: str, shard: Tuple[int, int]) -> bool:
+    """Return True if the job belongs to ``shard`` (``(i, n)``)."""
+    index, count = shard
+    return shard_of(job_id, count) == index
+
+
+def write_manifest(path: str, jobs: Iterable[Dict], shard: Tuple[int, int] = (1, 1)):
+    """
+    Record one runner's results.
+
+    Args:
+        path: Where to write the JSON manifest
+        jobs: Final job records
+        shard: The shard this runner processed
+    """
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'shard': list(shard),
+        'finished_at': time.time(),
+        'jobs': [{field: job.get(field) for field in _MANIFEST_FIELDS} for job in jobs],
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Wrote manifest for shard {shard[0]}/{shard[1]} to {path}")
+
+
+def merge_manifests(paths: Iterable[str]) -> Dict:
+    """
+    Combine per-shard manifests into one report.
+
+    Args:
+        paths: Manifest files
+
+    Returns:
+        Dict with ``jobs`` (every job, ordered by shard), ``shards`` (the
+        shard count) and ``missing`` (shard numbers with no manifest)
+
+    Raises:
+        ValueError: If the manifests disagree on the shard count or one is
+            not a manifest
+    """
+    manifests = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+            raise ValueError(f"{path} is not a version {MANIFEST_VERSION} manifest")
+        manifests.append(manifest)
+
+    counts = {manifest['shard'][1] for manifest in manifests}
+    if len(counts) > 1:
+        raise ValueError(f"Manifests come from different shard counts: {sorted(counts)}")
+    count = counts.pop() if counts else 0
+
+    jobs: Dict[str, Dict] = {}
+    seen = set()
+    for manifest in sorted(manifests, key=lambda m: m['shard'][0]):
+        seen.add(manifest['shard'][0])
+        for job in manifest['jobs']:
+            jobs[job['id']] = job
+
+    missing = [index for index in range(1, count + 1) if index not in seen]
+    if missing:
+        logger.warning(f"No manifest for shard(s) {missing} of {count}")
+    return {'jobs': list(jobs.values()), 'shards': count, 'missing': missing}
+
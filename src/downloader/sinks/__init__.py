@@ -0,0 +1,62 @@
+"""Upload sinks: where finished downloads are sent."""
+
+from typing import Callable, Optional
+
+from .base import BufferReader, Sink, map_file
+from .drive import DriveSink
+from .fanout import FanOutSink
+from .local import LocalSink
+from .s3 import S3Error, S3Sink
+
+
+def open_sink(spec: str, drive: Optional[Callable] = None,
+              staging_dir: Optional[str] = None) -> Sink:
+    """
+    Build the sink(s) described by a configuration string.
+
+    Args:
+        spec: Comma-separated sinks: ``drive``, ``s3://bucket/prefix`` (see
+            ``S3Sink.from_url``), or a local directory as ``file:///path`` or a
+            plain path. Several sinks are combined in a ``FanOutSink``.
+        drive: Returns the ``DriveUploader`` for ``drive``; called on the first
+            upload
+        staging_dir: The directory uploaded files are deleted from; a local
+            sink inside it is refused (see ``LocalSink``)
+
+    Returns:
+        The sink
+
+    Raises:
+        ValueError: If the spec names no sink, ``drive`` without an uploader,
+            or a local directory inside ``staging_dir``
+    """
+    sinks = []
+    for item in (part.strip() for part in spec.split(',')):
+        if not item:
+            continue
+        if item == 'drive':
+            if drive is None:
+                raise ValueError("The drive sink needs a Drive uploader")
+            sinks.append(DriveSink(drive))
+        elif item.startswith('s3://'):
+            sinks.append(S3Sink.from_url(item))
+        elif item.startswith('file://'):
+            sinks.append(LocalSink(item[len('file://'):], staging_dir=staging_dir))
+        else:
+            sinks.append(LocalSink(item, staging_dir=staging_dir))
+    if not sinks:
+        raise ValueError(f"No upload sink in {spec!r}")
+    return sinks[0] if len(sinks) == 1 else FanOutSink(sinks)
+
+
+__all__ = [
+    'BufferReader',
+    'DriveSink',
+    'FanOutSink',
+    'LocalSink',
+    'S3Error',
+    'S3Sink',
+    'Sink',
+    'map_file',
+    'open_sink',
+]
@@ -0,0 +1,122 @@
+"""Base interface for upload sinks."""
+
+import mmap
+import os
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from ..deadline import Deadline
+
+
+class Sink(ABC):
+    """Abstract base class for the places finished downloads are sent to."""
+
+    # Whether the sink can continue an interrupted upload from a session URI
+    resumable = False
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """Get the sink name, used to label the ids it returns."""
+        pass
+
+    @abstractmethod
+    def upload(self, path: str, data: Optional[memoryview] = None,
+               session_uri: Optional[str] = None,
+               on_session: Optional[Callable[[str], None]] = None,
+               deadline: Optional[Deadline] = None) -> Optional[str]:
+        """
+        Store one file.
+
+        Args:
+            path: The local file
+            data: The file's contents, already read (see ``FanOutSink``). When
+                given, the sink uses it rather than reading ``path`` again.
+            session_uri: Resumable session from an interrupted earlier attempt
+                (only used by resumable sinks)
+            on_session: Called with the session URI once it is known
+            deadline: Time by which the sink stops sending, for sinks that
+                send a file in pieces
+
+        Returns:
+            Where the file was stored (a sink-specific id), or None if the
+            upload failed
+
+        Raises:
+            DeadlineExceededError: If the upload stopped for ``deadline``
+        """
+        pass
+
+    def __call__(self, path: str, session_uri: Optional[str] = None,
+                 on_session: Optional[Callable[[str], None]] = None,
+                 deadline: Optional[Deadline] = None) -> Optional[str]:
+        """Upload ``path``; lets a sink stand in as a BatchRunner or DownloadService uploader."""
+        return self.upload(path, session_uri=session_uri, on_session=on_session,
+                           deadline=deadline)
+
+
+@contextmanager
+def map_file(path: str) -> Iterator[memoryview]:
+    """
+    Map a file into memory, read-only, for the duration of the block.
+
+    Pages are read from disk once and shared by everything slicing the view,
+    so several sinks can send the same file without each reading it.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap refuses empty files
+            yield memoryview(b'')
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        view.release()
+        try:
+            mapped.close()
+        except BufferError:
+            # A slice outlived the upload (e.g. held by a traceback); the
+            # mapping is unmapped when that slice is freed
+            pass
+
+
+class BufferReader:
+    """
+    Seekable, read-only file object over a buffer.
+
+    Each reader keeps its own position, so several consumers can read one
+    mapped file independently.
+    """
+
+    def __init__(self, data):
+        self._data = memoryview(data)
+        self._pos = 0
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        end = len(self._data) if size is None or size < 0 else self._pos + size
+        chunk = bytes(self._data[self._pos:end])
+        self._pos += len(chunk)
+        return chunk
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._pos, os.SEEK_END: len(self._data)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seekable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def close(self):
+        self._data.release()
@@ -0,0 +1,50 @@
+"""Google Drive sink."""
+
+from typing import Callable, Optional, Union
+
+from ..deadline import Deadline
+from ..drive import DriveUploader
+from .base import BufferReader, Sink
+
+
+class DriveSink(Sink):
+    """Upload to a Drive folder through a ``DriveUploader``."""
+
+    resumable = True
+
+    def __init__(self, uploader: Union[DriveUploader, Callable[[], DriveUploader]]):
+        """
+        Initialize the sink.
+
+        Args:
+            uploader: The uploader, or a function returning it, called on the
+                first upload (so credentials are only loaded when needed)
+        """
+        if isinstance(uploader, DriveUploader):
+            self._uploader, self._factory = uploader, None
+        else:
+            self._uploader, self._factory = None, uploader
+
+    @property
+    def name(self) -> str:
+        return 'drive'
+
+    @property
+    def uploader(self) -> DriveUploader:
+        if self._uploader is None:
+            self._uploader = self._factory()
+        return self._uploader
+
+    def upload(self, path: str, data: Optional[memoryview] = None,
+               session_uri: Optional[str] = None,
+               on_session: Optional[Callable[[str], None]] = None,
+               deadline: Optional[Deadline] = None) -> Optional[str]:
+        """Upload a file; see ``DriveUploader.upload()``. Returns the Drive file id."""
+        if data is None:
+            return self.uploader.upload(path, session_uri, on_session, deadline=deadline)
+        stream = BufferReader(data)
+        try:
+            return self.uploader.upload(path, session_uri, on_session, stream=stream,
+                                        deadline=deadline)
+        finally:
+            stream.close()
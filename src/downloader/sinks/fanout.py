@@ -0,0 +1,83 @@
+"""Send each file to several sinks at once."""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from ..deadline import Deadline
+from ..exceptions import DeadlineExceededError
+from .base import Sink, map_file
+
+logger = logging.getLogger(__name__)
+
+
+class FanOutSink(Sink):
+    """
+    Upload each file to every one of several sinks, concurrently.
+
+    The file is memory-mapped once and every sink reads from that mapping, so
+    it comes off the disk a single time however many sinks there are, and a
+    job takes as long as its slowest sink rather than the sum of them all.
+
+    The upload succeeds only if every sink took the file; otherwise it fails
+    and is retried as a whole (sinks overwrite by name, so resending to the
+    ones that succeeded is harmless). The first resumable sink gets the
+    stored session. If any sink stops for the deadline, the others finish or
+    stop too and the upload raises ``DeadlineExceededError``, to be resumed.
+    """
+
+    def __init__(self, sinks: List[Sink]):
+        """
+        Initialize the sink.
+
+        Args:
+            sinks: Where every file goes
+
+        Raises:
+            ValueError: If ``sinks`` is empty
+        """
+        if not sinks:
+            raise ValueError("FanOutSink needs at least one sink")
+        self.sinks = sinks
+        self.resumable = any(sink.resumable for sink in sinks)
+
+    @property
+    def name(self) -> str:
+        return '+'.join(sink.name for sink in self.sinks)
+
+    def upload(self, path: str, data: Optional[memoryview] = None,
+               session_uri: Optional[str] = None,
+               on_session: Optional[Callable[[str], None]] = None,
+               deadline: Optional[Deadline] = None) -> Optional[str]:
+        """
+        Upload a file to every sink.
+
+        Returns:
+            ``name:id`` of each sink, space-separated, or None if any sink failed
+        """
+        if data is None:
+            with map_file(path) as mapped:
+                return self.upload(path, mapped, session_uri, on_session, deadline)
+
+        resuming = next((sink for sink in self.sinks if sink.resumable), None)
+
+        def send(sink: Sink) -> Optional[str]:
+            try:
+                if sink is resuming:
+                    return sink.upload(path, data, session_uri, on_session, deadline)
+                return sink.upload(path, data, deadline=deadline)
+            except DeadlineExceededError:
+                raise
+            except Exception as e:
+                logger.error(f"{sink.name} upload of {path} failed: {e}", exc_info=True)
+                return None
+
+        with ThreadPoolExecutor(max_workers=len(self.sinks),
+                                thread_name_prefix='fan-out') as executor:
+            results = list(executor.map(send, self.sinks))
+
+        failed = [sink.name for sink, result in zip(self.sinks, results) if not result]
+        if failed:
+            logger.error(f"Upload of {path} failed on {', '.join(failed)}")
+            return None
+        return ' '.join(f"{sink.name}:{result}" for sink, result in zip(self.sinks, results))
@@ -0,0 +1,131 @@
+"""Local filesystem sink."""
+
+import errno
+import logging
+import os
+import shutil
+from typing import Callable, Optional
+
+from ..deadline import Deadline
+from .base import Sink
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ioctl cloning one file's extents into another (btrfs, XFS, bcachefs...)
+FICLONE = 0x40049409
+
+MODES = ('auto', 'reflink', 'hardlink', 'copy')
+
+
+class LocalSink(Sink):
+    """
+    Keep a copy of each file in a local (or mounted) directory.
+
+    Copying a video byte by byte is avoided where the filesystem allows:
+    ``auto`` tries a reflink (a copy-on-write clone sharing the original's
+    blocks), then a hardlink (a second name for the same file, which keeps the
+    data after the staging copy is deleted), and only then copies. The first
+    two need the directory on the same filesystem as the download.
+    """
+
+    def __init__(self, directory: str, mode: str = 'auto', staging_dir: Optional[str] = None):
+        """
+        Initialize the sink.
+
+        Args:
+            directory: Where files are placed (created if missing)
+            mode: ``auto``, or force one of ``reflink``, ``hardlink`` or ``copy``
+            staging_dir: Where downloads are staged and deleted once uploaded.
+                ``directory`` may not be it or lie inside it: a stored file
+                could then be the very staging file deleted after its upload.
+
+        Raises:
+            ValueError: If ``mode`` is not one of ``MODES``, or ``directory``
+                is inside ``staging_dir``
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown local sink mode {mode!r}; expected one of {MODES}")
+        if staging_dir is not None:
+            staging = os.path.realpath(staging_dir)
+            if os.path.commonpath([os.path.realpath(directory), staging]) == staging:
+                raise ValueError(f"Local sink {directory} is inside the staging directory "
+                                 f"{staging_dir}, whose files are deleted once uploaded")
+        self.directory = directory
+        self.mode = mode
+
+    @property
+    def name(self) -> str:
+        return 'local'
+
+    def upload(self, path: str, data: Optional[memoryview] = None,
+               session_uri: Optional[str] = None,
+               on_session: Optional[Callable[[str], None]] = None,
+               deadline: Optional[Deadline] = None) -> Optional[str]:
+        """
+        Place a file in the directory, replacing any file of the same name.
+
+        A local copy is one quick step, so ``deadline`` is not consulted.
+
+        Returns:
+            The path of the stored file, or None if it could not be written
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        destination = os.path.join(self.directory, os.path.basename(path))
+        # Written beside the destination then renamed, so a reader never sees
+        # half a file
+        temporary = f"{destination}.tmp"
+        methods = [self.mode] if self.mode != 'auto' else ['reflink', 'hardlink', 'copy']
+        try:
+            for method in methods:
+                try:
+                    self._remove(temporary)
+                    getattr(self, f'_{method}')(path, temporary, data)
+                    break
+                except OSError as e:
+                    if method == methods[-1]:
+                        raise
+                    logger.debug(f"{method} of {path} not possible ({e}); falling back")
+            os.replace(temporary, destination)
+        except OSError as e:
+            logger.error(f"Could not store {path} in {self.directory}: {e}")
+            return None
+        finally:
+            # Renaming a hardlink over the same file leaves it in place
+            self._remove(temporary)
+        logger.info(f"Stored {path} as {destination} ({method})")
+        return destination
+
+    @staticmethod
+    def _reflink(path: str, destination: str, data: Optional[memoryview]):
+        if fcntl is None:
+            raise OSError(errno.EOPNOTSUPP, "reflinks need fcntl")
+        try:
+            with open(path, 'rb') as source, open(destination, 'wb') as target:
+                fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            LocalSink._remove(destination)
+            raise
+
+    @staticmethod
+    def _hardlink(path: str, destination: str, data: Optional[memoryview]):
+        os.link(path, destination)
+
+    @staticmethod
+    def _copy(path: str, destination: str, data: Optional[memoryview]):
+        if data is None:
+            shutil.copyfile(path, destination)
+            return
+        with open(destination, 'wb') as target:
+            target.write(data)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,291 @@
+"""S3-compatible object storage sink (AWS S3, MinIO, Ceph, R2...)."""
+
+import datetime
+import hashlib
+import hmac
+import logging
+import os
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qsl, quote, urlsplit
+
+from ..bandwidth import BandwidthLimiter, shared_limiter
+from ..deadline import Deadline
+from .base import BufferReader, Sink, map_file
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+logger = logging.getLogger(__name__)
+
+# S3 rejects multipart parts smaller than this, except the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+PART_SIZE = 16 * 1024 * 1024
+PART_WORKERS = 4
+REQUEST_TIMEOUT = 120
+
+_EMPTY_SHA256 = hashlib.sha256(b'').hexdigest()
+
+
+def sign_request(method: str, url: str, headers: Dict[str, str], payload_hash: str,
+                 access_key: str, secret_key: str, region: str,
+                 now: Optional[datetime.datetime] = None) -> Dict[str, str]:
+    """
+    Sign a request with AWS Signature Version 4.
+
+    Args:
+        method: HTTP method
+        url: Full request URL; the path must already be URI-encoded
+        headers: Headers to sign besides ``host``, ``x-amz-date`` and
+            ``x-amz-content-sha256``, which are added
+        payload_hash: Hex SHA-256 of the body
+        access_key: Access key id
+        secret_key: Secret access key
+        region: Signing region
+        now: Signing time (default: now)
+
+    Returns:
+        The headers to send, including ``Authorization``
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    datestamp = now.strftime('%Y%m%d')
+    parts = urlsplit(url)
+
+    signed = {'host': parts.netloc, 'x-amz-date': amz_date,
+              'x-amz-content-sha256': payload_hash}
+    signed.update({key.lower(): str(value).strip() for key, value in headers.items()})
+    names = sorted(signed)
+    query = sorted(parse_qsl(parts.query, keep_blank_values=True))
+    canonical_request = '\n'.join([
+        method,
+        parts.path or '/',
+        '&'.join(f"{quote(k, safe='~')}={quote(v, safe='~')}" for k, v in query),
+        ''.join(f"{name}:{signed[name]}\n" for name in names),
+        ';'.join(names),
+        payload_hash,
+    ])
+
+    scope = f"{datestamp}/{region}/s3/aws4_request"
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256', amz_date, scope,
+        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest(),
+    ])
+    key = f"AWS4{secret_key}".encode('utf-8')
+    for step in (datestamp, region, 's3', 'aws4_request'):
+        key = hmac.new(key, step.encode('utf-8'), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    result = {name: signed[name] for name in names}
+    result['Authorization'] = (f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+                               f"SignedHeaders={';'.join(names)}, Signature={signature}")
+    return result
+
+
+class S3Error(Exception):
+    """An S3 request failed."""
+
+
+class S3Sink(Sink):
+    """
+    Store files in an S3-compatible bucket.
+
+    Files up to ``part_size`` go up in one PUT. Larger ones use a multipart
+    upload whose parts are sent by ``workers`` threads at once, each part a
+    slice of the memory-mapped file, so a single slow connection does not set
+    the pace. A multipart upload that fails is aborted so the bucket is not
+    left holding orphaned parts; so is one stopped by the deadline, since
+    the sink does not resume. Buckets are addressed path-style
+    (``endpoint/bucket/key``), which every S3-compatible server accepts.
+    """
+
+    def __init__(self,
+                 endpoint: str,
+                 bucket: str,
+                 access_key: str,
+                 secret_key: str,
+                 region: str = 'us-east-1',
+                 prefix: str = '',
+                 part_size: int = PART_SIZE,
+                 workers: int = PART_WORKERS,
+                 timeout: float = REQUEST_TIMEOUT,
+                 bandwidth: Optional[BandwidthLimiter] = None):
+        """
+        Initialize the sink.
+
+        Args:
+            endpoint: Server URL, e.g. ``https://s3.eu-west-1.amazonaws.com``
+                or ``http://minio:9000``
+            bucket: Bucket name
+            access_key: Access key id
+            secret_key: Secret access key
+            region: Signing region
+            prefix: Prepended to each file name to form its key
+            part_size: Bytes per multipart part (at least 5 MiB)
+            workers: Parts sent at once
+            timeout: Seconds a single request may take
+            bandwidth: Limiter whose upload budget each request body spends
+                from (default: the process-wide one)
+
+        Raises:
+            ImportError: If requests is missing
+            ValueError: If ``part_size`` is below the S3 minimum
+        """
+        if requests is None:
+            raise ImportError("requests is required for S3Sink. Install with: pip install requests")
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+        self.endpoint = endpoint.rstrip('/')
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.prefix = prefix
+        self.part_size = part_size
+        self.workers = workers
+        self.timeout = timeout
+        self.bandwidth = bandwidth if bandwidth is not None else shared_limiter()
+        self._local = threading.local()
+
+    @classmethod
+    def from_url(cls, url: str) -> 'S3Sink':
+        """
+        Build a sink from ``s3://bucket/prefix``.
+
+        The server and credentials come from ``S3_ENDPOINT_URL`` (default AWS),
+        ``AWS_ACCESS_KEY_ID``, ``AWS_SECRET_ACCESS_KEY`` and ``AWS_REGION``.
+
+        Raises:
+            ValueError: If the URL has no bucket or the credentials are unset
+        """
+        parts = urlsplit(url)
+        if parts.scheme != 's3' or not parts.netloc:
+            raise ValueError(f"S3 sink must look like s3://bucket/prefix, got {url!r}")
+        access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+        secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+        if not access_key or not secret_key:
+            raise ValueError("AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY must be set for S3 uploads")
+        region = os.environ.get('AWS_REGION', os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'))
+        endpoint = os.environ.get('S3_ENDPOINT_URL', f'https://s3.{region}.amazonaws.com')
+        prefix = parts.path.lstrip('/')
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
+        return cls(endpoint, parts.netloc, access_key, secret_key, region=region, prefix=prefix)
+
+    @property
+    def name(self) -> str:
+        return 's3'
+
+    def upload(self, path: str, data: Optional[memoryview] = None,
+               session_uri: Optional[str] = None,
+               on_session: Optional[Callable[[str], None]] = None,
+               deadline: Optional[Deadline] = None) -> Optional[str]:
+        """
+        Upload a file under ``prefix`` + its base name.
+
+        Returns:
+            ``s3://bucket/key``, or None if the upload failed
+
+        Raises:
+            DeadlineExceededError: If ``deadline`` passed before a part was sent
+        """
+        key = self.prefix + os.path.basename(path)
+        try:
+            if data is None:
+                with map_file(path) as mapped:
+                    self._send(key, mapped, deadline)
+            else:
+                self._send(key, data, deadline)
+        except (OSError, S3Error, requests.RequestException) as e:
+            logger.error(f"S3 upload of {path} failed: {e}")
+            return None
+        logger.info(f"Uploaded {path} to s3://{self.bucket}/{key}")
+        return f"s3://{self.bucket}/{key}"
+
+    def _send(self, key: str, data: memoryview, deadline: Optional[Deadline] = None):
+        if len(data) <= self.part_size:
+            self._request('PUT', key, data=data)
+            return
+
+        response = self._request('POST', key, query='uploads')
+        upload_id = _find(response.content, 'UploadId')
+        if not upload_id:
+            raise S3Error(f"no UploadId starting multipart upload of {key}")
+        query = f"uploadId={quote(upload_id, safe='')}"
+        offsets = range(0, len(data), self.part_size)
+        logger.info(f"Multipart upload of {key}: {len(offsets)} parts over {self.workers} thread(s)")
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers,
+                                    thread_name_prefix='s3-part') as executor:
+                etags = list(executor.map(
+                    lambda numbered: self._put_part(key, query, *numbered, data, deadline),
+                    enumerate(offsets, start=1)))
+            body = ''.join(f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                           for number, etag in enumerate(etags, start=1))
+            body = f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>".encode('utf-8')
+            response = self._request('POST', key, query=query, data=body)
+            # A completion can fail after a 200 status line; the error is in the body
+            if b'<Error>' in response.content:
+                raise S3Error(f"completing {key}: {_find(response.content, 'Message')}")
+        except BaseException:
+            try:
+                self._request('DELETE', key, query=query)
+            except Exception as e:
+                logger.warning(f"Could not abort multipart upload of {key}: {e}")
+            raise
+
+    def _put_part(self, key: str, query: str, number: int, offset: int,
+                  data: memoryview, deadline: Optional[Deadline] = None) -> str:
+        if deadline is not None:
+            deadline.check(f"S3 upload of {key} stopped at part {number}")
+        part = data[offset:offset + self.part_size]
+        try:
+            response = self._request('PUT', key, query=f"partNumber={number}&{query}", data=part)
+        finally:
+            part.release()
+        return response.headers['ETag']
+
+    def _request(self, method: str, key: str, query: str = '', data=b''):
+        url = f"{self.endpoint}/{quote(self.bucket, safe='')}/{quote(key, safe='/~')}"
+        if query:
+            url += f"?{query}"
+        headers = sign_request(method, url, {}, hashlib.sha256(data).hexdigest() if data
+                               else _EMPTY_SHA256, self.access_key, self.secret_key, self.region)
+        # A reader streams the buffer instead of copying it into one bytes object
+        body = BufferReader(data) if data else None
+        if body is not None:
+            headers['Content-Length'] = str(len(body))
+            self.bandwidth.upload.consume(len(body))
+        try:
+            response = self._session().request(method, url, data=body, headers=headers,
+                                               timeout=self.timeout)
+        finally:
+            if body is not None:
+                body.close()
+        if response.status_code >= 300:
+            raise S3Error(f"{method} {key}: HTTP {response.status_code} "
+                          f"{_find(response.content, 'Code') or response.reason}")
+        return response
+
+    def _session(self) -> 'requests.Session':
+        # One connection pool per thread
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+
+def _find(xml: bytes, tag: str) -> Optional[str]:
+    """Return the text of the first ``tag`` element in an S3 XML response."""
+    try:
+        root = ET.fromstring(xml)
+    except ET.ParseError:
+        return None
+    for element in root.iter():
+        if element.tag.rsplit('}', 1)[-1] == tag:
+            return element.text
+    return None
@@ -0,0 +1,241 @@
+"""Disk budget for the staging directory: reservations, backpressure, eviction."""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(text: str) -> int:
+    """
+    Parse a human-readable byte count.
+
+    Args:
+        text: e.g. ``"500M"``, ``"2G"``, ``"1.5GiB"`` or a plain number of bytes
+
+    Returns:
+        The size in bytes
+
+    Raises:
+        ValueError: If the text is not a size
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?\s*', str(text), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Not a size: {text!r}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+def estimate_size(info: Optional[Dict]) -> Optional[int]:
+    """
+    Estimate how many bytes a download will write, from a yt-dlp info dict.
+
+    Uses the exact ``filesize`` when the site reports one, then yt-dlp's
+    ``filesize_approx``, then duration × bitrate. Merged downloads add up
+    their component formats.
+
+    Args:
+        info: Info dict for a single video (after format selection)
+
+    Returns:
+        Estimated bytes, or None if nothing in the dict hints at a size
+    """
+    if not info:
+        return None
+
+    parts = info.get('requested_formats')
+    if parts:
+        sizes = [estimate_size(dict(part, duration=info.get('duration'))) for part in parts]
+        return sum(sizes) if all(size is not None for size in sizes) else None
+
+    for key in ('filesize', 'filesize_approx'):
+        if info.get(key):
+            return int(info[key])
+
+    # Bitrates are in KBit/s
+    if info.get('duration') and info.get('tbr'):
+        return int(info['duration'] * info['tbr'] * 1000 / 8)
+    return None
+
+
+class Reservation:
+    """Space set aside for one download until its real size is known."""
+
+    def __init__(self, nbytes: int):
+        self.nbytes = nbytes
+
+
+class StorageManager:
+    """
+    Keep the staging directory within a byte budget.
+
+    Before a download starts it reserves its estimated size; when the budget
+    is spent, ``reserve()`` blocks until running downloads finish or uploaded
+    files are freed. Once an upload is confirmed the local copy is deleted, or
+    — with ``keep_uploaded`` — kept as a cache and evicted least-recently-used
+    first when space is needed. Files not yet uploaded are never evicted.
+    """
+
+    def __init__(self,
+                 staging_dir: str,
+                 budget_bytes: Optional[int] = None,
+                 keep_uploaded: bool = False,
+                 default_estimate: int = 100 * 1024 ** 2):
+        """
+        Initialize the storage manager.
+
+        Args:
+            staging_dir: Directory downloads are written to (may be a tmpfs mount)
+            budget_bytes: Maximum bytes reserved or held at once; None for no limit
+            keep_uploaded: Keep uploaded files until their space is needed instead
+                of deleting them straight away
+            default_estimate: Bytes reserved for a download whose size is unknown
+        """
+        self.staging_dir = staging_dir
+        self.budget_bytes = budget_bytes
+        self.keep_uploaded = keep_uploaded
+        self.default_estimate = default_estimate
+
+        self._cond = threading.Condition()
+        self._reserved = 0
+        # path -> [size, uploaded], least recently used first
+        self._files: 'OrderedDict[str, list]' = OrderedDict()
+
+        os.makedirs(staging_dir, exist_ok=True)
+
+    @property
+    def used_bytes(self) -> int:
+        """Bytes currently reserved or held by tracked files."""
+        with self._cond:
+            return self._used()
+
+    def _used(self) -> int:
+        return self._reserved + sum(size for size, _ in self._files.values())
+
+    def reserve(self, nbytes: Optional[int], timeout: Optional[float] = None) -> Reservation:
+        """
+        Set aside space for a download, waiting for room if necessary.
+
+        A single download larger than the whole budget is admitted once
+        nothing else holds space, so it can still run on its own.
+
+        Args:
+            nbytes: Estimated size; None uses ``default_estimate``
+            timeout: Seconds to wait for space; None waits indefinitely
+
+        Returns:
+            The reservation, to pass to ``commit()`` or ``cancel()``
+
+        Raises:
+            TimeoutError: If no space became available within ``timeout``
+        """
+        nbytes = self.default_estimate if nbytes is None else nbytes
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            while not self._fits(nbytes):
+                if self._evict_one():
+                    continue
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(
+                        f"No room for {nbytes} bytes in {self.staging_dir} "
+                        f"({self._used()} of {self.budget_bytes} in use)"
+                    )
+                logger.info(f"Disk budget exhausted, waiting for space for {nbytes} bytes")
+                self._cond.wait(remaining)
+
+            self._reserved += nbytes
+            return Reservation(nbytes)
+
+    def _fits(self, nbytes: int) -> bool:
+        if self.budget_bytes is None:
+            return True
+        used = self._used()
+        return used + nbytes <= self.budget_bytes or used == 0
+
+    def _evict_one(self) -> bool:
+        """Delete the least recently used uploaded file. Caller holds the lock."""
+        for path, (size, uploaded) in self._files.items():
+            if uploaded:
+                del self._files[path]
+                self._remove(path)
+                logger.info(f"Evicted {path} ({size} bytes) to make room")
+                return True
+        return False
+
+    def commit(self, reservation: Reservation, path: str):
+        """
+        Replace a reservation with the file it turned into.
+
+        Args:
+            reservation: The reservation made for the download
+            path: The downloaded file
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = reservation.nbytes
+        with self._cond:
+            self._reserved -= reservation.nbytes
+            reservation.nbytes = 0
+            self._files[path] = [size, False]
+            self._files.move_to_end(path)
+            self._cond.notify_all()
+
+    def cancel(self, reservation: Reservation):
+        """Return a reservation's space, e.g. after a failed download."""
+        with self._cond:
+            self._reserved -= reservation.nbytes
+            reservation.nbytes = 0
+            self._cond.notify_all()
+
+    def track(self, path: str):
+        """
+        Start accounting for a file already on disk, e.g. one left by an earlier
+        run or one whose reservation has been cancelled in favour of its real size.
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._cond:
+            self._files[path] = [size, False]
+
+    def touch(self, path: str):
+        """Mark a kept file as recently used."""
+        with self._cond:
+            if path in self._files:
+                self._files.move_to_end(path)
+
+    def release(self, path: str):
+        """
+        Record that a file's upload is confirmed and its local copy may go.
+
+        Args:
+            path: The uploaded file
+        """
+        with self._cond:
+            if self.keep_uploaded:
+                entry = self._files.setdefault(path, [0, True])
+                entry[1] = True
+                self._files.move_to_end(path)
+            else:
+                self._files.pop(path, None)
+                self._remove(path)
+            self._cond.notify_all()
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not delete {path}: {e}")
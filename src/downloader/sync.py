@@ -0,0 +1,157 @@
+"""Incremental sync of channels, playlists and profiles against an archive index."""
+
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from .core import VideoDownloader
+from .jobstore import DONE, JobStore
+
+logger = logging.getLogger(__name__)
+
+
+def archive_key(entry: Dict) -> Optional[str]:
+    """
+    Return the archive line identifying a listed entry.
+
+    Args:
+        entry: An entry from ``VideoDownloader.list_entries()``
+
+    Returns:
+        ``"<extractor> <id>"``, or None if the listing did not give both
+    """
+    if not entry.get('extractor') or not entry.get('id'):
+        return None
+    return f"{entry['extractor']} {entry['id']}"
+
+
+class ArchiveIndex:
+    """
+    Persisted set of entries already downloaded.
+
+    The file holds one ``<extractor> <id>`` line per entry — the format of
+    yt-dlp's ``--download-archive`` — so it can be shared with yt-dlp run by
+    hand. Lines are appended as entries finish, so an interrupted sync loses
+    nothing it completed.
+    """
+
+    def __init__(self, path: str):
+        """
+        Load (or start) an archive.
+
+        Args:
+            path: The archive file; created on the first ``add()``
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._keys = set()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self._keys.update(line.strip() for line in f if line.strip())
+        logger.info(f"Archive {path} holds {len(self._keys)} entries")
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._keys
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._keys)
+
+    def add(self, key: str):
+        """Record an entry as downloaded."""
+        with self._lock:
+            if key in self._keys:
+                return
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(f"{key}\n")
+            self._keys.add(key)
+
+
+class ChannelSync:
+    """
+    Queue only the entries of a channel, playlist or profile not yet archived.
+
+    A sync lists the source with flat extraction (one listing, no per-video
+    requests), drops entries already in the archive, and adds the rest to the
+    job store. ``finished()`` archives each job as it completes (pass it as
+    ``BatchRunner(on_finished=...)``), so an interrupted run keeps what it
+    got done, and the next sync of the same source is one listing plus the
+    videos published since.
+    """
+
+    def __init__(self, downloader: VideoDownloader, store: JobStore, archive: ArchiveIndex):
+        """
+        Initialize the sync.
+
+        Args:
+            downloader: Used to list each source
+            store: Where new entries are queued as jobs
+            archive: Entries already downloaded
+        """
+        self.downloader = downloader
+        self.store = store
+        self.archive = archive
+        # job id -> archive key, for the jobs this sync queued
+        self._keys: Dict[str, str] = {}
+
+    def queue_new(self, url: str) -> List[Dict]:
+        """
+        List a source and queue its new entries.
+
+        Args:
+            url: Channel, playlist or profile URL
+
+        Returns:
+            The jobs for entries not yet archived (new, or left unfinished by
+            an earlier run)
+
+        Raises:
+            UnsupportedPlatformError: If the source cannot be listed
+            ExtractionError: If the listing fails
+        """
+        entries = self.downloader.list_entries(url)
+        jobs = []
+        for entry in entries:
+            key = archive_key(entry)
+            if key is not None and key in self.archive:
+                continue
+
+            job = self.store.add(entry['url'], entry.get('title') or entry.get('id'))
+            if job['state'] == DONE:
+                # Finished by a run that stopped before archiving it
+                if key is not None:
+                    self.archive.add(key)
+                continue
+            if key is not None:
+                self._keys[job['id']] = key
+            jobs.append(job)
+
+        logger.info(f"{url}: {len(entries)} entries listed, {len(jobs)} to download")
+        return jobs
+
+    def finished(self, job: Dict) -> bool:
+        """
+        Archive ``job`` if this sync queued it and it is done.
+
+        Returns:
+            Whether it was archived
+        """
+        key = self._keys.get(job['id'])
+        if key is None or job['state'] != DONE:
+            return False
+        self.archive.add(key)
+        return True
+
+    def record(self, jobs: Iterable[Dict]) -> int:
+        """
+        Archive the finished jobs among ``jobs``.
+
+        Args:
+            jobs: Job records after a run
+
+        Returns:
+            Number of entries archived
+        """
+        return sum(self.finished(job) for job in jobs)
@@ -6,10 +6,16 @@ from .file_utils import (
     check_duplicate,
     ensure_extension
 )
+from .url_utils import canonicalize_url, canonical_id, platform_of
+from .singleflight import SingleFlight
 
 __all__ = [
     'sanitize_filename',
     'get_file_hash',
     'check_duplicate',
-    'ensure_extension'
+    'ensure_extension',
+    'canonicalize_url',
+    'canonical_id',
+    'platform_of',
+    'SingleFlight',
 ]
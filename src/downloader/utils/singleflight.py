@@ -0,0 +1,69 @@
+"""Coalesce concurrent calls that would do the same work."""
+
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    """One in-flight call and the outcome every waiter will share."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time.
+
+    A caller arriving while a call for the same key is running does not start
+    its own: it waits and receives the leader's result (or exception). Once the
+    call finishes the key is forgotten, so a later call runs afresh.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Run ``fn`` for ``key``, or join a call for ``key`` that is already running.
+
+        Args:
+            key: Identity of the work
+            fn: Zero-argument callable doing the work
+
+        Returns:
+            The value ``fn`` returned, for the leader and every joined caller
+
+        Raises:
+            Whatever ``fn`` raised, re-raised in every caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        """Return the number of keys currently being worked on."""
+        with self._lock:
+            return len(self._calls)
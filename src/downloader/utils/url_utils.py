@@ -0,0 +1,212 @@
+"""URL canonicalization so that every spelling of a post maps to one job."""
+
+import re
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track where a link was shared from. They never
+# change which media a URL points at, so two links differing only in these are
+# the same job.
+_TRACKING_PARAMS = frozenset({
+    'igsh', 'igshid', 'img_index',              # Instagram share sheet
+    'si', 'feature', 'ab_channel',              # YouTube share / UI state
+    'is_from_webapp', 'sender_device', 'is_copy_url', 'web_id', '_r', '_t',  # TikTok
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', 'ref_src', 'ref_url',
+})
+_TRACKING_PREFIXES = ('utm_',)
+
+# Subdomains that serve the same content as the bare host
+_HOST_PREFIXES = ('www.', 'm.', 'mobile.', 'music.')
+
+# Hosts that are the same site. Link shorteners such as vm.tiktok.com or
+# fb.watch are deliberately absent: their paths are redirect tokens, not ids.
+_HOST_ALIASES = {
+    'youtu.be': 'youtube.com',
+    'youtube-nocookie.com': 'youtube.com',
+    'instagr.am': 'instagram.com',
+    'twitter.com': 'x.com',
+}
+
+_YOUTUBE_ID = r'([0-9A-Za-z_-]{11})'
+_YOUTUBE_PATH_PATTERNS = (
+    re.compile(r'^/(?:shorts|live|embed|v)/' + _YOUTUBE_ID),
+)
+_INSTAGRAM_PATH = re.compile(r'^/(?:[^/]+/)?(?:p|reels?|tv)/([0-9A-Za-z_-]+)')
+_TIKTOK_PATH = re.compile(r'^/@[^/]+/(?:video|photo)/(\d+)')
+_X_PATH = re.compile(r'^/[^/]+/status(?:es)?/(\d+)')
+
+
+def _split_host(netloc: str) -> Tuple[str, str]:
+    """
+    Normalize the host part of a URL.
+
+    Returns:
+        ``(bare_host, host)``: the lower-cased host without port, credentials or
+        ``www.``-style prefix, and the same host with aliases folded
+    """
+    bare = netloc.rsplit('@', 1)[-1].split(':', 1)[0].lower().rstrip('.')
+    for prefix in _HOST_PREFIXES:
+        if bare.startswith(prefix):
+            bare = bare[len(prefix):]
+            break
+    return bare, _HOST_ALIASES.get(bare, bare)
+
+
+def _is_tracking_param(name: str) -> bool:
+    lowered = name.lower()
+    return lowered in _TRACKING_PARAMS or lowered.startswith(_TRACKING_PREFIXES)
+
+
+def _extract_id(bare_host: str, host: str, path: str, query: dict) -> Optional[Tuple[str, str]]:
+    """
+    Pull the platform's own media id out of a URL.
+
+    Args:
+        bare_host: Host before alias folding (``youtu.be`` keeps its id in the
+            path rather than in ``v=``)
+        host: Host with aliases folded
+        path: URL path
+        query: Parsed query parameters
+
+    Returns:
+        ``(platform, media_id)`` or None if the URL shape is not recognised
+    """
+    if host == 'youtube.com':
+        if bare_host == 'youtu.be':
+            match = re.match(r'^/' + _YOUTUBE_ID, path)
+            return ('youtube', match.group(1)) if match else None
+        if path in ('/watch', '/watch/') and re.fullmatch(_YOUTUBE_ID, query.get('v', '')):
+            return 'youtube', query['v']
+        for pattern in _YOUTUBE_PATH_PATTERNS:
+            match = pattern.match(path)
+            if match:
+                return 'youtube', match.group(1)
+        return None
+
+    if host == 'instagram.com':
+        match = _INSTAGRAM_PATH.match(path)
+        return ('instagram', match.group(1)) if match else None
+
+    if host == 'tiktok.com':
+        match = _TIKTOK_PATH.match(path)
+        return ('tiktok', match.group(1)) if match else None
+
+    if host == 'x.com':
+        match = _X_PATH.match(path)
+        return ('x', match.group(1)) if match else None
+
+    return None
+
+
+# Canonical URL for each platform whose id we understand. Handing yt-dlp one
+# spelling per post also keeps its own caches (and ours) keyed consistently.
+# TikTok is missing on purpose: photo posts and videos share the id space but
+# not the URL shape, so its links are only stripped of tracking parameters.
+_CANONICAL_URLS = {
+    'youtube': 'https://www.youtube.com/watch?v={}',
+    'instagram': 'https://www.instagram.com/p/{}/',
+    'x': 'https://x.com/i/status/{}',
+}
+
+
+def _strip_tracking(parts, host: str) -> str:
+    """Rebuild a URL with ``host``, sorted non-tracking query and no fragment."""
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if not _is_tracking_param(k)]
+    path = parts.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+    return urlunsplit((parts.scheme.lower(), host, path, urlencode(sorted(query)), ''))
+
+
+def _parse(url: str):
+    """Split a URL and extract its platform id, or return None if it is not http(s)."""
+    parts = urlsplit(url.strip())
+    if parts.scheme.lower() not in ('http', 'https') or not parts.netloc:
+        return None
+    bare_host, host = _split_host(parts.netloc)
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    return parts, host, _extract_id(bare_host, host, parts.path, query)
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalize a video URL so that equivalent links compare equal.
+
+    Strips tracking parameters and fragments and, for platforms whose id scheme
+    is known, rewrites the URL to a single canonical form (``youtu.be/ID`` and
+    ``/shorts/ID`` both become ``watch?v=ID``).
+
+    Args:
+        url: The URL as submitted
+
+    Returns:
+        The canonical URL. Other hosts keep their host and path as written, since
+        yt-dlp's extractors often match on the exact subdomain.
+    """
+    parsed = _parse(url)
+    if parsed is None:
+        return url.strip()
+
+    parts, _, extracted = parsed
+    if extracted and extracted[0] in _CANONICAL_URLS:
+        platform, media_id = extracted
+        return _CANONICAL_URLS[platform].format(media_id)
+    return _strip_tracking(parts, parts.netloc.lower())
+
+
+def canonical_id(url: str) -> str:
+    """
+    Return a stable identity for the media a URL points at.
+
+    Args:
+        url: The URL as submitted
+
+    Returns:
+        ``"<platform>:<id>"`` for recognised platforms (e.g. ``youtube:dQw4w9WgXcQ``),
+        otherwise the URL with tracking stripped and its host aliases folded
+    """
+    parsed = _parse(url)
+    if parsed is None:
+        return url.strip()
+
+    parts, host, extracted = parsed
+    if extracted:
+        return '{}:{}'.format(*extracted)
+    return _strip_tracking(parts, host)
+
+
+# Sites known by a short name. Subdomains (vm.tiktok.com, mbasic.facebook.com)
+# belong to the same platform.
+_PLATFORMS = {
+    'youtube.com': 'youtube',
+    'instagram.com': 'instagram',
+    'tiktok.com': 'tiktok',
+    'x.com': 'x',
+    'facebook.com': 'facebook',
+    'fb.watch': 'facebook',
+}
+
+
+def platform_of(url: str) -> str:
+    """
+    Name the platform a URL belongs to, for per-platform limits and fairness.
+
+    Args:
+        url: The URL as submitted
+
+    Returns:
+        The platform (``youtube``, ``instagram``, ``tiktok``, ``x``,
+        ``facebook``), else the URL's host with aliases folded, or ``''`` if
+        it is not an http(s) URL
+    """
+    parsed = _parse(url)
+    if parsed is None:
+        return ''
+    host = parsed[1]
+    labels = host.split('.')
+    for start in range(len(labels) - 1):
+        platform = _PLATFORMS.get('.'.join(labels[start:]))
+        if platform:
+            return platform
+    return host
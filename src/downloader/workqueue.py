@@ -0,0 +1,706 @@
+"""Pull-based work queue with leases, for spreading jobs over a fleet of workers."""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from .core import VideoDownloader
+from .deadline import Deadline
+from .storage import StorageManager, estimate_size
+from .exceptions import (
+    AuthenticationRequiredError,
+    CircuitOpenError,
+    DeadlineExceededError,
+    DownloadError,
+    DuplicateFileError,
+    UnsupportedPlatformError,
+)
+from .utils import canonical_id, platform_of
+
+logger = logging.getLogger(__name__)
+
+# Queue entry states
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+# Failures no other worker or later attempt can fix
+_PERMANENT_ERRORS = (UnsupportedPlatformError, DuplicateFileError, AuthenticationRequiredError)
+
+
+class Lease:
+    """A worker's claim on one queue entry, valid until it expires."""
+
+    def __init__(self, job_id: str, payload: Dict, token: str, attempts: int):
+        self.job_id = job_id
+        self.payload = payload
+        self.token = token
+        self.attempts = attempts
+
+
+class WorkQueue(ABC):
+    """
+    Work queue backend.
+
+    Workers ``claim()`` an entry and hold it under a lease that they renew
+    with ``heartbeat()`` while working. An entry whose lease runs out (its
+    worker died or stalled) goes back to the queue for another worker, until
+    it has been handed out ``max_attempts`` times. Delivery is therefore
+    at-least-once: a worker that loses its lease finds out from
+    ``heartbeat()``/``complete()`` returning False.
+    """
+
+    def __init__(self, max_attempts: int = 3):
+        """
+        Args:
+            max_attempts: Times an entry is handed out before it is failed
+        """
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    def put(self, job_id: str, payload: Dict) -> bool:
+        """Queue an entry unless one with the same id exists. Returns True if added."""
+        pass
+
+    @abstractmethod
+    def claim(self, worker: str, lease_seconds: float) -> Optional[Lease]:
+        """Lease the oldest available entry, or return None if there is none."""
+        pass
+
+    @abstractmethod
+    def heartbeat(self, lease: Lease, lease_seconds: float) -> bool:
+        """Extend a lease. Returns False if it has been lost."""
+        pass
+
+    @abstractmethod
+    def checkpoint(self, lease: Lease, payload: Dict) -> bool:
+        """
+        Replace a leased entry's payload, so progress kept in it (e.g. upload
+        sessions) survives into later attempts. Returns False if the lease
+        has been lost.
+        """
+        pass
+
+    @abstractmethod
+    def complete(self, lease: Lease, result: Dict) -> bool:
+        """Record an entry as done. Returns False if the lease had been lost."""
+        pass
+
+    @abstractmethod
+    def fail(self, lease: Lease, error: Dict, retry: bool = True) -> bool:
+        """
+        Give an entry up: back to the queue if ``retry`` and attempts remain,
+        otherwise failed for good. Returns False if the lease had been lost.
+        """
+        pass
+
+    @abstractmethod
+    def release(self, lease: Lease, delay: float = 0) -> bool:
+        """
+        Hand an entry back without using up an attempt, e.g. because its
+        platform is refusing work for now. Nobody claims it again for
+        ``delay`` seconds. Returns False if the lease had been lost.
+        """
+        pass
+
+    @abstractmethod
+    def requeue_expired(self) -> int:
+        """Return entries with expired leases to the queue. Returns how many."""
+        pass
+
+    @abstractmethod
+    def counts(self) -> Dict[str, int]:
+        """Return the number of entries in each state."""
+        pass
+
+    def remaining(self) -> int:
+        """Return the number of entries not yet done or failed."""
+        counts = self.counts()
+        return counts.get(PENDING, 0) + counts.get(LEASED, 0)
+
+    def close(self):
+        """Release the backend's connection."""
+        pass
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    id           TEXT PRIMARY KEY,
+    payload      TEXT NOT NULL,
+    state        TEXT NOT NULL,
+    worker       TEXT,
+    token        TEXT,
+    lease_until  REAL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    result       TEXT,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL
+);
+"""
+
+
+class SQLiteQueue(WorkQueue):
+    """Queue in a SQLite file, shared by worker processes on one host."""
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        """
+        Open (creating if needed) a queue.
+
+        Args:
+            path: SQLite database file
+            max_attempts: See ``WorkQueue``
+        """
+        super().__init__(max_attempts)
+        self.path = path
+        self._lock = threading.Lock()
+        # Other processes hold the write lock briefly; wait for it
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def put(self, job_id: str, payload: Dict) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO queue (id, payload, state, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (job_id, json.dumps(payload), PENDING, now, now),
+            )
+        return cursor.rowcount == 1
+
+    def claim(self, worker: str, lease_seconds: float) -> Optional[Lease]:
+        self.requeue_expired()
+        now = time.time()
+        token = uuid.uuid4().hex
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two processes can't
+            # both select the same row
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                # A released entry keeps lease_until as the time it may be claimed again
+                row = self._conn.execute(
+                    'SELECT id, payload, attempts FROM queue WHERE state = ? '
+                    'AND (lease_until IS NULL OR lease_until <= ?) '
+                    'ORDER BY created_at, rowid LIMIT 1', (PENDING, now),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        'UPDATE queue SET state = ?, worker = ?, token = ?, lease_until = ?, '
+                        'attempts = attempts + 1, updated_at = ? WHERE id = ?',
+                        (LEASED, worker, token, now + lease_seconds, now, row['id']),
+                    )
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        if row is None:
+            return None
+        return Lease(row['id'], json.loads(row['payload']), token, row['attempts'] + 1)
+
+    def heartbeat(self, lease: Lease, lease_seconds: float) -> bool:
+        return self._update_leased(lease, 'lease_until = ?', time.time() + lease_seconds)
+
+    def checkpoint(self, lease: Lease, payload: Dict) -> bool:
+        return self._update_leased(lease, 'payload = ?', json.dumps(payload))
+
+    def complete(self, lease: Lease, result: Dict) -> bool:
+        return self._update_leased(lease, 'state = ?, token = NULL, result = ?',
+                                   DONE, json.dumps(result))
+
+    def fail(self, lease: Lease, error: Dict, retry: bool = True) -> bool:
+        state = PENDING if retry and lease.attempts < self.max_attempts else FAILED
+        return self._update_leased(lease, 'state = ?, token = NULL, lease_until = NULL, '
+                                   'result = ?', state, json.dumps(error))
+
+    def release(self, lease: Lease, delay: float = 0) -> bool:
+        return self._update_leased(lease, 'state = ?, token = NULL, lease_until = ?, '
+                                   'attempts = attempts - 1', PENDING, time.time() + delay)
+
+    def _update_leased(self, lease: Lease, assignments: str, *values) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE queue SET {assignments}, updated_at = ? "
+                'WHERE id = ? AND token = ? AND state = ?',
+                (*values, time.time(), lease.job_id, lease.token, LEASED),
+            )
+        return cursor.rowcount == 1
+
+    def requeue_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE queue SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, '
+                'token = NULL, updated_at = ? WHERE state = ? AND lease_until < ?',
+                (self.max_attempts, FAILED, PENDING, now, LEASED, now),
+            )
+        if cursor.rowcount:
+            logger.warning(f"Requeued {cursor.rowcount} entr(y/ies) with expired leases")
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute('SELECT state, COUNT(*) FROM queue GROUP BY state').fetchall()
+        return {state: count for state, count in rows}
+
+
+class RedisError(Exception):
+    """Raised when a Redis-protocol server replies with an error."""
+    pass
+
+
+class _RespConnection:
+    """Just enough of the Redis protocol (RESP2) to run the queue commands."""
+
+    def __init__(self, host: str, port: int, db: int = 0, timeout: float = 30):
+        self._lock = threading.Lock()
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._reader = self._sock.makefile('rb')
+        if db:
+            self.execute('SELECT', db)
+
+    def close(self):
+        with self._lock:
+            self._reader.close()
+            self._sock.close()
+
+    def execute(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        with self._lock:
+            self._sock.sendall(b''.join(parts))
+            return self._read()
+
+    def _read(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError('Redis connection closed')
+        prefix, rest = line[:1], line[1:-2]
+        if prefix == b'+':
+            return rest.decode('utf-8')
+        if prefix == b'-':
+            raise RedisError(rest.decode('utf-8'))
+        if prefix == b':':
+            return int(rest)
+        if prefix == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)[:-2]
+            return data.decode('utf-8')
+        if prefix == b'*':
+            length = int(rest)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+
+class RedisQueue(WorkQueue):
+    """
+    Queue on a Redis-protocol server, shared by workers on any number of hosts.
+
+    Keys (under ``prefix``): a ``pending`` list of ids, a ``leases`` sorted
+    set scored by lease deadline, a ``delayed`` sorted set of released ids
+    scored by when they may be claimed again, and hashes mapping id to
+    payload, state, lease token, attempts and result. Only plain commands are used (no Lua),
+    so any server speaking the protocol will do; an expired lease is
+    reclaimed by whichever worker removes it from ``leases`` first.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6379, db: int = 0,
+                 prefix: str = 'paola:queue', max_attempts: int = 3):
+        """
+        Connect to a queue.
+
+        Args:
+            host: Server host
+            port: Server port
+            db: Database number
+            prefix: Key prefix, so several queues can share a server
+            max_attempts: See ``WorkQueue``
+        """
+        super().__init__(max_attempts)
+        self.prefix = prefix
+        self._conn = _RespConnection(host, port, db)
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}:{name}"
+
+    def close(self):
+        self._conn.close()
+
+    def put(self, job_id: str, payload: Dict) -> bool:
+        if not self._conn.execute('HSETNX', self._key('state'), job_id, PENDING):
+            return False
+        self._conn.execute('HSET', self._key('payload'), job_id, json.dumps(payload))
+        self._conn.execute('RPUSH', self._key('pending'), job_id)
+        return True
+
+    def claim(self, worker: str, lease_seconds: float) -> Optional[Lease]:
+        self.requeue_expired()
+        self._requeue_delayed()
+        job_id = self._conn.execute('LPOP', self._key('pending'))
+        if job_id is None:
+            return None
+        # A worker dying right here strands the entry as pending-but-unlisted;
+        # the window is a few round trips, against a lease of minutes.
+        token = uuid.uuid4().hex
+        self._conn.execute('ZADD', self._key('leases'), time.time() + lease_seconds, job_id)
+        self._conn.execute('HSET', self._key('tokens'), job_id, token)
+        self._conn.execute('HSET', self._key('state'), job_id, LEASED)
+        attempts = self._conn.execute('HINCRBY', self._key('attempts'), job_id, 1)
+        payload = json.loads(self._conn.execute('HGET', self._key('payload'), job_id) or '{}')
+        return Lease(job_id, payload, token, attempts)
+
+    def _holds(self, lease: Lease) -> bool:
+        return self._conn.execute('HGET', self._key('tokens'), lease.job_id) == lease.token
+
+    def heartbeat(self, lease: Lease, lease_seconds: float) -> bool:
+        if not self._holds(lease):
+            return False
+        self._conn.execute('ZADD', self._key('leases'), 'XX',
+                           time.time() + lease_seconds, lease.job_id)
+        return True
+
+    def checkpoint(self, lease: Lease, payload: Dict) -> bool:
+        if not self._holds(lease):
+            return False
+        self._conn.execute('HSET', self._key('payload'), lease.job_id, json.dumps(payload))
+        return True
+
+    def complete(self, lease: Lease, result: Dict) -> bool:
+        return self._finish(lease, DONE, result)
+
+    def fail(self, lease: Lease, error: Dict, retry: bool = True) -> bool:
+        state = PENDING if retry and lease.attempts < self.max_attempts else FAILED
+        return self._finish(lease, state, error)
+
+    def release(self, lease: Lease, delay: float = 0) -> bool:
+        if not self._holds(lease):
+            return False
+        if not self._conn.execute('ZREM', self._key('leases'), lease.job_id):
+            return False  # expired and reclaimed in the meantime
+        self._conn.execute('HDEL', self._key('tokens'), lease.job_id)
+        self._conn.execute('HINCRBY', self._key('attempts'), lease.job_id, -1)
+        self._conn.execute('HSET', self._key('state'), lease.job_id, PENDING)
+        self._conn.execute('ZADD', self._key('delayed'), time.time() + delay, lease.job_id)
+        return True
+
+    def _requeue_delayed(self):
+        """Move released entries whose delay is over back onto the pending list."""
+        due = self._conn.execute('ZRANGEBYSCORE', self._key('delayed'), '-inf', time.time())
+        for job_id in due or []:
+            # Whoever removes it owns the requeue
+            if self._conn.execute('ZREM', self._key('delayed'), job_id):
+                self._conn.execute('RPUSH', self._key('pending'), job_id)
+
+    def _finish(self, lease: Lease, state: str, result: Dict) -> bool:
+        if not self._holds(lease):
+            return False
+        if not self._conn.execute('ZREM', self._key('leases'), lease.job_id):
+            return False  # expired and reclaimed in the meantime
+        self._conn.execute('HDEL', self._key('tokens'), lease.job_id)
+        self._conn.execute('HSET', self._key('results'), lease.job_id, json.dumps(result))
+        self._conn.execute('HSET', self._key('state'), lease.job_id, state)
+        if state == PENDING:
+            self._conn.execute('RPUSH', self._key('pending'), lease.job_id)
+        return True
+
+    def requeue_expired(self) -> int:
+        expired = self._conn.execute('ZRANGEBYSCORE', self._key('leases'), '-inf', time.time())
+        requeued = 0
+        for job_id in expired or []:
+            # Whoever removes the lease owns the requeue
+            if not self._conn.execute('ZREM', self._key('leases'), job_id):
+                continue
+            self._conn.execute('HDEL', self._key('tokens'), job_id)
+            attempts = int(self._conn.execute('HGET', self._key('attempts'), job_id) or 0)
+            if attempts >= self.max_attempts:
+                self._conn.execute('HSET', self._key('state'), job_id, FAILED)
+            else:
+                self._conn.execute('HSET', self._key('state'), job_id, PENDING)
+                self._conn.execute('RPUSH', self._key('pending'), job_id)
+            requeued += 1
+        if requeued:
+            logger.warning(f"Requeued {requeued} entr(y/ies) with expired leases")
+        return requeued
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for state in self._conn.execute('HVALS', self._key('state')) or []:
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
+
+def open_queue(url: str, max_attempts: int = 3) -> WorkQueue:
+    """
+    Open a queue from its URL.
+
+    Args:
+        url: ``redis://host:port/db``, ``sqlite:///path/queue.db`` or a plain
+            path to a SQLite file
+        max_attempts: See ``WorkQueue``
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == 'redis':
+        db = int(parsed.path.lstrip('/') or 0)
+        return RedisQueue(parsed.hostname or '127.0.0.1', parsed.port or 6379, db,
+                          max_attempts=max_attempts)
+    if parsed.scheme == 'sqlite':
+        return SQLiteQueue(parsed.path, max_attempts=max_attempts)
+    if parsed.scheme:
+        raise ValueError(f"Unsupported queue URL: {url}")
+    return SQLiteQueue(url, max_attempts=max_attempts)
+
+
+def enqueue(queue: WorkQueue, url: str, title: Optional[str] = None) -> bool:
+    """Queue a download under its canonical id. Returns False if already queued."""
+    return queue.put(canonical_id(url), {'url': url, 'title': title})
+
+
+class Worker:
+    """
+    Pull jobs from a queue until it is drained: download, upload, record.
+
+    While a job runs, a background thread renews its lease every third of
+    ``lease_seconds``, so a long download keeps its claim and a crashed
+    worker's job is picked up by another worker once the lease runs out.
+
+    A job whose platform has its circuit open goes back to the queue
+    without using up an attempt, and is not claimed again until the circuit
+    lets a probe through. With a ``deadline``, downloads and uploads stop
+    when it comes and the job goes back to the queue the same way, its
+    progress kept; the worker then claims nothing more.
+
+    Uploads are resumable as in ``BatchRunner``: each file's upload session,
+    and its remote id once sent, are checkpointed into the queue entry, so a
+    later attempt continues the session and skips files already uploaded.
+    With ``storage``, downloads wait for room in the disk budget and each
+    file is deleted once its upload is confirmed.
+    """
+
+    def __init__(self,
+                 queue: WorkQueue,
+                 downloader: VideoDownloader,
+                 uploader: Optional[Callable[..., Optional[str]]] = None,
+                 lease_seconds: float = 120,
+                 poll_interval: float = 5,
+                 worker_id: Optional[str] = None,
+                 storage: Optional[StorageManager] = None,
+                 deadline: Optional[Deadline] = None):
+        """
+        Initialize the worker.
+
+        Args:
+            queue: Where jobs come from
+            downloader: Downloader used for every job
+            uploader: Optional upload step, called like a ``BatchRunner``
+                uploader: ``uploader(path, session_uri=None, on_session=None)``
+                returning a remote id, or None when the upload failed
+            lease_seconds: How long a claim lasts without a heartbeat
+            poll_interval: Seconds to wait when every remaining job is leased
+                by someone else
+            worker_id: Name recorded on claims (default: host and pid)
+            storage: Optional disk budget for the downloader's output directory
+            deadline: When to stop working, leaving unfinished jobs resumable
+        """
+        self.queue = queue
+        self.downloader = downloader
+        self.uploader = uploader
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.storage = storage
+        self.deadline = deadline if deadline is not None else Deadline()
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Finish the current job, then stop."""
+        self._stop.set()
+
+    def run(self) -> List[Dict]:
+        """
+        Process jobs until the queue has nothing left, ``stop()`` is called or
+        the deadline passes.
+
+        Returns:
+            A record per job this worker finished (``id``, ``url``, ``state``,
+            ``filepath``, ``remote_id``, ``error``, ``error_type``), in the
+            shape the batch runner reports. A job the deadline stopped is
+            included in state ``pending``.
+        """
+        finished = []
+        while not self._stop.is_set() and not self.deadline.expired():
+            lease = self.queue.claim(self.worker_id, self.lease_seconds)
+            if lease is None:
+                if self.queue.remaining() == 0:
+                    break
+                # Others hold the rest; one of their leases may yet expire
+                self._stop.wait(min(self.poll_interval, self.deadline.remaining()))
+                continue
+            record = self.process(lease)
+            if record is not None:
+                finished.append(record)
+        logger.info(f"Worker {self.worker_id} finished {len(finished)} job(s)")
+        return finished
+
+    def process(self, lease: Lease) -> Optional[Dict]:
+        """
+        Run one claimed job under a renewed lease.
+
+        Returns:
+            The job's record, or None if the lease was lost before it finished
+            (another worker now owns the job)
+        """
+        url, title = lease.payload['url'], lease.payload.get('title')
+        logger.info(f"{self.worker_id}: {lease.job_id} (attempt {lease.attempts})")
+
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(lease, done), daemon=True)
+        heartbeat.start()
+        try:
+            outcome, retry = self._run_job(lease)
+        finally:
+            done.set()
+            heartbeat.join()
+
+        record = dict(outcome, id=lease.job_id, url=url, title=title)
+        if record['state'] == PENDING:
+            if self.queue.release(lease, outcome['delay']):
+                logger.info(f"{lease.job_id} put back for {outcome['delay']:.0f}s: "
+                            f"{outcome['error']}")
+            else:
+                logger.warning(f"{lease.job_id}: lease lost before it was put back")
+                return None
+            # Reported as left over, like a batch job the deadline stopped
+            return record if outcome['error_type'] == DeadlineExceededError.__name__ else None
+        if record['state'] == DONE:
+            recorded = self.queue.complete(lease, outcome)
+        else:
+            recorded = self.queue.fail(lease, outcome, retry=retry)
+            if recorded and retry and lease.attempts < self.queue.max_attempts:
+                logger.info(f"{lease.job_id} returned to the queue: {outcome['error']}")
+                return None
+        if not recorded:
+            logger.warning(f"{lease.job_id}: lease lost before the result was recorded")
+            return None
+        return record
+
+    def _heartbeat(self, lease: Lease, done: threading.Event):
+        while not done.wait(self.lease_seconds / 3):
+            if not self.queue.heartbeat(lease, self.lease_seconds):
+                logger.warning(f"{lease.job_id}: lease lost")
+                return
+
+    def _run_job(self, lease: Lease) -> tuple:
+        """
+        Download and upload one job.
+
+        Returns:
+            ``(outcome, retryable)``; an outcome in state ``PENDING`` hands the
+            job back, to be claimed again after its ``delay``
+        """
+        url, title = lease.payload['url'], lease.payload.get('title')
+        reservations = []
+        options = {}
+        if self.deadline.at is not None:
+            options['deadline'] = self.deadline.at
+        if self.storage:
+            # Runs on the download thread, holding the transfer back until there is room
+            options['before_download'] = lambda info: reservations.append(
+                self.storage.reserve(estimate_size(info)))
+        try:
+            result = self.downloader.download(url, title, **options)
+        except CircuitOpenError as e:
+            # Not this job's fault: wait for the platform instead of burning attempts
+            breaker = self.downloader.breaker
+            delay = breaker.retry_after(platform_of(url)) if breaker else 0
+            return dict(_failure(e), state=PENDING, delay=delay), True
+        except DeadlineExceededError as e:
+            return self._out_of_time(e), True
+        except DownloadError as e:
+            return _failure(e), not isinstance(e, _PERMANENT_ERRORS)
+        except Exception as e:
+            logger.error(f"{url}: unexpected error: {e}", exc_info=True)
+            return _failure(e), True
+        finally:
+            # Swapped for the files' real sizes below
+            for reservation in reservations:
+                self.storage.cancel(reservation)
+
+        if not result['success']:
+            return dict(_failure(DownloadError(result.get('error'))),
+                        error=result.get('error')), True
+
+        filepaths = result.get('filepaths') or [result['filepath']]
+        if self.storage:
+            for path in filepaths:
+                self.storage.track(path)
+        outcome = {'state': DONE, 'filepath': filepaths[0], 'filepaths': filepaths,
+                   'remote_id': None, 'error': None, 'error_type': None}
+        if self.uploader is not None:
+            remote_ids = []
+            for path in filepaths:
+                try:
+                    remote_id = self._upload(lease, path)
+                except DeadlineExceededError as e:
+                    return self._out_of_time(e), True
+                if not remote_id:
+                    return dict(outcome, state=FAILED, error=f'upload failed: {path}',
+                                error_type='UploadError'), True
+                remote_ids.append(remote_id)
+            outcome['remote_id'] = ', '.join(remote_ids)
+        return outcome, False
+
+    def _upload(self, lease: Lease, path: str) -> Optional[str]:
+        """Upload one file, continuing an earlier attempt's session; returns its remote id."""
+        upload = lease.payload.get('uploads', {}).get(path, {})
+        remote_id = upload.get('remote_id')
+        if not remote_id:
+            self.deadline.check(f"Not uploading {path}")
+            options = {'deadline': self.deadline} if self.deadline.at is not None else {}
+            remote_id = self.uploader(
+                path,
+                session_uri=upload.get('session'),
+                on_session=lambda uri: self._checkpoint(lease, path, session=uri),
+                **options,
+            )
+            if not remote_id:
+                return None
+            self._checkpoint(lease, path, remote_id=remote_id, session=None)
+        if self.storage:
+            self.storage.release(path)
+        return remote_id
+
+    def _out_of_time(self, error: DeadlineExceededError) -> Dict:
+        """Stop working and hand the job back for whoever runs next."""
+        logger.warning(f"{error}; stopping")
+        self.stop()
+        return dict(_failure(error), state=PENDING, delay=0)
+
+    def _checkpoint(self, lease: Lease, path: str, **fields):
+        """Record upload progress on ``path`` in the queue entry."""
+        lease.payload.setdefault('uploads', {}).setdefault(path, {}).update(fields)
+        if not self.queue.checkpoint(lease, lease.payload):
+            logger.warning(f"{lease.job_id}: lease lost, upload progress not recorded")
+
+
+def _failure(error: Exception) -> Dict:
+    return {'state': FAILED, 'error': str(error), 'error_type': type(error).__name__,
+            'filepath': None, 'remote_id': None}
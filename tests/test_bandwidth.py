@@ -0,0 +1,129 @@
+"""Tests for the shared download and upload bandwidth limits."""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader.bandwidth import BandwidthLimiter, TokenBucket, parse_rate, progress_hook
+from downloader.providers.worker import ParentBucket
+
+KiB = 1024
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_unlimited_never_waits(self):
+        bucket = TokenBucket()
+        started = time.monotonic()
+        bucket.consume(10 * 2**30)
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual(bucket.stats()['consumed'], 10 * 2**30)
+
+    def test_rate_is_shared_by_threads(self):
+        bucket = TokenBucket(rate=400 * KiB, burst=40 * KiB)
+        bucket.consume(40 * KiB)  # spend the initial burst
+
+        def transfer():
+            for _ in range(5):
+                bucket.consume(20 * KiB)
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=transfer) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        # 200 KiB at 400 KiB/s; the last chunk goes through on credit
+        elapsed = time.monotonic() - started
+        self.assertGreater(elapsed, 0.35)
+        self.assertLess(elapsed, 1.5)
+
+    def test_chunk_larger_than_the_burst_passes(self):
+        bucket = TokenBucket(rate=100 * KiB)
+        started = time.monotonic()
+        bucket.consume(10 * 2**20)
+        self.assertLess(time.monotonic() - started, 0.1)
+
+    def test_lifting_the_limit_releases_waiters(self):
+        bucket = TokenBucket(rate=1 * KiB)
+        bucket.consume(100 * KiB)  # 100 s of debt
+        done = threading.Event()
+        thread = threading.Thread(target=lambda: (bucket.consume(1), done.set()))
+        thread.start()
+        self.assertFalse(done.wait(0.1))
+        bucket.set_rate(None)
+        self.assertTrue(done.wait(5))
+        thread.join(5)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('2M'), 2 * 2**20)
+        self.assertEqual(parse_rate(1500), 1500.0)
+        self.assertIsNone(parse_rate('0'))
+        self.assertIsNone(parse_rate(None))
+        with self.assertRaises(ValueError):
+            parse_rate('fast')
+        with self.assertRaises(ValueError):
+            parse_rate(-1)
+
+
+class TestBandwidthLimiter(unittest.TestCase):
+
+    def test_directions_are_separate(self):
+        limiter = BandwidthLimiter(download=2**20)
+        limiter.set_limits(upload='512K')
+        self.assertEqual(limiter.download.rate, 2**20)
+        self.assertEqual(limiter.upload.rate, 512 * KiB)
+        limiter.set_limits(download=None)
+        self.assertEqual(limiter.stats()['download']['rate'], None)
+
+    def test_unknown_direction_changes_nothing(self):
+        limiter = BandwidthLimiter(download=2**20)
+        with self.assertRaises(ValueError):
+            limiter.set_limits(download='1M', sideways='1M')
+        self.assertEqual(limiter.download.rate, 2**20)
+
+
+class _Recorder:
+
+    def __init__(self):
+        self.consumed = []
+
+    def consume(self, nbytes):
+        self.consumed.append(nbytes)
+
+
+class TestProgressHook(unittest.TestCase):
+
+    def test_spends_what_each_file_received(self):
+        bucket = _Recorder()
+        hook = progress_hook(bucket)
+        hook({'status': 'downloading', 'tmpfilename': 'a.part', 'downloaded_bytes': 100})
+        hook({'status': 'downloading', 'tmpfilename': 'b.part', 'downloaded_bytes': 30})
+        hook({'status': 'downloading', 'tmpfilename': 'a.part', 'downloaded_bytes': 250})
+        hook({'status': 'finished', 'filename': 'a.part', 'downloaded_bytes': 300})
+        self.assertEqual(bucket.consumed, [100, 30, 150, 50])
+
+    def test_restarted_file_counts_from_zero(self):
+        bucket = _Recorder()
+        hook = progress_hook(bucket)
+        hook({'status': 'downloading', 'tmpfilename': 'a.part', 'downloaded_bytes': 500})
+        hook({'status': 'downloading', 'tmpfilename': 'a.part', 'downloaded_bytes': 200})
+        self.assertEqual(bucket.consumed, [500, 200])
+
+
+class TestParentBucket(unittest.TestCase):
+
+    def test_asks_the_parent_once_per_step(self):
+        asked = []
+        bucket = ParentBucket(asked.append, step=100)
+        for _ in range(7):
+            bucket.consume(40)
+        self.assertEqual(asked, [120, 120])
+
+
+if __name__ == '__main__':
+    unittest.main()
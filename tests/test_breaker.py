@@ -0,0 +1,191 @@
+"""Tests for per-platform circuit breakers and the retry budget."""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader import VideoDownloader
+from downloader.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, RetryBudget
+from downloader.exceptions import CircuitOpenError
+from downloader.providers import BaseProvider
+
+
+class _Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = _Clock()
+        self.breaker = CircuitBreaker(threshold=3, cooldown=60, clock=self.clock)
+
+    def _fail(self, times, key='instagram'):
+        for _ in range(times):
+            self.breaker.record(key, ok=False)
+
+    def test_opens_after_consecutive_failures(self):
+        self._fail(2)
+        self.breaker.record('instagram', ok=True)
+        self._fail(2)
+        self.assertTrue(self.breaker.allow('instagram'))
+        self._fail(1)
+        self.assertEqual(self.breaker.state('instagram'), OPEN)
+        self.assertFalse(self.breaker.allow('instagram'))
+        self.assertFalse(self.breaker.closed('instagram'))
+        self.assertEqual(self.breaker.retry_after('instagram'), 60)
+        # Other platforms are unaffected
+        self.assertTrue(self.breaker.allow('youtube'))
+
+    def test_half_open_lets_one_probe_through(self):
+        self._fail(3)
+        self.clock.now = 60
+        self.assertTrue(self.breaker.allow('instagram'))
+        self.assertEqual(self.breaker.state('instagram'), HALF_OPEN)
+        self.assertFalse(self.breaker.allow('instagram'))
+        self.breaker.record('instagram', ok=True)
+        self.assertEqual(self.breaker.state('instagram'), CLOSED)
+        self.assertTrue(self.breaker.allow('instagram'))
+
+    def test_failed_probe_reopens(self):
+        self._fail(3)
+        self.clock.now = 60
+        self.assertTrue(self.breaker.allow('instagram'))
+        self._fail(1)
+        self.assertEqual(self.breaker.state('instagram'), OPEN)
+        self.clock.now = 100
+        self.assertFalse(self.breaker.allow('instagram'))
+        self.assertEqual(self.breaker.stats()['instagram']['opened'], 2)
+
+    def test_failures_that_are_not_the_platforms_change_nothing(self):
+        self._fail(2)
+        self.breaker.record('instagram', ok=None)
+        self.assertEqual(self.breaker.stats()['instagram']['failures'], 2)
+        self._fail(1)
+        self.assertEqual(self.breaker.state('instagram'), OPEN)
+        # A probe that ends so is replaced straight away
+        self.clock.now = 60
+        self.assertTrue(self.breaker.allow('instagram'))
+        self.breaker.record('instagram', ok=None)
+        self.assertEqual(self.breaker.state('instagram'), HALF_OPEN)
+        self.assertTrue(self.breaker.allow('instagram'))
+
+    def test_lost_probe_is_replaced_after_a_cooldown(self):
+        self._fail(3)
+        self.clock.now = 60
+        self.assertTrue(self.breaker.allow('instagram'))
+        self.clock.now = 120
+        self.assertTrue(self.breaker.allow('instagram'))
+
+
+class TestRetryBudget(unittest.TestCase):
+
+    def test_retries_are_capped_at_a_share_of_attempts(self):
+        clock = _Clock()
+        budget = RetryBudget(ratio=0.2, min_retries=1, window=60, clock=clock)
+        for _ in range(10):
+            budget.record_attempt()
+        # 1 + 0.2 * 10
+        self.assertEqual([budget.try_retry() for _ in range(4)], [True, True, True, False])
+        self.assertEqual(budget.stats()['denied'], 1)
+
+        clock.now = 61
+        self.assertTrue(budget.try_retry())
+
+
+class _FlakyProvider(BaseProvider):
+    """Fails every attempt, reporting each and asking before each retry."""
+
+    def __init__(self, retries=2, **failure):
+        self.retries = retries
+        self.failure = failure or {'throttled': True}
+        self.calls = 0
+        self.listeners = []
+        self.gate = None
+
+    @property
+    def name(self):
+        return 'flaky'
+
+    def supports(self, url):
+        return True
+
+    def extract_info(self, url):
+        return {}
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def set_retry_gate(self, gate):
+        self.gate = gate
+
+    def download(self, url, output_path, title=None, **options):
+        return self.download_all(url, output_path, title, **options)[0]
+
+    def download_all(self, url, output_path, title=None, **options):
+        self.calls += 1
+        for attempt in range(self.retries + 1):
+            if attempt and not self.gate(url):
+                break
+            for listener in self.listeners:
+                listener(dict({'url': url, 'ok': False}, **self.failure))
+        raise RuntimeError('rate-limit reached')
+
+
+class TestDownloaderGuards(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _downloader(self, provider, **guards):
+        return VideoDownloader(output_dir=self._tmp.name, prevent_duplicates=False,
+                               providers=[provider], **guards)
+
+    def test_open_circuit_fails_jobs_fast(self):
+        provider = _FlakyProvider(retries=2)
+        downloader = self._downloader(provider, breaker=CircuitBreaker(threshold=2))
+        result = downloader.download('https://www.instagram.com/p/a/')
+        self.assertFalse(result['success'])
+        # The circuit opened on the second attempt, so the third was not made
+        with self.assertRaises(CircuitOpenError):
+            downloader.download('https://www.instagram.com/p/b/')
+        self.assertEqual(provider.calls, 1)
+        # Other platforms still get tried
+        self.assertFalse(downloader.download('https://youtu.be/abcdefghijk')['success'])
+        self.assertEqual(provider.calls, 2)
+
+    def test_failures_off_the_platform_do_not_open_the_circuit(self):
+        # e.g. ffmpeg failing to merge, or the disk filling up
+        provider = _FlakyProvider(retries=2, throttled=False, auth=False, extraction=False)
+        downloader = self._downloader(provider, breaker=CircuitBreaker(threshold=2))
+        self.assertFalse(downloader.download('https://www.instagram.com/p/a/')['success'])
+        self.assertFalse(downloader.download('https://www.instagram.com/p/b/')['success'])
+        self.assertEqual(provider.calls, 2)
+        self.assertEqual(downloader.breaker.state('instagram'), CLOSED)
+
+    def test_extraction_failures_open_the_circuit(self):
+        provider = _FlakyProvider(retries=2, extraction=True)
+        downloader = self._downloader(provider, breaker=CircuitBreaker(threshold=2))
+        downloader.download('https://www.instagram.com/p/a/')
+        self.assertEqual(downloader.breaker.state('instagram'), OPEN)
+
+    def test_retry_budget_limits_retries(self):
+        provider = _FlakyProvider(retries=5)
+        downloader = self._downloader(provider, retry_budget=RetryBudget(ratio=0, min_retries=2))
+        downloader.download('https://example.com/a')
+        self.assertEqual(downloader.retry_budget.stats()['attempts'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
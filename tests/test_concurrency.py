@@ -0,0 +1,98 @@
+"""Tests for the adaptive download concurrency limit."""
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader.concurrency import AIMDController
+
+MiB = 2**20
+
+
+class _Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAIMDController(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = _Clock()
+        self.controller = AIMDController(initial=2, max_limit=8, interval=10, clock=self.clock)
+
+    def _interval(self, mib, busy=True):
+        """Run one measuring interval that moves ``mib`` MiB."""
+        if busy:
+            for _ in range(self.controller.limit):
+                self.controller.acquire()
+        self.controller.observe({'bytes': mib * MiB})
+        self.clock.now += 10
+        if busy:
+            for _ in range(self.controller.active):
+                self.controller.release()
+        else:
+            self.controller.observe({})
+
+    def test_grows_while_throughput_improves(self):
+        self._interval(10)
+        self.assertEqual(self.controller.limit, 3)
+        self._interval(20)
+        self.assertEqual(self.controller.limit, 4)
+        self._interval(20)
+        self.assertEqual(self.controller.limit, 4)
+
+    def test_does_not_grow_when_the_limit_is_not_used(self):
+        self._interval(10, busy=False)
+        self.assertEqual(self.controller.limit, 2)
+
+    def test_undoes_an_increase_that_lowered_throughput(self):
+        self._interval(10)
+        self.assertEqual(self.controller.limit, 3)
+        self._interval(5)
+        self.assertEqual(self.controller.limit, 2)
+
+    def test_throttle_halves_the_limit_once_per_interval(self):
+        controller = AIMDController(initial=8, max_limit=8, interval=10, clock=self.clock)
+        controller.observe({'throttled': True})
+        controller.observe({'auth': True})
+        self.assertEqual(controller.limit, 4)
+        self.clock.now += 10
+        controller.observe({'throttled': True})
+        self.assertEqual(controller.limit, 2)
+        self.assertEqual(controller.stats()['throttles'], 3)
+
+    def test_limit_stays_within_bounds(self):
+        controller = AIMDController(initial=1, max_limit=2, interval=10, clock=self.clock)
+        controller.observe({'throttled': True})
+        self.assertEqual(controller.limit, 1)
+
+    def test_acquire_waits_at_the_limit(self):
+        controller = AIMDController(initial=1, max_limit=4)
+        controller.acquire()
+        entered = threading.Event()
+
+        def second():
+            with controller:
+                entered.set()
+
+        thread = threading.Thread(target=second)
+        thread.start()
+        self.assertFalse(entered.wait(0.1))
+        controller.release()
+        self.assertTrue(entered.wait(5))
+        thread.join(5)
+
+    def test_rejects_inconsistent_bounds(self):
+        with self.assertRaises(ValueError):
+            AIMDController(min_limit=4, max_limit=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
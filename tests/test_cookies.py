@@ -0,0 +1,87 @@
+"""Tests for the cookie session pool."""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader.cookies import CookiePool, CookieSession
+
+NETSCAPE_COOKIES = (
+    "# Netscape HTTP Cookie File\n"
+    ".instagram.com\tTRUE\t/\tTRUE\t2147483647\tsessionid\t{value}\n"
+)
+
+
+class TestCookiePool(unittest.TestCase):
+    """Sessions rotate, and throttled ones sit out their cooldown."""
+
+    def _pool(self, count=3, cooldown=60):
+        return CookiePool([CookieSession(f"account{i}.txt", jar=object()) for i in range(count)],
+                          cooldown=cooldown)
+
+    def test_healthy_sessions_rotate_round_robin(self):
+        pool = self._pool()
+        with patch('downloader.cookies.time.monotonic', side_effect=range(1, 7)):
+            names = [pool.acquire().name for _ in range(6)]
+        self.assertEqual(names, ['account0.txt', 'account1.txt', 'account2.txt'] * 2)
+
+    def test_throttled_session_is_skipped_until_its_cooldown_ends(self):
+        pool = self._pool(count=2, cooldown=60)
+        with patch('downloader.cookies.time.monotonic', return_value=100):
+            first = pool.acquire()
+            pool.throttled(first)
+            self.assertIsNot(pool.acquire(), first)
+            self.assertIsNot(pool.acquire(), first)
+            self.assertEqual(pool.available(), 1)
+        with patch('downloader.cookies.time.monotonic', return_value=161):
+            self.assertEqual(pool.available(), 2)
+
+    def test_least_recently_throttled_is_used_when_all_are_cooling_down(self):
+        pool = self._pool(count=2, cooldown=60)
+        a, b = pool.sessions
+        with patch('downloader.cookies.time.monotonic', return_value=100):
+            pool.throttled(a)
+        with patch('downloader.cookies.time.monotonic', return_value=110):
+            pool.throttled(b)
+            self.assertIs(pool.acquire(), a)
+
+    def test_empty_pool_hands_out_nothing(self):
+        self.assertIsNone(CookiePool([]).acquire())
+
+
+class TestLoading(unittest.TestCase):
+    """Cookie files are parsed once; bad entries are skipped."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+
+    def _write(self, name, value):
+        path = os.path.join(self._tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(NETSCAPE_COOKIES.format(value=value))
+        return path
+
+    def test_from_env_reads_every_listed_file(self):
+        paths = [self._write('a.txt', 'one'), self._write('b.txt', 'two'),
+                 os.path.join(self._tmp.name, 'missing.txt')]
+        with patch.dict(os.environ, {'COOKIES_FILE': os.pathsep.join(paths)}):
+            pool = CookiePool.from_env()
+
+        self.assertEqual([s.name for s in pool.sessions], ['a.txt', 'b.txt'])
+        values = [next(iter(s.jar)).value for s in pool.sessions]
+        self.assertEqual(values, ['one', 'two'])
+
+    def test_from_env_without_usable_files_is_none(self):
+        with patch.dict(os.environ, {'COOKIES_FILE': ''}):
+            self.assertIsNone(CookiePool.from_env())
+        with patch.dict(os.environ, {'COOKIES_FILE': '/nonexistent/cookies.txt'}):
+            self.assertIsNone(CookiePool.from_env())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+"""Tests for run and job deadlines."""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader import VideoDownloader
+from downloader.deadline import Deadline, parse_duration
+from downloader.exceptions import DeadlineExceededError
+from downloader.jobstore import (
+    DONE,
+    DOWNLOADED,
+    DOWNLOADING,
+    FAILED,
+    QUEUED,
+    UPLOADING,
+    JobStore,
+)
+from downloader.pipeline import BatchRunner
+from downloader.providers import BaseProvider
+from downloader.providers.ytdlp_provider import YtDlpProvider
+
+
+class _Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration('90'), 90)
+        self.assertEqual(parse_duration('90m'), 5400)
+        self.assertEqual(parse_duration('5h30m'), 19800)
+        self.assertEqual(parse_duration('1.5h'), 5400)
+        self.assertIsNone(parse_duration(''))
+        self.assertIsNone(parse_duration('0'))
+        with self.assertRaises(ValueError):
+            parse_duration('soon')
+
+    def test_remaining_and_expiry(self):
+        clock = _Clock()
+        deadline = Deadline.after(60, clock)
+        self.assertEqual(deadline.remaining(), 60)
+        self.assertTrue(deadline.allows(59))
+        self.assertFalse(deadline.allows(60))
+        clock.now += 60
+        self.assertTrue(deadline.expired())
+        with self.assertRaises(DeadlineExceededError):
+            deadline.check('Upload')
+
+    def test_no_deadline_never_passes(self):
+        deadline = Deadline()
+        self.assertFalse(deadline.expired())
+        self.assertTrue(deadline.allows(10 ** 9))
+
+    def test_within_takes_the_earlier(self):
+        clock = _Clock()
+        deadline = Deadline.after(60, clock)
+        self.assertEqual(deadline.within(30).remaining(), 30)
+        self.assertEqual(deadline.within(120).remaining(), 60)
+        self.assertIs(deadline.within(None), deadline)
+        self.assertEqual(Deadline(clock=clock).within(30).remaining(), 30)
+
+    def test_progress_hook_aborts_after_the_deadline(self):
+        clock = _Clock()
+        hook = Deadline.after(60, clock).progress_hook()
+        hook({'status': 'downloading', 'downloaded_bytes': 1})
+        clock.now += 61
+        hook({'status': 'finished'})
+        with self.assertRaises(DeadlineExceededError):
+            hook({'status': 'downloading', 'downloaded_bytes': 2})
+
+
+class _TimedProvider(BaseProvider):
+    """Records the deadline it is given; runs out of time when asked to."""
+
+    def __init__(self, clock, takes=0.0):
+        self.clock = clock
+        self.takes = takes
+        self.deadlines = []
+
+    @property
+    def name(self):
+        return 'timed'
+
+    def supports(self, url):
+        return True
+
+    def extract_info(self, url):
+        return {}
+
+    def download(self, url, output_path, title=None, **options):
+        return self.download_all(url, output_path, title, **options)[0]
+
+    def download_all(self, url, output_path, title=None, before_download=None,
+                     deadline=None, **options):
+        self.deadlines.append(deadline)
+        path = os.path.join(output_path, f"{title}.mp4")
+        if before_download:
+            before_download({'format_id': '18', '_filename': path})
+        self.clock.now += self.takes
+        if deadline is not None and self.clock() >= deadline:
+            raise DeadlineExceededError(f"Download of {url} stopped: deadline passed")
+        with open(path, 'w') as f:
+            f.write('data')
+        return [path]
+
+
+class TestBatchRunnerDeadline(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.store = JobStore()
+        self.clock = _Clock()
+
+    def tearDown(self):
+        self.store.close()
+        self._tmp.cleanup()
+
+    def _runner(self, provider, seconds, uploader=None, **kwargs):
+        downloader = VideoDownloader(output_dir=self._tmp.name, prevent_duplicates=False,
+                                     providers=[provider])
+        return BatchRunner(downloader, self.store, uploader=uploader,
+                           deadline=Deadline.after(seconds, self.clock), **kwargs)
+
+    def test_job_that_would_not_fit_is_not_started(self):
+        provider = _TimedProvider(self.clock)
+        big = self.store.add('https://example.com/big', 'big')
+        self.store.update(big['id'], est_bytes=100 * 2**20)
+        self.store.add('https://example.com/small', 'small')
+
+        big, small = self._runner(provider, 10, throughput=2**20).run()
+        self.assertEqual(big['state'], QUEUED)
+        self.assertEqual(small['state'], DONE)
+        self.assertEqual(len(provider.deadlines), 1)
+
+    def test_download_stopped_at_the_deadline_is_left_resumable(self):
+        provider = _TimedProvider(self.clock, takes=120)
+        self.store.add('https://example.com/v', 'clip')
+
+        [job] = self._runner(provider, 60).run()
+        self.assertEqual(job['state'], DOWNLOADING)
+        self.assertEqual(job['format_id'], '18')
+        self.assertEqual(provider.deadlines, [self.clock.now - 120 + 60])
+        self.assertEqual(self.store.unfinished()[0]['id'], job['id'])
+
+    def test_job_timeout_fails_the_job(self):
+        provider = _TimedProvider(self.clock, takes=120)
+        self.store.add('https://example.com/v', 'clip')
+
+        [job] = self._runner(provider, 3600, job_timeout=60).run()
+        self.assertEqual(job['state'], FAILED)
+        self.assertEqual(job['error_type'], 'DeadlineExceededError')
+
+    def test_upload_is_not_started_after_the_deadline(self):
+        provider = _TimedProvider(self.clock)
+        path = os.path.join(self._tmp.name, 'done.mp4')
+        open(path, 'w').close()
+        job = self.store.add('https://example.com/v', 'clip')
+        self.store.update(job['id'], DOWNLOADED, filepath=path)
+        uploads = []
+        runner = self._runner(provider, 60, uploader=lambda path, **kw: uploads.append(path))
+        self.clock.now += 60
+
+        [job] = runner.run()
+        self.assertEqual(uploads, [])
+        self.assertNotIn(job['state'], (DONE, FAILED))
+
+    def test_upload_stopped_at_the_deadline_resumes_next_run(self):
+        provider = _TimedProvider(self.clock)
+        self.store.add('https://example.com/v', 'clip')
+        calls = []
+
+        def uploader(path, session_uri=None, on_session=None, deadline=None):
+            calls.append(session_uri)
+            if session_uri is None:
+                on_session('https://upload/session/1')
+                raise DeadlineExceededError(f"Upload of {path} stopped")
+            return 'remote'
+
+        [job] = self._runner(provider, 60, uploader=uploader).run()
+        self.assertEqual(job['state'], UPLOADING)
+        self.assertEqual(self.store.files(job['id'])[0]['upload_session'],
+                         'https://upload/session/1')
+
+        [job] = self._runner(provider, 60, uploader=uploader).run()
+        self.assertEqual(job['state'], DONE)
+        self.assertEqual(calls, [None, 'https://upload/session/1'])
+
+
+class TestYtDlpProviderDeadline(unittest.TestCase):
+
+    def _patched_ydl(self, error):
+        ydl = MagicMock()
+        ydl.__enter__.return_value.extract_info.side_effect = error
+        return patch('downloader.providers.ytdlp_provider.yt_dlp.YoutubeDL', return_value=ydl)
+
+    def test_no_retry_whose_backoff_passes_the_deadline(self):
+        provider = YtDlpProvider(max_retries=3, retry_delay=60, stall_speed=0)
+        with self._patched_ydl(Exception('connection reset')) as ydl_cls, \
+             patch('downloader.providers.ytdlp_provider.time.sleep') as sleep:
+            with self.assertRaises(DeadlineExceededError):
+                provider.download_all('https://example.com/v', output_path=self._tmp(),
+                                      deadline=__import__('time').time() + 30)
+        self.assertEqual(ydl_cls.call_count, 1)
+        sleep.assert_not_called()
+
+    def test_passed_deadline_downloads_nothing(self):
+        provider = YtDlpProvider(max_retries=3, retry_delay=0, stall_speed=0)
+        with self._patched_ydl(Exception('unused')) as ydl_cls:
+            with self.assertRaises(DeadlineExceededError):
+                provider.download_all('https://example.com/v', output_path=self._tmp(),
+                                      deadline=0)
+        ydl_cls.assert_not_called()
+
+    def _tmp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return tmp.name
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,8 @@
 import unittest
 import os
 import sys
+import threading
+import time
 from unittest.mock import Mock, patch, MagicMock
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
@@ -158,5 +160,81 @@ class TestVideoDownloader(unittest.TestCase):
         self.assertIn('url', info)
 
 
+
+class BlockingProvider(MockProvider):
+    """Provider whose downloads wait until the test releases them."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.release = threading.Event()
+        self.calls = []
+
+    def download(self, url, output_path, title=None):
+        self.calls.append(url)
+        self.release.wait(5)
+        return super().download(url, output_path, title)
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Concurrent requests for the same media share one download."""
+
+    def setUp(self):
+        import tempfile
+        self._tmp = tempfile.TemporaryDirectory()
+        self.provider = BlockingProvider(supported_urls=['youtu'])
+        self.downloader = VideoDownloader(
+            output_dir=self._tmp.name,
+            prevent_duplicates=False,
+            providers=[self.provider],
+        )
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _download_concurrently(self, urls):
+        results = [None] * len(urls)
+
+        def run(i, url):
+            results[i] = self.downloader.download(url, 'clip')
+
+        threads = [threading.Thread(target=run, args=(i, u)) for i, u in enumerate(urls)]
+        for thread in threads:
+            thread.start()
+        # Hold the leader until the other callers have had time to join it
+        for _ in range(100):
+            if self.provider.calls:
+                break
+            time.sleep(0.01)
+        time.sleep(0.1)
+        self.provider.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_url_variants_are_coalesced(self):
+        results = self._download_concurrently([
+            'https://youtu.be/dQw4w9WgXcQ?si=abc',
+            'https://www.youtube.com/watch?v=dQw4w9WgXcQ&si=def',
+            'https://youtube.com/shorts/dQw4w9WgXcQ',
+        ])
+        self.assertEqual(self.provider.calls, ['https://www.youtube.com/watch?v=dQw4w9WgXcQ'])
+        self.assertTrue(all(r['success'] for r in results))
+        self.assertEqual({r['filepath'] for r in results}, {results[0]['filepath']})
+        self.assertEqual({r['canonical_id'] for r in results}, {'youtube:dQw4w9WgXcQ'})
+
+    def test_different_media_are_not_coalesced(self):
+        self._download_concurrently([
+            'https://youtu.be/dQw4w9WgXcQ',
+            'https://youtu.be/9bZkp7q19f0',
+        ])
+        self.assertEqual(len(self.provider.calls), 2)
+
+    def test_sequential_requests_download_again(self):
+        self.provider.release.set()
+        self.downloader.download('https://youtu.be/dQw4w9WgXcQ', 'clip')
+        self.downloader.download('https://youtu.be/dQw4w9WgXcQ', 'clip')
+        self.assertEqual(len(self.provider.calls), 2)
+
+
 if __name__ == '__main__':
     unittest.main()
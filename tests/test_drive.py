@@ -0,0 +1,234 @@
+"""Tests for Drive uploads over a service-account pool."""
+
+import datetime
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from downloader.deadline import Deadline
+from downloader.drive import (
+    DriveUploader,
+    ServiceAccount,
+    ServiceAccountPool,
+    _error_reasons,
+    next_quota_reset,
+)
+from downloader.exceptions import DeadlineExceededError
+
+
+def _http_error(status, reason):
+    content = json.dumps({'error': {'code': status, 'errors': [{'reason': reason}]}})
+    return HttpError(httplib2.Response({'status': status}), content.encode('utf-8'))
+
+
+class _FakeDrive:
+    """Drive client whose uploads finish in one chunk, or raise `error`."""
+
+    def __init__(self, file_id, error=None):
+        self.file_id = file_id
+        self.error = error
+        self.uploads = 0
+
+    def files(self):
+        return self
+
+    def create(self, **kwargs):
+        request = MagicMock(resumable_uri=None)
+        if self.error:
+            request.next_chunk.side_effect = self.error
+        else:
+            request.next_chunk.return_value = (None, {'id': self.file_id})
+        self.uploads += 1
+        return request
+
+
+class _ChunkedDrive(_FakeDrive):
+    """Drive client whose uploads take `chunks` chunks, calling `on_chunk` after each."""
+
+    def __init__(self, file_id, chunks, on_chunk=None):
+        super().__init__(file_id)
+        self.chunks = chunks
+        self.on_chunk = on_chunk
+        self.sent = 0
+        self.requests = []
+
+    def create(self, **kwargs):
+        request = MagicMock(resumable_uri=None, _in_error_state=False)
+
+        def next_chunk():
+            self.sent += 1
+            request.resumable_uri = 'https://upload/session/1'
+            if self.on_chunk:
+                self.on_chunk()
+            return (None, {'id': self.file_id}) if self.sent >= self.chunks else (None, None)
+
+        request.next_chunk.side_effect = next_chunk
+        self.uploads += 1
+        self.requests.append(request)
+        return request
+
+
+class TestServiceAccountPool(unittest.TestCase):
+    """Accounts rotate and rest until their quota comes back."""
+
+    def _pool(self, count=2):
+        return ServiceAccountPool([ServiceAccount(f'sa{i}.json', credentials=None)
+                                   for i in range(count)])
+
+    def test_rotates_between_accounts(self):
+        pool = self._pool(3)
+        names = [pool.acquire().name for _ in range(6)]
+        self.assertEqual(names, ['sa0.json', 'sa1.json', 'sa2.json'] * 2)
+
+    def test_rate_limited_account_rests_for_the_rate_window(self):
+        pool = self._pool()
+        first, second = pool.accounts
+        with patch('downloader.drive.time.time', return_value=1000):
+            pool.exhausted(first, {'userRateLimitExceeded'})
+            self.assertIs(pool.acquire(), second)
+            self.assertIs(pool.acquire(), second)
+        self.assertEqual(first.exhausted_until, 1100)
+
+    def test_upload_limit_rests_until_the_daily_reset(self):
+        pool = self._pool(1)
+        [account] = pool.accounts
+        pool.exhausted(account, {'uploadLimitExceeded'})
+        self.assertIsNone(pool.acquire())
+        self.assertEqual(account.exhausted_until, next_quota_reset())
+
+    def test_clients_are_cached_per_thread_and_account(self):
+        pool = self._pool()
+        with patch('downloader.drive.build', side_effect=lambda *a, **kw: object()) as build:
+            first = pool.client(pool.accounts[0])
+            self.assertIs(pool.client(pool.accounts[0]), first)
+            self.assertIsNot(pool.client(pool.accounts[1]), first)
+        self.assertEqual(build.call_count, 2)
+
+    def test_each_thread_gets_its_own_transport_with_the_timeout(self):
+        pool = ServiceAccountPool([ServiceAccount('sa.json', credentials=None)], timeout=7)
+        with patch('downloader.drive.build', side_effect=lambda *a, **kw: kw['http']):
+            mine = pool.client(pool.accounts[0])
+            theirs = []
+            thread = threading.Thread(target=lambda: theirs.append(pool.client(pool.accounts[0])))
+            thread.start()
+            thread.join()
+        self.assertIsNot(theirs[0], mine)
+        self.assertEqual(mine.http.timeout, 7)
+
+
+class TestQuotaHelpers(unittest.TestCase):
+
+    def test_error_reasons_are_read_from_the_body(self):
+        self.assertEqual(_error_reasons(_http_error(403, 'uploadLimitExceeded')),
+                         {'uploadLimitExceeded'})
+
+    def test_quota_resets_at_pacific_midnight(self):
+        # 2024-01-15 15:00 UTC is 07:00 in Los Angeles (PST, UTC-8)
+        now = datetime.datetime(2024, 1, 15, 15, tzinfo=datetime.timezone.utc).timestamp()
+        reset = datetime.datetime.fromtimestamp(next_quota_reset(now), datetime.timezone.utc)
+        self.assertEqual(reset, datetime.datetime(2024, 1, 16, 8, tzinfo=datetime.timezone.utc))
+
+
+class TestDriveUploader(unittest.TestCase):
+    """A quota error moves the upload to the next account."""
+
+    def _uploader(self, clients):
+        pool = ServiceAccountPool([ServiceAccount(name, credentials=None) for name in clients])
+        pool.client = lambda account: clients[account.path]
+        return DriveUploader(pool, folder_id='folder')
+
+    def test_exhausted_account_hands_over_to_the_next(self):
+        clients = {'a.json': _FakeDrive('x', error=_http_error(403, 'uploadLimitExceeded')),
+                   'b.json': _FakeDrive('file-b')}
+        uploader = self._uploader(clients)
+        with patch('downloader.drive.MediaFileUpload'):
+            self.assertEqual(uploader.upload('/tmp/clip.mp4'), 'file-b')
+            # The exhausted account is skipped from now on
+            self.assertEqual(uploader.upload('/tmp/clip.mp4'), 'file-b')
+        self.assertEqual(clients['a.json'].uploads, 1)
+
+    def test_gives_up_when_every_account_is_exhausted(self):
+        clients = {'a.json': _FakeDrive('x', error=_http_error(403, 'userRateLimitExceeded'))}
+        with patch('downloader.drive.MediaFileUpload'):
+            self.assertIsNone(self._uploader(clients).upload('/tmp/clip.mp4'))
+
+    def test_other_errors_fail_the_upload_without_retiring_the_account(self):
+        clients = {'a.json': _FakeDrive('x', error=_http_error(403, 'insufficientPermissions'))}
+        uploader = self._uploader(clients)
+        with patch('downloader.drive.MediaFileUpload'):
+            self.assertIsNone(uploader.upload('/tmp/clip.mp4'))
+        self.assertEqual(uploader.pool.available(), 1)
+
+    def test_timed_out_request_fails_the_upload(self):
+        clients = {'a.json': _FakeDrive('x', error=socket.timeout('timed out'))}
+        uploader = self._uploader(clients)
+        with patch('downloader.drive.MediaFileUpload'):
+            self.assertIsNone(uploader.upload('/tmp/clip.mp4'))
+        self.assertEqual(uploader.pool.available(), 1)
+
+    def test_stream_is_uploaded_instead_of_the_file(self):
+        uploader = self._uploader({'a.json': _FakeDrive('x')})
+        stream = MagicMock()
+        with patch('downloader.drive.MediaIoBaseUpload') as media, \
+                patch('downloader.drive.MediaFileUpload') as file_media:
+            self.assertEqual(uploader.upload('clip.mp4', stream=stream), 'x')
+        self.assertIs(media.call_args.args[0], stream)
+        file_media.assert_not_called()
+
+    def test_deadline_stops_between_chunks_and_the_session_resumes(self):
+        now = [0.0]
+        drive = _ChunkedDrive('x', chunks=4, on_chunk=lambda: now.__setitem__(0, now[0] + 10))
+        uploader = self._uploader({'a.json': drive})
+        sessions = []
+        with patch('downloader.drive.MediaFileUpload'):
+            with self.assertRaises(DeadlineExceededError):
+                uploader.upload('/tmp/clip.mp4', on_session=sessions.append,
+                                deadline=Deadline(25, clock=lambda: now[0]))
+            # Two chunks fit before the deadline; the third was not started
+            self.assertEqual(drive.sent, 2)
+            self.assertEqual(sessions, ['https://upload/session/1'])
+
+            self.assertEqual(uploader.upload('/tmp/clip.mp4', session_uri=sessions[0]), 'x')
+        resumed = drive.requests[-1]
+        # Flagged to ask Drive for its offset, so the upload continues rather than restarts
+        self.assertTrue(resumed._in_error_state)
+        self.assertEqual(resumed.resumable_uri, sessions[0])
+        self.assertEqual(drive.sent, 4)
+
+    def test_concurrent_uploads_are_capped(self):
+        active, peak, lock = [0], [0], threading.Lock()
+
+        class SlowDrive(_FakeDrive):
+            def create(self, **kwargs):
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.05)
+                with lock:
+                    active[0] -= 1
+                return super().create(**kwargs)
+
+        uploader = self._uploader({'a.json': SlowDrive('x')})
+        uploader = DriveUploader(uploader.pool, folder_id='folder', concurrency=2)
+        with patch('downloader.drive.MediaFileUpload'):
+            threads = [threading.Thread(target=uploader.upload, args=('/tmp/clip.mp4',))
+                       for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(peak[0], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
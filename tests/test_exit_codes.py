@@ -11,6 +11,8 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 import app
 from downloader.exceptions import (
+    CircuitOpenError,
+    DeadlineExceededError,
     DownloadError,
     UnsupportedPlatformError,
     DuplicateFileError,
@@ -47,6 +49,26 @@ class TestExitCodes(unittest.TestCase):
                           side_effect=DownloadError('extractor broke')):
             self.assertEqual(self._run_expecting_exit(), app.EXIT_STALE_EXTRACTOR)
 
+    def test_open_circuit_is_retryable(self):
+        with patch.object(app.VideoDownloader, 'download',
+                          side_effect=CircuitOpenError('instagram failed repeatedly')):
+            self.assertEqual(self._run_expecting_exit(), app.EXIT_STALE_EXTRACTOR)
+
+    def test_job_timeout_asks_for_a_rerun(self):
+        with patch.object(app.VideoDownloader, 'download',
+                          side_effect=DeadlineExceededError('deadline passed')):
+            self.assertEqual(self._run_expecting_exit(), app.EXIT_DEADLINE)
+
+    def test_jobs_left_at_the_run_deadline_ask_for_a_rerun(self):
+        # A deadline already passed by the time jobs start
+        with patch.object(app.VideoDownloader, 'download') as download, \
+             patch.object(app.Deadline, 'after', return_value=app.Deadline(0)):
+            with self.assertRaises(SystemExit) as ctx:
+                app.main(['--deadline', '1h'])
+        # Not started: no time was left for it
+        download.assert_not_called()
+        self.assertEqual(ctx.exception.code, app.EXIT_DEADLINE)
+
     def test_auth_required_is_not_retryable(self):
         with patch.object(app.VideoDownloader, 'download',
                           side_effect=AuthenticationRequiredError('login required')):
@@ -114,6 +136,79 @@ class TestExitCodes(unittest.TestCase):
              patch.object(app, 'sendVideo', return_value='drive-file-id'):
             self.assertIsNone(app.main())
 
+    def test_batch_workers_are_set_apart_from_worker_processes(self):
+        with patch.object(app.VideoDownloader, 'download',
+                          return_value={'success': True, 'filepath': 'test.mp4'}), \
+             patch.object(app, 'sendVideo', return_value='drive-file-id'), \
+             patch.object(app, 'BatchRunner', wraps=app.BatchRunner) as runner:
+            app.main(['--workers', '3'])
+        self.assertEqual(runner.call_args.kwargs['workers'], 3)
+
+    def test_serve_workers_may_come_before_or_after_the_command(self):
+        self.assertEqual(app._parse_args(['--workers', '4', 'serve']).workers, 4)
+        self.assertEqual(app._parse_args(['serve', '--workers', '4']).workers, 4)
+        self.assertEqual(app._parse_args(['serve']).workers,
+                         app._parse_args([]).workers)
+
+    def test_plan_prints_the_forecast_without_downloading(self):
+        with patch.object(app.VideoDownloader, 'extract_info',
+                          return_value={'filesize_approx': 50 * 2**20}), \
+             patch.object(app.VideoDownloader, 'download') as download, \
+             patch('builtins.print') as printed:
+            self.assertIsNone(app.main(['--plan', '--throughput', '10M']))
+        download.assert_not_called()
+        self.assertIn('done in 0:00:10', printed.call_args[0][0])
+
+
+class TestBatchExitCodes(unittest.TestCase):
+    """A batch exits with a retryable code if any failure could be retried."""
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        with open('data.json', 'w', encoding='utf-8') as f:
+            json.dump([
+                {'title': 'ok', 'link': 'https://example.com/ok'},
+                {'title': 'private', 'link': 'https://example.com/private'},
+            ], f)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    @staticmethod
+    def _fake_download(url, title=None, **options):
+        if 'private' in url:
+            raise AuthenticationRequiredError('login required')
+        return {'success': True, 'filepath': f'{title}.mp4'}
+
+    def test_retryable_failure_wins_over_success(self):
+        with patch.object(app.VideoDownloader, 'download', side_effect=self._fake_download), \
+             patch.object(app, 'sendVideo', return_value='drive-file-id'):
+            with self.assertRaises(SystemExit) as ctx:
+                app.main()
+        self.assertEqual(ctx.exception.code, app.EXIT_AUTH_REQUIRED)
+
+    def test_rerun_with_state_only_retries_the_failure(self):
+        with patch.object(app.VideoDownloader, 'download',
+                          side_effect=self._fake_download) as download, \
+             patch.object(app, 'sendVideo', return_value='drive-file-id'):
+            with self.assertRaises(SystemExit):
+                app.main(['--state', 'jobs.db'])
+            download.reset_mock()
+            with self.assertRaises(SystemExit):
+                app.main(['--state', 'jobs.db'])
+        self.assertEqual([c.args[0] for c in download.call_args_list],
+                         ['https://example.com/private'])
+
+    def test_invalid_entry_fails_the_whole_batch(self):
+        with open('data.json', 'w', encoding='utf-8') as f:
+            json.dump([{'title': 'ok', 'link': 'https://example.com/ok'}, {'title': 'x'}], f)
+        with self.assertRaises(SystemExit) as ctx:
+            app.main()
+        self.assertEqual(ctx.exception.code, app.EXIT_ERROR)
+
 
 class TestAuthErrorPropagation(unittest.TestCase):
     """core.download() must not flatten auth errors into a generic failure dict."""
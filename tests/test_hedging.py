@@ -0,0 +1,109 @@
+"""Tests for hedged requests."""
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader.hedging import Hedger
+
+
+class TestHedger(unittest.TestCase):
+
+    def _warm(self, hedger, key='extract:instagram', count=5):
+        for _ in range(count):
+            hedger.run(key, lambda: 'fast')
+
+    def test_no_hedge_until_latency_is_known(self):
+        hedger = Hedger(ratio=1, min_samples=5)
+        self.assertIsNone(hedger.threshold('extract:instagram'))
+        self._warm(hedger, count=4)
+        self.assertIsNone(hedger.threshold('extract:instagram'))
+        self._warm(hedger, count=1)
+        self.assertLess(hedger.threshold('extract:instagram'), 1)
+        self.assertIsNone(hedger.threshold('extract:youtube'))
+
+    def test_slow_operation_is_hedged_and_hedge_wins(self):
+        hedger = Hedger(ratio=1, min_samples=5)
+        self._warm(hedger)
+        release = threading.Event()
+        calls = []
+        discarded = []
+
+        def operation():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(5)
+                return 'slow'
+            return 'hedge'
+
+        self.assertEqual(hedger.run('extract:instagram', operation, discarded.append), 'hedge')
+        self.assertEqual(hedger.stats()['hedged'], 1)
+        self.assertEqual(hedger.stats()['won'], 1)
+        # The loser finishes in the background and is discarded
+        release.set()
+        for _ in range(50):
+            if discarded:
+                break
+            threading.Event().wait(0.02)
+        self.assertEqual(discarded, ['slow'])
+
+    def test_failed_hedge_waits_for_the_original(self):
+        hedger = Hedger(ratio=1, min_samples=5)
+        self._warm(hedger)
+        calls = []
+
+        def operation():
+            calls.append(1)
+            if len(calls) == 1:
+                threading.Event().wait(0.2)
+                return 'slow'
+            raise RuntimeError('hedge failed')
+
+        self.assertEqual(hedger.run('extract:instagram', operation), 'slow')
+        self.assertEqual(hedger.stats()['won'], 0)
+
+    def test_both_failing_raises(self):
+        hedger = Hedger(ratio=1, min_samples=5)
+        self._warm(hedger)
+        calls = []
+
+        def operation():
+            calls.append(1)
+            threading.Event().wait(0.2 if len(calls) == 1 else 0)
+            raise RuntimeError(f'failure {len(calls)}')
+
+        with self.assertRaises(RuntimeError):
+            hedger.run('extract:instagram', operation)
+        self.assertEqual(len(calls), 2)
+
+    def test_budget_caps_hedges(self):
+        hedger = Hedger(ratio=0, min_samples=5)
+        self._warm(hedger)
+        calls = []
+
+        def operation():
+            calls.append(1)
+            threading.Event().wait(0.1)
+            return 'slow'
+
+        self.assertEqual(hedger.run('extract:instagram', operation), 'slow')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(hedger.stats()['budget']['denied'], 1)
+
+    def test_from_env(self):
+        previous = os.environ.pop('HEDGE_BUDGET', None)
+        try:
+            self.assertIsNone(Hedger.from_env())
+            os.environ['HEDGE_BUDGET'] = '0.05'
+            self.assertEqual(Hedger.from_env().budget.ratio, 0.05)
+        finally:
+            os.environ.pop('HEDGE_BUDGET', None)
+            if previous is not None:
+                os.environ['HEDGE_BUDGET'] = previous
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""Unit tests for the SQLite job store."""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader.jobstore import (
+    DONE,
+    DOWNLOADED,
+    DOWNLOADING,
+    FAILED,
+    QUEUED,
+    JobStore,
+)
+
+
+class TestJobStore(unittest.TestCase):
+    """Jobs are keyed by media, and their progress survives a restart."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, 'jobs.db')
+        self.store = JobStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self._tmp.cleanup()
+
+    def test_same_media_is_one_job(self):
+        first = self.store.add('https://youtu.be/dQw4w9WgXcQ', 'a')
+        second = self.store.add('https://www.youtube.com/watch?v=dQw4w9WgXcQ&si=x', 'b')
+        self.assertEqual(first['id'], second['id'])
+        self.assertEqual(second['title'], 'a')
+        self.assertEqual(len(self.store.jobs()), 1)
+
+    def test_progress_survives_reopening(self):
+        job = self.store.add('https://example.com/v', 'clip')
+        self.store.update(job['id'], DOWNLOADING, format_id='137+140', part_path='clip.mp4.part')
+        self.store.close()
+
+        self.store = JobStore(self.path)
+        reopened = self.store.get(job['id'])
+        self.assertEqual(reopened['state'], DOWNLOADING)
+        self.assertEqual(reopened['format_id'], '137+140')
+
+    def test_store_from_before_size_estimates_is_upgraded(self):
+        import sqlite3
+        self.store.close()
+        old = os.path.join(self._tmp.name, 'old.db')
+        conn = sqlite3.connect(old)
+        conn.execute('CREATE TABLE jobs (id TEXT PRIMARY KEY, url TEXT NOT NULL, title TEXT, '
+                     'state TEXT NOT NULL, format_id TEXT, part_path TEXT, filepath TEXT, '
+                     'remote_id TEXT, error TEXT, error_type TEXT, '
+                     'attempts INTEGER NOT NULL DEFAULT 0, '
+                     'created_at REAL NOT NULL, updated_at REAL NOT NULL)')
+        conn.execute('CREATE TABLE files (job_id TEXT NOT NULL, path TEXT NOT NULL, '
+                     'position INTEGER NOT NULL, upload_session TEXT, remote_id TEXT, '
+                     'PRIMARY KEY (job_id, path))')
+        conn.execute("INSERT INTO jobs (id, url, state, created_at, updated_at) "
+                     "VALUES ('a', 'https://example.com/a', 'queued', 0, 0)")
+        conn.commit()
+        conn.close()
+
+        self.store = JobStore(old)
+        self.assertIsNone(self.store.get('a')['est_bytes'])
+        self.assertEqual(self.store.update('a', est_bytes=42, duration=1.5)['est_bytes'], 42)
+        self.store.start_file('a', 0, 'a - 01.mp4', format_id='22')
+        self.assertEqual(self.store.files('a')[0]['format_id'], '22')
+
+    def test_unfinished_excludes_terminal_states(self):
+        done = self.store.add('https://example.com/1')
+        failed = self.store.add('https://example.com/2')
+        pending = self.store.add('https://example.com/3')
+        self.store.update(done['id'], DONE)
+        self.store.update(failed['id'], FAILED, error='boom')
+        self.assertEqual([j['id'] for j in self.store.unfinished()], [pending['id']])
+
+    def test_requeue_failed_resumes_from_the_last_durable_stage(self):
+        not_downloaded = self.store.add('https://example.com/1')
+        downloaded = self.store.add('https://example.com/2')
+        self.store.update(not_downloaded['id'], FAILED, error='boom')
+        self.store.update(downloaded['id'], FAILED, filepath='x.mp4', error='upload failed')
+
+        self.assertEqual(self.store.requeue_failed(), 2)
+        self.assertEqual(self.store.get(not_downloaded['id'])['state'], QUEUED)
+        self.assertEqual(self.store.get(downloaded['id'])['state'], DOWNLOADED)
+        self.assertIsNone(self.store.get(downloaded['id'])['error'])
+
+    def test_set_files_keeps_upload_progress_of_known_files(self):
+        job = self.store.add('https://example.com/v')
+        self.store.set_files(job['id'], ['a.mp4', 'b.mp4'])
+        self.store.update_file(job['id'], 'a.mp4', remote_id='remote-a')
+        self.store.set_files(job['id'], ['a.mp4', 'c.mp4'])
+
+        files = self.store.files(job['id'])
+        self.assertEqual([f['path'] for f in files], ['a.mp4', 'c.mp4'])
+        self.assertEqual(files[0]['remote_id'], 'remote-a')
+        self.assertIsNone(files[1]['remote_id'])
+
+    def test_start_file_keeps_one_row_per_part(self):
+        job = self.store.add('https://example.com/carousel')
+        self.store.start_file(job['id'], 1, 'b.webm', format_id='248+251')
+        self.store.start_file(job['id'], 0, 'a.mp4', format_id='137+140', part_path='a.mp4.part')
+        self.store.start_file(job['id'], 1, 'b.mp4', format_id='22', part_path='b.mp4.part')
+
+        files = self.store.files(job['id'])
+        self.assertEqual([(f['path'], f['format_id']) for f in files],
+                         [('a.mp4', '137+140'), ('b.mp4', '22')])
+        self.assertEqual(files[1]['part_path'], 'b.mp4.part')
+
+    def test_rejects_unknown_states_and_fields(self):
+        job = self.store.add('https://example.com/v')
+        with self.assertRaises(ValueError):
+            self.store.update(job['id'], 'paused')
+        with self.assertRaises(ValueError):
+            self.store.update(job['id'], url='https://elsewhere')
+        with self.assertRaises(KeyError):
+            self.store.update('missing', DONE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,353 @@
+"""Tests for the resumable batch pipeline."""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader import VideoDownloader
+from downloader.concurrency import AIMDController
+from downloader.exceptions import AuthenticationRequiredError
+from downloader.jobstore import (
+    DONE,
+    DOWNLOADED,
+    DOWNLOADING,
+    FAILED,
+    UPLOADING,
+    JobStore,
+)
+from downloader.pipeline import BatchRunner
+from downloader.providers import BaseProvider
+from downloader.storage import StorageManager
+
+
+class RecordingProvider(BaseProvider):
+    """Writes a file per download and records the options it was given."""
+
+    def __init__(self):
+        self.calls = []
+        self.parts = 1
+
+    @property
+    def name(self):
+        return 'recording'
+
+    def supports(self, url):
+        return True
+
+    def extract_info(self, url):
+        return {}
+
+    def download(self, url, output_path, title=None, format_id=None,
+                 before_download=None, playlist_index=None, **options):
+        self.calls.append({'url': url, 'format_id': format_id})
+        if 'private' in url:
+            raise AuthenticationRequiredError('login required')
+        path = os.path.join(output_path, f"{title}.mp4")
+        if before_download:
+            info = {'format_id': format_id or '18', '_filename': path}
+            if playlist_index is not None:
+                info['playlist_index'] = playlist_index
+            before_download(info)
+        with open(path, 'w') as f:
+            f.write('data')
+        return path
+
+    def download_all(self, url, output_path, title=None, entry_formats=None, **options):
+        if self.parts == 1:
+            return [self.download(url, output_path, title, **options)]
+        options.pop('format_id', None)
+        formats = entry_formats or []
+        return [self.download(url, output_path, f"{title} - {index:02d}",
+                              format_id=formats[index - 1] if index <= len(formats) else None,
+                              playlist_index=index, **options)
+                for index in range(1, self.parts + 1)]
+
+
+class RecordingUploader:
+    """Upload stand-in that hands out a session and records resumes."""
+
+    def __init__(self, result='remote-id'):
+        self.result = result
+        self.calls = []
+
+    def __call__(self, filepath, session_uri=None, on_session=None):
+        self.calls.append((filepath, session_uri))
+        if on_session and not session_uri:
+            on_session('https://upload/session/1')
+        return self.result
+
+
+class TestBatchRunner(unittest.TestCase):
+    """Each job continues from the stage it had reached."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.store = JobStore()
+        self.provider = RecordingProvider()
+        self.downloader = VideoDownloader(
+            output_dir=self._tmp.name, prevent_duplicates=False, providers=[self.provider]
+        )
+
+    def tearDown(self):
+        self.store.close()
+        self._tmp.cleanup()
+
+    def _runner(self, uploader=None):
+        return BatchRunner(self.downloader, self.store, uploader=uploader)
+
+    def test_fresh_job_is_downloaded_and_uploaded(self):
+        job = self.store.add('https://example.com/v', 'clip')
+        uploader = RecordingUploader()
+        [final] = self._runner(uploader).run()
+
+        self.assertEqual(final['state'], DONE)
+        self.assertEqual(final['remote_id'], 'remote-id')
+        self.assertEqual(final['format_id'], '18')
+        self.assertEqual(uploader.calls, [(final['filepath'], None)])
+        self.assertIsNone(self.provider.calls[0]['format_id'])
+
+    def test_interrupted_download_reuses_its_format(self):
+        job = self.store.add('https://example.com/v', 'clip')
+        self.store.update(job['id'], DOWNLOADING, format_id='137+140')
+        self._runner().run()
+        self.assertEqual(self.provider.calls[0]['format_id'], '137+140')
+
+    def test_downloaded_job_skips_straight_to_upload(self):
+        path = os.path.join(self._tmp.name, 'done.mp4')
+        open(path, 'w').close()
+        job = self.store.add('https://example.com/v', 'clip')
+        self.store.update(job['id'], DOWNLOADED, filepath=path)
+
+        uploader = RecordingUploader()
+        [final] = self._runner(uploader).run()
+        self.assertEqual(self.provider.calls, [])
+        self.assertEqual(final['state'], DONE)
+
+    def test_downloaded_job_with_missing_file_is_downloaded_again(self):
+        job = self.store.add('https://example.com/v', 'clip')
+        self.store.update(job['id'], DOWNLOADED, filepath='/nonexistent/clip.mp4')
+        [final] = self._runner(RecordingUploader()).run()
+        self.assertEqual(len(self.provider.calls), 1)
+        self.assertEqual(final['state'], DONE)
+
+    def test_interrupted_upload_continues_its_session(self):
+        path = os.path.join(self._tmp.name, 'clip.mp4')
+        open(path, 'w').close()
+        job = self.store.add('https://example.com/v', 'clip')
+        self.store.update(job['id'], UPLOADING, filepath=path)
+        self.store.set_files(job['id'], [path])
+        self.store.update_file(job['id'], path, upload_session='https://upload/session/old')
+
+        uploader = RecordingUploader()
+        self._runner(uploader).run()
+        self.assertEqual(uploader.calls, [(path, 'https://upload/session/old')])
+
+    def test_uploaded_files_are_freed_from_the_staging_dir(self):
+        storage = StorageManager(self._tmp.name, budget_bytes=10 ** 6)
+        self.store.add('https://example.com/v', 'clip')
+        runner = BatchRunner(self.downloader, self.store,
+                             uploader=RecordingUploader(), storage=storage)
+        [final] = runner.run()
+        self.assertEqual(final['state'], DONE)
+        self.assertFalse(os.path.exists(final['filepath']))
+        self.assertEqual(storage.used_bytes, 0)
+
+    def test_failed_upload_keeps_the_file_accounted_for(self):
+        storage = StorageManager(self._tmp.name, budget_bytes=10 ** 6)
+        self.store.add('https://example.com/v', 'clip')
+        runner = BatchRunner(self.downloader, self.store,
+                             uploader=RecordingUploader(result=None), storage=storage)
+        [final] = runner.run()
+        self.assertTrue(os.path.exists(final['filepath']))
+        self.assertEqual(storage.used_bytes, os.path.getsize(final['filepath']))
+
+    def test_failures_are_recorded_with_their_type(self):
+        self.store.add('https://example.com/private', 'clip')
+        [final] = self._runner().run()
+        self.assertEqual(final['state'], FAILED)
+        self.assertEqual(final['error_type'], 'AuthenticationRequiredError')
+
+    def test_failed_upload_keeps_the_session_for_the_next_run(self):
+        job = self.store.add('https://example.com/v', 'clip')
+        [final] = self._runner(RecordingUploader(result=None)).run()
+        self.assertEqual(final['state'], FAILED)
+        self.assertEqual(final['error_type'], 'UploadError')
+        [file] = self.store.files(job['id'])
+        self.assertEqual(file['upload_session'], 'https://upload/session/1')
+
+    def test_uploads_overlap_with_later_downloads(self):
+        for index in range(4):
+            self.store.add(f'https://example.com/v{index}', f'clip{index}')
+        both_uploading = threading.Barrier(2, timeout=5)
+
+        def uploader(filepath, session_uri=None, on_session=None):
+            # Only returns once another upload is in flight at the same time
+            both_uploading.wait()
+            return 'remote-id'
+
+        runner = BatchRunner(self.downloader, self.store, uploader=uploader, upload_workers=2)
+        jobs = runner.run()
+        self.assertEqual([job['state'] for job in jobs], [DONE] * 4)
+        self.assertEqual([job['title'] for job in jobs], [f'clip{i}' for i in range(4)])
+
+    def test_downloads_start_from_prefetched_metadata(self):
+        class Prefetched:
+            def __init__(self, url):
+                self.url, self.age, self.discarded = url, 0, False
+
+            def discard(self):
+                self.discarded = True
+
+        made, used = [], []
+        self.provider.prefetch = lambda url: made.append(Prefetched(url)) or made[-1]
+        download = self.provider.download
+
+        def recording_download(url, output_path, title=None, prefetched=None, **options):
+            used.append((url, prefetched and prefetched.url))
+            return download(url, output_path, title, **options)
+
+        self.provider.download = recording_download
+        for index in range(3):
+            self.store.add(f'https://example.com/v{index}', f'clip{index}')
+
+        jobs = BatchRunner(self.downloader, self.store, prefetch=2).run()
+        self.assertEqual([job['state'] for job in jobs], [DONE] * 3)
+        # Whatever was prefetched went to the download of the same URL
+        self.assertTrue(made)
+        for url, prefetched_url in used:
+            self.assertIn(prefetched_url, (None, url))
+        self.assertTrue(all(prefetched.discarded for prefetched in made))
+
+    def test_longest_jobs_start_first_from_recorded_estimates(self):
+        sizes = {'https://example.com/small': 10, 'https://example.com/big': 1000,
+                 'https://example.com/mid': 100}
+        extracted = []
+
+        def extract_info(url):
+            extracted.append(url)
+            return {'filesize_approx': sizes[url], 'duration': 60}
+
+        self.provider.extract_info = extract_info
+        for url in sizes:
+            self.store.add(url, url.rsplit('/', 1)[-1])
+
+        runner = BatchRunner(self.downloader, self.store, order='longest')
+        batch_plan = runner.plan()
+        self.assertEqual([entry['job']['title'] for entry in batch_plan['jobs']],
+                         ['big', 'mid', 'small'])
+        jobs = runner.run()
+        # Results stay in queue order; the estimates were extracted only once
+        self.assertEqual([job['title'] for job in jobs], ['small', 'big', 'mid'])
+        self.assertEqual([call['url'] for call in self.provider.calls],
+                         ['https://example.com/big', 'https://example.com/mid',
+                          'https://example.com/small'])
+        self.assertEqual(len(extracted), 3)
+        self.assertEqual(self.store.get(jobs[1]['id'])['est_bytes'], 1000)
+
+    def test_stalled_platform_does_not_hold_every_worker(self):
+        youtube_done = threading.Event()
+        finished = []
+        download = self.provider.download
+
+        def stalling_download(url, output_path, title=None, **options):
+            if 'instagram' in url:
+                # A throttled platform in backoff until the others are through
+                youtube_done.wait(5)
+            path = download(url, output_path, title, **options)
+            finished.append(title)
+            if sum(t.startswith('yt') for t in finished) == 3:
+                youtube_done.set()
+            return path
+
+        self.provider.download = stalling_download
+        for index in range(3):
+            self.store.add(f'https://www.instagram.com/p/post{index}/', f'ig{index}')
+        for index in range(3):
+            self.store.add(f'https://youtu.be/video{index:06d}', f'yt{index}')
+
+        runner = BatchRunner(self.downloader, self.store, workers=2,
+                             platform_workers={'instagram': 1})
+        jobs = runner.run()
+        self.assertEqual([job['state'] for job in jobs], [DONE] * 6)
+        self.assertTrue(youtube_done.is_set())
+        self.assertEqual(finished[:3], ['yt0', 'yt1', 'yt2'])
+
+    def test_adaptive_limit_bounds_running_downloads(self):
+        controller = AIMDController(initial=1, max_limit=3)
+        running, peak = [0], [0]
+        lock = threading.Lock()
+        download = self.provider.download
+
+        def counting_download(url, output_path, title=None, **options):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            try:
+                return download(url, output_path, title, **options)
+            finally:
+                with lock:
+                    running[0] -= 1
+
+        self.provider.download = counting_download
+        for index in range(4):
+            self.store.add(f'https://example.com/v{index}', f'clip{index}')
+        jobs = BatchRunner(self.downloader, self.store, concurrency=controller).run()
+        self.assertEqual([job['state'] for job in jobs], [DONE] * 4)
+        self.assertEqual(peak[0], 1)
+        self.assertEqual(controller.active, 0)
+
+    def test_carousel_parts_are_uploaded_separately(self):
+        self.provider.parts = 3
+        job = self.store.add('https://example.com/carousel', 'post')
+        uploader = RecordingUploader()
+        [final] = self._runner(uploader).run()
+
+        self.assertEqual(final['state'], DONE)
+        paths = [f['path'] for f in self.store.files(job['id'])]
+        self.assertEqual(len(paths), 3)
+        self.assertEqual([call[0] for call in uploader.calls], paths)
+        self.assertEqual(final['filepath'], paths[0])
+
+    def test_carousel_parts_record_their_own_format(self):
+        self.provider.parts = 2
+        job = self.store.add('https://example.com/carousel', 'post')
+        [final] = self._runner().run()
+        self.assertIsNone(final['format_id'])
+        self.assertEqual([f['format_id'] for f in self.store.files(job['id'])], ['18', '18'])
+
+    def test_interrupted_carousel_resumes_each_part_in_its_own_format(self):
+        self.provider.parts = 2
+        job = self.store.add('https://example.com/carousel', 'post')
+        self.store.update(job['id'], DOWNLOADING)
+        for position, format_id in enumerate(['137+140', '22']):
+            path = os.path.join(self._tmp.name, f"post - {position + 1:02d}.mp4")
+            self.store.start_file(job['id'], position, path, format_id=format_id,
+                                  part_path=f"{path}.part")
+
+        [final] = self._runner().run()
+        self.assertEqual(final['state'], DONE)
+        self.assertEqual([call['format_id'] for call in self.provider.calls], ['137+140', '22'])
+        self.assertEqual([f['format_id'] for f in self.store.files(job['id'])],
+                         ['137+140', '22'])
+
+    def test_rerun_skips_parts_already_uploaded(self):
+        self.provider.parts = 2
+        job = self.store.add('https://example.com/carousel', 'post')
+        self._runner(RecordingUploader(result=None)).run()
+        first, second = self.store.files(job['id'])
+        self.store.update_file(job['id'], first['path'], remote_id='remote-1')
+        self.store.requeue_failed()
+
+        uploader = RecordingUploader()
+        [final] = self._runner(uploader).run()
+        self.assertEqual(len(self.provider.calls), 2)  # first run only
+        self.assertEqual([call[0] for call in uploader.calls], [second['path']])
+        self.assertEqual(final['remote_id'], 'remote-1, remote-id')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Tests for the metadata prefetch lookahead."""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader.prefetch import Prefetcher
+
+
+class _Prefetched:
+
+    def __init__(self, job_id, age=0):
+        self.job_id = job_id
+        self.age = age
+        self.discarded = False
+
+    def discard(self):
+        self.discarded = True
+
+
+def _jobs(count):
+    return [{'id': f'job{i}', 'url': f'https://example.com/{i}'} for i in range(count)]
+
+
+class TestPrefetcher(unittest.TestCase):
+
+    def test_lookahead_is_bounded(self):
+        fetched = []
+        lock = threading.Lock()
+
+        def fetch(job):
+            with lock:
+                fetched.append(job['id'])
+            return _Prefetched(job['id'])
+
+        jobs = _jobs(5)
+        with Prefetcher(fetch, jobs, lookahead=2) as prefetcher:
+            time.sleep(0.2)
+            self.assertEqual(sorted(fetched), ['job0', 'job1'])
+            self.assertEqual(prefetcher.take(jobs[0]).job_id, 'job0')
+            time.sleep(0.2)
+            self.assertEqual(sorted(fetched), ['job0', 'job1', 'job2'])
+
+    def test_take_waits_for_a_running_prefetch(self):
+        started, release = threading.Event(), threading.Event()
+
+        def fetch(job):
+            started.set()
+            release.wait(5)
+            return _Prefetched(job['id'])
+
+        jobs = _jobs(1)
+        with Prefetcher(fetch, jobs, lookahead=1) as prefetcher:
+            started.wait(5)
+            threading.Timer(0.1, release.set).start()
+            self.assertEqual(prefetcher.take(jobs[0]).job_id, 'job0')
+
+    def test_job_not_reached_is_skipped(self):
+        fetched = []
+        gate = threading.Event()
+
+        def fetch(job):
+            gate.wait(5)
+            fetched.append(job['id'])
+            return _Prefetched(job['id'])
+
+        jobs = _jobs(3)
+        with Prefetcher(fetch, jobs, lookahead=1) as prefetcher:
+            self.assertIsNone(prefetcher.take(jobs[2]))
+            gate.set()
+            self.assertIsNotNone(prefetcher.take(jobs[0]))
+            time.sleep(0.2)
+            self.assertIsNotNone(prefetcher.take(jobs[1]))
+        self.assertEqual(fetched, ['job0', 'job1'])
+
+    def test_stale_or_failed_prefetch_is_not_used(self):
+        stale = _Prefetched('job0', age=600)
+
+        def fetch(job):
+            if job['id'] == 'job1':
+                raise RuntimeError('boom')
+            return stale
+
+        jobs = _jobs(2)
+        with Prefetcher(fetch, jobs, lookahead=2, max_age=300) as prefetcher:
+            self.assertIsNone(prefetcher.take(jobs[0]))
+            self.assertIsNone(prefetcher.take(jobs[1]))
+        self.assertTrue(stale.discarded)
+
+    def test_untaken_prefetches_are_discarded_on_exit(self):
+        made = []
+
+        def fetch(job):
+            made.append(_Prefetched(job['id']))
+            return made[-1]
+
+        with Prefetcher(fetch, _jobs(2), lookahead=2):
+            time.sleep(0.1)
+        self.assertEqual(len(made), 2)
+        self.assertTrue(all(prefetched.discarded for prefetched in made))
+
+    def test_disabled_lookahead_fetches_nothing(self):
+        jobs = _jobs(2)
+        with Prefetcher(lambda job: self.fail('fetched'), jobs, lookahead=0) as prefetcher:
+            self.assertIsNone(prefetcher.take(jobs[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+"""Tests for the egress route pool."""
+
+import os
+import re
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader.proxies import Route, RoutePool
+from downloader.providers.ytdlp_provider import YtDlpProvider
+
+
+class TestRoute(unittest.TestCase):
+    """Configuration strings map onto yt-dlp options."""
+
+    def test_parse(self):
+        self.assertEqual(Route.parse('socks5://127.0.0.1:1080').ydl_options(),
+                         {'proxy': 'socks5://127.0.0.1:1080'})
+        self.assertEqual(Route.parse(' 10.0.0.2 ').ydl_options(),
+                         {'source_address': '10.0.0.2'})
+        self.assertEqual(Route.parse('direct').ydl_options(), {})
+
+    def test_from_env(self):
+        with patch.dict(os.environ, {'PROXIES': 'http://a:8080, direct,'}):
+            pool = RoutePool.from_env()
+        self.assertEqual([r.name for r in pool.routes], ['http://a:8080', 'direct'])
+        with patch.dict(os.environ, {'PROXIES': ''}):
+            self.assertIsNone(RoutePool.from_env())
+
+
+class TestRoutePool(unittest.TestCase):
+    """Routes are scored from what they deliver and evicted when they misbehave."""
+
+    def _pool(self, **kwargs):
+        return RoutePool([Route('http://a'), Route('http://b')], **kwargs)
+
+    def test_untried_routes_are_tried_first(self):
+        pool = self._pool()
+        first = pool.acquire()
+        second = pool.acquire()
+        self.assertIsNot(first, second)
+
+    def test_faster_route_is_preferred(self):
+        pool = self._pool()
+        a, b = pool.routes
+        for route, nbytes in ((a, 1000), (b, 5000)):
+            pool.acquire()
+            pool.release(route, 1.0, nbytes)
+        self.assertIs(pool.acquire(), b)
+
+    def test_throttled_route_is_evicted_then_returns(self):
+        pool = self._pool(cooldown=60)
+        a, b = pool.routes
+        with patch('downloader.proxies.time.monotonic', return_value=100):
+            pool.acquire()
+            pool.release(a, 1.0, ok=False, throttled=True)
+            self.assertIs(pool.acquire(), b)
+            self.assertIs(pool.acquire(), b)
+        with patch('downloader.proxies.time.monotonic', return_value=161):
+            self.assertFalse(pool.stats()[0]['evicted'])
+
+    def test_repeated_eviction_doubles_the_cooldown(self):
+        pool = RoutePool([Route('http://a')], cooldown=60)
+        [route] = pool.routes
+        with patch('downloader.proxies.time.monotonic', return_value=0):
+            pool.acquire()
+            pool.release(route, 1.0, ok=False, throttled=True)
+            pool.acquire()
+            pool.release(route, 1.0, ok=False, throttled=True)
+        self.assertEqual(route.evicted_until, 120)
+
+    def test_failing_route_is_evicted_once_unhealthy(self):
+        pool = self._pool(min_samples=3)
+        a, _ = pool.routes
+        for _ in range(4):
+            pool.acquire()
+            pool.release(a, 1.0, ok=False)
+        self.assertTrue(pool.stats()[0]['evicted'])
+
+    def test_slow_route_is_evicted(self):
+        pool = self._pool(min_samples=1, slow_ratio=0.2)
+        a, b = pool.routes
+        pool.acquire()
+        pool.acquire()
+        pool.release(b, 1.0, 100000)
+        pool.release(a, 1.0, 1000)
+        self.assertEqual([s['evicted'] for s in pool.stats()], [True, False])
+
+
+PAYLOAD = b'\x00\x00\x00\x18ftypmp42' + b'x' * 5000
+
+
+class _ProxyStandIn(BaseHTTPRequestHandler):
+    """Answers proxied requests itself: a small mp4, or 429 when blocked."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.server.blocked:
+            self.send_response(429)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = PAYLOAD
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or len(body) - 1), len(body) - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+            body = body[start:end + 1]
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestProxiedDownload(unittest.TestCase):
+    """Downloads go out through the pool's proxies and move off blocked ones."""
+
+    def _proxy(self, blocked=False):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _ProxyStandIn)
+        server.blocked = blocked
+        server.requests = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_blocked_proxy_is_evicted_and_the_retry_uses_another(self):
+        blocked, healthy = self._proxy(blocked=True), self._proxy()
+        pool = RoutePool([Route(f'http://127.0.0.1:{s.server_address[1]}')
+                          for s in (blocked, healthy)])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = YtDlpProvider(max_retries=2, retry_delay=0, route_pool=pool).download(
+                'http://video.invalid/clip.mp4', tmp, title='clip')
+            self.assertEqual(os.path.getsize(path), len(PAYLOAD))
+
+        self.assertTrue(blocked.requests)
+        self.assertTrue(healthy.requests)
+        blocked_stats, healthy_stats = pool.stats()
+        self.assertTrue(blocked_stats['evicted'])
+        self.assertGreater(healthy_stats['throughput'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
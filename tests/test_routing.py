@@ -0,0 +1,113 @@
+"""Tests for routing URLs to their yt-dlp extractor."""
+
+import os
+import re
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader.exceptions import ExtractionError
+from downloader.providers.routing import ExtractorRouter, url_shape
+from downloader.providers.ytdlp_provider import YtDlpProvider
+
+
+def _extractor(key, pattern):
+    """A stand-in extractor class that counts its ``suitable()`` calls."""
+    regex = re.compile(pattern)
+
+    class Extractor:
+        checks = 0
+
+        @classmethod
+        def ie_key(cls):
+            return key
+
+        @classmethod
+        def suitable(cls, url):
+            cls.checks += 1
+            return regex.match(url) is not None
+
+    return Extractor
+
+
+class TestUrlShape(unittest.TestCase):
+
+    def test_shapes(self):
+        self.assertEqual(url_shape('https://www.instagram.com/reel/Cx1/'), ('instagram.com', 'reel'))
+        self.assertEqual(url_shape('https://instagram.com/reel/Dy2'), ('instagram.com', 'reel'))
+        self.assertEqual(url_shape('https://m.youtube.com/watch?v=x'), ('youtube.com', 'watch'))
+        self.assertEqual(url_shape('https://youtu.be/dQw4w9WgXcQ'), ('youtu.be', '*'))
+        self.assertEqual(url_shape('https://www.tiktok.com/@user/video/1'), ('tiktok.com', '@'))
+        self.assertEqual(url_shape('https://example.com'), ('example.com', ''))
+
+
+class TestExtractorRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.first = _extractor('First', r'https?://first\.example/')
+        self.reels = _extractor('Reels', r'https?://(?:www\.)?site\.example/reel/\w+')
+        self.generic = _extractor('Generic', r'.')
+        self.router = ExtractorRouter([self.first, self.reels, self.generic])
+
+    def test_scans_once_per_shape(self):
+        self.assertEqual(self.router.route('https://site.example/reel/a'), 'Reels')
+        checks = self.first.checks
+        self.assertEqual(self.router.route('https://www.site.example/reel/b'), 'Reels')
+        self.assertEqual(self.first.checks, checks)
+        self.assertEqual((self.router.scans, self.router.hits), (1, 1))
+
+    def test_cached_key_that_does_not_fit_rescans(self):
+        self.router.route('https://site.example/reel/a')
+        self.assertEqual(self.router.route('https://site.example/reel/'), 'Generic')
+        self.assertEqual(self.router.scans, 2)
+
+    def test_generic_is_never_scanned_but_is_the_fallback(self):
+        self.assertEqual(self.router.route('https://other.example/x'), 'Generic')
+        self.assertEqual(self.generic.checks, 0)
+
+    def test_unsupported_shapes_expire(self):
+        self.router.unsupported('https://other.example/page/1')
+        self.assertTrue(self.router.is_unsupported('https://other.example/page/2'))
+        self.assertFalse(self.router.is_unsupported('https://other.example/watch/2'))
+        with patch('downloader.providers.routing.time.monotonic', return_value=1e12):
+            self.assertFalse(self.router.is_unsupported('https://other.example/page/2'))
+
+
+class TestProviderRouting(unittest.TestCase):
+    """The provider passes the routed key to yt-dlp and skips known-unsupported URLs."""
+
+    def setUp(self):
+        router = ExtractorRouter([_extractor('Reels', r'https://site\.example/reel/\w+'),
+                                  _extractor('Generic', r'.')])
+        self.provider = YtDlpProvider(router=router, cookie_pool=None, route_pool=None)
+        self.ydl = MagicMock()
+        self.ydl.extract_info.return_value = {'title': 't'}
+        self.provider._local.info_ydl = self.ydl
+
+    def test_extract_info_names_the_extractor(self):
+        self.provider.extract_info('https://site.example/reel/a')
+        self.assertEqual(self.ydl.extract_info.call_args.kwargs['ie_key'], 'Reels')
+
+    def test_known_unsupported_url_makes_no_request(self):
+        self.ydl.extract_info.side_effect = Exception(
+            'ERROR: Unsupported URL: https://other.example/page/1')
+        with self.assertRaises(ExtractionError):
+            self.provider.extract_info('https://other.example/page/1')
+        self.assertEqual(self.ydl.extract_info.call_args.kwargs['ie_key'], 'Generic')
+
+        self.ydl.extract_info.reset_mock()
+        with self.assertRaises(ExtractionError):
+            self.provider.extract_info('https://other.example/page/2')
+        self.ydl.extract_info.assert_not_called()
+
+    def test_other_failures_are_not_remembered(self):
+        self.ydl.extract_info.side_effect = Exception('HTTP Error 500')
+        with self.assertRaises(ExtractionError):
+            self.provider.extract_info('https://other.example/page/1')
+        self.assertFalse(self.provider.router.is_unsupported('https://other.example/page/2'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""Tests for size-aware job ordering and the batch forecast."""
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader.scheduler import (
+    FairScheduler,
+    format_plan,
+    order_jobs,
+    parse_platform_values,
+    plan,
+)
+
+MiB = 2**20
+
+
+def _jobs(*sizes):
+    return [{'id': f'job{i}', 'url': f'https://example.com/{i}', 'title': f'clip{i}',
+             'est_bytes': size} for i, size in enumerate(sizes)]
+
+
+class TestOrderJobs(unittest.TestCase):
+
+    def test_orders(self):
+        jobs = _jobs(10, 30, 20, 30)
+        sizes = {job['id']: job['est_bytes'] for job in jobs}
+        ids = lambda order: [job['id'] for job in order_jobs(jobs, sizes, order)]
+        self.assertEqual(ids('fifo'), ['job0', 'job1', 'job2', 'job3'])
+        self.assertEqual(ids('longest'), ['job1', 'job3', 'job2', 'job0'])
+        self.assertEqual(ids('shortest'), ['job0', 'job2', 'job1', 'job3'])
+
+    def test_unknown_order_is_rejected(self):
+        with self.assertRaises(ValueError):
+            order_jobs([], {}, 'random')
+
+
+class TestPlan(unittest.TestCase):
+
+    def test_longest_first_shortens_the_batch(self):
+        # One big video last in the queue leaves a worker running alone at the end
+        jobs = _jobs(100 * MiB, 100 * MiB, 100 * MiB, 300 * MiB)
+        kwargs = {'workers': 2, 'throughput': MiB, 'overhead': 0}
+        self.assertEqual(plan(jobs, 'fifo', **kwargs)['makespan'], 400)
+        self.assertEqual(plan(jobs, 'longest', **kwargs)['makespan'], 300)
+
+    def test_shortest_first_lowers_mean_completion(self):
+        jobs = _jobs(300 * MiB, 100 * MiB, 100 * MiB)
+        kwargs = {'workers': 1, 'throughput': MiB, 'overhead': 0}
+        self.assertLess(plan(jobs, 'shortest', **kwargs)['mean_completion'],
+                        plan(jobs, 'fifo', **kwargs)['mean_completion'])
+
+    def test_unknown_sizes_are_assumed_to_be_the_median(self):
+        batch_plan = plan(_jobs(10, 20, 90, None), workers=1, throughput=1, overhead=0)
+        self.assertEqual(batch_plan['unknown'], 1)
+        self.assertEqual(batch_plan['jobs'][3]['bytes'], 20)
+        self.assertFalse(batch_plan['jobs'][3]['estimated'])
+        self.assertEqual(batch_plan['makespan'], 140)
+
+    def test_format(self):
+        text = format_plan(plan(_jobs(3 * MiB, None), workers=1, throughput=MiB, overhead=0))
+        self.assertIn('3.0 MiB?', text)
+        self.assertIn('clip1', text)
+        self.assertIn('done in 0:00:06', text)
+        self.assertIn('1 size(s) unknown', text)
+
+
+
+def _mixed(**counts):
+    hosts = {'instagram': 'https://www.instagram.com/p/{}/',
+             'youtube': 'https://youtu.be/{:0>11}', 'tiktok': 'https://www.tiktok.com/@u/video/{}'}
+    return [{'id': f'{platform}{i}', 'url': hosts[platform].format(i)}
+            for platform, count in counts.items() for i in range(count)]
+
+
+class TestFairScheduler(unittest.TestCase):
+
+    def test_platforms_are_interleaved(self):
+        ids = [job['id'] for job in FairScheduler(_mixed(instagram=3, youtube=2, tiktok=1)).preview()]
+        self.assertEqual(ids, ['instagram0', 'youtube0', 'tiktok0',
+                               'instagram1', 'youtube1', 'instagram2'])
+
+    def test_weights_share_the_starts(self):
+        scheduler = FairScheduler(_mixed(instagram=4, youtube=4), weights={'youtube': 3})
+        first = [job['id'][:-1] for job in scheduler.preview()[:4]]
+        self.assertEqual(first.count('youtube'), 3)
+
+    def test_capped_platform_leaves_workers_to_the_others(self):
+        scheduler = FairScheduler(_mixed(instagram=3, youtube=2), max_active={'instagram': 1})
+        started = [scheduler.acquire() for _ in range(3)]
+        self.assertEqual([job['id'] for job in started], ['instagram0', 'youtube0', 'youtube1'])
+
+        # Only instagram is left, and its slot is taken until released
+        waiting = []
+        thread = threading.Thread(target=lambda: waiting.append(scheduler.acquire()))
+        thread.start()
+        thread.join(0.1)
+        self.assertEqual(waiting, [])
+        scheduler.release(started[0])
+        thread.join(5)
+        self.assertEqual(waiting[0]['id'], 'instagram1')
+
+    def test_acquire_ends_when_every_job_is_handed_out(self):
+        scheduler = FairScheduler(_mixed(youtube=1))
+        self.assertIsNotNone(scheduler.acquire())
+        self.assertIsNone(scheduler.acquire())
+
+    def test_parse_platform_values(self):
+        self.assertEqual(parse_platform_values('2, Instagram=1,youtube=0.5'),
+                         {'*': 2.0, 'instagram': 1.0, 'youtube': 0.5})
+        self.assertEqual(parse_platform_values(None), {})
+        with self.assertRaises(ValueError):
+            parse_platform_values('instagram=fast')
+        with self.assertRaises(ValueError):
+            FairScheduler([], max_active={'*': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
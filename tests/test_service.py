@@ -0,0 +1,197 @@
+"""Tests for the resident download service and its HTTP job API."""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader import VideoDownloader
+from downloader.bandwidth import BandwidthLimiter
+from downloader.concurrency import AIMDController
+from downloader.exceptions import AuthenticationRequiredError
+from downloader.providers import BaseProvider
+from downloader.service import DONE, FAILED, DownloadService, make_server
+
+
+class FileWritingProvider(BaseProvider):
+    """Writes a small file, or raises for URLs containing 'private'."""
+
+    def __init__(self):
+        self.warmed = False
+
+    @property
+    def name(self):
+        return 'fake'
+
+    def warm_up(self):
+        self.warmed = True
+
+    def supports(self, url):
+        return True
+
+    def extract_info(self, url):
+        return {}
+
+    def download(self, url, output_path, title=None):
+        if 'private' in url:
+            raise AuthenticationRequiredError('login required')
+        path = os.path.join(output_path, f"{title}.mp4")
+        with open(path, 'w') as f:
+            f.write('data')
+        return path
+
+    def download_all(self, url, output_path, title=None, **options):
+        if 'carousel' not in url:
+            return [self.download(url, output_path, title)]
+        return [self.download(url, output_path, f"{title} - {i:02d}") for i in (1, 2)]
+
+
+class TestDownloadService(unittest.TestCase):
+    """Jobs run on the worker pool and report their final status."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.provider = FileWritingProvider()
+        self.uploaded = []
+        self.downloader = VideoDownloader(
+            output_dir=self._tmp.name, prevent_duplicates=False, providers=[self.provider]
+        )
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _service(self, uploader=None):
+        service = DownloadService(self.downloader, uploader=uploader, workers=2)
+        self.addCleanup(service.shutdown)
+        return service
+
+    def _wait(self, service, job_id):
+        for _ in range(200):
+            job = service.get(job_id)
+            if job['status'] in (DONE, FAILED):
+                return job
+            time.sleep(0.01)
+        self.fail(f"job {job_id} did not finish")
+
+    def test_adaptive_limit_is_reported_as_a_metric(self):
+        controller = AIMDController(initial=2, max_limit=4)
+        service = DownloadService(self.downloader, workers=4, concurrency=controller)
+        self.addCleanup(service.shutdown)
+        job = service.submit('https://example.com/v', 'clip')
+        self.assertEqual(self._wait(service, job['id'])['status'], DONE)
+        stats = service.stats()['concurrency']
+        self.assertEqual((stats['limit'], stats['active'], stats['max_limit']), (2, 0, 4))
+
+    def test_providers_are_warmed_up_once_at_start(self):
+        self._service()
+        self.assertTrue(self.provider.warmed)
+
+    def test_successful_job_is_uploaded(self):
+        def uploader(path):
+            self.uploaded.append(path)
+            return 'drive-id'
+
+        service = self._service(uploader)
+        job = self._wait(service, service.submit('https://example.com/a', 'clip')['id'])
+        self.assertEqual(job['status'], DONE)
+        self.assertEqual(job['remote_id'], 'drive-id')
+        self.assertEqual(self.uploaded, [job['filepath']])
+
+    def test_every_part_of_a_carousel_is_uploaded(self):
+        def uploader(path):
+            self.uploaded.append(path)
+            return f"drive-{len(self.uploaded)}"
+
+        service = self._service(uploader)
+        job = self._wait(service, service.submit('https://example.com/carousel', 'post')['id'])
+        self.assertEqual(job['status'], DONE)
+        self.assertEqual(self.uploaded, job['filepaths'])
+        self.assertEqual(job['remote_ids'], ['drive-1', 'drive-2'])
+
+    def test_failed_upload_fails_the_job(self):
+        service = self._service(lambda path: None)
+        job = self._wait(service, service.submit('https://example.com/a', 'clip')['id'])
+        self.assertEqual(job['status'], FAILED)
+        self.assertEqual(job['error_type'], 'UploadError')
+
+    def test_download_errors_are_reported_by_type(self):
+        service = self._service()
+        job = self._wait(service, service.submit('https://example.com/private', 'clip')['id'])
+        self.assertEqual(job['status'], FAILED)
+        self.assertEqual(job['error_type'], 'AuthenticationRequiredError')
+
+
+class TestJobAPI(unittest.TestCase):
+    """The HTTP layer validates input and exposes job status."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        downloader = VideoDownloader(
+            output_dir=self._tmp.name, prevent_duplicates=False,
+            providers=[FileWritingProvider()],
+        )
+        self.service = DownloadService(downloader, workers=1, bandwidth=BandwidthLimiter())
+        self.server = make_server(self.service, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.shutdown()
+        self._tmp.cleanup()
+
+    def _request(self, method, path, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = Request(self.base + path, data=data, method=method,
+                          headers={'Content-Type': 'application/json'})
+        try:
+            with urlopen(request, timeout=5) as response:
+                return response.status, json.loads(response.read())
+        except HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_submit_and_poll(self):
+        status, job = self._request('POST', '/jobs', {'link': 'https://example.com/v', 'title': 't'})
+        self.assertEqual(status, 202)
+
+        for _ in range(200):
+            status, polled = self._request('GET', f"/jobs/{job['id']}")
+            if polled['status'] == DONE:
+                break
+            time.sleep(0.01)
+        self.assertEqual(polled['status'], DONE)
+
+        status, health = self._request('GET', '/health')
+        self.assertEqual(health['jobs'][DONE], 1)
+
+    def test_rejects_missing_link(self):
+        status, body = self._request('POST', '/jobs', {'title': 'no link'})
+        self.assertEqual(status, 400)
+
+    def test_bandwidth_limits_change_at_runtime(self):
+        status, limits = self._request('POST', '/bandwidth', {'download': '2M', 'upload': 0})
+        self.assertEqual(status, 200)
+        self.assertEqual(limits['download']['rate'], 2 * 2**20)
+        self.assertIsNone(limits['upload']['rate'])
+        self.assertEqual(self.service.bandwidth.download.rate, 2 * 2**20)
+
+        status, _ = self._request('POST', '/bandwidth', {'download': 'fast'})
+        self.assertEqual(status, 400)
+        status, health = self._request('GET', '/health')
+        self.assertEqual(health['bandwidth']['download']['rate'], 2 * 2**20)
+
+    def test_unknown_job_is_404(self):
+        status, _ = self._request('GET', '/jobs/nope')
+        self.assertEqual(status, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
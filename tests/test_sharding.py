@@ -0,0 +1,106 @@
+"""Tests for sharding a job list across runners and merging their manifests."""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import app
+from downloader.sharding import (
+    in_shard,
+    merge_manifests,
+    parse_shard,
+    shard_of,
+    write_manifest,
+)
+
+
+class TestShardAssignment(unittest.TestCase):
+    """Every job lands in exactly one shard, the same one every time."""
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard('3/20'), (3, 20))
+        for bad in ('0/4', '5/4', '1/0', 'two/4', '1'):
+            with self.assertRaises(ValueError):
+                parse_shard(bad)
+
+    def test_assignment_is_stable(self):
+        # Pinned so a change of hash is noticed: runners of one import must agree
+        self.assertEqual(shard_of('youtube:dQw4w9WgXcQ', 20), 19)
+        self.assertEqual(shard_of('youtube:dQw4w9WgXcQ', 1), 1)
+
+    def test_shards_are_disjoint_and_roughly_even(self):
+        ids = [f'youtube:video{i:05d}' for i in range(5000)]
+        sizes = [sum(in_shard(job_id, (i, 20)) for job_id in ids) for i in range(1, 21)]
+        self.assertEqual(sum(sizes), len(ids))
+        self.assertLess(max(sizes), 1.3 * len(ids) / 20)
+
+
+class TestManifests(unittest.TestCase):
+    """Per-shard manifests merge into one report."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+
+    def _write(self, shard, jobs):
+        path = os.path.join(self._tmp.name, f'manifest-{shard[0]}.json')
+        write_manifest(path, jobs, shard)
+        return path
+
+    def test_merge_combines_shards_and_reports_missing_ones(self):
+        paths = [
+            self._write((1, 3), [{'id': 'a', 'state': 'done'}]),
+            self._write((3, 3), [{'id': 'c', 'state': 'failed', 'error_type': 'DownloadError'}]),
+        ]
+        merged = merge_manifests(paths)
+        self.assertEqual([job['id'] for job in merged['jobs']], ['a', 'c'])
+        self.assertEqual(merged['missing'], [2])
+
+    def test_merge_rejects_mixed_shard_counts(self):
+        paths = [self._write((1, 2), []), self._write((2, 3), [])]
+        with self.assertRaises(ValueError):
+            merge_manifests(paths)
+
+
+class TestShardedRun(unittest.TestCase):
+    """app.py runs one shard per invocation and merges their manifests."""
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.links = [f'https://example.com/video{i}' for i in range(12)]
+        with open('data.json', 'w', encoding='utf-8') as f:
+            json.dump([{'title': f'v{i}', 'link': link} for i, link in enumerate(self.links)], f)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_shards_cover_the_list_once_and_merge_cleanly(self):
+        with patch.object(app.VideoDownloader, 'download',
+                          side_effect=lambda url, title=None, **kw:
+                              {'success': True, 'filepath': f'{title}.mp4'}) as download, \
+             patch.object(app, 'sendVideo', return_value='drive-file-id'):
+            for i in (1, 2, 3):
+                app.main(['--shard', f'{i}/3', '--manifest', f'shard{i}.json'])
+
+        downloaded = [c.args[0] for c in download.call_args_list]
+        self.assertEqual(sorted(downloaded), sorted(self.links))
+
+        app.main(['merge', 'shard1.json', 'shard2.json', 'shard3.json'])
+
+    def test_merge_with_a_missing_shard_fails(self):
+        write_manifest('shard1.json', [], (1, 2))
+        with self.assertRaises(SystemExit) as ctx:
+            app.main(['merge', 'shard1.json'])
+        self.assertEqual(ctx.exception.code, app.EXIT_ERROR)
+
+
+if __name__ == '__main__':
+    unittest.main()
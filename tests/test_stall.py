@@ -0,0 +1,133 @@
+"""Tests for stall detection on yt-dlp transfers."""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader.exceptions import DownloadError, DownloadStalledError
+from downloader.providers.stall import StallMonitor
+from downloader.providers.ytdlp_provider import YtDlpProvider
+
+KiB = 1024
+
+
+class _Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _progress(done, name='clip.mp4.part', status='downloading'):
+    return {'status': status, 'tmpfilename': name, 'downloaded_bytes': done}
+
+
+class TestStallMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = _Clock()
+        self.monitor = StallMonitor(min_speed=10 * KiB, window=30, clock=self.clock)
+
+    def _feed(self, seconds, speed, start=0, name='clip.mp4.part'):
+        for second in range(seconds + 1):
+            self.clock.now = start + second
+            self.monitor(_progress(speed * second, name))
+
+    def test_steady_transfer_is_left_alone(self):
+        self._feed(120, 50 * KiB)
+        self.assertIsNone(self.monitor.stalled)
+
+    def test_trickle_is_aborted_after_a_window(self):
+        with self.assertRaises(DownloadStalledError):
+            self._feed(120, 2 * KiB)
+        self.assertEqual(self.clock.now, 30)
+        self.assertIn('clip.mp4.part stalled at 2.0 KiB/s', self.monitor.stalled)
+
+    def test_slowdown_after_a_fast_start_is_caught(self):
+        self._feed(30, 100 * KiB)
+        base = 30 * 100 * KiB
+        with self.assertRaises(DownloadStalledError):
+            for second in range(1, 120):
+                self.clock.now = 30 + second
+                self.monitor(_progress(base + second * KiB))
+        # The fast start takes a while to leave the window
+        self.assertGreater(self.clock.now, 55)
+
+    def test_finished_file_is_forgotten(self):
+        self.monitor(_progress(0))
+        self.clock.now = 100
+        self.monitor(_progress(10, status='finished'))
+        self.monitor(_progress(10))
+        self.assertIsNone(self.monitor.stalled)
+
+
+class TestStallRestart(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, 'clip.mp4')
+        with open(self.path, 'w') as f:
+            f.write('video')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _download_once(self, stalls):
+        calls = []
+
+        def download_once(url, opts, before_download, session=None, info=None,
+                          entry_formats=None):
+            calls.append(info)
+            if len(calls) <= stalls:
+                monitor = opts['progress_hooks'][-1]
+                monitor.stalled = 'clip.mp4.part stalled at 1.0 KiB/s over 60s'
+                raise DownloadStalledError(monitor.stalled)
+            return [self.path]
+
+        return calls, download_once
+
+    def test_stall_restarts_at_once_with_a_fresh_extraction(self):
+        provider = YtDlpProvider(max_retries=1, stall_speed=KiB, stall_restarts=2)
+        calls, download_once = self._download_once(stalls=2)
+        with patch.object(provider, '_download_once', side_effect=download_once), \
+             patch('downloader.providers.ytdlp_provider.time.sleep') as sleep:
+            paths = provider.download_all('https://example.com/v', self._tmp.name, 'clip')
+        self.assertEqual(paths, [self.path])
+        self.assertEqual(len(calls), 3)
+        sleep.assert_not_called()
+
+    def test_persistent_stall_fails_the_attempt_and_is_retried(self):
+        provider = YtDlpProvider(max_retries=2, retry_delay=0, stall_speed=KiB, stall_restarts=1)
+        calls, download_once = self._download_once(stalls=10)
+        with patch.object(provider, '_download_once', side_effect=download_once), \
+             patch('downloader.providers.ytdlp_provider.time.sleep'):
+            with self.assertRaisesRegex(DownloadError, 'stalled'):
+                provider.download_all('https://example.com/v', self._tmp.name, 'clip')
+        # Two attempts of two tries each
+        self.assertEqual(len(calls), 4)
+
+    def test_disabled_monitor_adds_no_hook(self):
+        provider = YtDlpProvider(stall_speed=0)
+        calls, download_once = self._download_once(stalls=0)
+        with patch.object(provider, '_download_once', side_effect=download_once) as once:
+            provider.download_all('https://example.com/v', self._tmp.name, 'clip')
+        hooks = once.call_args[0][1]['progress_hooks']
+        self.assertFalse(any(isinstance(hook, StallMonitor) for hook in hooks))
+
+
+    def test_stall_detection_is_off_unless_asked_for(self):
+        with patch.dict(os.environ):
+            os.environ.pop('STALL_SPEED', None)
+            self.assertIsNone(YtDlpProvider().stall_speed)
+            os.environ['STALL_SPEED'] = '16K'
+            self.assertEqual(YtDlpProvider().stall_speed, 16 * KiB)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""Unit tests for the staging-directory disk budget."""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader.storage import StorageManager, estimate_size, parse_size
+
+
+class TestSizes(unittest.TestCase):
+    """Size parsing and estimation from yt-dlp metadata."""
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size('1024'), 1024)
+        self.assertEqual(parse_size('2G'), 2 * 1024 ** 3)
+        self.assertEqual(parse_size('1.5MiB'), int(1.5 * 1024 ** 2))
+        with self.assertRaises(ValueError):
+            parse_size('lots')
+
+    def test_estimate_prefers_exact_size(self):
+        self.assertEqual(estimate_size({'filesize': 10, 'filesize_approx': 20}), 10)
+        self.assertEqual(estimate_size({'filesize_approx': 20}), 20)
+
+    def test_estimate_sums_merged_formats(self):
+        info = {'requested_formats': [{'filesize': 100}, {'filesize_approx': 50}]}
+        self.assertEqual(estimate_size(info), 150)
+
+    def test_estimate_falls_back_to_bitrate(self):
+        # 10 s at 800 KBit/s
+        self.assertEqual(estimate_size({'duration': 10, 'tbr': 800}), 1_000_000)
+
+    def test_estimate_unknown(self):
+        self.assertIsNone(estimate_size({}))
+        self.assertIsNone(estimate_size({'requested_formats': [{'filesize': 1}, {}]}))
+
+
+class TestStorageManager(unittest.TestCase):
+    """Reservations respect the budget; uploads free their space."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _file(self, name, size):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        return path
+
+    def test_reserve_blocks_until_space_is_released(self):
+        storage = StorageManager(self.dir, budget_bytes=100)
+        first = storage.reserve(80)
+        acquired = threading.Event()
+
+        def second():
+            storage.reserve(50)
+            acquired.set()
+
+        threading.Thread(target=second, daemon=True).start()
+        time.sleep(0.05)
+        self.assertFalse(acquired.is_set())
+
+        storage.cancel(first)
+        self.assertTrue(acquired.wait(1))
+
+    def test_reserve_times_out(self):
+        storage = StorageManager(self.dir, budget_bytes=100)
+        storage.reserve(80)
+        with self.assertRaises(TimeoutError):
+            storage.reserve(50, timeout=0.01)
+
+    def test_oversized_download_runs_alone(self):
+        storage = StorageManager(self.dir, budget_bytes=100)
+        storage.reserve(500, timeout=0)
+        with self.assertRaises(TimeoutError):
+            storage.reserve(1, timeout=0)
+
+    def test_release_deletes_the_uploaded_file(self):
+        storage = StorageManager(self.dir, budget_bytes=100)
+        path = self._file('a.mp4', 60)
+        storage.commit(storage.reserve(80), path)
+        self.assertEqual(storage.used_bytes, 60)
+
+        storage.release(path)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(storage.used_bytes, 0)
+
+    def test_kept_uploads_are_evicted_least_recently_used_first(self):
+        storage = StorageManager(self.dir, budget_bytes=100, keep_uploaded=True)
+        old = self._file('old.mp4', 40)
+        new = self._file('new.mp4', 40)
+        storage.commit(storage.reserve(40), old)
+        storage.commit(storage.reserve(40), new)
+        storage.release(old)
+        storage.release(new)
+        storage.touch(old)
+
+        storage.reserve(50, timeout=0)
+        self.assertTrue(os.path.exists(old))
+        self.assertFalse(os.path.exists(new))
+
+    def test_files_awaiting_upload_are_never_evicted(self):
+        storage = StorageManager(self.dir, budget_bytes=100, keep_uploaded=True)
+        pending = self._file('pending.mp4', 80)
+        storage.commit(storage.reserve(80), pending)
+        with self.assertRaises(TimeoutError):
+            storage.reserve(50, timeout=0)
+        self.assertTrue(os.path.exists(pending))
+
+
+if __name__ == '__main__':
+    unittest.main()
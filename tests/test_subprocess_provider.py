@@ -0,0 +1,221 @@
+"""Tests for providers running in worker processes, and fallback between providers."""
+
+import os
+import sys
+import tempfile
+import textwrap
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader.bandwidth import BandwidthLimiter
+from downloader.exceptions import (
+    AuthenticationRequiredError,
+    DownloadError,
+    ExtractionError,
+    UnsupportedPlatformError,
+)
+from downloader.providers import BaseProvider, FallbackProvider, SubprocessProvider
+from downloader.providers.worker import compact_info
+
+# Stands in for a second yt-dlp install: a module only the worker can import
+_FAKE_PROVIDER = '''
+import os
+import time
+from downloader.bandwidth import shared_limiter
+from downloader.providers import BaseProvider
+from downloader.exceptions import ExtractionError
+
+
+class FakeProvider(BaseProvider):
+    def __init__(self, label='alt'):
+        self.label = label
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    @property
+    def name(self):
+        return self.label
+
+    def supports(self, url):
+        return True
+
+    def extract_info(self, url):
+        if 'broken' in url:
+            raise ExtractionError('unsupported page layout')
+        if 'crash' in url:
+            os._exit(3)
+        if 'slow' in url:
+            time.sleep(0.5)
+        print('progress noise on stdout')
+        return {'id': url.rsplit('/', 1)[-1], 'label': self.label, 'pid': os.getpid()}
+
+    def download(self, url, output_path, title=None, **options):
+        return self.download_all(url, output_path, title, **options)[0]
+
+    def download_all(self, url, output_path, title=None, before_download=None, received=0):
+        shared_limiter().download.consume(received)
+        path = os.path.join(output_path, f"{title}.mp4")
+        if before_download:
+            before_download({'format_id': '18', '_filename': path, 'filesize': 4,
+                             'formats': ['not sent']})
+        with open(path, 'w') as f:
+            f.write(self.label)
+        for listener in self.listeners:
+            listener({'ok': True, 'throttled': False, 'auth': False, 'bytes': 4})
+        return [path]
+'''
+
+
+class TestSubprocessProvider(unittest.TestCase):
+    """Calls round-trip through a long-lived worker with its own import path."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        with open(os.path.join(self._tmp.name, 'fake_provider.py'), 'w') as f:
+            f.write(textwrap.dedent(_FAKE_PROVIDER))
+        self.provider = SubprocessProvider(path=[self._tmp.name],
+                                           target='fake_provider:FakeProvider',
+                                           options={'label': 'nightly'})
+
+    def tearDown(self):
+        self.provider.close()
+        self._tmp.cleanup()
+
+    def test_worker_is_started_once_and_reused(self):
+        first = self.provider.extract_info('https://example.com/a')
+        second = self.provider.extract_info('https://example.com/b')
+        self.assertEqual(first['label'], 'nightly')
+        self.assertEqual(first['pid'], second['pid'])
+        self.assertNotEqual(first['pid'], os.getpid())
+
+    def test_download_reports_before_download_with_a_compact_info(self):
+        seen = []
+        [path] = self.provider.download_all('https://example.com/v', self._tmp.name, 'clip',
+                                            before_download=seen.append)
+        with open(path) as f:
+            self.assertEqual(f.read(), 'nightly')
+        self.assertEqual(seen, [{'format_id': '18', '_filename': path, 'filesize': 4}])
+
+    def test_attempts_are_forwarded_to_listeners(self):
+        attempts = []
+        self.provider.add_listener(attempts.append)
+        self.provider.download_all('https://example.com/v', self._tmp.name, 'clip')
+        self.assertEqual(attempts, [{'ok': True, 'throttled': False, 'auth': False, 'bytes': 4}])
+
+    def test_downloads_spend_the_parent_bandwidth(self):
+        limiter = BandwidthLimiter()
+        provider = SubprocessProvider(path=[self._tmp.name], target='fake_provider:FakeProvider',
+                                      bandwidth=limiter)
+        try:
+            provider.download_all('https://example.com/v', self._tmp.name, 'clip',
+                                  received=3 * 2**20)
+        finally:
+            provider.close()
+        self.assertEqual(limiter.download.stats()['consumed'], 3 * 2**20)
+
+    def test_errors_keep_their_type(self):
+        with self.assertRaises(ExtractionError):
+            self.provider.extract_info('https://example.com/broken')
+        # The worker survives a failed call
+        self.assertEqual(self.provider.extract_info('https://example.com/ok')['id'], 'ok')
+
+    def test_dead_worker_is_replaced(self):
+        with self.assertRaises(DownloadError):
+            self.provider.extract_info('https://example.com/crash')
+        self.assertEqual(self.provider.pids, [])
+        self.assertEqual(self.provider.extract_info('https://example.com/ok')['id'], 'ok')
+
+    def test_worker_is_recycled_after_max_jobs(self):
+        self.provider.max_jobs = 2
+        pids = [self.provider.extract_info(f'https://example.com/{i}')['pid'] for i in range(4)]
+        self.assertEqual(pids[0], pids[1])
+        self.assertEqual(pids[2], pids[3])
+        self.assertNotEqual(pids[1], pids[2])
+        self.assertEqual(self.provider.recycled, 2)
+
+    def test_worker_is_recycled_past_max_rss(self):
+        self.provider.max_rss = 1
+        first = self.provider.extract_info('https://example.com/a')['pid']
+        self.assertEqual(self.provider.pids, [])
+        self.assertNotEqual(self.provider.extract_info('https://example.com/b')['pid'], first)
+
+    def test_calls_run_in_parallel_workers(self):
+        provider = SubprocessProvider(path=[self._tmp.name], target='fake_provider:FakeProvider',
+                                      workers=3)
+        self.addCleanup(provider.close)
+        provider.warm_up()
+        self.assertEqual(len(set(provider.pids)), 3)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            pids = set(executor.map(lambda i: provider.extract_info(
+                f'https://example.com/slow{i}')['pid'], range(3)))
+        self.assertEqual(len(pids), 3)
+
+    def test_unloadable_target_fails_as_a_download_error(self):
+        provider = SubprocessProvider(target='no_such_module:Provider')
+        with self.assertRaises(DownloadError):
+            provider.extract_info('https://example.com/v')
+
+
+class _Provider(BaseProvider):
+
+    def __init__(self, label, error=None):
+        self.label = label
+        self.error = error
+        self.calls = 0
+
+    @property
+    def name(self):
+        return self.label
+
+    def supports(self, url):
+        return True
+
+    def extract_info(self, url):
+        return {}
+
+    def download(self, url, output_path, title=None, **options):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return f'{self.label}.mp4'
+
+
+class TestFallbackProvider(unittest.TestCase):
+
+    def test_stale_extractor_failure_moves_to_the_next_provider(self):
+        for error in (DownloadError('no formats'), ExtractionError('regex failed'),
+                      AuthenticationRequiredError('empty media response')):
+            stable, nightly = _Provider('stable', error), _Provider('nightly')
+            self.assertEqual(FallbackProvider([stable, nightly]).download_all('u', '.'),
+                             ['nightly.mp4'])
+
+    def test_last_failure_is_raised(self):
+        providers = [_Provider('stable', DownloadError('a')),
+                     _Provider('nightly', ExtractionError('b'))]
+        with self.assertRaises(ExtractionError):
+            FallbackProvider(providers).download_all('u', '.')
+
+    def test_bad_input_is_not_retried(self):
+        nightly = _Provider('nightly')
+        provider = FallbackProvider([_Provider('stable', UnsupportedPlatformError('x')), nightly])
+        with self.assertRaises(UnsupportedPlatformError):
+            provider.download_all('u', '.')
+        self.assertEqual(nightly.calls, 0)
+
+    def test_compact_info_keeps_merge_sizes(self):
+        info = {'format_id': '137+140', 'formats': [{}] * 50,
+                'requested_formats': [{'format_id': '137', 'filesize': 10, 'url': 'x'},
+                                      {'format_id': '140', 'filesize_approx': 2}]}
+        self.assertEqual(compact_info(info), {
+            'format_id': '137+140',
+            'requested_formats': [{'format_id': '137', 'filesize': 10},
+                                  {'format_id': '140', 'filesize_approx': 2}],
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""Tests for incremental channel/playlist sync."""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader import VideoDownloader
+from downloader.jobstore import DONE, FAILED, JobStore
+from downloader.pipeline import BatchRunner
+from downloader.providers import BaseProvider
+from downloader.sync import ArchiveIndex, ChannelSync, archive_key
+
+
+class ListingProvider(BaseProvider):
+    """Lists a fixed set of entries for any URL."""
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.listings = 0
+
+    @property
+    def name(self):
+        return 'listing'
+
+    def supports(self, url):
+        return True
+
+    def extract_info(self, url):
+        return {}
+
+    def list_entries(self, url):
+        self.listings += 1
+        return [{'id': i, 'url': f'https://www.youtube.com/watch?v={i}',
+                 'title': f'video {i}', 'extractor': 'youtube'} for i in self.ids]
+
+    def download(self, url, output_path, title=None, **options):
+        raise AssertionError('sync must not download')
+
+
+class TestArchiveIndex(unittest.TestCase):
+    """The archive persists one line per entry."""
+
+    def test_entries_survive_reloading(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'archive.txt')
+            archive = ArchiveIndex(path)
+            archive.add('youtube abc')
+            archive.add('youtube abc')
+
+            reloaded = ArchiveIndex(path)
+            self.assertIn('youtube abc', reloaded)
+            self.assertEqual(len(reloaded), 1)
+            with open(path) as f:
+                self.assertEqual(f.read(), 'youtube abc\n')
+
+    def test_archive_key_needs_extractor_and_id(self):
+        self.assertEqual(archive_key({'extractor': 'youtube', 'id': 'x'}), 'youtube x')
+        self.assertIsNone(archive_key({'extractor': None, 'id': 'x'}))
+
+
+class TestChannelSync(unittest.TestCase):
+    """Only entries not yet archived are queued."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.store = JobStore()
+        self.archive = ArchiveIndex(os.path.join(self._tmp.name, 'archive.txt'))
+        self.provider = ListingProvider(['aaaaaaaaaaa', 'bbbbbbbbbbb', 'ccccccccccc'])
+        self.sync = ChannelSync(
+            VideoDownloader(output_dir=self._tmp.name, providers=[self.provider]),
+            self.store, self.archive,
+        )
+
+    def tearDown(self):
+        self.store.close()
+        self._tmp.cleanup()
+
+    def test_archived_entries_are_skipped(self):
+        self.archive.add('youtube aaaaaaaaaaa')
+        jobs = self.sync.queue_new('https://www.youtube.com/@channel')
+        self.assertEqual([j['id'] for j in jobs],
+                         ['youtube:bbbbbbbbbbb', 'youtube:ccccccccccc'])
+        self.assertEqual(jobs[0]['title'], 'video bbbbbbbbbbb')
+
+    def test_only_finished_jobs_are_archived(self):
+        done, failed, _ = self.sync.queue_new('https://www.youtube.com/@channel')
+        done = self.store.update(done['id'], DONE)
+        failed = self.store.update(failed['id'], FAILED, error='boom')
+
+        self.assertEqual(self.sync.record([done, failed]), 1)
+        self.assertIn('youtube aaaaaaaaaaa', self.archive)
+        self.assertNotIn('youtube bbbbbbbbbbb', self.archive)
+
+    def test_job_finished_before_archiving_is_archived_on_the_next_sync(self):
+        [job, *_] = self.sync.queue_new('https://www.youtube.com/@channel')
+        self.store.update(job['id'], DONE)
+
+        jobs = self.sync.queue_new('https://www.youtube.com/@channel')
+        self.assertEqual(len(jobs), 2)
+        self.assertIn('youtube aaaaaaaaaaa', self.archive)
+
+    def test_jobs_are_archived_as_they_finish(self):
+        seen = []
+
+        def download_all(url, output_path, title=None, **options):
+            # What the archive held when this download started
+            seen.append(len(self.archive))
+            path = os.path.join(output_path, f"{title}.mp4")
+            open(path, 'w').close()
+            return [path]
+
+        self.provider.download_all = download_all
+        self.sync.queue_new('https://www.youtube.com/@channel')
+        runner = BatchRunner(self.sync.downloader, self.store, on_finished=self.sync.finished)
+        for job in self.store.unfinished():
+            runner.process(job)
+        self.assertEqual(seen, [0, 1, 2])
+        self.assertEqual(len(self.archive), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""Unit tests for URL canonicalization."""
+
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader.utils import canonical_id, canonicalize_url, platform_of
+
+
+class TestCanonicalId(unittest.TestCase):
+    """Every spelling of the same post must collapse to one identity."""
+
+    def test_instagram_reel_and_post_are_the_same_media(self):
+        variants = [
+            'https://www.instagram.com/reel/Cx1_ab-C/?igsh=MWQ1ZGUxMzBkMA==',
+            'https://instagram.com/p/Cx1_ab-C/',
+            'https://www.instagram.com/reels/Cx1_ab-C',
+            'https://www.instagram.com/someuser/reel/Cx1_ab-C/?utm_source=ig_web_copy_link',
+        ]
+        self.assertEqual({canonical_id(u) for u in variants}, {'instagram:Cx1_ab-C'})
+
+    def test_youtube_variants_are_the_same_media(self):
+        variants = [
+            'https://youtu.be/dQw4w9WgXcQ?si=AbCdEf',
+            'https://www.youtube.com/watch?v=dQw4w9WgXcQ&si=AbCdEf',
+            'https://m.youtube.com/watch?feature=share&v=dQw4w9WgXcQ',
+            'https://youtube.com/shorts/dQw4w9WgXcQ?feature=share',
+        ]
+        self.assertEqual({canonical_id(u) for u in variants}, {'youtube:dQw4w9WgXcQ'})
+
+    def test_tiktok_id_ignores_uploader_and_tracking(self):
+        self.assertEqual(
+            canonical_id('https://www.tiktok.com/@someone/video/7301234567890?is_from_webapp=1'),
+            'tiktok:7301234567890',
+        )
+
+    def test_unknown_host_falls_back_to_stripped_url(self):
+        a = canonical_id('https://www.vimeo.com/123456/?utm_source=x&utm_medium=y#t=5')
+        b = canonical_id('https://vimeo.com/123456')
+        self.assertEqual(a, b)
+
+    def test_meaningful_query_parameters_are_kept(self):
+        self.assertNotEqual(
+            canonical_id('https://example.com/watch?id=1'),
+            canonical_id('https://example.com/watch?id=2'),
+        )
+
+
+class TestCanonicalizeUrl(unittest.TestCase):
+    """The canonical URL is what gets handed to yt-dlp."""
+
+    def test_youtube_short_link_becomes_watch_url(self):
+        self.assertEqual(
+            canonicalize_url('https://youtu.be/dQw4w9WgXcQ?si=AbCdEf'),
+            'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+        )
+
+    def test_instagram_reel_becomes_post_url(self):
+        self.assertEqual(
+            canonicalize_url('https://www.instagram.com/reel/Cx1_ab-C/?igsh=abc'),
+            'https://www.instagram.com/p/Cx1_ab-C/',
+        )
+
+    def test_unknown_host_keeps_its_subdomain(self):
+        # Many extractors match on the exact host, so only tracking is removed
+        self.assertEqual(
+            canonicalize_url('https://www.tiktok.com/@someone/video/1?_r=1&lang=en'),
+            'https://www.tiktok.com/@someone/video/1?lang=en',
+        )
+
+    def test_non_http_input_is_returned_unchanged(self):
+        self.assertEqual(canonicalize_url('not-a-url'), 'not-a-url')
+
+
+class TestPlatformOf(unittest.TestCase):
+    """Every spelling and short link of a site counts as one platform."""
+
+    def test_known_platforms(self):
+        self.assertEqual(platform_of('https://youtu.be/dQw4w9WgXcQ'), 'youtube')
+        self.assertEqual(platform_of('https://vm.tiktok.com/ZMabc/'), 'tiktok')
+        self.assertEqual(platform_of('https://fb.watch/abc/'), 'facebook')
+        self.assertEqual(platform_of('https://twitter.com/u/status/1'), 'x')
+
+    def test_other_hosts_are_their_own_platform(self):
+        self.assertEqual(platform_of('https://www.vimeo.com/1'), 'vimeo.com')
+        self.assertEqual(platform_of('not-a-url'), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
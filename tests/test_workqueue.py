@@ -0,0 +1,398 @@
+"""Tests for the leased work queue, its backends and the worker loop."""
+
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from downloader import VideoDownloader
+from downloader.breaker import CircuitBreaker
+from downloader.deadline import Deadline
+from downloader.exceptions import AuthenticationRequiredError, DeadlineExceededError
+from downloader.providers import BaseProvider
+from downloader.storage import StorageManager
+from downloader.workqueue import (
+    DONE,
+    FAILED,
+    LEASED,
+    PENDING,
+    RedisQueue,
+    SQLiteQueue,
+    Worker,
+    enqueue,
+    open_queue,
+)
+
+
+class _RedisStandIn(socketserver.StreamRequestHandler):
+    """Serves the handful of Redis commands the queue uses, from memory."""
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2].decode())
+            with self.server.lock:
+                reply = self._execute(args[0].upper(), args[1:])
+            self.wfile.write(self._encode(reply))
+
+    def _execute(self, command, args):
+        data = self.server.data
+        if command == 'HSET':
+            data.setdefault(args[0], {})[args[1]] = args[2]
+            return 1
+        if command == 'HSETNX':
+            table = data.setdefault(args[0], {})
+            if args[1] in table:
+                return 0
+            table[args[1]] = args[2]
+            return 1
+        if command == 'HGET':
+            return data.get(args[0], {}).get(args[1])
+        if command == 'HDEL':
+            return int(data.get(args[0], {}).pop(args[1], None) is not None)
+        if command == 'HINCRBY':
+            table = data.setdefault(args[0], {})
+            table[args[1]] = str(int(table.get(args[1], 0)) + int(args[2]))
+            return int(table[args[1]])
+        if command == 'HVALS':
+            return list(data.get(args[0], {}).values())
+        if command == 'RPUSH':
+            data.setdefault(args[0], []).append(args[1])
+            return len(data[args[0]])
+        if command == 'LPOP':
+            items = data.get(args[0]) or []
+            return items.pop(0) if items else None
+        if command == 'ZADD':
+            zset = data.setdefault(args[0], {})
+            if args[1] == 'XX':
+                if args[3] in zset:
+                    zset[args[3]] = float(args[2])
+                return 0
+            zset[args[2]] = float(args[1])
+            return 1
+        if command == 'ZREM':
+            return int(data.get(args[0], {}).pop(args[1], None) is not None)
+        if command == 'ZRANGEBYSCORE':
+            high = float(args[2])
+            return [m for m, score in sorted(data.get(args[0], {}).items(), key=lambda i: i[1])
+                    if score <= high]
+        return Exception(f"ERR unknown command {command}")
+
+    @classmethod
+    def _encode(cls, reply):
+        if reply is None:
+            return b'$-1\r\n'
+        if isinstance(reply, Exception):
+            return f"-{reply}\r\n".encode()
+        if isinstance(reply, int):
+            return f":{reply}\r\n".encode()
+        if isinstance(reply, list):
+            return f"*{len(reply)}\r\n".encode() + b''.join(cls._encode(r) for r in reply)
+        data = reply.encode()
+        return b'$%d\r\n%s\r\n' % (len(data), data)
+
+
+class _QueueContract:
+    """Behaviour every backend must share. Subclasses provide `_queue()`."""
+
+    def test_entries_are_claimed_once_in_order(self):
+        queue = self._queue()
+        self.assertTrue(queue.put('a', {'url': 'https://example.com/a'}))
+        self.assertFalse(queue.put('a', {'url': 'https://example.com/a'}))
+        queue.put('b', {'url': 'https://example.com/b'})
+
+        first = queue.claim('w1', 60)
+        second = queue.claim('w2', 60)
+        self.assertEqual((first.job_id, second.job_id), ('a', 'b'))
+        self.assertEqual(first.payload, {'url': 'https://example.com/a'})
+        self.assertIsNone(queue.claim('w3', 60))
+        self.assertEqual(queue.counts(), {LEASED: 2})
+
+    def test_expired_lease_is_requeued_and_the_old_holder_loses_it(self):
+        queue = self._queue()
+        queue.put('a', {})
+        stale = queue.claim('w1', 60)
+        with patch('downloader.workqueue.time.time', return_value=time.time() + 120):
+            fresh = queue.claim('w2', 60)
+        self.assertEqual(fresh.job_id, 'a')
+        self.assertEqual(fresh.attempts, 2)
+        self.assertFalse(queue.heartbeat(stale, 60))
+        self.assertFalse(queue.complete(stale, {}))
+        self.assertTrue(queue.heartbeat(fresh, 60))
+        self.assertTrue(queue.complete(fresh, {'remote_id': 'x'}))
+        self.assertEqual(queue.counts(), {DONE: 1})
+
+    def test_failure_is_retried_until_attempts_run_out(self):
+        queue = self._queue()
+        queue.put('a', {})
+        for _ in range(2):
+            queue.fail(queue.claim('w', 60), {'error': 'boom'})
+            self.assertEqual(queue.counts(), {PENDING: 1})
+        queue.fail(queue.claim('w', 60), {'error': 'boom'})
+        self.assertEqual(queue.counts(), {FAILED: 1})
+        self.assertEqual(queue.remaining(), 0)
+
+    def test_checkpoint_carries_into_later_attempts(self):
+        queue = self._queue()
+        queue.put('a', {'url': 'https://example.com/a'})
+        lease = queue.claim('w', 60)
+        self.assertTrue(queue.checkpoint(lease, {'url': 'https://example.com/a', 'step': 1}))
+        queue.fail(lease, {'error': 'boom'})
+        self.assertEqual(queue.claim('w', 60).payload['step'], 1)
+        self.assertFalse(queue.checkpoint(lease, {}))
+
+    def test_released_entry_keeps_its_attempt_and_waits(self):
+        queue = self._queue()
+        queue.put('a', {})
+        lease = queue.claim('w', 60)
+        self.assertTrue(queue.release(lease, 30))
+        self.assertFalse(queue.complete(lease, {}))
+        self.assertEqual(queue.counts(), {PENDING: 1})
+        self.assertIsNone(queue.claim('w', 60))
+        with patch('downloader.workqueue.time.time', return_value=time.time() + 31):
+            again = queue.claim('w', 60)
+        self.assertEqual(again.job_id, 'a')
+        self.assertEqual(again.attempts, 1)
+
+    def test_permanent_failure_is_not_retried(self):
+        queue = self._queue()
+        queue.put('a', {})
+        queue.fail(queue.claim('w', 60), {'error': 'private'}, retry=False)
+        self.assertEqual(queue.counts(), {FAILED: 1})
+
+
+class TestSQLiteQueue(_QueueContract, unittest.TestCase):
+
+    def _queue(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        queue = SQLiteQueue(os.path.join(tmp.name, 'queue.db'))
+        self.addCleanup(queue.close)
+        return queue
+
+
+class TestRedisQueue(_QueueContract, unittest.TestCase):
+
+    def _queue(self):
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _RedisStandIn)
+        server.daemon_threads = True
+        server.data, server.lock = {}, threading.Lock()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        queue = open_queue(f'redis://127.0.0.1:{server.server_address[1]}/0')
+        self.assertIsInstance(queue, RedisQueue)
+        self.addCleanup(queue.close)
+        return queue
+
+
+class FileWritingProvider(BaseProvider):
+    """Writes a small file per download; 'private' URLs need a login."""
+
+    @property
+    def name(self):
+        return 'fake'
+
+    def supports(self, url):
+        return True
+
+    def extract_info(self, url):
+        return {}
+
+    def download(self, url, output_path, title=None, **options):
+        if 'private' in url:
+            raise AuthenticationRequiredError('login required')
+        path = os.path.join(output_path, f"{title}.mp4")
+        with open(path, 'w') as f:
+            f.write('data')
+        return path
+
+
+class TestWorker(unittest.TestCase):
+    """Workers drain the queue between them."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = os.path.join(self._tmp.name, 'queue.db')
+        self.downloader = VideoDownloader(output_dir=self._tmp.name, prevent_duplicates=False,
+                                          providers=[FileWritingProvider()])
+
+    def _worker(self, name, uploader=None):
+        queue = SQLiteQueue(self.path)
+        self.addCleanup(queue.close)
+        return Worker(queue, self.downloader, uploader=uploader, lease_seconds=30,
+                      poll_interval=0.01, worker_id=name)
+
+    def test_two_workers_drain_the_queue_without_overlap(self):
+        queue = SQLiteQueue(self.path)
+        self.addCleanup(queue.close)
+        for i in range(10):
+            enqueue(queue, f'https://example.com/v{i}', f'v{i}')
+
+        workers = [self._worker(f'w{i}', uploader=lambda path, **kw: 'remote') for i in range(2)]
+        results = [None, None]
+        threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, workers[i].run()))
+                   for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        ids = [job['id'] for jobs in results for job in jobs]
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(len(set(ids)), 10)
+        self.assertTrue(all(job['state'] == DONE for jobs in results for job in jobs))
+        self.assertEqual(queue.counts(), {DONE: 10})
+
+    def test_permanent_failure_is_reported_once(self):
+        queue = SQLiteQueue(self.path)
+        self.addCleanup(queue.close)
+        enqueue(queue, 'https://example.com/private', 'p')
+
+        [job] = self._worker('w').run()
+        self.assertEqual(job['state'], FAILED)
+        self.assertEqual(job['error_type'], 'AuthenticationRequiredError')
+
+    def test_failed_upload_is_retried_by_the_queue(self):
+        queue = SQLiteQueue(self.path)
+        self.addCleanup(queue.close)
+        enqueue(queue, 'https://example.com/v', 'v')
+        calls = []
+
+        def flaky_uploader(path, **kw):
+            calls.append(path)
+            return 'remote' if len(calls) > 1 else None
+
+        [job] = self._worker('w', uploader=flaky_uploader).run()
+        self.assertEqual(job['state'], DONE)
+        self.assertEqual(len(calls), 2)
+
+    def test_interrupted_upload_continues_its_session(self):
+        queue = SQLiteQueue(self.path)
+        self.addCleanup(queue.close)
+        enqueue(queue, 'https://example.com/v', 'v')
+        calls = []
+
+        def interrupted_uploader(path, session_uri=None, on_session=None):
+            calls.append(session_uri)
+            if session_uri is None:
+                on_session('https://upload/session/1')
+                return None
+            return 'remote'
+
+        [job] = self._worker('w', uploader=interrupted_uploader).run()
+        self.assertEqual(job['state'], DONE)
+        self.assertEqual(calls, [None, 'https://upload/session/1'])
+
+    def test_uploaded_files_are_freed_from_storage(self):
+        queue = SQLiteQueue(self.path)
+        self.addCleanup(queue.close)
+        enqueue(queue, 'https://example.com/v', 'v')
+        storage = StorageManager(self._tmp.name, budget_bytes=2**20)
+        worker = Worker(queue, self.downloader, uploader=lambda path, **kw: 'remote',
+                        poll_interval=0.01, worker_id='w', storage=storage)
+
+        [job] = worker.run()
+        self.assertEqual(job['state'], DONE)
+        self.assertFalse(os.path.exists(job['filepath']))
+        self.assertEqual(storage.used_bytes, 0)
+
+    def test_open_circuit_puts_the_job_back_until_its_probe(self):
+        queue = SQLiteQueue(self.path)
+        self.addCleanup(queue.close)
+        enqueue(queue, 'https://example.com/v', 'v')
+        downloader = VideoDownloader(output_dir=self._tmp.name, prevent_duplicates=False,
+                                     providers=[FileWritingProvider()],
+                                     breaker=CircuitBreaker(threshold=1, cooldown=300))
+        downloader.breaker.record('example.com', ok=False)
+        worker = Worker(queue, downloader, worker_id='w')
+
+        self.assertIsNone(worker.process(queue.claim('w', 30)))
+        self.assertEqual(queue.counts(), {PENDING: 1})
+        self.assertIsNone(queue.claim('w', 30))
+        with patch('downloader.workqueue.time.time', return_value=time.time() + 301):
+            lease = queue.claim('w', 30)
+        # The refused claim did not use up an attempt
+        self.assertEqual(lease.attempts, 1)
+
+    def test_upload_stopped_by_the_deadline_goes_back_resumable(self):
+        queue = SQLiteQueue(self.path)
+        self.addCleanup(queue.close)
+        enqueue(queue, 'https://example.com/v', 'v')
+        calls = []
+
+        def uploader(path, session_uri=None, on_session=None, deadline=None):
+            calls.append((session_uri, deadline))
+            if session_uri is None:
+                on_session('https://upload/session/1')
+                raise DeadlineExceededError(f"Upload of {path} stopped")
+            return 'remote'
+
+        deadline = Deadline.after(3600)
+        worker = Worker(queue, self.downloader, uploader=uploader, worker_id='w1',
+                        deadline=deadline)
+        [job] = worker.run()
+        # Left over for the next run, not failed, and the worker stopped claiming
+        self.assertEqual(job['state'], PENDING)
+        self.assertEqual(queue.counts(), {PENDING: 1})
+        self.assertIs(calls[0][1], deadline)
+
+        [job] = self._worker('w2', uploader=uploader).run()
+        self.assertEqual(job['state'], DONE)
+        self.assertEqual(calls[1][0], 'https://upload/session/1')
+
+    def test_passed_deadline_claims_nothing(self):
+        queue = SQLiteQueue(self.path)
+        self.addCleanup(queue.close)
+        enqueue(queue, 'https://example.com/v', 'v')
+        worker = Worker(queue, self.downloader, worker_id='w', deadline=Deadline(0))
+
+        self.assertEqual(worker.run(), [])
+        self.assertEqual(queue.counts(), {PENDING: 1})
+
+    def test_download_stopped_by_the_deadline_keeps_its_attempt(self):
+        queue = SQLiteQueue(self.path)
+        self.addCleanup(queue.close)
+        enqueue(queue, 'https://example.com/v', 'v')
+        worker = Worker(queue, self.downloader, worker_id='w',
+                        deadline=Deadline.after(3600))
+
+        with patch.object(self.downloader, 'download',
+                          side_effect=DeadlineExceededError('deadline passed')) as download:
+            [job] = worker.run()
+        self.assertEqual(job['state'], PENDING)
+        self.assertEqual(download.call_args.kwargs['deadline'], worker.deadline.at)
+        self.assertEqual(queue.claim('w', 30).attempts, 1)
+
+    def test_heartbeat_keeps_a_long_job_leased(self):
+        queue = SQLiteQueue(self.path)
+        self.addCleanup(queue.close)
+        enqueue(queue, 'https://example.com/v', 'v')
+        worker = Worker(queue, self.downloader, lease_seconds=0.3, worker_id='w')
+
+        original = worker._run_job
+
+        def slow_job(lease):
+            time.sleep(0.6)
+            return original(lease)
+
+        with patch.object(worker, '_run_job', side_effect=slow_job):
+            [job] = worker.run()
+        self.assertEqual(job['state'], DONE)
+
+
+if __name__ == '__main__':
+    unittest.main()
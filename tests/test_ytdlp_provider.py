@@ -3,14 +3,20 @@
 import unittest
 import os
 import sys
+import tempfile
 from unittest.mock import MagicMock, patch
 
+import yt_dlp
+
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
+from downloader.cookies import CookiePool, CookieSession
+from downloader.proxies import Route, RoutePool
 from downloader.exceptions import AuthenticationRequiredError, DownloadError
 from downloader.providers.ytdlp_provider import (
     YtDlpProvider,
     _is_auth_error,
+    _is_extraction_error,
     _is_rate_limited,
 )
 
@@ -77,6 +83,187 @@ class TestResolveFilepath(unittest.TestCase):
         self.assertIsNone(YtDlpProvider._resolve_filepath({'_type': 'playlist', 'entries': []}))
         self.assertIsNone(YtDlpProvider._resolve_filepath({'_type': 'multi_video'}))
 
+    def test_resolve_filepaths_returns_every_entry(self):
+        info = {
+            '_type': 'multi_video',
+            'entries': [
+                {'requested_downloads': [{'filepath': 'part1.mp4'}]},
+                None,
+                {'requested_downloads': [{'filepath': 'part2.mp4'}]},
+            ],
+        }
+        self.assertEqual(YtDlpProvider._resolve_filepaths(info), ['part1.mp4', 'part2.mp4'])
+
+
+class TestMultiPartDownload(unittest.TestCase):
+    """Carousel entries are fetched by their own YoutubeDL, each under its own name."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+
+    def _ydl(self, opts):
+        ydl = MagicMock()
+        ydl.opts = opts
+        ydl.__enter__.return_value = ydl
+        ydl.extract_info.return_value = {
+            '_type': 'multi_video',
+            'id': 'x',
+            'title': 'Post by someone',
+            'extractor': 'Instagram',
+            'extractor_key': 'Instagram',
+            'webpage_url': 'https://www.instagram.com/p/x/',
+            'entries': [{'id': 'a'}, {'id': 'b', 'webpage_url': 'https://cdn.example/b'}, None],
+        }
+
+        def process(entry, download=True):
+            path = opts['outtmpl'].replace('%(ext)s', 'mp4')
+            open(path, 'w').close()
+            return {'_filename': path}
+
+        ydl.process_ie_result.side_effect = process
+        self.instances.append(ydl)
+        return ydl
+
+    def test_each_entry_is_downloaded_to_a_numbered_file(self):
+        self.instances = []
+        with patch('downloader.providers.ytdlp_provider.yt_dlp.YoutubeDL', side_effect=self._ydl):
+            paths = YtDlpProvider(retry_delay=0).download_all(
+                'https://www.instagram.com/p/x/', self._tmp.name, title='post')
+
+        self.assertEqual([os.path.basename(p) for p in paths], ['post - 01.mp4', 'post - 02.mp4'])
+        # One instance resolves the post, one more per entry
+        self.assertEqual(len(self.instances), 3)
+        self.assertEqual(self.instances[0].process_ie_result.call_count, 0)
+
+    def test_each_entry_is_pinned_to_its_recorded_format(self):
+        self.instances = []
+        with patch('downloader.providers.ytdlp_provider.yt_dlp.YoutubeDL', side_effect=self._ydl):
+            YtDlpProvider(retry_delay=0).download_all(
+                'https://www.instagram.com/p/x/', self._tmp.name, title='post',
+                entry_formats=['137+140', '22'])
+
+        resolver, *entries = self.instances
+        self.assertNotIn(resolver.opts['format'], ('137+140', '22'))
+        formats = {os.path.basename(ydl.opts['outtmpl']): ydl.opts['format'] for ydl in entries}
+        self.assertEqual(formats, {'post - 01.%(ext)s': '137+140', 'post - 02.%(ext)s': '22'})
+
+    def test_entries_get_the_playlist_fields(self):
+        self.instances = []
+        with patch('downloader.providers.ytdlp_provider.yt_dlp.YoutubeDL', side_effect=self._ydl):
+            YtDlpProvider(retry_delay=0).download_all(
+                'https://www.instagram.com/p/x/', self._tmp.name, title='post')
+
+        entries = sorted((ydl.process_ie_result.call_args[0][0] for ydl in self.instances[1:]),
+                         key=lambda entry: entry['playlist_index'])
+        first, second = entries
+        self.assertEqual(first['id'], 'a')
+        self.assertEqual(first['extractor_key'], 'Instagram')
+        self.assertEqual(first['webpage_url'], 'https://www.instagram.com/p/x/')
+        self.assertEqual(first['webpage_url_domain'], 'instagram.com')
+        self.assertEqual(first['playlist_id'], 'x')
+        self.assertEqual(first['playlist'], 'Post by someone')
+        self.assertEqual(first['n_entries'], 2)
+        self.assertEqual(second['playlist_index'], 2)
+        # An entry's own fields are kept
+        self.assertEqual(second['webpage_url'], 'https://cdn.example/b')
+
+    def test_download_returns_the_first_part(self):
+        self.instances = []
+        with patch('downloader.providers.ytdlp_provider.yt_dlp.YoutubeDL', side_effect=self._ydl):
+            path = YtDlpProvider(retry_delay=0).download(
+                'https://www.instagram.com/p/x/', self._tmp.name, title='post')
+        self.assertEqual(os.path.basename(path), 'post - 01.mp4')
+
+
+class TestPrefetch(unittest.TestCase):
+    """A prefetched download starts from the extracted metadata, over the same route."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.instances = []
+
+    def _ydl(self, opts):
+        ydl = MagicMock()
+        ydl.opts = opts
+        ydl.__enter__.return_value = ydl
+        ydl.extract_info.return_value = {'id': 'v', 'formats': []}
+
+        def process(info, download=True):
+            path = opts['outtmpl'].replace('%(ext)s', 'mp4')
+            open(path, 'w').close()
+            return {'_filename': path}
+
+        ydl.process_ie_result.side_effect = process
+        self.instances.append(ydl)
+        return ydl
+
+    def test_download_skips_extraction(self):
+        routes = RoutePool([Route('http://proxy-a:8080'), Route('http://proxy-b:8080')])
+        provider = YtDlpProvider(retry_delay=0, route_pool=routes)
+        with patch('downloader.providers.ytdlp_provider.yt_dlp.YoutubeDL', side_effect=self._ydl):
+            prefetched = provider.prefetch('https://example.com/v')
+            provider.download_all('https://example.com/v', self._tmp.name, 'clip',
+                                  prefetched=prefetched)
+
+        fetcher, downloader = self.instances
+        self.assertEqual(fetcher.extract_info.call_count, 1)
+        downloader.extract_info.assert_not_called()
+        downloader.process_ie_result.assert_called_once_with({'id': 'v', 'formats': []},
+                                                             download=True)
+        self.assertEqual(fetcher.opts['proxy'], downloader.opts['proxy'])
+        self.assertEqual([route.active for route in routes.routes], [0, 0])
+
+    def test_discarded_prefetch_returns_its_route(self):
+        routes = RoutePool([Route('http://proxy-a:8080')])
+        provider = YtDlpProvider(route_pool=routes)
+        with patch('downloader.providers.ytdlp_provider.yt_dlp.YoutubeDL', side_effect=self._ydl):
+            prefetched = provider.prefetch('https://example.com/v')
+        self.assertEqual(routes.routes[0].active, 1)
+        prefetched.discard()
+        prefetched.discard()
+        self.assertEqual(routes.routes[0].active, 0)
+
+
+class TestListEntries(unittest.TestCase):
+    """Flat listings are reduced to id, URL, title and extractor."""
+
+    def _list(self, info):
+        ydl = MagicMock()
+        ydl.__enter__.return_value.extract_info.return_value = info
+        with patch('downloader.providers.ytdlp_provider.yt_dlp.YoutubeDL', return_value=ydl) as cls:
+            entries = YtDlpProvider().list_entries('https://www.youtube.com/@channel')
+        self.assertEqual(cls.call_args[0][0]['extract_flat'], 'in_playlist')
+        return entries
+
+    def test_lists_playlist_entries_without_extracting_them(self):
+        entries = self._list({
+            '_type': 'playlist',
+            'entries': [
+                {'_type': 'url', 'id': 'a', 'ie_key': 'Youtube', 'title': 'A',
+                 'url': 'https://www.youtube.com/watch?v=a'},
+                None,
+            ],
+        })
+        self.assertEqual(entries, [{'id': 'a', 'url': 'https://www.youtube.com/watch?v=a',
+                                    'title': 'A', 'extractor': 'youtube'}])
+
+    def test_flattens_channel_tabs(self):
+        entries = self._list({
+            '_type': 'playlist',
+            'entries': [{'_type': 'playlist', 'entries': [
+                {'id': 'a', 'ie_key': 'Youtube', 'url': 'https://www.youtube.com/watch?v=a'},
+            ]}],
+        })
+        self.assertEqual([e['id'] for e in entries], ['a'])
+
+    def test_single_video_lists_itself(self):
+        [entry] = self._list({'id': 'v', 'extractor_key': 'Youtube', 'title': 'V',
+                              'webpage_url': 'https://www.youtube.com/watch?v=v'})
+        self.assertEqual(entry['extractor'], 'youtube')
+        self.assertEqual(entry['url'], 'https://www.youtube.com/watch?v=v')
+
 
 class TestAuthErrorDetection(unittest.TestCase):
     """Tests for telling a hard refusal apart from a throttle."""
@@ -108,6 +295,33 @@ class TestAuthErrorDetection(unittest.TestCase):
         self.assertFalse(_is_rate_limited('HTTP Error 500: Internal Server Error'))
 
 
+class TestExtractionErrorDetection(unittest.TestCase):
+    """Only the platform failing to serve metadata counts against its circuit."""
+
+    def _wrapped(self, error):
+        # As YoutubeDL.report_error() raises it
+        try:
+            raise error
+        except Exception:
+            return yt_dlp.utils.DownloadError(f"ERROR: {error}", sys.exc_info())
+
+    def test_extractor_error_counts(self):
+        error = yt_dlp.utils.ExtractorError('Unable to extract shared data')
+        self.assertTrue(_is_extraction_error(self._wrapped(error)))
+
+    def test_connection_failure_during_extraction_does_not(self):
+        error = yt_dlp.utils.ExtractorError('Unable to download webpage',
+                                            cause=ConnectionResetError())
+        self.assertFalse(_is_extraction_error(self._wrapped(error)))
+
+    def test_unsupported_url_and_local_errors_do_not(self):
+        self.assertFalse(_is_extraction_error(
+            self._wrapped(yt_dlp.utils.UnsupportedError('https://example.com/x'))))
+        self.assertFalse(_is_extraction_error(
+            yt_dlp.utils.DownloadError('ERROR: Postprocessing: ffmpeg exited with code 1')))
+        self.assertFalse(_is_extraction_error(OSError(28, 'No space left on device')))
+
+
 class TestFormatSelector(unittest.TestCase):
     """Merged formats may only be offered when ffmpeg can do the merging."""
 
@@ -151,6 +365,56 @@ class TestRateLimitRetry(unittest.TestCase):
                 self._provider().download('https://youtube.com/watch?v=x', output_path='.')
             self.assertEqual(ydl_cls.call_count, 1)
 
+    def test_throttled_cookie_session_is_rotated_out(self):
+        pool = CookiePool([CookieSession('a.txt', jar='jar-a'), CookieSession('b.txt', jar='jar-b')])
+        error = Exception(TestAuthErrorDetection.INSTAGRAM_AMBIGUOUS)
+        provider = YtDlpProvider(max_retries=2, retry_delay=0, cookie_pool=pool)
+        jars = []
+        with patch('downloader.providers.ytdlp_provider.yt_dlp.YoutubeDL',
+                   side_effect=lambda opts: self._recording_ydl(error, jars)), \
+             patch('downloader.providers.ytdlp_provider.time.sleep'):
+            with self.assertRaises(AuthenticationRequiredError):
+                provider.download('https://instagram.com/p/x', output_path='.')
+
+        self.assertEqual(jars, ['jar-a', 'jar-b'])
+        self.assertEqual([s.throttles for s in pool.sessions], [1, 1])
+
+    def _recording_ydl(self, error, jars):
+        ydl = MagicMock()
+        ydl.__enter__.return_value = ydl
+
+        def extract_info(*args, **kwargs):
+            jars.append(ydl.cookiejar)
+            raise error
+
+        ydl.extract_info.side_effect = extract_info
+        return ydl
+
+    def test_attempts_are_reported_to_listeners(self):
+        error = Exception(TestAuthErrorDetection.INSTAGRAM_AMBIGUOUS)
+        provider = self._provider()
+        attempts = []
+        provider.add_listener(attempts.append)
+        with self._patched_ydl(error), \
+             patch('downloader.providers.ytdlp_provider.time.sleep'):
+            with self.assertRaises(AuthenticationRequiredError):
+                provider.download('https://instagram.com/p/x', output_path='.')
+        self.assertEqual([(a['ok'], a['throttled'], a['auth']) for a in attempts],
+                         [(False, True, False)] * 3)
+
+    def test_retry_gate_can_stop_retries(self):
+        provider = self._provider()
+        asked = []
+        provider.set_retry_gate(lambda url: asked.append(url) or False)
+        attempts = []
+        provider.add_listener(attempts.append)
+        with self._patched_ydl(Exception('HTTP Error 500: Internal Server Error')), \
+             patch('downloader.providers.ytdlp_provider.time.sleep'):
+            with self.assertRaisesRegex(DownloadError, 'after 1 attempt'):
+                provider.download('https://example.com/v', output_path='.')
+        self.assertEqual(asked, ['https://example.com/v'])
+        self.assertEqual(len(attempts), 1)
+
     def test_generic_failure_still_raises_download_error(self):
         with self._patched_ydl(Exception('HTTP Error 500: Internal Server Error')), \
              patch('downloader.providers.ytdlp_provider.time.sleep'):